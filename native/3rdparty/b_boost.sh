@@ -38,9 +38,6 @@ BOOST_SOURCE_PARENT_DIR="${SCRIPT_BASE_DIR}/source/boost"
 BOOST_SOURCE_DIR_NAME="boost_${BOOST_VERSION_UNDERSCORE}"
 BOOST_SOURCE_DIR_FULL_PATH="${BOOST_SOURCE_PARENT_DIR}/${BOOST_SOURCE_DIR_NAME}"
 
-echo -e "${YELLOW}--- Clearing Boost source---${NC}"
-rm -rf "$BOOST_SOURCE_DIR_FULL_PATH"
-
 # --- Boost 构建目录
 BOOST_BUILD_ROOT_DIR="${SCRIPT_BASE_DIR}/build/boost"
 
@@ -55,12 +52,81 @@ ANDROID_API_ARM64="24"
 ANDROID_API_X86="24"
 ANDROID_API_X86_64="24"
 CLANG_VERSION_FOR_JAM="20.0"
+# 编译参数配置: default | speed (ThinLTO + 按 ABI 调优) | size | debug-perf (保留帧指针, 用于性能分析)
+BOOST_FLAG_PROFILE="${BOOST_FLAG_PROFILE:-default}"
+# 链接配置: default | lean (段回收, ICF, 默认隐藏符号, 重定位压缩, gnu hash; 减小 .so 体积并加快 dlopen)
+BOOST_LINK_PROFILE="${BOOST_LINK_PROFILE:-default}"
 HOST_TAG_FOR_JAM="linux-x86_64"
+# 编译缓存: none | auto | ccache | sccache (auto: 使用 PATH 中找到的第一个)
+COMPILER_LAUNCHER="${COMPILER_LAUNCHER:-auto}"
+# 预编译产物缓存: 本地目录或 sftp://user@host[:port]/path, none 关闭 (默认 ~/.cache/geecodex/3rdparty-prebuilt)
+PREBUILT_CACHE="${PREBUILT_CACHE:-}"
+# 全新构建: 1 时删除已解压的源码和 b2 构建目录; 默认保留, 增量构建时 b2 只重新编译变化的部分
+BOOST_CLEAN_BUILD="${BOOST_CLEAN_BUILD:-0}"
 
 # 配置 NDK 工具链
 NDK_TOOLCHAIN_BIN_PATH="${ANDROID_NDK_HOME}/toolchains/llvm/prebuilt/linux-x86_64/bin"
 NDK_SYSROOT="${ANDROID_NDK_HOME}/toolchains/llvm/prebuilt/linux-x86_64/sysroot"
 
+PYTHON_JAM_GENERATOR="${SCRIPT_DIR_REALPATH}/gen_boost_jam.py"
+PREBUILT_CACHE_PY="${SCRIPT_DIR_REALPATH}/prebuilt_cache.py"
+export ENV_ANDROID_NDK_HOME="${ANDROID_NDK_HOME}"
+export ENV_ANDROID_API_ARM64="${ANDROID_API_ARM64}"
+export ENV_ANDROID_API_ARM32="${ANDROID_API_ARM32}"
+export ENV_ANDROID_API_X86="${ANDROID_API_X86}"
+export ENV_ANDROID_API_X86_64="${ANDROID_API_X86_64}"
+export ENV_HOST_TAG="${HOST_TAG_FOR_JAM}"
+export ENV_CLANG_VERSION_FOR_JAM="${CLANG_VERSION_FOR_JAM}"
+export ENV_BOOST_FLAG_PROFILE="${BOOST_FLAG_PROFILE}"
+export ENV_BOOST_LINK_PROFILE="${BOOST_LINK_PROFILE}"
+export ENV_COMPILER_LAUNCHER="${COMPILER_LAUNCHER}"
+export ENV_PREBUILT_CACHE="${PREBUILT_CACHE}"
+# ccache: 将工作目录下的绝对路径改写为相对路径, 并且不把 cwd 计入哈希,
+# 配合生成器中的 -ffile-prefix-map 使不同机器/目录之间也能命中缓存
+export CCACHE_BASEDIR="${SCRIPT_BASE_DIR}"
+export CCACHE_NOHASHDIR=true
+
+# ---- 预编译产物缓存 ----
+# 缓存键由 Boost 版本, ABI, 生成的工具链参数 (与路径无关), 编译器版本及本脚本内容决定;
+# 命中的 ABI 直接恢复安装目录, 全部命中时无需下载和编译源码
+echo -e "${BLUE}--- Looking up prebuilt Boost in cache ---${NC}"
+declare -A PREBUILT_CACHE_KEYS
+ABIS_NOT_CACHED=()
+for CURRENT_ABI in "${ABIS_TO_BUILD[@]}"; do
+    if [ "$CURRENT_ABI" = "linux-x86_64" ]; then
+        COMPILER_ID="$HOST_GCC_VERSION"
+    else
+        COMPILER_ID="NDK $NDK_VERSION_STRING, $CLANG_VERSION_STRING"
+    fi
+    if ! TOOLSET_FINGERPRINT=$(python3 "$PYTHON_JAM_GENERATOR" --fingerprint "$CURRENT_ABI") ||
+       ! PREBUILT_CACHE_KEYS[$CURRENT_ABI]=$(python3 "$PREBUILT_CACHE_PY" key \
+            --library boost --version "$BOOST_VERSION" --abi "$CURRENT_ABI" \
+            --config "$TOOLSET_FINGERPRINT" --config "$COMPILER_ID" \
+            --config-file "${SCRIPT_DIR_REALPATH}/b_boost.sh"); then
+        echo -e "${BRED}Error: Failed to compute prebuilt cache key for ABI $CURRENT_ABI ${NC}" >&2
+        exit 1
+    fi
+    if python3 "$PREBUILT_CACHE_PY" restore --key "${PREBUILT_CACHE_KEYS[$CURRENT_ABI]}" \
+            --dest "${BOOST_INSTALL_ROOT_DIR}/boost_android_${CURRENT_ABI}" --label "boost ${BOOST_VERSION} ${CURRENT_ABI}"; then
+        echo -e "${GREEN}Boost ABI $CURRENT_ABI restored from prebuilt cache.${NC}"
+    else
+        ABIS_NOT_CACHED+=("$CURRENT_ABI")
+    fi
+done
+ABIS_TO_BUILD=("${ABIS_NOT_CACHED[@]}")
+export ENV_BOOST_ABIS="${ABIS_TO_BUILD[*]}"
+
+if [ ${#ABIS_TO_BUILD[@]} -eq 0 ]; then
+    echo -e "${BGREEN}All Boost ABIs restored from prebuilt cache, nothing to build.${NC}"
+    ls -1 "$BOOST_INSTALL_ROOT_DIR"
+    exit 0
+fi
+
+if [ "$BOOST_CLEAN_BUILD" = "1" ]; then
+    echo -e "${YELLOW}--- Clearing Boost source---${NC}"
+    rm -rf "$BOOST_SOURCE_DIR_FULL_PATH"
+fi
+
 # ---- Boost 源码 ----
 echo -e "${YELLOW}--- Preparing Boost source: $BOOST_SOURCE_PARENT_DIR ---${NC}"
 mkdir -p "$BOOST_SOURCE_PARENT_DIR"
@@ -91,17 +157,18 @@ else
 fi
 
 # ---- 生成 project-config.jam ----
-PYTHON_JAM_GENERATOR="${SCRIPT_DIR_REALPATH}/gen_boost_jam.py"
 echo -e "${BLUE}--- Generating project-config.jam ---${NC}"
-export ENV_ANDROID_NDK_HOME="${ANDROID_NDK_HOME}"
-export ENV_ANDROID_API_ARM64="${ANDROID_API_ARM64}"
-export ENV_ANDROID_API_ARM32="${ANDROID_API_ARM32}"
-export ENV_ANDROID_API_X86="${ANDROID_API_X86}"
-export ENV_ANDROID_API_X86_64="${ANDROID_API_X86_64}"
-export ENV_HOST_TAG="${HOST_TAG_FOR_JAM}"
-export ENV_CLANG_VERSION_FOR_JAM="${CLANG_VERSION_FOR_JAM}"
-
+# 生成 project-config.jam文件用于 b2 的编译 (内容未变化时不会改写文件)
+cd "$BOOST_SOURCE_DIR_FULL_PATH"
+if ! python3 "$PYTHON_JAM_GENERATOR"; then
+    echo -e "${BRED}Error: Failed to run gen_boost_jam.py ${NC}" >&2
+    exit 1
+fi
 
+if [ ! -f "./project-config.jam" ]; then
+    echo -e "${BRED}Error: NOT GENERATE project-config.jam ${NC}" >&2
+    exit 1
+fi
 
 # --- 构建和安装的根目录 ---
 mkdir -p "$BOOST_BUILD_ROOT_DIR"
@@ -135,7 +202,7 @@ for CURRENT_ABI in "${ABIS_TO_BUILD[@]}"; do
     cd "$BOOST_SOURCE_DIR_FULL_PATH"
 
     echo -e "${YELLOW}--- Building and installing Boost for ABI $CURRENT_ABI(It will take a long time...) ---${NC}"
-    if [ -d "$B2_BUILD_DIR_ABI" ]; then
+    if [ "$BOOST_CLEAN_BUILD" = "1" ] && [ -d "$B2_BUILD_DIR_ABI" ]; then
       echo -e "${YELLOW}--- Clearing b2 build directory: $B2_BUILD_DIR_ABI ---${NC}"
       rm -rf "$B2_BUILD_DIR_ABI"
     fi
@@ -158,25 +225,6 @@ for CURRENT_ABI in "${ABIS_TO_BUILD[@]}"; do
             "-j$(nproc)"
         )
     else
-        # 生成 project-config.jam文件用于 b2 的编译
-        # if ! python3 "$PYTHON_JAM_GENERATOR"; then
-        # echo -e "${BRED}Error: Failed to run gen_boost_jam.py ${NC}" >&2
-        # exit 1 
-        # fi
-
-        # if [ ! -f "./project-config.jam" ]; then
-        # echo -e "${BRED}Error: NOT GENERATE project-config.jam ${NC}" >&2
-        # exit 1
-        # fi
-
-        unset ENV_ANDROID_NDK_HOME
-        unset ENV_ANDROID_API_ARM64
-        unset ENV_ANDROID_API_ARM32
-        unset ENV_ANDROID_API_X86
-        unset ENV_ANDROID_API_X86_64
-        unset ENV_HOST_TAG
-        unset ENV_CLANG_VERSION_FOR_JAM
-
         if [ "$CURRENT_ABI" = "arm64-v8a" ]; then
             TOOLSET_NAME_FOR_B2_VERSION_SUFFIX="${CLANG_MAJOR_VERSION_SHORT}_android64"
             
@@ -240,9 +288,14 @@ for CURRENT_ABI in "${ABIS_TO_BUILD[@]}"; do
         )
     fi
     if [ -n "$B2_EXTRA_DEFINES_FOR_B2" ]; then B2_ARGS+=("${B2_EXTRA_DEFINES_FOR_B2}"); fi
+    # 编译参数配置所需的 b2 属性 (如 optimization=space)
+    read -r -a B2_PROFILE_PROPERTIES <<< "$(python3 "$PYTHON_JAM_GENERATOR" --b2-properties)"
+    B2_ARGS+=("${B2_PROFILE_PROPERTIES[@]}")
     
     echo "Execute b2: ./b2 ${B2_ARGS[*]}" >> "${LOG_FILE_FOR_ABI}"
 
+    python3 "$PYTHON_JAM_GENERATOR" --zero-cache-stats
+
     BUILD_SUCCESSFUL_FLAG=false
     if ./b2 "${B2_ARGS[@]}" >> "${LOG_FILE_FOR_ABI}" 2>&1; then
         B2_REAL_EXIT_CODE=0
@@ -251,6 +304,12 @@ for CURRENT_ABI in "${ABIS_TO_BUILD[@]}"; do
         B2_REAL_EXIT_CODE=$?
     fi
 
+    CACHE_STATS_LINE=$(python3 "$PYTHON_JAM_GENERATOR" --cache-stats)
+    if [ -n "$CACHE_STATS_LINE" ]; then
+        echo -e "${CYAN}${CACHE_STATS_LINE}${NC}"
+        echo "$CACHE_STATS_LINE" >> "${LOG_FILE_FOR_ABI}"
+    fi
+
     if [ "$BUILD_SUCCESSFUL_FLAG" = true ]; then
         echo -e "${GREEN}Boost ABI $CURRENT_ABI built successfully. Log file: ${LOG_FILE_FOR_ABI}${NC}"
 
@@ -274,6 +333,24 @@ for CURRENT_ABI in "${ABIS_TO_BUILD[@]}"; do
         echo "b2 Arguments Used: "              >> "$REPORT_FILE"
         printf "    %s\n" "${B2_ARGS[@]}"       >> "$REPORT_FILE"
         echo ""                                 >> "$REPORT_FILE"
+        python3 "$PYTHON_JAM_GENERATOR" --report-flags "$CURRENT_ABI" >> "$REPORT_FILE"
+        echo ""                                 >> "$REPORT_FILE"
+
+        # 与上一次构建对比的 .so 体积/重定位报告
+        SIZE_REPORT=$(python3 "$PYTHON_JAM_GENERATOR" --size-report "${INSTALL_DIR_ABI}/lib" "${INSTALL_DIR_ABI}/size_report_${CURRENT_ABI}.json")
+        echo -e "${CYAN}${SIZE_REPORT}${NC}"
+        echo "$SIZE_REPORT"                     >> "$REPORT_FILE"
+        echo ""                                 >> "$REPORT_FILE"
+        if [ -n "$CACHE_STATS_LINE" ]; then
+            echo "$CACHE_STATS_LINE"            >> "$REPORT_FILE"
+            echo ""                             >> "$REPORT_FILE"
+        fi
+
+        # 发布到预编译产物缓存 (失败仅警告, 不影响本次构建)
+        if ! python3 "$PREBUILT_CACHE_PY" publish --key "${PREBUILT_CACHE_KEYS[$CURRENT_ABI]}" \
+                --src "$INSTALL_DIR_ABI" --label "boost ${BOOST_VERSION} ${CURRENT_ABI}"; then
+            echo -e "${YELLOW}Warning: Boost ABI $CURRENT_ABI was not published to the prebuilt cache.${NC}" >&2
+        fi
     fi
 
     if [ $B2_REAL_EXIT_CODE -ne 0 ]; then
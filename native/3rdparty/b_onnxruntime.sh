@@ -57,12 +57,59 @@ DEFAULT_ANDROID_API="24"
 
 HOST_TAG="linux-x86_64"
 
+ONNXRUNTIME_REPO_URL="https://github.com/microsoft/onnxruntime.git"
+
+# 预编译产物缓存: 本地目录或 sftp://user@host[:port]/path, none 关闭 (默认 ~/.cache/geecodex/3rdparty-prebuilt)
+PREBUILT_CACHE="${PREBUILT_CACHE:-}"
+export ENV_PREBUILT_CACHE="${PREBUILT_CACHE}"
+PREBUILT_CACHE_PY="${SCRIPT_DIR_REALPATH}/prebuilt_cache.py"
+
+# ---- 预编译产物缓存 ----
+# 缓存键由 ONNXRuntime commit (ls-remote 解析, 无需克隆), ABI, 构建配置, 编译器版本及本脚本内容决定;
+# 全部命中时跳过克隆 (含子模块) 和编译
+typeset -A PREBUILT_CACHE_KEYS
+ONNXRUNTIME_REVISION=$(git_remote_revision "$ONNXRUNTIME_REPO_URL" "$ONNXRUNTIME_VERSION") || ONNXRUNTIME_REVISION=""
+if [ -n "$ONNXRUNTIME_REVISION" ]; then
+    echo -e "${BLUE}--- Looking up prebuilt ONNXRuntime in cache ---${NC}"
+    ABIS_NOT_CACHED=()
+    for CURRENT_ABI in "${ABIS_TO_BUILD[@]}"; do
+        if [ "$CURRENT_ABI" = "linux-x86_64" ]; then
+            CACHED_INSTALL_DIR="${ONNXRUNTIME_INSTALL_ROOT_DIR}/onnxruntime_${CURRENT_ABI}"
+            COMPILER_ID="$HOST_GCC_VERSION"
+            BUILD_CONFIG_ID="config=${ONNXRUNTIME_HOST_BUILD_CONFIG}"
+        else
+            CACHED_INSTALL_DIR="${ONNXRUNTIME_INSTALL_ROOT_DIR}/onnxruntime_android_${CURRENT_ABI}"
+            COMPILER_ID="NDK $NDK_VERSION_STRING, $CLANG_VERSION_STRING"
+            BUILD_CONFIG_ID="config=${ONNXRUNTIME_BUILD_CONFIG} api=${DEFAULT_ANDROID_API}"
+        fi
+        PREBUILT_CACHE_KEYS[$CURRENT_ABI]=$(python3 "$PREBUILT_CACHE_PY" key --library onnxruntime \
+            --version "$ONNXRUNTIME_REVISION" --abi "$CURRENT_ABI" \
+            --config "$BUILD_CONFIG_ID" --config "$COMPILER_ID" \
+            --config-file "${SCRIPT_DIR_REALPATH}/b_onnxruntime.sh")
+        if python3 "$PREBUILT_CACHE_PY" restore --key "${PREBUILT_CACHE_KEYS[$CURRENT_ABI]}" \
+                --dest "$CACHED_INSTALL_DIR" --label "onnxruntime ${ONNXRUNTIME_VERSION} ${CURRENT_ABI}"; then
+            echo -e "${GREEN}ONNXRuntime ABI $CURRENT_ABI restored from prebuilt cache.${NC}"
+        else
+            ABIS_NOT_CACHED+=("$CURRENT_ABI")
+        fi
+    done
+    ABIS_TO_BUILD=("${ABIS_NOT_CACHED[@]}")
+
+    if [ ${#ABIS_TO_BUILD[@]} -eq 0 ]; then
+        echo -e "${BGREEN}All ONNXRuntime ABIs restored from prebuilt cache, nothing to build.${NC}"
+        ls -1 "$ONNXRUNTIME_INSTALL_ROOT_DIR"
+        exit 0
+    fi
+else
+    echo -e "${YELLOW}Warning: Could not resolve ONNXRuntime revision '$ONNXRUNTIME_VERSION', prebuilt cache disabled for this run.${NC}" >&2
+fi
+
 # ---- 准备源码 ----
 echo -e "${YELLOW}--- Preparing ONNXRuntime source directories under: $ONNXRUNTIME_SOURCE_PARENT_DIR --- ${NC}"
 mkdir -p "$ONNXRUNTIME_SOURCE_PARENT_DIR"
 
 echo -e "${YELLOW}--- Handling ONNXRuntime repository ---${NC}"
-git_clone_or_update "https://github.com/microsoft/onnxruntime.git" "$ONNXRUNTIME_SOURCE_DIR_FULL_PATH" "$ONNXRUNTIME_VERSION"
+git_clone_or_update "$ONNXRUNTIME_REPO_URL" "$ONNXRUNTIME_SOURCE_DIR_FULL_PATH" "$ONNXRUNTIME_VERSION"
 
 if [ -d "$ONNXRUNTIME_SOURCE_DIR_FULL_PATH/.git" ]; then
     echo -e "${YELLOW}--- Update submodules for ONNXRuntime under $ONNXRUNTIME_SOURCE_DIR_FULL_PATH ---${NC}" 
@@ -197,6 +244,13 @@ for CURRENT_ABI in "${ABIS_TO_BUILD[@]}"; do
     fi
 
     cd "$SCRIPT_BASE_DIR"
+
+    # 发布到预编译产物缓存 (失败仅警告)
+    if [ $ONNXRUNTIME_BUILD_EXIT_CODE -eq 0 ] && [ -n "${PREBUILT_CACHE_KEYS[$CURRENT_ABI]}" ]; then
+        python3 "$PREBUILT_CACHE_PY" publish --key "${PREBUILT_CACHE_KEYS[$CURRENT_ABI]}" --src "$INSTALL_DIR_ABI" \
+            --label "onnxruntime ${ONNXRUNTIME_VERSION} ${CURRENT_ABI}" || \
+            echo -e "${YELLOW}Warning: ONNXRuntime ABI $CURRENT_ABI was not published to the prebuilt cache.${NC}" >&2
+    fi
     
     echo -e "${YELLOW}Built ONNXRuntime for ABI $CURRENT_ABI. Copied build output to $INSTALL_DIR_ABI${NC}"
     echo -e "${YELLOW}-------------------------------------------------------------------------------${NC}"
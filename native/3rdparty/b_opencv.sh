@@ -49,17 +49,39 @@ OPENCV_CONTRIB_REPO_NAME="opencv_contrib"
 OPENCV_SOURCE_DIR_FULL_PATH="${OPENCV_SOURCE_PARENT_DIR}/${OPENCV_REPO_NAME}"
 OPENCV_CONTRIB_SOURCE_DIR_FULL_PATH="${OPENCV_SOURCE_PARENT_DIR}/${OPENCV_CONTRIB_REPO_NAME}"
 
+OPENCV_REPO_URL="https://github.com/opencv/opencv.git"
+OPENCV_CONTRIB_REPO_URL="https://github.com/opencv/opencv_contrib.git"
+
 # 构建和安装路径
 OPENCV_BUILD_ROOT_DIR="${SCRIPT_BASE_DIR}/build/opencv"
 OPENCV_INSTALL_ROOT_DIR="${SCRIPT_BASE_DIR}/opencv"
 
-# ---- 准备源码 ----
-echo -e  "${YELLOW}--- Preparing OpenCV source directories under: $OPENCV_SOURCE_PARENT_DIR ---${NC}"
-mkdir -p "$OPENCV_SOURCE_PARENT_DIR"
-echo -e  "${YELLOW}--- Handling OpenCV repository ---${NC}"
-git_clone_or_update "https://github.com/opencv/opencv.git" "$OPENCV_SOURCE_DIR_FULL_PATH" "$OPENCV_VERSION"
-echo -e  "${YELLOW}--- Handling OpenCV Contrib repository ---${NC}"
-git_clone_or_update "https://github.com/opencv/opencv_contrib.git" "$OPENCV_CONTRIB_SOURCE_DIR_FULL_PATH" "$OPENCV_VERSION"
+# 预编译产物缓存: 本地目录或 sftp://user@host[:port]/path, none 关闭 (默认 ~/.cache/geecodex/3rdparty-prebuilt)
+PREBUILT_CACHE="${PREBUILT_CACHE:-}"
+export ENV_PREBUILT_CACHE="${PREBUILT_CACHE}"
+PREBUILT_CACHE_PY="${SCRIPT_DIR_REALPATH}/prebuilt_cache.py"
+
+# 缓存键使用源码的 commit (OPENCV_VERSION 可能是分支), 通过 ls-remote 解析, 无需先克隆
+OPENCV_REVISION=$(git_remote_revision "$OPENCV_REPO_URL" "$OPENCV_VERSION") || OPENCV_REVISION=""
+OPENCV_CONTRIB_REVISION=$(git_remote_revision "$OPENCV_CONTRIB_REPO_URL" "$OPENCV_VERSION") || OPENCV_CONTRIB_REVISION=""
+if [ -z "$OPENCV_REVISION" ] || [ -z "$OPENCV_CONTRIB_REVISION" ]; then
+    echo -e "${YELLOW}Warning: Could not resolve OpenCV revision '$OPENCV_VERSION', prebuilt cache disabled for this run.${NC}" >&2
+fi
+
+# ---- 准备源码 (首次缓存未命中时才克隆/更新) ----
+OPENCV_SOURCE_READY=false
+prepare_opencv_source() {
+    if [ "$OPENCV_SOURCE_READY" = true ]; then
+        return 0
+    fi
+    echo -e  "${YELLOW}--- Preparing OpenCV source directories under: $OPENCV_SOURCE_PARENT_DIR ---${NC}"
+    mkdir -p "$OPENCV_SOURCE_PARENT_DIR"
+    echo -e  "${YELLOW}--- Handling OpenCV repository ---${NC}"
+    git_clone_or_update "$OPENCV_REPO_URL" "$OPENCV_SOURCE_DIR_FULL_PATH" "$OPENCV_VERSION"
+    echo -e  "${YELLOW}--- Handling OpenCV Contrib repository ---${NC}"
+    git_clone_or_update "$OPENCV_CONTRIB_REPO_URL" "$OPENCV_CONTRIB_SOURCE_DIR_FULL_PATH" "$OPENCV_VERSION"
+    OPENCV_SOURCE_READY=true
+}
 
 # 编译日志
 OPENCV_LOG_DIR="${SCRIPT_BASE_DIR}/logs/opencv"
@@ -91,6 +113,25 @@ build_opencv_for_abi() {
         local INSTALL_DIR_ABI="${OPENCV_INSTALL_ROOT_DIR}/opencv_android_${ABI}"
     fi
     
+    # 预编译产物缓存: 命中则直接恢复安装目录
+    local PREBUILT_CACHE_KEY=""
+    if [ -n "$OPENCV_REVISION" ] && [ -n "$OPENCV_CONTRIB_REVISION" ]; then
+        local COMPILER_ID="NDK $NDK_VERSION_STRING, $CLANG_VERSION_STRING"
+        if [ "$ABI" = "linux-x86_64" ]; then
+            COMPILER_ID="$HOST_GCC_VERSION"
+        fi
+        PREBUILT_CACHE_KEY=$(python3 "$PREBUILT_CACHE_PY" key --library opencv \
+            --version "${OPENCV_REVISION}+contrib-${OPENCV_CONTRIB_REVISION}" --abi "$ABI" \
+            --config "min-sdk=${MIN_SDK_VERSION} ${EXTRA_CMAKE_OPTIONS}" --config "$COMPILER_ID" \
+            --config-file "${SCRIPT_DIR_REALPATH}/b_opencv.sh")
+        if python3 "$PREBUILT_CACHE_PY" restore --key "$PREBUILT_CACHE_KEY" --dest "$INSTALL_DIR_ABI" \
+                --label "opencv ${OPENCV_VERSION} ${ABI}"; then
+            echo -e "${GREEN}OpenCV ABI $ABI restored from prebuilt cache.${NC}"
+            return 0
+        fi
+    fi
+    prepare_opencv_source
+
     local LOG_FILE_FOR_ABI="${OPENCV_LOG_DIR}/build_opencv_${ABI}.log"
     rm -rf "$LOG_FILE_FOR_ABI"
 
@@ -252,6 +293,13 @@ build_opencv_for_abi() {
             printf "    %s\n" "${CMAKE_ARGS[@]}"                            >> "$REPORT_FILE"
             echo ""                                                         >> "$REPORT_FILE"
             echo -e "${GREEN}Build Report Generated: ${REPORT_FILE}${NC}"            
+
+            # 发布到预编译产物缓存 (失败仅警告)
+            if [ -n "$PREBUILT_CACHE_KEY" ]; then
+                python3 "$PREBUILT_CACHE_PY" publish --key "$PREBUILT_CACHE_KEY" --src "$INSTALL_DIR_ABI" \
+                    --label "opencv ${OPENCV_VERSION} ${ABI}" || \
+                    echo -e "${YELLOW}Warning: OpenCV ABI $ABI was not published to the prebuilt cache.${NC}" >&2
+            fi
         fi
     fi
 
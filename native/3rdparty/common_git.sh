@@ -79,4 +79,30 @@ git_clone_or_update() {
 
     cd "$original_pwd" || { echo "Error: Failed to cd back to original directory  '$original_pwd'." >&2; return 1; }
     return 0;
-}
\ No newline at end of file
+}
+# 函数: git_remote_revision
+# 功能: 不克隆仓库, 通过 git ls-remote 解析远程分支/标签对应的 commit (附注标签取其指向的 commit)
+# 参数:
+#   $1: Repository URL (仓库地址)
+#   $2: Git Version (tag, branch 或完整的 commit hash)
+# 输出: commit hash; 无法解析时返回 1
+
+git_remote_revision() {
+    local repo_url="$1"
+    local version_tag="$2"
+    local refs
+    local revision
+
+    if printf '%s' "$version_tag" | grep -Eq '^[0-9a-f]{40}$'; then
+        echo "$version_tag"
+        return 0
+    fi
+
+    refs=$(git ls-remote "$repo_url" "$version_tag" "${version_tag}^{}" 2>/dev/null) || return 1
+    revision=$(printf '%s\n' "$refs" | awk '/\^\{\}$/ { print $1; exit }')
+    if [ -z "$revision" ]; then
+        revision=$(printf '%s\n' "$refs" | head -n 1 | cut -f1)
+    fi
+    [ -n "$revision" ] || return 1
+    echo "$revision"
+}
@@ -1,6 +1,145 @@
+import argparse
+import hashlib
+import json
 import os
+import shutil
+import struct
+import subprocess
 import sys
 
+# Per-ABI toolset table. `toolset` is the b2 toolset family, `name_suffix` is
+# appended to the clang major version to form the b2 toolset version that
+# b_boost.sh selects (e.g. toolset=clang-20_android64), and `api_env` names the
+# environment variable holding the Android API level for the ABI.
+# `tune_flags` are only applied by flag profiles with "tune" set; they stay
+# within each ABI's guaranteed instruction set (Android CDD / NDK ABI docs) and
+# only raise the scheduling target, so the libraries still load on every
+# device of that ABI.
+ABI_TOOLSETS = {
+    "arm64-v8a": {
+        "toolset": "clang",
+        "name_suffix": "android64",
+        "triple": "aarch64-none-linux-android",
+        "api_env": "ENV_ANDROID_API_ARM64",
+        "compile_flags": [],
+        "link_flags": [],
+        "tune_flags": ["-march=armv8-a", "-mtune=cortex-a76"],
+    },
+    "armeabi-v7a": {
+        "toolset": "clang",
+        "name_suffix": "android32",
+        "triple": "armv7a-none-linux-androideabi",
+        "api_env": "ENV_ANDROID_API_ARM32",
+        "compile_flags": ["-march=armv7-a", "-mfloat-abi=softfp", "-mfpu=neon"],
+        "link_flags": ["-Wl,--fix-cortex-a8"],
+        "tune_flags": ["-mtune=cortex-a53"],
+    },
+    "x86": {
+        "toolset": "clang",
+        "name_suffix": "androidx86",
+        "triple": "i686-none-linux-android",
+        "api_env": "ENV_ANDROID_API_X86",
+        "compile_flags": ["-march=i686"],
+        "link_flags": [],
+        "tune_flags": ["-mssse3", "-mtune=intel"],
+    },
+    "x86_64": {
+        "toolset": "clang",
+        "name_suffix": "androidx86_64",
+        "triple": "x86_64-none-linux-android",
+        "api_env": "ENV_ANDROID_API_X86_64",
+        "compile_flags": [],
+        "link_flags": [],
+        "tune_flags": ["-msse4.2", "-mpopcnt", "-mtune=intel"],
+    },
+    # Host build used for tests; b_boost.sh builds it with plain toolset=gcc.
+    "linux-x86_64": {
+        "toolset": "gcc",
+        "name_suffix": None,
+        "triple": None,
+        "api_env": None,
+        "compile_flags": [],
+        "link_flags": [],
+        "tune_flags": [],
+    },
+}
+
+# Optimization flag profiles selected with ENV_BOOST_FLAG_PROFILE. `b2` lists
+# properties b_boost.sh adds to the b2 command line; they are needed because
+# b2's own variant flags come after the toolset flags and would override any
+# -O level set here. `lto` adds LTO_FLAGS for the toolset family and `tune`
+# adds the ABI's tune_flags.
+FLAG_PROFILES = {
+    "default": {
+        "description": "-O3, generic codegen",
+        "compile": ["-O3"],
+        "link": [],
+        "b2": [],
+        "lto": False,
+        "tune": False,
+    },
+    "speed": {
+        "description": "-O3 with ThinLTO and per-ABI CPU tuning",
+        "compile": ["-O3"],
+        "link": ["-O3"],
+        "b2": [],
+        "lto": True,
+        "tune": True,
+    },
+    "size": {
+        "description": "optimize for size",
+        "compile": [],
+        "link": [],
+        "b2": ["optimization=space"],
+        "lto": True,
+        "tune": False,
+    },
+    "debug-perf": {
+        "description": "release code with frame pointers and debug info for profilers",
+        "compile": ["-fno-omit-frame-pointer", "-mno-omit-leaf-frame-pointer"],
+        "link": [],
+        "b2": ["debug-symbols=on"],
+        "lto": False,
+        "tune": True,
+    },
+}
+
+LTO_FLAGS = {"clang": "-flto=thin", "gcc": "-flto=auto"}
+
+# Link profiles selected with ENV_BOOST_LINK_PROFILE. "lean" drops unreferenced
+# sections, folds identical code and hides non-exported symbols (Boost marks
+# its API with BOOST_SYMBOL_EXPORT), which shrinks the .so files and the
+# dynamic symbol/relocation tables the loader walks on dlopen. Identical-code
+# folding needs lld, so the host gcc toolset (GNU ld) only gets --gc-sections.
+LINK_PROFILES = {
+    "default": {
+        "description": "toolchain defaults",
+        "compile": [],
+        "cxx": [],
+        "link": {"clang": [], "gcc": []},
+        "android_relocations": False,
+    },
+    "lean": {
+        "description": "section GC, ICF, hidden visibility, packed relocations, gnu hash",
+        "compile": ["-ffunction-sections", "-fdata-sections", "-fvisibility=hidden"],
+        "cxx": ["-fvisibility-inlines-hidden"],
+        "link": {
+            "clang": ["-Wl,--gc-sections", "-Wl,--icf=safe"],
+            "gcc": ["-Wl,--gc-sections"],
+        },
+        "android_relocations": True,
+    },
+}
+
+# Compiler cache launchers understood by ENV_COMPILER_LAUNCHER ("auto" picks
+# the first one found on PATH).
+COMPILER_LAUNCHERS = ("ccache", "sccache")
+
+# Stable names substituted for machine-specific roots in __FILE__, debug info
+# and other embedded paths.
+SOURCE_ROOT_ALIAS = "."
+NDK_ROOT_ALIAS = "/android-ndk"
+
 def get_env_var(var_name, required=True, default_value=None):
     value = os.environ.get(var_name)
     if value is None and default_value is not None:
@@ -10,165 +149,613 @@ def get_env_var(var_name, required=True, default_value=None):
         sys.exit(1)
     return value
 
-def generate_jam_content(
-    ndk_home,
-    api_arm64,
-    api_arm32,
-    api_x86,
-    api_x86_64,
-    host_tag="linux-x86_64",
-    clang_version_for_jam="20.0"
-):
-    base_toolchain_path = f"{ndk_home}/toolchains/llvm/prebuilt/{host_tag}"
-    clang_c_exe = f"{base_toolchain_path}/bin/clang" 
-    clang_cpp_exe = f"{base_toolchain_path}/bin/clang++" 
-    llvm_ar_exe = f"{base_toolchain_path}/bin/llvm-ar"
-    llvm_ranlib_exe = f"{base_toolchain_path}/bin/llvm-ranlib"
-    sysroot = f"{base_toolchain_path}/sysroot"
+def parse_abis(abis_value):
+    """Split a space/comma separated ABI list, keeping ABI_TOOLSETS order."""
+    if not abis_value or not abis_value.strip():
+        return list(ABI_TOOLSETS)
+    requested = abis_value.replace(",", " ").split()
+    unknown = [abi for abi in requested if abi not in ABI_TOOLSETS]
+    if unknown:
+        raise ValueError(
+            f"Unsupported ABI(s): {', '.join(unknown)}. "
+            f"Known ABIs: {', '.join(ABI_TOOLSETS)}"
+        )
+    return [abi for abi in ABI_TOOLSETS if abi in requested]
+
+def resolve_launcher(launcher_value):
+    """Map an ENV_COMPILER_LAUNCHER value to an executable path, or None.
+
+    Accepts "", "none", "auto", "ccache", "sccache" or a path to either tool.
+    A launcher that was asked for by name but is not installed only warns, so
+    builds still work on machines without a compiler cache.
+    """
+    value = (launcher_value or "").strip()
+    if value.lower() in ("", "none", "off", "0"):
+        return None
+    if value.lower() == "auto":
+        for name in COMPILER_LAUNCHERS:
+            path = shutil.which(name)
+            if path:
+                return path
+        return None
+    if os.path.basename(value) not in COMPILER_LAUNCHERS:
+        raise ValueError(
+            f"Unsupported compiler launcher '{value}'. "
+            f"Use one of: none, auto, {', '.join(COMPILER_LAUNCHERS)}"
+        )
+    path = shutil.which(value)
+    if path is None:
+        print(f"Warning: compiler launcher '{value}' not found, compiling without it.", file=sys.stderr)
+    return path
+
+def prefix_map_flags(prefix_maps):
+    flags = []
+    for path, alias in prefix_maps:
+        flags.append(f"-ffile-prefix-map={path}={alias}")
+        flags.append(f"-fdebug-prefix-map={path}={alias}")
+    return flags
+
+def _jam_flags(feature, flags_list):
+    return [f'  <{feature}>"{flag}"' for flag in flags_list]
+
+def _jam_command(launcher, compiler):
+    if launcher:
+        return f'  "{launcher}" "{compiler}"'
+    return f'  "{compiler}"'
+
+def _jam_compiler_c(launcher, compiler):
+    # One <compiler-c> per word, the way b2 turns an option into a command list
+    if launcher:
+        return f'  <compiler-c>"{launcher}" <compiler-c>"{compiler}"'
+    return f'  <compiler-c>"{compiler}"'
+
+def android_relocation_flags(api_level):
+    """lld relocation packing and hash-style flags the given API level can load.
+
+    Follows the NDK build system maintainers guide: APS2 packing from API 23,
+    RELR from API 28 (Android-specific tags before API 30), GNU hash from 23.
+    """
+    api = int(api_level)
+    if api >= 30:
+        flags = ["-Wl,--pack-dyn-relocs=android+relr"]
+    elif api >= 28:
+        flags = ["-Wl,--pack-dyn-relocs=android+relr", "-Wl,--use-android-relr-tags"]
+    elif api >= 23:
+        flags = ["-Wl,--pack-dyn-relocs=android"]
+    else:
+        flags = []
+    flags.append("-Wl,--hash-style=gnu" if api >= 23 else "-Wl,--hash-style=both")
+    return flags
+
+def toolset_flags(abi, api_level=None, toolchain=None, launcher=None,
+                  prefix_maps=(), profile="default", link_profile="default"):
+    """Return the effective cflags/cxxflags/linkflags emitted for `abi`."""
+    spec = ABI_TOOLSETS[abi]
+    profile_spec = FLAG_PROFILES[profile]
+    link_spec = LINK_PROFILES[link_profile]
+    family = spec["toolset"]
+    path_flags = prefix_map_flags(prefix_maps)
+    profile_compile = list(profile_spec["compile"])
+    profile_link = list(profile_spec["link"])
+    if profile_spec["lto"]:
+        profile_compile.append(LTO_FLAGS[family])
+        profile_link.append(LTO_FLAGS[family])
+    if profile_spec["tune"]:
+        profile_compile += spec["tune_flags"]
+    profile_compile += link_spec["compile"]
+    profile_cxx = profile_compile + link_spec["cxx"]
+    profile_link += link_spec["link"][family]
+    if link_spec["android_relocations"] and spec["triple"] is not None:
+        profile_link += android_relocation_flags(api_level)
+
+    if spec["triple"] is None:
+        common_c_flags = ["-fPIC", "-Wno-unused-parameter"] + path_flags
+        common_cxx_flags = ["-fPIC", "-std=c++20", "-Wno-unused-parameter"] + path_flags
+        return {
+            "cflags": common_c_flags + profile_compile + spec["compile_flags"],
+            "cxxflags": common_cxx_flags + profile_cxx + spec["compile_flags"],
+            "linkflags": profile_link + spec["link_flags"],
+        }
+
+    triple_flag = f"-target {spec['triple']}{api_level}"
     jam_library_name_placeholder = "$(<library-name>)"
 
+    # NDK clang locates its bundled sysroot relative to its own binary, so the
+    # explicit (absolute) sysroot flags are dropped when compiling through a
+    # cache: they would make the hashed command line differ per machine.
+    if launcher:
+        sysroot_compile_flags = []
+        sysroot_link_flags = []
+    else:
+        sysroot_compile_flags = [f"-isysroot {toolchain['sysroot']}"]
+        sysroot_link_flags = [f"--sysroot={toolchain['sysroot']}"]
+
     common_c_flags = [
         "-fPIC",
-        "-O3",
-        "-Wno-unused-parameter", 
+        "-Wno-unused-parameter",
         "-DANDROID",
-        f"-isysroot {sysroot}"
-    ]
-
+    ] + sysroot_compile_flags + path_flags
     common_cxx_flags = [
         "-fPIC",
-        "-O3",
         "-std=c++20",
         "-stdlib=libc++",
         "-Wno-unused-parameter",
         "-DANDROID",
-        f"-isysroot {sysroot}"
-    ]
-    
+    ] + sysroot_compile_flags + path_flags
     common_link_flags = [
-        "-stdlib=libc++", 
-        f"--sysroot={sysroot}",
+        "-stdlib=libc++",
+    ] + sysroot_link_flags + [
         "-Wl,--no-undefined",
         "-Wl,-z,noexecstack"
     ]
+    return {
+        "cflags": common_c_flags + profile_compile + [triple_flag] + spec["compile_flags"],
+        "cxxflags": common_cxx_flags + profile_cxx + [triple_flag] + spec["compile_flags"],
+        "linkflags": [triple_flag] + common_link_flags + profile_link + spec["link_flags"]
+                     + [f"-Wl,-soname,lib{jam_library_name_placeholder}.so"],
+    }
+
+def _android_toolset_block(abi, spec, api_level, toolchain, clang_version_for_jam,
+                           launcher=None, prefix_maps=(), profile="default",
+                           link_profile="default"):
+    flags = toolset_flags(abi, api_level, toolchain, launcher, prefix_maps, profile,
+                          link_profile)
+    major = clang_version_for_jam.split('.')[0]
+
+    lines = [
+        f"# --- Toolset for Android {abi} (API {api_level}) ---",
+        f"using clang : {major}_{spec['name_suffix']}",
+        ": # Compiler",
+        _jam_command(launcher, toolchain['clang_cpp']),
+        ": # Options",
+        _jam_compiler_c(launcher, toolchain['clang_c']),
+    ]
+    lines += _jam_flags("cflags", flags["cflags"])
+    lines += _jam_flags("cxxflags", flags["cxxflags"])
+    lines.append("  # Link Flags")
+    lines += _jam_flags("linkflags", flags["linkflags"])
+    lines += [
+        f"  <archiver>\"{toolchain['ar']}\" <ranlib>\"{toolchain['ranlib']}\"",
+        f"  <version>\"{clang_version_for_jam}\"",
+        ";",
+    ]
+    return lines
+
+def _host_toolset_block(abi, spec, host_cxx, launcher=None, prefix_maps=(),
+                        profile="default", link_profile="default"):
+    flags = toolset_flags(abi, launcher=launcher, prefix_maps=prefix_maps, profile=profile,
+                          link_profile=link_profile)
+
+    lines = [
+        f"# --- Toolset for host {abi} ---",
+        f"using {spec['toolset']} :",
+        ": # Compiler",
+        _jam_command(launcher, host_cxx),
+        ": # Options",
+    ]
+    lines += _jam_flags("cflags", flags["cflags"])
+    lines += _jam_flags("cxxflags", flags["cxxflags"])
+    lines += _jam_flags("linkflags", flags["linkflags"])
+    lines.append(";")
+    return lines
+
+def ndk_toolchain(ndk_home, host_tag="linux-x86_64"):
+    base_toolchain_path = f"{ndk_home}/toolchains/llvm/prebuilt/{host_tag}"
+    return {
+        "clang_c": f"{base_toolchain_path}/bin/clang",
+        "clang_cpp": f"{base_toolchain_path}/bin/clang++",
+        "ar": f"{base_toolchain_path}/bin/llvm-ar",
+        "ranlib": f"{base_toolchain_path}/bin/llvm-ranlib",
+        "sysroot": f"{base_toolchain_path}/sysroot",
+    }
+
+def toolset_prefix_maps(abi, ndk_home=None, source_root=None):
+    prefix_maps = []
+    if source_root:
+        prefix_maps.append((source_root, SOURCE_ROOT_ALIAS))
+    if ndk_home and ABI_TOOLSETS[abi]["triple"] is not None:
+        prefix_maps.append((ndk_home, NDK_ROOT_ALIAS))
+    return prefix_maps
+
+def generate_jam_content(
+    ndk_home,
+    api_levels,
+    abis=None,
+    host_tag="linux-x86_64",
+    clang_version_for_jam="20.0",
+    host_cxx="g++",
+    launcher=None,
+    source_root=None,
+    profile="default",
+    link_profile="default"
+):
+    """Build project-config.jam for `abis` (default: every ABI in ABI_TOOLSETS).
+
+    `api_levels` maps each Android ABI to its API level. The output contains no
+    timestamps so identical inputs always give byte-identical content.
+    `launcher` (a ccache/sccache path) is put in front of every compiler, and
+    `source_root` plus the NDK are remapped to stable prefixes so objects do
+    not embed the paths of the machine that built them. `profile` and
+    `link_profile` name the FLAG_PROFILES / LINK_PROFILES entries applied to
+    every toolset.
+    """
+    abis = list(ABI_TOOLSETS) if abis is None else abis
+    toolchain = ndk_toolchain(ndk_home, host_tag)
+
+    lines = [
+        "import os ;",
+        "# project-config.jam generated by Python script",
+        f"# ABIs: {' '.join(abis)}",
+        f"# Flag profile: {profile}",
+        f"# Link profile: {link_profile}",
+    ]
+    if launcher:
+        lines.append(f"# Compiler launcher: {os.path.basename(launcher)}")
+    for abi in abis:
+        spec = ABI_TOOLSETS[abi]
+        prefix_maps = toolset_prefix_maps(abi, ndk_home, source_root)
+        lines.append("")
+        if spec["triple"] is None:
+            lines += _host_toolset_block(abi, spec, host_cxx, launcher, prefix_maps, profile,
+                                         link_profile)
+        else:
+            lines += _android_toolset_block(
+                abi, spec, api_levels[abi], toolchain, clang_version_for_jam,
+                launcher, prefix_maps, profile, link_profile
+            )
+    return "\n".join(lines) + "\n"
+
+def format_flag_report(abi, flags, profile, link_profile="default"):
+    lines = [
+        f"Flag profile: {profile} ({FLAG_PROFILES[profile]['description']})",
+        f"Link profile: {link_profile} ({LINK_PROFILES[link_profile]['description']})",
+        f"b2 properties from profile: {' '.join(FLAG_PROFILES[profile]['b2']) or '(none)'}",
+    ]
+    for feature in ("cflags", "cxxflags", "linkflags"):
+        lines.append(f"Effective {feature} for {abi}:")
+        lines += [f"    {flag}" for flag in flags[feature]]
+    return "\n".join(lines)
+
+def build_fingerprint(abi, api_level=None, clang_version_for_jam="20.0", host_cxx="g++",
+                      profile="default", link_profile="default"):
+    """Machine-independent description of the toolset generated for `abi`.
+
+    Paths are replaced by placeholders and the compiler launcher is left out,
+    so the same configuration gives the same fingerprint on every host; used
+    as the prebuilt_cache.py key for the ABI.
+    """
+    spec = ABI_TOOLSETS[abi]
+    flags = toolset_flags(
+        abi, api_level, ndk_toolchain("<ndk>"), None,
+        toolset_prefix_maps(abi, "<ndk>", "<source>"), profile, link_profile
+    )
+    fingerprint = {
+        "toolset": spec["toolset"],
+        "flags": flags,
+        "b2": FLAG_PROFILES[profile]["b2"],
+    }
+    if spec["triple"] is None:
+        fingerprint["compiler"] = os.path.basename(host_cxx)
+    else:
+        fingerprint["api_level"] = api_level
+        fingerprint["clang_version"] = clang_version_for_jam
+    return json.dumps(fingerprint, sort_keys=True)
+
+def content_digest(data):
+    return hashlib.sha256(data).hexdigest()
+
+def write_if_changed(path, content):
+    """Write `content` to `path` unless the file already holds it.
+
+    Returns True when the file was (re)written. An unchanged file keeps its
+    mtime, so b2 does not treat the configuration as modified.
+    """
+    data = content.encode("utf-8")
+    try:
+        with open(path, "rb") as f:
+            if content_digest(f.read()) == content_digest(data):
+                return False
+    except FileNotFoundError:
+        pass
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    return True
+
+def _run_quiet(args):
+    try:
+        return subprocess.run(args, capture_output=True, text=True, check=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def zero_launcher_stats(launcher):
+    # ccache and sccache share the flag.
+    return _run_quiet([launcher, "--zero-stats"]) is not None
+
+def launcher_stats(launcher):
+    """Return (hits, misses) counted by the launcher, or None if unavailable."""
+    name = os.path.basename(launcher)
+    if name == "ccache":
+        output = _run_quiet([launcher, "--print-stats"])
+        if output is None:
+            return None
+        counters = {}
+        for line in output.splitlines():
+            key, _, value = line.partition("\t")
+            if value.strip().isdigit():
+                counters[key.strip()] = int(value)
+        # ccache 4.x names first, ccache 3.x names second.
+        hits = (counters.get("direct_cache_hit", counters.get("cache_hit_direct", 0))
+                + counters.get("preprocessed_cache_hit", counters.get("cache_hit_preprocessed", 0)))
+        return hits, counters.get("cache_miss", 0)
+    output = _run_quiet([launcher, "--show-stats", "--stats-format=json"])
+    if output is None:
+        return None
+    try:
+        stats = json.loads(output)["stats"]
+    except (ValueError, KeyError):
+        return None
+    hits = sum(stats.get("cache_hits", {}).get("counts", {}).values())
+    misses = sum(stats.get("cache_misses", {}).get("counts", {}).values())
+    return hits, misses
+
+def format_launcher_stats(launcher, stats):
+    name = os.path.basename(launcher)
+    if stats is None:
+        return f"Compiler cache ({name}): statistics unavailable"
+    hits, misses = stats
+    total = hits + misses
+    if total == 0:
+        return f"Compiler cache ({name}): no cacheable compilations"
+    return f"Compiler cache ({name}): {hits}/{total} hits ({hits * 100.0 / total:.1f}%), {misses} misses"
+
+SHT_REL = 9
+SHT_RELA = 4
+SHT_DYNSYM = 11
+SHF_EXECINSTR = 0x4
+
+def elf_stats(path):
+    """Size, .text, relocation and export figures of a shared library.
+
+    Reads the section headers directly so no binutils/llvm tools are needed.
+    Returns None for files that are not ELF.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    if data[:4] != b"\x7fELF":
+        return None
+    is_64 = data[4] == 2
+    endian = "<" if data[5] == 1 else ">"
+    if is_64:
+        shoff, = struct.unpack_from(endian + "Q", data, 0x28)
+        shentsize, shnum, shstrndx = struct.unpack_from(endian + "HHH", data, 0x3A)
+        section_fmt = endian + "IIQQQQIIQQ"
+        symbol_fmt, symbol_size = endian + "IBBHQQ", 24
+    else:
+        shoff, = struct.unpack_from(endian + "I", data, 0x20)
+        shentsize, shnum, shstrndx = struct.unpack_from(endian + "HHH", data, 0x2E)
+        section_fmt = endian + "IIIIIIIIII"
+        symbol_fmt, symbol_size = endian + "IIIBBH", 16
+
+    sections = []
+    for index in range(shnum):
+        (name, sh_type, flags, _addr, offset, size, _link, _info, _align,
+         entsize) = struct.unpack_from(section_fmt, data, shoff + index * shentsize)
+        sections.append({"name": name, "type": sh_type, "flags": flags,
+                         "offset": offset, "size": size, "entsize": entsize})
+    names_offset = sections[shstrndx]["offset"] if shstrndx < len(sections) else 0
+    for section in sections:
+        end = data.find(b"\0", names_offset + section["name"])
+        section["name"] = data[names_offset + section["name"]:end].decode("ascii", "replace")
 
-    def format_c_flags(flags_list):
-        return "\n".join([f'  <cflags>"{flag}"' for flag in flags_list])
-    def format_cxx_flags(flags_list):
-        return "\n".join([f'  <cxxflags>"{flag}"' for flag in flags_list])
-    def format_link_flags(flags_list):
-        return "\n".join([f'  <linkflags>"{flag}"' for flag in flags_list])
-
-    common_c_flags_jam = format_c_flags(common_c_flags)
-    common_cxx_flags_jam = format_cxx_flags(common_cxx_flags)
-    common_link_flags_jam = format_link_flags(common_link_flags)
-
-    content = f"""\
-import os ;
-# project-config.jam generated by Python script
-
-# --- Toolset for Android arm64-v8a (API {api_arm64}) ---
-using clang : {clang_version_for_jam.split('.')[0]}_android64 
-: # Compiler executable (b2 will make the choice automatically)
-  "{clang_cpp_exe}" 
-: # Options
-  <compiler-c>"{clang_c_exe}" 
-{common_c_flags_jam}
-  <cflags>"-target aarch64-none-linux-android{api_arm64}"
-{common_cxx_flags_jam}
-  <cxxflags>"-target aarch64-none-linux-android{api_arm64}"
-  # Link Flags
-  <linkflags>"-target aarch64-none-linux-android{api_arm64}"
-{common_link_flags_jam}
-  <linkflags>"-Wl,-soname,lib{jam_library_name_placeholder}.so"
-  <archiver>"{llvm_ar_exe}" <ranlib>"{llvm_ranlib_exe}"
-  <version>"{clang_version_for_jam}"
-;
-
-# --- Toolset for Android armeabi-v7a (API {api_arm32}) ---
-using clang : {clang_version_for_jam.split('.')[0]}_android32
-: # Compiler
-  "{clang_cpp_exe}"
-: # Options
-  <compiler-c>"{clang_c_exe}"
-{common_c_flags_jam}
-  <cflags>"-target armv7a-none-linux-androideabi{api_arm32}"
-  <cflags>"-march=armv7-a" <cflags>"-mfloat-abi=softfp" <cflags>"-mfpu=neon"
-{common_cxx_flags_jam}
-  <cxxflags>"-target armv7a-none-linux-androideabi{api_arm32}"
-  <cxxflags>"-march=armv7-a" <cxxflags>"-mfloat-abi=softfp" <cxxflags>"-mfpu=neon"
-  # Link Flags
-  <linkflags>"-target armv7a-none-linux-androideabi{api_arm32}"
-{common_link_flags_jam}
-  <linkflags>"-Wl,-soname,lib{jam_library_name_placeholder}.so" <linkflags>"-Wl,--fix-cortex-a8"
-  <archiver>"{llvm_ar_exe}" <ranlib>"{llvm_ranlib_exe}"
-  <version>"{clang_version_for_jam}"
-;
-
-# --- Toolset for Android x86 (API {api_x86}) ---
-using clang : {clang_version_for_jam.split('.')[0]}_androidx86
-: # Compiler
-  "{clang_cpp_exe}"
-: # Options
-  <compiler-c>"{clang_c_exe}"
-{common_c_flags_jam}
-  <cflags>"-target i686-none-linux-android{api_x86}"
-  <cflags>"-march=i686"
-{common_cxx_flags_jam}
-  <cxxflags>"-target i686-none-linux-android{api_x86}"
-  <cxxflags>"-march=i686"
-  # Link Flags
-  <linkflags>"-target i686-none-linux-android{api_x86}"
-{common_link_flags_jam}
-  <linkflags>"-Wl,-soname,lib{jam_library_name_placeholder}.so"
-  <archiver>"{llvm_ar_exe}" <ranlib>"{llvm_ranlib_exe}"
-  <version>"{clang_version_for_jam}"
-;
-
-# --- Toolset for Android x86_64 (API {api_x86_64}) ---
-using clang : {clang_version_for_jam.split('.')[0]}_androidx86_64
-: # Compiler
-  "{clang_cpp_exe}"
-: # Options
-  <compiler-c>"{clang_c_exe}"
-{common_c_flags_jam}
-  <cflags>"-target x86_64-none-linux-android{api_x86_64}"
-{common_cxx_flags_jam}
-  <cxxflags>"-target x86_64-none-linux-android{api_x86_64}"
-  # Link Flags
-  <linkflags>"-target x86_64-none-linux-android{api_x86_64}"
-{common_link_flags_jam}
-  <linkflags>"-Wl,-soname,lib{jam_library_name_placeholder}.so"
-  <archiver>"{llvm_ar_exe}" <ranlib>"{llvm_ranlib_exe}"
-  <version>"{clang_version_for_jam}"
-;
-"""
-    return content
+    stats = {"size": len(data), "text": 0, "reloc_bytes": 0, "relocs": 0,
+             "exports": 0, "hash": "none"}
+    hash_styles = []
+    for section in sections:
+        if section["flags"] & SHF_EXECINSTR:
+            stats["text"] += section["size"]
+        if section["name"].startswith(".rel"):
+            stats["reloc_bytes"] += section["size"]
+            # Packed (APS2/RELR) sections have no fixed entry size to count by.
+            if section["type"] in (SHT_REL, SHT_RELA) and section["entsize"]:
+                stats["relocs"] += section["size"] // section["entsize"]
+        if section["name"] == ".gnu.hash":
+            hash_styles.append("gnu")
+        elif section["name"] == ".hash":
+            hash_styles.append("sysv")
+        if section["type"] == SHT_DYNSYM:
+            for offset in range(section["offset"] + symbol_size,
+                                section["offset"] + section["size"], symbol_size):
+                fields = struct.unpack_from(symbol_fmt, data, offset)
+                if is_64:
+                    info, other, shndx = fields[1], fields[2], fields[3]
+                else:
+                    info, other, shndx = fields[3], fields[4], fields[5]
+                binding, visibility = info >> 4, other & 0x3
+                # Defined GLOBAL/WEAK symbols with default or protected visibility.
+                if binding in (1, 2) and shndx != 0 and visibility in (0, 3):
+                    stats["exports"] += 1
+    if hash_styles:
+        stats["hash"] = "+".join(sorted(hash_styles))
+    return stats
+
+def _format_bytes(value):
+    for unit in ("B", "KiB", "MiB"):
+        if abs(value) < 1024 or unit == "MiB":
+            return f"{value:.0f} {unit}" if unit == "B" else f"{value:.1f} {unit}"
+        value /= 1024.0
+
+def _format_delta(current, previous, as_bytes=True):
+    if previous is None:
+        return ""
+    delta = current - previous
+    if delta == 0:
+        return " (=)"
+    sign = "+" if delta > 0 else "-"
+    text = _format_bytes(abs(delta)) if as_bytes else str(abs(delta))
+    return f" ({sign}{text})"
+
+def size_report(lib_dir, state_file, link_profile="default"):
+    """Report size/relocation stats of the .so files in `lib_dir`.
+
+    The stats are compared with the previous run recorded in `state_file`,
+    which is then overwritten with this run's figures.
+    """
+    previous = {}
+    try:
+        with open(state_file) as f:
+            previous_state = json.load(f)
+        previous = previous_state.get("libraries", {})
+        previous_profile = previous_state.get("link_profile", "?")
+    except (OSError, ValueError):
+        previous_profile = None
+
+    libraries = {}
+    if os.path.isdir(lib_dir):
+        for name in sorted(os.listdir(lib_dir)):
+            path = os.path.join(lib_dir, name)
+            if ".so" in name and os.path.isfile(path) and not os.path.islink(path):
+                stats = elf_stats(path)
+                if stats is not None:
+                    libraries[name] = stats
+
+    header = f"Shared library size report (link profile: {link_profile}"
+    header += f", compared with previous build using '{previous_profile}')" if previous_profile else ")"
+    lines = [header]
+    if not libraries:
+        lines.append(f"    no shared libraries found in {lib_dir}")
+    totals = {"size": 0, "text": 0, "reloc_bytes": 0, "exports": 0}
+    previous_totals = dict.fromkeys(totals, 0)
+    for name, stats in libraries.items():
+        old = previous.get(name, {})
+        lines.append(
+            f"    {name}: size {_format_bytes(stats['size'])}{_format_delta(stats['size'], old.get('size'))}"
+            f", .text {_format_bytes(stats['text'])}{_format_delta(stats['text'], old.get('text'))}"
+            f", relocations {_format_bytes(stats['reloc_bytes'])}"
+            f"{_format_delta(stats['reloc_bytes'], old.get('reloc_bytes'))}"
+            f" ({stats['relocs']} unpacked)"
+            f", exports {stats['exports']}{_format_delta(stats['exports'], old.get('exports'), False)}"
+            f", hash {stats['hash']}"
+        )
+        for key in totals:
+            totals[key] += stats[key]
+            previous_totals[key] += old.get(key, stats[key])
+    if len(libraries) > 1:
+        has_previous = bool(previous)
+        lines.append(
+            f"    total: size {_format_bytes(totals['size'])}"
+            f"{_format_delta(totals['size'], previous_totals['size'] if has_previous else None)}"
+            f", relocations {_format_bytes(totals['reloc_bytes'])}"
+            f"{_format_delta(totals['reloc_bytes'], previous_totals['reloc_bytes'] if has_previous else None)}"
+            f", exports {totals['exports']}"
+            f"{_format_delta(totals['exports'], previous_totals['exports'] if has_previous else None, False)}"
+        )
+
+    if libraries:
+        tmp_path = f"{state_file}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"link_profile": link_profile, "libraries": libraries}, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, state_file)
+    return "\n".join(lines)
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate Boost project-config.jam from ENV_* variables.")
+    parser.add_argument("--zero-cache-stats", action="store_true",
+                        help="Reset the compiler cache statistics and exit.")
+    parser.add_argument("--cache-stats", action="store_true",
+                        help="Print the compiler cache hit rate since the last reset and exit.")
+    parser.add_argument("--b2-properties", action="store_true",
+                        help="Print the b2 properties required by the flag profile and exit.")
+    parser.add_argument("--report-flags", metavar="ABI",
+                        help="Print the effective flags generated for ABI and exit.")
+    parser.add_argument("--fingerprint", metavar="ABI",
+                        help="Print a path-independent fingerprint of the toolset for ABI and exit.")
+    parser.add_argument("--size-report", nargs=2, metavar=("LIB_DIR", "STATE_JSON"),
+                        help="Print size/relocation stats of the shared libraries in LIB_DIR, "
+                             "compared with the previous run stored in STATE_JSON, and exit.")
+    args = parser.parse_args()
+
     # Environment Variables
-    ndk_home = get_env_var("ENV_ANDROID_NDK_HOME")
-    api_arm64 = get_env_var("ENV_ANDROID_API_ARM64")
-    api_arm32 = get_env_var("ENV_ANDROID_API_ARM32")
-    api_x86 = get_env_var("ENV_ANDROID_API_X86")
-    api_x86_64 = get_env_var("ENV_ANDROID_API_X86_64")
+    try:
+        launcher = resolve_launcher(get_env_var("ENV_COMPILER_LAUNCHER", required=False))
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    if args.zero_cache_stats or args.cache_stats:
+        if launcher is None:
+            sys.exit(0)
+        if args.zero_cache_stats:
+            zero_launcher_stats(launcher)
+        else:
+            print(format_launcher_stats(launcher, launcher_stats(launcher)))
+        sys.exit(0)
+
+    profile = get_env_var("ENV_BOOST_FLAG_PROFILE", default_value="default")
+    if profile not in FLAG_PROFILES:
+        print(f"Error: Unknown flag profile '{profile}'. Known profiles: {', '.join(FLAG_PROFILES)}", file=sys.stderr)
+        sys.exit(1)
+    if args.b2_properties:
+        print(" ".join(FLAG_PROFILES[profile]["b2"]))
+        sys.exit(0)
+    link_profile = get_env_var("ENV_BOOST_LINK_PROFILE", default_value="default")
+    if link_profile not in LINK_PROFILES:
+        print(f"Error: Unknown link profile '{link_profile}'. Known profiles: {', '.join(LINK_PROFILES)}", file=sys.stderr)
+        sys.exit(1)
+    if args.size_report:
+        lib_dir, state_file = args.size_report
+        print(size_report(lib_dir, state_file, link_profile))
+        sys.exit(0)
+
+    try:
+        abis = parse_abis(args.report_flags or args.fingerprint
+                          or get_env_var("ENV_BOOST_ABIS", required=False))
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    android_abis = [abi for abi in abis if ABI_TOOLSETS[abi]["triple"] is not None]
+
+    ndk_home = get_env_var("ENV_ANDROID_NDK_HOME", required=bool(android_abis))
+    api_levels = {
+        abi: get_env_var(ABI_TOOLSETS[abi]["api_env"]) for abi in android_abis
+    }
     host_tag = get_env_var("ENV_HOST_TAG", default_value="linux-x86_64")
     clang_version_for_jam = get_env_var("ENV_CLANG_VERSION_FOR_JAM", default_value="17.0")
+    host_cxx = get_env_var("ENV_HOST_CXX", default_value="g++")
+
+    if args.fingerprint:
+        abi = abis[0]
+        print(build_fingerprint(abi, api_levels.get(abi), clang_version_for_jam, host_cxx,
+                                profile, link_profile))
+        sys.exit(0)
+
+    if args.report_flags:
+        abi = abis[0]
+        flags = toolset_flags(
+            abi, api_levels.get(abi), ndk_toolchain(ndk_home, host_tag), launcher,
+            toolset_prefix_maps(abi, ndk_home, os.getcwd()), profile, link_profile
+        )
+        print(format_flag_report(abi, flags, profile, link_profile))
+        sys.exit(0)
 
     jam_file_content = generate_jam_content(
         ndk_home,
-        api_arm64,
-        api_arm32,
-        api_x86,
-        api_x86_64,
+        api_levels,
+        abis,
         host_tag,
-        clang_version_for_jam
+        clang_version_for_jam,
+        host_cxx,
+        launcher,
+        os.getcwd(),
+        profile,
+        link_profile
     )
     output_filename = "project-config.jam"
     try:
-        with open(output_filename, "w") as f:
-            f.write(jam_file_content)
-        print(f"'{output_filename}' generated. ")
+        if write_if_changed(output_filename, jam_file_content):
+            print(f"'{output_filename}' generated for ABIs: {' '.join(abis)}")
+        else:
+            print(f"'{output_filename}' is up to date, left untouched.")
     except IOError as e:
         print(f"Error: Failed to write '{output_filename}': {e}", file=sys.stderr)
-        sys.exit(1)
\ No newline at end of file
+        sys.exit(1)
@@ -0,0 +1,344 @@
+import argparse
+import base64
+import hashlib
+import json
+import os
+import posixpath
+import shutil
+import sys
+import tarfile
+import tempfile
+import time
+from urllib.parse import unquote, urlparse
+
+# Content-addressed cache of installed third-party trees (one per library,
+# version, ABI and build configuration). Build scripts compute a key, try to
+# restore it before downloading/compiling, and publish the install tree after
+# a successful build. The store is a local directory or an sftp:// URL taken
+# from ENV_PREBUILT_CACHE; cache problems are reported and treated as a miss,
+# never as a build failure.
+
+# Bump when the archive layout or key derivation changes.
+CACHE_FORMAT_VERSION = 1
+
+DEFAULT_CACHE_DIR = os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"),
+    "geecodex", "3rdparty-prebuilt"
+)
+
+def file_digest(path):
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+def cache_key(library, version, abi, configs=(), config_files=()):
+    """Derive the cache key for one library build.
+
+    `configs` are strings describing the build (flag set, compiler version,
+    ...); `config_files` are hashed by content only, so the key does not
+    depend on where the checkout lives.
+    """
+    description = {
+        "format": CACHE_FORMAT_VERSION,
+        "library": library,
+        "version": version,
+        "abi": abi,
+        "configs": list(configs),
+        "config_files": [file_digest(path) for path in config_files],
+    }
+    encoded = json.dumps(description, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+def _object_names(key):
+    return f"{key[:2]}/{key}.tar.gz", f"{key[:2]}/{key}.json"
+
+class LocalStore:
+    def __init__(self, root):
+        self.root = os.path.abspath(os.path.expanduser(root))
+
+    def describe(self):
+        return self.root
+
+    def exists(self, name):
+        return os.path.isfile(os.path.join(self.root, name))
+
+    def get(self, name, local_path):
+        path = os.path.join(self.root, name)
+        if not os.path.isfile(path):
+            return False
+        shutil.copyfile(path, local_path)
+        return True
+
+    def put(self, local_path, name):
+        path = os.path.join(self.root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp-{os.getpid()}"
+        shutil.copyfile(local_path, tmp_path)
+        os.replace(tmp_path, path)
+
+    def close(self):
+        pass
+
+def host_key_fingerprint(key):
+    """OpenSSH style fingerprint of a host key, e.g. SHA256:nThbg6kXUpJWGl7E1IGOCspRomTxdCARLviKw6E5SY8."""
+    digest = base64.b64encode(hashlib.sha256(key.asbytes()).digest()).decode("ascii").rstrip("=")
+    return f"SHA256:{digest}"
+
+class SftpStore:
+    """Store on an SFTP server: sftp://user@host[:port]/path.
+
+    Authenticates with ENV_PREBUILT_CACHE_SFTP_PASSWORD when set, otherwise
+    with the SSH agent / default keys. The server's host key must be in
+    ~/.ssh/known_hosts (or ENV_PREBUILT_CACHE_KNOWN_HOSTS), or match the
+    fingerprint pinned in ENV_PREBUILT_CACHE_SFTP_HOST_KEY: the archives and
+    their checksums both come from this server, so an unverified host could
+    hand out arbitrary native libraries.
+    """
+
+    def __init__(self, url):
+        try:
+            import paramiko
+        except ImportError:
+            raise RuntimeError("paramiko is required for sftp:// prebuilt caches (pip install paramiko)")
+        parsed = urlparse(url)
+        if not parsed.hostname:
+            raise ValueError(f"Invalid SFTP cache URL '{url}'")
+        self.url = url
+        self.root = unquote(parsed.path) or "."
+        password = os.environ.get("ENV_PREBUILT_CACHE_SFTP_PASSWORD") or None
+        pinned = os.environ.get("ENV_PREBUILT_CACHE_SFTP_HOST_KEY", "").strip()
+
+        class PinnedHostKeyPolicy(paramiko.MissingHostKeyPolicy):
+            # Only reached for hosts that are not in known_hosts
+            def missing_host_key(self, client, hostname, key):
+                fingerprint = host_key_fingerprint(key)
+                if pinned and fingerprint == pinned:
+                    return
+                raise paramiko.SSHException(
+                    f"Host key {fingerprint} of '{hostname}' is not trusted; add the host to known_hosts "
+                    f"or pin it with ENV_PREBUILT_CACHE_SFTP_HOST_KEY"
+                    + (f" (pinned: {pinned})" if pinned else ""))
+
+        self.client = paramiko.SSHClient()
+        self.client.load_system_host_keys()
+        known_hosts = os.environ.get("ENV_PREBUILT_CACHE_KNOWN_HOSTS")
+        if known_hosts:
+            self.client.load_host_keys(os.path.expanduser(known_hosts))
+        self.client.set_missing_host_key_policy(PinnedHostKeyPolicy())
+        self.client.connect(
+            parsed.hostname,
+            port=parsed.port or 22,
+            username=unquote(parsed.username) if parsed.username else None,
+            password=password,
+            look_for_keys=password is None,
+            allow_agent=password is None,
+            timeout=15,
+        )
+        self.sftp = self.client.open_sftp()
+
+    def describe(self):
+        parsed = urlparse(self.url)
+        return f"sftp://{parsed.hostname}{':' + str(parsed.port) if parsed.port else ''}{self.root}"
+
+    def _path(self, name):
+        return posixpath.join(self.root, name)
+
+    def exists(self, name):
+        try:
+            self.sftp.stat(self._path(name))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def get(self, name, local_path):
+        try:
+            self.sftp.get(self._path(name), local_path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def _makedirs(self, path):
+        parts = []
+        while path not in ("", "/", "."):
+            try:
+                self.sftp.stat(path)
+                break
+            except FileNotFoundError:
+                parts.append(path)
+                path = posixpath.dirname(path)
+        for part in reversed(parts):
+            self.sftp.mkdir(part)
+
+    def put(self, local_path, name):
+        path = self._path(name)
+        self._makedirs(posixpath.dirname(path))
+        tmp_path = f"{path}.tmp-{os.getpid()}"
+        self.sftp.put(local_path, tmp_path)
+        try:
+            self.sftp.posix_rename(tmp_path, path)
+        except IOError:
+            # Servers without the posix-rename extension.
+            if self.exists(name):
+                self.sftp.remove(path)
+            self.sftp.rename(tmp_path, path)
+
+    def close(self):
+        self.sftp.close()
+        self.client.close()
+
+def open_store(spec=None):
+    """Open the store named by `spec` / ENV_PREBUILT_CACHE; None if disabled."""
+    if spec is None:
+        spec = os.environ.get("ENV_PREBUILT_CACHE", "")
+    spec = spec.strip()
+    if spec.lower() in ("none", "off", "0"):
+        return None
+    if spec.startswith("sftp://"):
+        return SftpStore(spec)
+    return LocalStore(spec or DEFAULT_CACHE_DIR)
+
+def _safe_extract(archive, dest):
+    with tarfile.open(archive, "r:gz") as tar:
+        if hasattr(tarfile, "data_filter"):
+            tar.extractall(dest, filter="data")
+            return
+        root = os.path.realpath(dest)
+        for member in tar.getmembers():
+            target = os.path.realpath(os.path.join(dest, member.name))
+            if os.path.commonpath([root, target]) != root or member.isdev():
+                raise ValueError(f"Refusing to extract unsafe archive member '{member.name}'")
+        tar.extractall(dest)
+
+def restore(store, key, dest):
+    """Replace `dest` with the cached tree for `key`. Returns the manifest or None."""
+    archive_name, manifest_name = _object_names(key)
+    parent = os.path.dirname(os.path.abspath(dest))
+    os.makedirs(parent, exist_ok=True)
+    with tempfile.TemporaryDirectory(prefix=".prebuilt-", dir=parent) as tmp_dir:
+        manifest_path = os.path.join(tmp_dir, "manifest.json")
+        # The manifest is published last, so its presence marks a complete entry.
+        if not store.get(manifest_name, manifest_path):
+            return None
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        archive_path = os.path.join(tmp_dir, "tree.tar.gz")
+        if not store.get(archive_name, archive_path):
+            return None
+        if file_digest(archive_path) != manifest.get("archive_sha256"):
+            raise ValueError(f"Cached archive for key {key[:12]} is corrupt (checksum mismatch)")
+        tree = os.path.join(tmp_dir, "tree")
+        os.mkdir(tree)
+        _safe_extract(archive_path, tree)
+        # Swap the trees with renames; the old tree is removed with tmp_dir.
+        if os.path.lexists(dest):
+            os.rename(dest, os.path.join(tmp_dir, "old"))
+        os.rename(tree, dest)
+    return manifest
+
+def publish(store, key, src, label=""):
+    """Upload the tree at `src` under `key`. Returns False if it was already cached."""
+    archive_name, manifest_name = _object_names(key)
+    if store.exists(manifest_name):
+        return False
+    with tempfile.TemporaryDirectory(prefix="prebuilt-") as tmp_dir:
+        archive_path = os.path.join(tmp_dir, "tree.tar.gz")
+        with tarfile.open(archive_path, "w:gz") as tar:
+            for entry in sorted(os.listdir(src)):
+                tar.add(os.path.join(src, entry), arcname=entry)
+            files = sum(1 for member in tar.getmembers() if member.isfile())
+        manifest = {
+            "format": CACHE_FORMAT_VERSION,
+            "key": key,
+            "label": label,
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "files": files,
+            "archive_bytes": os.path.getsize(archive_path),
+            "archive_sha256": file_digest(archive_path),
+        }
+        manifest_path = os.path.join(tmp_dir, "manifest.json")
+        with open(manifest_path, "w") as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        store.put(archive_path, archive_name)
+        store.put(manifest_path, manifest_name)
+    return True
+
+def _format_bytes(value):
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if value < 1024 or unit == "GiB":
+            return f"{value:.0f} {unit}" if unit == "B" else f"{value:.1f} {unit}"
+        value /= 1024.0
+
+def _open_store_or_warn(spec):
+    try:
+        return open_store(spec)
+    except Exception as e:
+        print(f"Warning: prebuilt cache unavailable: {e}", file=sys.stderr)
+        return None
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Content-addressed cache of prebuilt third-party install trees.")
+    parser.add_argument("--store", help="Local directory or sftp://user@host[:port]/path "
+                                        "(default: ENV_PREBUILT_CACHE, then ~/.cache/geecodex/3rdparty-prebuilt; "
+                                        "'none' disables the cache). SFTP hosts must be in known_hosts "
+                                        "or pinned with ENV_PREBUILT_CACHE_SFTP_HOST_KEY=SHA256:...")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    key_parser = commands.add_parser("key", help="Print the cache key for a build.")
+    key_parser.add_argument("--library", required=True)
+    key_parser.add_argument("--version", required=True)
+    key_parser.add_argument("--abi", required=True)
+    key_parser.add_argument("--config", action="append", default=[],
+                            help="Text describing the build configuration (repeatable).")
+    key_parser.add_argument("--config-file", action="append", default=[],
+                            help="File whose content is part of the configuration (repeatable).")
+
+    restore_parser = commands.add_parser("restore", help="Restore a cached tree; exit 1 on a miss.")
+    restore_parser.add_argument("--key", required=True)
+    restore_parser.add_argument("--dest", required=True)
+    restore_parser.add_argument("--label", default="")
+
+    publish_parser = commands.add_parser("publish", help="Publish an installed tree.")
+    publish_parser.add_argument("--key", required=True)
+    publish_parser.add_argument("--src", required=True)
+    publish_parser.add_argument("--label", default="")
+
+    args = parser.parse_args()
+
+    if args.command == "key":
+        try:
+            print(cache_key(args.library, args.version, args.abi, args.config, args.config_file))
+        except OSError as e:
+            print(f"Error: Failed to hash configuration: {e}", file=sys.stderr)
+            sys.exit(1)
+        sys.exit(0)
+
+    label = args.label or args.key[:12]
+    store = _open_store_or_warn(args.store)
+    if store is None:
+        sys.exit(1 if args.command == "restore" else 0)
+    try:
+        started = time.monotonic()
+        if args.command == "restore":
+            manifest = restore(store, args.key, args.dest)
+            if manifest is None:
+                print(f"Prebuilt cache miss for {label} (key {args.key[:12]}) in {store.describe()}")
+                sys.exit(1)
+            print(f"Prebuilt cache hit for {label} (key {args.key[:12]}): restored {manifest['files']} files "
+                  f"({_format_bytes(manifest['archive_bytes'])} archive, built {manifest['created']}) "
+                  f"from {store.describe()} in {time.monotonic() - started:.1f}s")
+        else:
+            if not os.path.isdir(args.src):
+                print(f"Error: '{args.src}' is not a directory, nothing to publish.", file=sys.stderr)
+                sys.exit(1)
+            if publish(store, args.key, args.src, label):
+                print(f"Published {label} (key {args.key[:12]}) to {store.describe()} "
+                      f"in {time.monotonic() - started:.1f}s")
+            else:
+                print(f"{label} (key {args.key[:12]}) is already in {store.describe()}")
+    except Exception as e:
+        print(f"Warning: prebuilt cache {args.command} failed for {label}: {e}", file=sys.stderr)
+        sys.exit(1)
+    finally:
+        store.close()
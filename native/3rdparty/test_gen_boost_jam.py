@@ -0,0 +1,243 @@
+import os
+import json
+import shutil
+import subprocess
+
+import pytest
+
+import gen_boost_jam
+from gen_boost_jam import (
+    android_relocation_flags, build_fingerprint, elf_stats, format_flag_report, format_launcher_stats,
+    generate_jam_content, launcher_stats, parse_abis, resolve_launcher, size_report, toolset_flags, write_if_changed,
+)
+
+API_LEVELS = {"arm64-v8a": 24, "armeabi-v7a": 21, "x86": 24, "x86_64": 30}
+
+
+def test_write_if_changed_creates_file(tmp_path):
+    path = tmp_path / "project-config.jam"
+    assert write_if_changed(str(path), "using clang : android64 ;\n")
+    assert path.read_text() == "using clang : android64 ;\n"
+    assert not os.path.exists(f"{path}.tmp")
+
+
+def test_write_if_changed_keeps_unchanged_file(tmp_path):
+    path = tmp_path / "project-config.jam"
+    path.write_text("using clang : android64 ;\n")
+    os.utime(path, (1000000000, 1000000000))
+    assert not write_if_changed(str(path), "using clang : android64 ;\n")
+    assert os.stat(path).st_mtime == 1000000000
+
+
+def test_write_if_changed_rewrites_changed_file(tmp_path):
+    path = tmp_path / "project-config.jam"
+    path.write_text("using clang : android64 ;\n")
+    os.utime(path, (1000000000, 1000000000))
+    assert write_if_changed(str(path), "using clang : android32 ;\n")
+    assert path.read_text() == "using clang : android32 ;\n"
+    assert os.stat(path).st_mtime != 1000000000
+
+
+@pytest.mark.parametrize("value", [None, "", "   "])
+def test_parse_abis_defaults_to_all(value):
+    assert parse_abis(value) == list(gen_boost_jam.ABI_TOOLSETS)
+
+
+def test_parse_abis_keeps_toolset_order():
+    abis = list(gen_boost_jam.ABI_TOOLSETS)
+    requested = list(reversed(abis))
+    assert parse_abis(",".join(requested)) == abis
+    assert parse_abis(f" {abis[-1]}  {abis[0]} ") == [abis[0], abis[-1]]
+    assert parse_abis(f"{abis[0]} {abis[0]}") == [abis[0]]
+
+
+def test_parse_abis_rejects_unknown():
+    with pytest.raises(ValueError, match="mips"):
+        parse_abis(f"{next(iter(gen_boost_jam.ABI_TOOLSETS))},mips")
+
+
+@pytest.fixture
+def installed(monkeypatch):
+    tools = {}
+    monkeypatch.setattr(gen_boost_jam.shutil, "which", lambda name: tools.get(os.path.basename(name)))
+    return tools
+
+
+def test_resolve_launcher(installed):
+    assert resolve_launcher("") is None and resolve_launcher(" none ") is None and resolve_launcher(None) is None
+    assert resolve_launcher("auto") is None
+    installed["sccache"] = "/usr/bin/sccache"
+    assert resolve_launcher("auto") == "/usr/bin/sccache"
+    installed["ccache"] = "/usr/bin/ccache"
+    assert resolve_launcher("auto") == "/usr/bin/ccache" # First of COMPILER_LAUNCHERS
+    assert resolve_launcher("/opt/bin/sccache") == "/usr/bin/sccache"
+    with pytest.raises(ValueError, match="distcc"):
+        resolve_launcher("distcc")
+
+
+def test_missing_launcher_only_warns(installed, capsys):
+    assert resolve_launcher("ccache") is None
+    assert "not found" in capsys.readouterr().err
+
+
+def test_launcher_wraps_every_compiler():
+    content = generate_jam_content("/opt/ndk", API_LEVELS, abis=["arm64-v8a", "linux-x86_64"],
+                                   launcher="/usr/bin/ccache", source_root="/home/dev/boost")
+    assert "# Compiler launcher: ccache" in content
+    assert '  "/usr/bin/ccache" "/opt/ndk/toolchains/llvm/prebuilt/linux-x86_64/bin/clang++"' in content
+    assert ('  <compiler-c>"/usr/bin/ccache" <compiler-c>"/opt/ndk/toolchains/llvm/prebuilt/linux-x86_64/bin/clang"'
+            in content)
+    assert '  "/usr/bin/ccache" "g++"' in content
+    assert "sysroot" not in content # NDK clang finds its sysroot itself; absolute paths would spoil cache hits
+    assert '<cflags>"-ffile-prefix-map=/home/dev/boost=."' in content
+    assert '<cflags>"-fdebug-prefix-map=/opt/ndk=/android-ndk"' in content
+    host_block = content[content.index("# --- Toolset for host"):]
+    assert "/android-ndk" not in host_block
+
+
+def test_generated_content_is_deterministic():
+    first = generate_jam_content("/opt/ndk", API_LEVELS)
+    assert first == generate_jam_content("/opt/ndk", API_LEVELS)
+    assert '<cflags>"-isysroot /opt/ndk/toolchains/llvm/prebuilt/linux-x86_64/sysroot"' in first
+    assert "Compiler launcher" not in first
+
+
+def test_fingerprint_ignores_machine_paths():
+    fingerprint = build_fingerprint("arm64-v8a", 24)
+    assert "/opt" not in fingerprint and "<ndk>" in fingerprint
+    assert fingerprint != build_fingerprint("arm64-v8a", 28)
+    assert fingerprint != build_fingerprint("arm64-v8a", 24, clang_version_for_jam="19.0")
+    assert build_fingerprint("linux-x86_64", host_cxx="/usr/bin/g++") == build_fingerprint("linux-x86_64")
+
+
+def test_launcher_stats(monkeypatch):
+    outputs = {
+        "ccache": "direct_cache_hit\t7\npreprocessed_cache_hit\t3\ncache_miss\t5\nstats_updated_timestamp\tx\n",
+        "sccache": '{"stats": {"cache_hits": {"counts": {"C/C++": 4}}, "cache_misses": {"counts": {"C/C++": 2, "Rust": 1}}}}',
+    }
+    monkeypatch.setattr(gen_boost_jam, "_run_quiet", lambda args: outputs.get(os.path.basename(args[0])))
+    assert launcher_stats("/usr/bin/ccache") == (10, 5)
+    assert launcher_stats("/usr/bin/sccache") == (4, 3)
+    outputs.clear()
+    assert launcher_stats("/usr/bin/ccache") is None
+    assert format_launcher_stats("/usr/bin/ccache", (10, 5)) == "Compiler cache (ccache): 10/15 hits (66.7%), 5 misses"
+    assert format_launcher_stats("/usr/bin/ccache", (0, 0)) == "Compiler cache (ccache): no cacheable compilations"
+    assert format_launcher_stats("sccache", None) == "Compiler cache (sccache): statistics unavailable"
+
+
+def _android_flags(abi, profile="default", link_profile="default", api_level=24):
+    return toolset_flags(abi, api_level, gen_boost_jam.ndk_toolchain("/opt/ndk"), profile=profile,
+                         link_profile=link_profile)
+
+
+def test_default_profile_has_generic_codegen():
+    flags = _android_flags("arm64-v8a")
+    assert "-O3" in flags["cflags"] and "-O3" in flags["cxxflags"]
+    assert not any(flag.startswith(("-flto", "-mtune", "-march")) for flag in flags["cflags"] + flags["linkflags"])
+
+
+def test_speed_profile_adds_thin_lto_and_tuning():
+    flags = _android_flags("arm64-v8a", "speed")
+    for feature in ("cflags", "cxxflags", "linkflags"):
+        assert "-flto=thin" in flags[feature]
+    assert {"-march=armv8-a", "-mtune=cortex-a76"} <= set(flags["cflags"])
+    assert "-mtune=cortex-a76" not in flags["linkflags"]
+    host = toolset_flags("linux-x86_64", profile="speed")
+    assert "-flto=auto" in host["cflags"] and "-flto=auto" in host["linkflags"] # gcc spelling
+
+
+@pytest.mark.parametrize("abi", [abi for abi, spec in gen_boost_jam.ABI_TOOLSETS.items() if spec["triple"]])
+def test_tuning_only_with_tuned_profiles(abi):
+    tune = gen_boost_jam.ABI_TOOLSETS[abi]["tune_flags"]
+    assert set(tune) <= set(_android_flags(abi, "speed")["cflags"])
+    assert not set(tune) & set(_android_flags(abi, "size")["cflags"])
+
+
+def test_size_and_debug_perf_profiles():
+    size = _android_flags("x86_64", "size")
+    assert "-O3" not in size["cflags"] and "-flto=thin" in size["linkflags"]
+    assert gen_boost_jam.FLAG_PROFILES["size"]["b2"] == ["optimization=space"] # b2's variant would override -Os
+    perf = _android_flags("x86_64", "debug-perf")
+    assert "-fno-omit-frame-pointer" in perf["cxxflags"] and "-mtune=intel" in perf["cxxflags"]
+    assert gen_boost_jam.FLAG_PROFILES["debug-perf"]["b2"] == ["debug-symbols=on"]
+
+
+def test_profile_is_part_of_output_and_fingerprint():
+    content = generate_jam_content("/opt/ndk", API_LEVELS, abis=["x86"], profile="speed")
+    assert "# Flag profile: speed" in content and '<cxxflags>"-flto=thin"' in content
+    assert build_fingerprint("x86", 24, profile="speed") != build_fingerprint("x86", 24)
+    report = format_flag_report("x86", _android_flags("x86", "size"), "size")
+    assert report.splitlines()[:3] == [
+        "Flag profile: size (optimize for size)",
+        "Link profile: default (toolchain defaults)",
+        "b2 properties from profile: optimization=space",
+    ]
+    assert "Effective linkflags for x86:" in report and "    -flto=thin" in report
+
+
+@pytest.mark.parametrize("api_level, flags", [
+    (21, ["-Wl,--hash-style=both"]),
+    (23, ["-Wl,--pack-dyn-relocs=android", "-Wl,--hash-style=gnu"]),
+    (28, ["-Wl,--pack-dyn-relocs=android+relr", "-Wl,--use-android-relr-tags", "-Wl,--hash-style=gnu"]),
+    (30, ["-Wl,--pack-dyn-relocs=android+relr", "-Wl,--hash-style=gnu"]),
+])
+def test_android_relocation_flags_follow_the_api_level(api_level, flags):
+    assert android_relocation_flags(api_level) == flags
+
+
+def test_lean_link_profile():
+    flags = _android_flags("armeabi-v7a", link_profile="lean", api_level=21)
+    assert {"-ffunction-sections", "-fdata-sections", "-fvisibility=hidden"} <= set(flags["cflags"])
+    assert "-fvisibility-inlines-hidden" in flags["cxxflags"] and "-fvisibility-inlines-hidden" not in flags["cflags"]
+    assert {"-Wl,--gc-sections", "-Wl,--icf=safe", "-Wl,--hash-style=both"} <= set(flags["linkflags"])
+    assert flags["linkflags"][-1] == "-Wl,-soname,lib$(<library-name>).so"
+    host = toolset_flags("linux-x86_64", link_profile="lean")
+    assert "-Wl,--gc-sections" in host["linkflags"]
+    assert not any("icf" in flag or "pack-dyn-relocs" in flag or "hash-style" in flag for flag in host["linkflags"])
+    default = _android_flags("armeabi-v7a")
+    assert not any("gc-sections" in flag or "hash-style" in flag for flag in default["linkflags"])
+    content = generate_jam_content("/opt/ndk", API_LEVELS, abis=["x86_64"], link_profile="lean")
+    assert "# Link profile: lean" in content and '<linkflags>"-Wl,--pack-dyn-relocs=android+relr"' in content
+
+
+@pytest.fixture
+def shared_library(tmp_path):
+    compiler = shutil.which("cc")
+    if compiler is None:
+        pytest.skip("no C compiler")
+    source = tmp_path / "lib.c"
+    source.write_text('int exported(int x) { return x + 1; }\n'
+                      '__attribute__((visibility("hidden"))) int hidden(int x) { return x * 2; }\n'
+                      'int value = 3;\nint *pointer = &value;\n')
+    lib_dir = tmp_path / "lib"
+    lib_dir.mkdir()
+    subprocess.run([compiler, "-shared", "-fPIC", "-Wl,--hash-style=gnu", "-o", str(lib_dir / "libdemo.so"),
+                    str(source)], check=True)
+    return lib_dir
+
+
+def test_elf_stats(shared_library, tmp_path):
+    stats = elf_stats(str(shared_library / "libdemo.so"))
+    assert stats["size"] == os.path.getsize(shared_library / "libdemo.so")
+    assert stats["exports"] == 3 # exported, value and pointer; not the hidden function
+    assert stats["hash"] == "gnu"
+    assert stats["text"] > 0 and stats["reloc_bytes"] > 0 and stats["relocs"] > 0
+    (tmp_path / "notes.so.txt").write_text("not a library")
+    assert elf_stats(str(tmp_path / "notes.so.txt")) is None
+
+
+def test_size_report_compares_with_the_previous_build(shared_library, tmp_path):
+    state = tmp_path / "sizes.json"
+    first = size_report(str(shared_library), str(state))
+    assert first.splitlines()[0] == "Shared library size report (link profile: default)"
+    assert "libdemo.so: size" in first and "(=)" not in first
+    assert json.loads(state.read_text())["link_profile"] == "default"
+
+    second = size_report(str(shared_library), str(state), link_profile="lean")
+    assert second.splitlines()[0] == ("Shared library size report (link profile: lean, "
+                                      "compared with previous build using 'default')")
+    assert "exports 3 (=)" in second
+
+    empty = size_report(str(tmp_path / "missing"), str(state))
+    assert f"no shared libraries found in {tmp_path / 'missing'}" in empty
+    assert json.loads(state.read_text())["link_profile"] == "lean" # Kept when nothing was measured
@@ -0,0 +1,77 @@
+import os
+
+import pytest
+
+import prebuilt_cache
+from prebuilt_cache import LocalStore, cache_key, open_store, publish, restore
+
+
+def _tree(root):
+    (root / "include" / "boost").mkdir(parents=True)
+    (root / "lib").mkdir()
+    (root / "include" / "boost" / "config.hpp").write_text("#define BOOST_VERSION 108600\n")
+    (root / "lib" / "libboost_system.a").write_bytes(b"!<arch>\n" + bytes(range(256)) * 16)
+    return root
+
+
+@pytest.fixture
+def store(tmp_path):
+    return LocalStore(str(tmp_path / "store"))
+
+
+def test_cache_key_depends_on_content_not_location(tmp_path):
+    first = tmp_path / "a" / "user-config.jam"
+    second = tmp_path / "b" / "user-config.jam"
+    for path in (first, second):
+        path.parent.mkdir()
+        path.write_text("using clang ;\n")
+    key = cache_key("boost", "1.86.0", "arm64-v8a", ["-O2"], [str(first)])
+    assert key == cache_key("boost", "1.86.0", "arm64-v8a", ["-O2"], [str(second)])
+
+    second.write_text("using gcc ;\n")
+    assert key != cache_key("boost", "1.86.0", "arm64-v8a", ["-O2"], [str(second)])
+    assert key != cache_key("boost", "1.86.0", "x86_64", ["-O2"], [str(first)])
+    assert key != cache_key("boost", "1.86.0", "arm64-v8a", ["-O3"], [str(first)])
+
+
+def test_publish_and_restore_round_trip(tmp_path, store):
+    src = _tree(tmp_path / "install")
+    key = cache_key("boost", "1.86.0", "arm64-v8a")
+    assert restore(store, key, str(tmp_path / "out")) is None
+
+    assert publish(store, key, str(src), label="boost 1.86.0 arm64-v8a")
+    assert store.exists(f"{key[:2]}/{key}.tar.gz")
+    assert not publish(store, key, str(src)) # Already cached
+
+    dest = tmp_path / "out"
+    (dest / "stale").mkdir(parents=True)
+    manifest = restore(store, key, str(dest))
+    assert manifest['key'] == key
+    assert manifest['files'] == 2
+    assert manifest['label'] == "boost 1.86.0 arm64-v8a"
+    assert sorted(os.listdir(dest)) == ["include", "lib"]
+    for rel_path in ("include/boost/config.hpp", "lib/libboost_system.a"):
+        assert (dest / rel_path).read_bytes() == (src / rel_path).read_bytes()
+    assert [name for name in os.listdir(tmp_path) if name.startswith(".prebuilt-")] == []
+
+
+def test_restore_rejects_corrupt_archive(tmp_path, store):
+    key = cache_key("boost", "1.86.0", "x86_64")
+    publish(store, key, str(_tree(tmp_path / "install")))
+    with open(os.path.join(store.root, key[:2], f"{key}.tar.gz"), "ab") as f:
+        f.write(b"garbage")
+    dest = tmp_path / "out"
+    dest.mkdir()
+    (dest / "kept").write_text("old tree")
+    with pytest.raises(ValueError, match="corrupt"):
+        restore(store, key, str(dest))
+    assert (dest / "kept").read_text() == "old tree"
+
+
+def test_open_store(tmp_path, monkeypatch):
+    assert open_store("off") is None
+    assert open_store(str(tmp_path)).describe() == str(tmp_path)
+    monkeypatch.setenv("ENV_PREBUILT_CACHE", "none")
+    assert open_store() is None
+    monkeypatch.setenv("ENV_PREBUILT_CACHE", "")
+    assert open_store().describe() == prebuilt_cache.DEFAULT_CACHE_DIR
@@ -0,0 +1,519 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Remote build agents of the Flutter Build & Deploy Tool.
+
+A build agent is a host reachable over SSH with the Flutter SDK installed,
+registered in AGENTS_FILE (RELEASER_HOME/agents.json):
+
+  {"agents": [
+    {"name": "mac-mini", "host": "10.0.0.12", "port": 22, "user": "ci",
+     "key_path": "~/.ssh/id_ed25519", "os": "macOS",
+     "project_dir": "/Users/ci/builds/geecodex", "max_jobs": 1}
+  ]}
+
+Optional fields: password_env (environment variable holding the SSH
+password, passwords are never stored), flutter (command, default
+"flutter"), targets (flutter build commands the agent serves, default all
+its OS can build).
+
+For a build, pick_agent() chooses the least-loaded agent that can build the
+target: fewest running jobs relative to max_jobs, then the lowest load
+average per core. Running jobs are slot files below AGENTS_STATE_DIR, so
+the processes of a release matrix see each other's jobs. An agent with
+max_jobs > 1 keeps one copy of the project per slot (project_dir/slot-<n>),
+so concurrent jobs never share a sync manifest, build/ tree or Gradle
+project lock. RemoteBuild syncs the project to the agent (only files whose
+size or mtime changed since the last sync), runs `flutter build` on a
+pooled SSH connection while streaming its output, and pulls the artifact
+back to where a local build would have written it.
+
+Qt-free; paramiko is only imported (through releaser_sftp) once an agent is
+contacted.
+"""
+
+import os
+import json
+import stat
+import time
+import uuid
+import shutil
+import fnmatch
+import posixpath
+import contextlib
+import concurrent.futures
+
+# OSes that can build a flutter build command; commands not listed build anywhere
+TARGET_BUILD_OS = {'ipa': ('macOS',)}
+AGENT_OS = ("Windows", "macOS", "Linux") # Same names as BUILD_PLATFORMS
+AGENT_STATUS_TIMEOUT = 5 # Seconds for the load query of one agent
+AGENT_WAIT_POLL_SECONDS = 2.0 # While every suitable agent is busy
+# Slot files not refreshed for this long belong to a crashed process
+AGENT_SLOT_STALE_SECONDS = 120
+AGENT_SLOT_HEARTBEAT_SECONDS = 20
+# Remote file listing the synced files with their local (size, mtime_ns)
+SYNC_MANIFEST_NAME = ".geecodex-sync.json"
+SYNC_CHANNELS = 4
+# Not synced: generated, tool-local or VCS directories
+SYNC_IGNORED_DIRS = {'build', '.dart_tool', '.gradle', '.cxx', '.idea', '.git', 'Pods', '.symlinks',
+                     '__pycache__', 'ephemeral'}
+# Not synced: files flutter generates with SDK and tool paths of the host (relative paths, fnmatch patterns)
+SYNC_IGNORED_FILES = ('android/local.properties', '.flutter-plugins*', 'ios/Flutter/Generated.xcconfig',
+                      'ios/Flutter/flutter_export_environment.sh')
+
+# POSIX agents: cores, then the 1 minute load average (Linux, then macOS)
+_STATUS_COMMAND = ("getconf _NPROCESSORS_ONLN 2>/dev/null || sysctl -n hw.ncpu; "
+                   "cat /proc/loadavg 2>/dev/null || sysctl -n vm.loadavg")
+
+
+class BuildAgent:
+    """One entry of the agent registry."""
+
+    def __init__(self, name, host, user, agent_os, project_dir, port=22, key_path=None, password_env=None,
+                 max_jobs=1, flutter="flutter", targets=None):
+        if agent_os not in AGENT_OS:
+            raise ValueError(f"Build agent {name}: os must be one of {', '.join(AGENT_OS)}, not {agent_os!r}.")
+        self.name = name
+        self.host = host
+        self.port = int(port)
+        self.user = user
+        self.os = agent_os
+        self.project_dir = project_dir.replace("\\", "/").rstrip('/')
+        self.key_path = key_path
+        self.password_env = password_env
+        self.max_jobs = max(1, int(max_jobs))
+        self.flutter = flutter
+        self.targets = tuple(targets) if targets else None
+
+    def can_build(self, platform_cmd):
+        if self.targets is not None and platform_cmd not in self.targets:
+            return False
+        return self.os in TARGET_BUILD_OS.get(platform_cmd, AGENT_OS)
+
+    def ssh_config(self):
+        """Connection settings in the form SFTP_POOL expects."""
+        return {
+            'sftp_host': self.host, 'sftp_port': str(self.port), 'sftp_user': self.user,
+            'sftp_password': os.environ.get(self.password_env, '') if self.password_env else '',
+            'sftp_key_path': os.path.expanduser(self.key_path) if self.key_path else None,
+        }
+
+    def work_dir(self, slot):
+        """Remote project directory of a job slot; with max_jobs > 1 every slot has its own copy."""
+        return self.project_dir if self.max_jobs == 1 else f"{self.project_dir}/slot-{slot}"
+
+    def build_command(self, platform_cmd, work_dir=None):
+        build = f"{self.flutter} build {platform_cmd} --release"
+        work_dir = work_dir or self.project_dir
+        if self.os == "Windows": # cmd.exe of Windows OpenSSH; SFTP paths look like /C:/builds/app
+            return f'cd /d "{work_dir.lstrip("/")}" && {build}'
+        return f"cd '{work_dir}' && {build}"
+
+    def __repr__(self):
+        return f"BuildAgent({self.name}, {self.user}@{self.host}:{self.port}, {self.os})"
+
+
+def load_agents(path):
+    """The registered agents. Returns [] if there is no registry; raises ValueError if it is malformed."""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return []
+    except (OSError, ValueError) as e:
+        raise ValueError(f"Cannot read the build agent registry {path}: {e}")
+    agents = []
+    for entry in data.get('agents', []):
+        entry = dict(entry)
+        try:
+            agents.append(BuildAgent(agent_os=entry.pop('os', None), **entry))
+        except TypeError as e:
+            raise ValueError(f"Invalid build agent entry {entry.get('name', '?')} in {path}: {e}")
+    names = [agent.name for agent in agents]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Build agent names in {path} must be unique.")
+    return agents
+
+
+def suitable_agents(agents, platform_cmd, wanted='auto'):
+    """Agents that can build platform_cmd: all of them for wanted='auto', else the named one."""
+    return [agent for agent in agents
+            if (wanted == 'auto' or agent.name == wanted) and agent.can_build(platform_cmd)]
+
+
+def agent_status(agent, timeout=AGENT_STATUS_TIMEOUT):
+    """{'cores', 'load', 'load_per_core'} of a POSIX agent; load is None for Windows agents."""
+    if agent.os == "Windows":
+        return {'cores': None, 'load': None, 'load_per_core': 0.0}
+    from releaser_sftp import SFTP_POOL
+    exit_status, out, err = SFTP_POOL.exec_command(agent.ssh_config(), _STATUS_COMMAND, timeout=timeout)
+    lines = [line.strip().strip('{}').split() for line in out.splitlines() if line.strip()]
+    if exit_status != 0 or len(lines) < 2:
+        raise OSError(f"unexpected status output: {(err or out).strip()[:200]}")
+    cores, load = max(1, int(lines[0][0])), float(lines[1][0])
+    return {'cores': cores, 'load': load, 'load_per_core': load / cores}
+
+
+class AgentSlots:
+    """Running agent jobs of all local processes, one slot file per job.
+
+    Choosing an agent and taking its slot happens under a lock file, so two
+    matrix processes never both take the last slot of an agent. Slots are
+    numbered 0..max_jobs-1 per agent; the number picks the job's remote
+    working directory (BuildAgent.work_dir).
+    """
+
+    def __init__(self, state_dir):
+        self.state_dir = state_dir
+
+    def running(self, agent_name):
+        return len(self.taken(agent_name))
+
+    def taken(self, agent_name):
+        """Slot numbers of the agent's running jobs."""
+        slots = set()
+        now = time.time()
+        for name in self._slot_names():
+            parts = name[:-len('.slot')].rsplit('.', 3) # <agent>.<slot>.<pid>.<id>.slot
+            if len(parts) != 4 or parts[0] != agent_name or not parts[1].isdigit():
+                continue
+            try:
+                if now - os.path.getmtime(os.path.join(self.state_dir, name)) < AGENT_SLOT_STALE_SECONDS:
+                    slots.add(int(parts[1]))
+            except OSError: # Released meanwhile
+                pass
+        return slots
+
+    def reserve(self, agents, statuses):
+        """Takes a slot on the best agent with a free slot. Returns (agent, slot path, slot, running) or None."""
+        with self._lock():
+            free = []
+            for agent in agents:
+                taken = self.taken(agent.name)
+                running = len(taken)
+                if running < agent.max_jobs:
+                    load = statuses[agent.name]['load_per_core']
+                    slot = min(set(range(agent.max_jobs)) - taken)
+                    free.append(((running / agent.max_jobs, load, running), agent, slot, running))
+            if not free:
+                return None
+            _, agent, slot, running = min(free, key=lambda item: item[0])
+            slot_path = os.path.join(self.state_dir, f"{agent.name}.{slot}.{os.getpid()}.{uuid.uuid4().hex[:8]}.slot")
+            with open(slot_path, 'w', encoding='utf-8'):
+                pass
+        return agent, slot_path, slot, running
+
+    @staticmethod
+    def heartbeat(slot_path):
+        try:
+            os.utime(slot_path)
+        except OSError:
+            pass
+
+    @staticmethod
+    def release(slot_path):
+        try:
+            os.remove(slot_path)
+        except OSError:
+            pass
+
+    def _slot_names(self):
+        try:
+            return [name for name in os.listdir(self.state_dir) if name.endswith('.slot')]
+        except FileNotFoundError:
+            return []
+
+    @contextlib.contextmanager
+    def _lock(self, timeout=10):
+        os.makedirs(self.state_dir, exist_ok=True)
+        lock_path = os.path.join(self.state_dir, "reserve.lock")
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                break
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(lock_path) > timeout: # Left behind by a crash
+                        os.remove(lock_path)
+                        continue
+                except OSError:
+                    continue
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"Build agent lock {lock_path} is held by another process.")
+                time.sleep(0.05)
+        os.close(fd)
+        try:
+            yield
+        finally:
+            os.remove(lock_path)
+
+
+def pick_agent(agents, slots, on_output=print, should_stop=lambda: False):
+    """Reserves the least-loaded of agents, waiting while all are busy.
+
+    Unreachable agents are skipped. Returns (agent, slot path, slot), or
+    None if stopped or no agent is reachable.
+    """
+    waiting = False
+    while not should_stop():
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(agents), thread_name_prefix="agent-status") as pool:
+            futures = {agent.name: pool.submit(agent_status, agent) for agent in agents}
+        statuses, reachable = {}, []
+        for agent in agents:
+            try:
+                statuses[agent.name] = futures[agent.name].result()
+                reachable.append(agent)
+            except Exception as e:
+                on_output(f"Build agent {agent.name} is not reachable: {type(e).__name__}: {e}")
+        if not reachable:
+            return None
+        reserved = slots.reserve(reachable, statuses)
+        if reserved is not None:
+            agent, slot_path, slot, running = reserved
+            status = statuses[agent.name]
+            load = f"load {status['load']:.2f} on {status['cores']} core(s)" if status['load'] is not None else "load unknown"
+            on_output(f"Build agent: {agent.name} ({agent.os}, {load}, {running}/{agent.max_jobs} job(s) running).")
+            return agent, slot_path, slot
+        if not waiting:
+            on_output("All suitable build agents are busy, waiting for a free slot...")
+            waiting = True
+        time.sleep(AGENT_WAIT_POLL_SECONDS)
+    return None
+
+
+def project_files(project_dir):
+    """Files to sync as {relative posix path: os.stat_result}."""
+    files = {}
+    for root, dirs, names in os.walk(project_dir):
+        dirs[:] = [d for d in dirs if d not in SYNC_IGNORED_DIRS]
+        for file_name in names:
+            path = os.path.join(root, file_name)
+            rel = os.path.relpath(path, project_dir).replace(os.sep, '/')
+            if any(fnmatch.fnmatchcase(rel, pattern) for pattern in SYNC_IGNORED_FILES):
+                continue
+            try:
+                files[rel] = os.stat(path)
+            except OSError:
+                continue
+    return files
+
+
+class RemoteBuild:
+    """Runs one flutter build on an agent: sync, build, fetch, in the work directory of its slot."""
+
+    def __init__(self, agent, slot=0, on_line=print, should_stop=lambda: False, heartbeat=lambda: None):
+        from releaser_sftp import SFTP_POOL
+        self.agent = agent
+        self.work_dir = agent.work_dir(slot)
+        self.pool = SFTP_POOL
+        self.config = agent.ssh_config()
+        self._on_line = on_line
+        self._should_stop = should_stop
+        self._heartbeat = heartbeat
+        self._channel = None
+        self.started_at = None # Agent clock when the build started; older artifacts are leftovers
+
+    # --- Sync ---
+
+    def sync(self, project_dir):
+        """Uploads changed project files and removes deleted ones. Returns stats."""
+        start = time.perf_counter()
+        local = project_files(project_dir)
+        manifest_path = f"{self.work_dir}/{SYNC_MANIFEST_NAME}"
+        with self.pool.checkout(self.config) as lease:
+            sftp = lease.sftp
+            self._makedirs(sftp, self.work_dir, set())
+            try:
+                with sftp.open(manifest_path, 'r') as f:
+                    remote = json.loads(f.read().decode('utf-8'))
+            except (IOError, ValueError):
+                remote = {}
+            changed = [rel for rel, st in local.items() if remote.get(rel) != [st.st_size, st.st_mtime_ns]]
+            removed = [rel for rel in remote if rel not in local]
+            for rel in removed:
+                try:
+                    sftp.remove(f"{self.work_dir}/{rel}")
+                except IOError:
+                    pass
+            created = set()
+            for rel in changed:
+                self._makedirs(sftp, posixpath.dirname(f"{self.work_dir}/{rel}"), created)
+        # Several SFTP channels on the pooled connection, like ParallelUploader
+        batches = [changed[i::SYNC_CHANNELS] for i in range(SYNC_CHANNELS)]
+        with concurrent.futures.ThreadPoolExecutor(max_workers=SYNC_CHANNELS, thread_name_prefix="agent-sync") as pool:
+            for future in [pool.submit(self._put_files, project_dir, batch, local) for batch in batches if batch]:
+                future.result()
+        with self.pool.checkout(self.config) as lease:
+            manifest = {rel: [st.st_size, st.st_mtime_ns] for rel, st in local.items()}
+            with lease.sftp.open(manifest_path + ".part", 'w') as f:
+                f.write(json.dumps(manifest).encode('utf-8'))
+            lease.sftp.posix_rename(manifest_path + ".part", manifest_path)
+        return {'files': len(local), 'uploaded': len(changed), 'removed': len(removed),
+                'bytes': sum(local[rel].st_size for rel in changed), 'seconds': time.perf_counter() - start}
+
+    def _put_files(self, project_dir, rel_paths, local):
+        with self.pool.checkout(self.config) as lease:
+            for rel in rel_paths:
+                if self._should_stop():
+                    raise InterruptedError("Sync cancelled.")
+                remote_path = f"{self.work_dir}/{rel}"
+                lease.sftp.put(os.path.join(project_dir, *rel.split('/')), remote_path)
+                st = local[rel]
+                # Same mtime as the local file, so the agent's incremental build tools see what changed
+                lease.sftp.utime(remote_path, (st.st_atime, st.st_mtime))
+
+    @staticmethod
+    def _makedirs(sftp, remote_dir, created):
+        missing = []
+        while remote_dir and remote_dir not in created and remote_dir not in ('/', '.'):
+            try:
+                sftp.stat(remote_dir)
+                break
+            except IOError:
+                missing.append(remote_dir)
+                remote_dir = posixpath.dirname(remote_dir)
+        for path in reversed(missing):
+            sftp.mkdir(path)
+        created.update(missing)
+        if remote_dir:
+            created.add(remote_dir)
+
+    # --- Build ---
+
+    def run(self, platform_cmd):
+        """Runs flutter build on the agent, calling on_line per output line. Returns the exit status."""
+        command = self.agent.build_command(platform_cmd, self.work_dir)
+        self.started_at = self._remote_now()
+        self._on_line(f"Running on {self.agent.name}: {command}")
+        last_heartbeat = time.monotonic()
+        with self.pool.session(self.config) as channel:
+            self._channel = channel
+            if self.agent.os != "Windows":
+                channel.get_pty(width=200) # Closing the channel then hangs up the remote build
+            channel.set_combine_stderr(True)
+            channel.settimeout(1.0)
+            channel.exec_command(command)
+            pending = b""
+            while True:
+                if self._should_stop():
+                    return None
+                if time.monotonic() - last_heartbeat > AGENT_SLOT_HEARTBEAT_SECONDS:
+                    self._heartbeat()
+                    last_heartbeat = time.monotonic()
+                try:
+                    data = channel.recv(32768)
+                except TimeoutError: # socket.timeout: nothing printed for a second
+                    continue
+                if not data:
+                    break
+                *lines, pending = (pending + data).split(b"\n")
+                for line in lines:
+                    self._on_line(line.decode('utf-8', 'replace').rstrip('\r'))
+            if pending:
+                self._on_line(pending.decode('utf-8', 'replace').rstrip('\r'))
+            return channel.recv_exit_status()
+
+    def _remote_now(self):
+        """The agent's clock, as the mtime of a scratch file (the local clock may differ)."""
+        path = f"{self.work_dir}/.geecodex-build-{uuid.uuid4().hex}"
+        with self.pool.checkout(self.config) as lease:
+            with lease.sftp.open(path, 'w'):
+                pass
+            try:
+                return lease.sftp.stat(path).st_mtime
+            finally:
+                lease.sftp.remove(path)
+
+    def terminate(self):
+        """Hangs up the remote build (from another thread)."""
+        channel = self._channel
+        if channel is not None:
+            channel.close()
+
+    # --- Artifact ---
+
+    def fetch(self, project_dir, artifact_pattern, reported_paths):
+        """Copies the artifact to the same relative path below project_dir. Returns (local path, remote path)."""
+        with self.pool.checkout(self.config) as lease:
+            sftp = lease.sftp
+            remote_path = self._remote_artifact(sftp, artifact_pattern, reported_paths)
+            rel = posixpath.relpath(remote_path, self.work_dir)
+            local_path = os.path.join(project_dir, *rel.split('/'))
+            if self._is_dir(sftp, remote_path):
+                if os.path.isdir(local_path):
+                    shutil.rmtree(local_path)
+                self._get_dir(sftp, remote_path, local_path)
+            else:
+                os.makedirs(os.path.dirname(local_path), exist_ok=True)
+                sftp.get(remote_path, local_path + ".part")
+                os.replace(local_path + ".part", local_path)
+        return local_path, remote_path
+
+    def _remote_artifact(self, sftp, artifact_pattern, reported_paths):
+        has_glob = any(c in artifact_pattern for c in '*?[')
+        directory, name_pattern = posixpath.split(f"{self.work_dir}/{artifact_pattern}")
+        for reported in reversed(reported_paths): # flutter's "Built ..." lines, newest last
+            path = posixpath.normpath(reported if reported.startswith('/') else f"{self.work_dir}/{reported}")
+            try:
+                if has_glob and self._is_dir(sftp, path): # "Built IPA to build/ios/ipa": look inside
+                    return self._newest_match(sftp, path, name_pattern)
+                return path
+            except IOError:
+                continue
+        if not has_glob:
+            path = f"{directory}/{name_pattern}"
+            if not self._is_fresh(sftp, path, sftp.stat(path)): # stat raises FileNotFoundError if nothing is there
+                raise FileNotFoundError(f"{path} on {self.agent.name} is left over from an earlier build.")
+            return path
+        return self._newest_match(sftp, directory, name_pattern)
+
+    def _newest_match(self, sftp, directory, name_pattern):
+        matches = [entry for entry in sftp.listdir_attr(directory) if fnmatch.fnmatch(entry.filename, name_pattern)]
+        if not matches:
+            raise FileNotFoundError(f"No artifact matching {name_pattern} in {directory} on {self.agent.name}.")
+        newest = max(matches, key=lambda entry: entry.st_mtime)
+        path = f"{directory}/{newest.filename}"
+        if not self._is_fresh(sftp, path, newest):
+            raise FileNotFoundError(f"Only artifacts from earlier builds match {name_pattern} in {directory} on {self.agent.name}.")
+        return path
+
+    def _is_fresh(self, sftp, remote_path, attr):
+        """True if remote_path (for a directory: anything below it) was written since the build started."""
+        if self.started_at is None or attr.st_mtime >= self.started_at:
+            return True
+        if stat.S_ISDIR(attr.st_mode):
+            return any(self._is_fresh(sftp, f"{remote_path}/{entry.filename}", entry)
+                       for entry in sftp.listdir_attr(remote_path))
+        return False
+
+    @staticmethod
+    def _is_dir(sftp, remote_path):
+        return stat.S_ISDIR(sftp.stat(remote_path).st_mode)
+
+    def _get_dir(self, sftp, remote_dir, local_dir):
+        os.makedirs(local_dir, exist_ok=True)
+        for entry in sftp.listdir_attr(remote_dir):
+            remote_path = f"{remote_dir}/{entry.filename}"
+            local_path = os.path.join(local_dir, entry.filename)
+            if stat.S_ISDIR(entry.st_mode):
+                self._get_dir(sftp, remote_path, local_path)
+            else:
+                sftp.get(remote_path, local_path)
+
+
+def format_agent_table(agents, slots):
+    """One line per agent with its capabilities, jobs and load (used by the CLI)."""
+    lines = []
+    for agent in agents:
+        try:
+            status = agent_status(agent)
+            load = f"load {status['load']:.2f}/{status['cores']} cores" if status['load'] is not None else "load unknown"
+        except Exception as e:
+            load = f"unreachable ({type(e).__name__}: {e})"
+        builds = ", ".join(cmd for cmd in ('apk', 'appbundle', 'ipa', 'web') if agent.can_build(cmd))
+        lines.append(f"{agent.name}: {agent.user}@{agent.host}:{agent.port} {agent.os}, builds {builds}, "
+                     f"{slots.running(agent.name)}/{agent.max_jobs} job(s), {load}")
+    return lines
+
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Incremental build cache of the Flutter Build & Deploy Tool.
+
+Before `flutter build` runs, the build inputs of the target (lib/,
+pubspec.yaml, pubspec.lock, native/ and the platform directory such as
+android/) are fingerprinted. Files are hashed in parallel on a thread pool,
+and a per-project index of (size, mtime) -> sha256 lets later checks hash
+only the files that changed, so a re-check of an unchanged tree is a
+directory walk plus stat calls.
+
+The fingerprint maps to the artifact of the last successful build with
+those inputs. Artifacts live in a local content-addressed store (one object
+per sha256, directories such as build/web are stored file by file), so
+identical outputs of different builds share their bytes. A hit restores the
+artifact to where flutter would have written it and the build is skipped.
+
+Qt-free and stdlib only.
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import concurrent.futures
+
+# Bump when the fingerprint or entry format changes; old entries then miss
+BUILD_CACHE_FORMAT = 1
+# Cached builds kept per target command (older entries and their objects are pruned)
+BUILD_CACHE_KEEP = 5
+HASH_BLOCK_BYTES = 1024 * 1024
+# Index entries modified this close to the last index write are re-hashed:
+# a file changed within the same mtime tick would keep its (size, mtime)
+RACY_MTIME_NS = 2 * 1000 * 1000 * 1000
+# Unreferenced objects younger than this are kept: another process may be storing its entry
+PRUNE_GRACE_SECONDS = 600
+
+# Inputs of every target, relative to the project directory
+BUILD_COMMON_INPUTS = ('lib', 'pubspec.yaml', 'pubspec.lock', 'l10n.yaml', 'native')
+# Platform directories by flutter build command
+BUILD_PLATFORM_INPUTS = {
+    'apk': ('android',),
+    'appbundle': ('android',),
+    'ipa': ('ios',),
+    'web': ('web',),
+}
+# Generated or tool-local directories below the inputs
+BUILD_IGNORED_DIRS = {'build', '.dart_tool', '.gradle', '.cxx', '.idea', '.git', 'Pods', '.symlinks', '__pycache__'}
+
+
+def _sha256_file(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while True:
+            block = f.read(HASH_BLOCK_BYTES) # hashlib releases the GIL for large blocks
+            if not block:
+                return digest.hexdigest()
+            digest.update(block)
+
+
+def toolchain_key():
+    """Identifies the flutter SDK on PATH: its resolved location and engine stamp."""
+    flutter = shutil.which('flutter')
+    if not flutter:
+        return 'flutter-not-found'
+    flutter = os.path.realpath(flutter)
+    stamp = os.path.join(os.path.dirname(flutter), 'cache', 'engine.stamp')
+    try:
+        with open(stamp, 'r', encoding='utf-8') as f:
+            return f"{flutter}@{f.read().strip()}"
+    except OSError:
+        return flutter
+
+
+class BuildCache:
+    """Fingerprints build inputs and stores/restores artifacts by fingerprint.
+
+    Layout below cache_dir:
+      index/<project>.json         (size, mtime_ns, sha256) per input file
+      entries/<fingerprint>.json   artifact of a build: files and their object digests
+      objects/<ab>/<sha256>        artifact bytes, read-only
+    """
+
+    def __init__(self, cache_dir, keep=BUILD_CACHE_KEEP, workers=None):
+        self.cache_dir = cache_dir
+        self.keep = keep
+        self.workers = workers or min(8, (os.cpu_count() or 2) * 2)
+
+    # --- Fingerprints ---
+
+    def input_files(self, project_dir, platform_cmd):
+        """Input files of a target as {relative path: os.stat_result}."""
+        files = {}
+        for name in BUILD_COMMON_INPUTS + BUILD_PLATFORM_INPUTS.get(platform_cmd, ()):
+            path = os.path.join(project_dir, name)
+            if os.path.isfile(path):
+                files[name] = os.stat(path)
+                continue
+            for root, dirs, names in os.walk(path):
+                dirs[:] = [d for d in dirs if d not in BUILD_IGNORED_DIRS]
+                for file_name in names:
+                    file_path = os.path.join(root, file_name)
+                    try:
+                        st = os.stat(file_path)
+                    except OSError: # Dangling symlink or removed meanwhile
+                        continue
+                    files[os.path.relpath(file_path, project_dir).replace(os.sep, '/')] = st
+        return files
+
+    def fingerprint(self, project_dir, platform_cmd, extra=()):
+        """Returns (fingerprint, stats) of the target's inputs.
+
+        stats: files, hashed (files read), hashed_bytes, seconds.
+        extra: further strings that change the output, e.g. the toolchain.
+        """
+        start = time.perf_counter()
+        project_dir = os.path.abspath(project_dir)
+        index_path = os.path.join(self.cache_dir, 'index',
+                                  hashlib.sha256(project_dir.encode('utf-8')).hexdigest()[:24] + '.json')
+        index, index_written_ns = self._read_index(index_path)
+        files = self.input_files(project_dir, platform_cmd)
+
+        digests, to_hash = {}, []
+        for rel_path, st in files.items():
+            known = index.get(rel_path)
+            if known and known[0] == st.st_size and known[1] == st.st_mtime_ns \
+                    and st.st_mtime_ns < index_written_ns - RACY_MTIME_NS:
+                digests[rel_path] = known[2]
+            else:
+                to_hash.append(rel_path)
+        if to_hash:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=self.workers,
+                                                       thread_name_prefix="build-fingerprint") as executor:
+                paths = [os.path.join(project_dir, rel_path) for rel_path in to_hash]
+                for rel_path, digest in zip(to_hash, executor.map(_sha256_file, paths)):
+                    digests[rel_path] = digest
+
+        combined = hashlib.sha256(f"format={BUILD_CACHE_FORMAT}\ncmd={platform_cmd}\n".encode('utf-8'))
+        for item in extra:
+            combined.update(f"extra={item}\n".encode('utf-8'))
+        for rel_path in sorted(digests):
+            combined.update(f"{rel_path}\0{digests[rel_path]}\n".encode('utf-8'))
+        if to_hash or len(index) != len(files):
+            self._write_index(index_path, {rel_path: [st.st_size, st.st_mtime_ns, digests[rel_path]]
+                                           for rel_path, st in files.items()})
+        return combined.hexdigest(), {
+            'files': len(files), 'hashed': len(to_hash),
+            'hashed_bytes': sum(files[rel_path].st_size for rel_path in to_hash),
+            'seconds': time.perf_counter() - start,
+        }
+
+    # --- Entries ---
+
+    def lookup(self, fingerprint):
+        """The cached entry of a fingerprint, or None if missing or incomplete."""
+        try:
+            with open(self._entry_path(fingerprint), 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not all(os.path.isfile(self._object_path(digest)) for _, digest, _ in entry['files']):
+            return None # Objects were removed behind our back
+        return entry
+
+    def store(self, fingerprint, artifact_path, platform_cmd, artifact_digest=None):
+        """Adds the artifact of a successful build. Returns the new entry.
+
+        artifact_digest is the known sha256 of a file artifact (saves a read).
+        """
+        if os.path.isdir(artifact_path):
+            files = []
+            for root, dirs, names in os.walk(artifact_path):
+                dirs.sort()
+                for name in sorted(names):
+                    path = os.path.join(root, name)
+                    files.append((os.path.relpath(path, artifact_path).replace(os.sep, '/'),
+                                  self._add_object(path), os.stat(path).st_mode & 0o777))
+            kind = 'dir'
+        else:
+            files = [('', self._add_object(artifact_path, artifact_digest), os.stat(artifact_path).st_mode & 0o777)]
+            kind = 'file'
+        entry = {
+            'format': BUILD_CACHE_FORMAT, 'fingerprint': fingerprint, 'cmd': platform_cmd, 'kind': kind,
+            'name': os.path.basename(os.path.normpath(artifact_path)), 'files': files,
+            'bytes': sum(os.path.getsize(self._object_path(digest)) for _, digest, _ in files),
+            'created': time.time(),
+        }
+        self._write_json(self._entry_path(fingerprint), entry)
+        self.prune()
+        return entry
+
+    def restore(self, entry, dest_path):
+        """Materializes a cached artifact at dest_path (replacing what is there)."""
+        temp_path = f"{dest_path}.restore-{os.getpid()}"
+        os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+        if entry['kind'] == 'dir':
+            shutil.rmtree(temp_path, ignore_errors=True)
+            for rel_path, digest, mode in entry['files']:
+                path = os.path.join(temp_path, *rel_path.split('/'))
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                shutil.copyfile(self._object_path(digest), path)
+                os.chmod(path, mode | 0o200)
+            if os.path.isdir(dest_path):
+                shutil.rmtree(dest_path)
+        else:
+            _, digest, mode = entry['files'][0]
+            shutil.copyfile(self._object_path(digest), temp_path)
+            os.chmod(temp_path, mode | 0o200)
+        os.replace(temp_path, dest_path)
+        os.utime(self._entry_path(entry['fingerprint'])) # mtime = last use, used for pruning
+        return dest_path
+
+    def prune(self):
+        """Keeps the newest entries per target command and drops unreferenced objects."""
+        entries_dir = os.path.join(self.cache_dir, 'entries')
+        by_cmd = {}
+        for name in os.listdir(entries_dir) if os.path.isdir(entries_dir) else []:
+            path = os.path.join(entries_dir, name)
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    entry = json.load(f)
+                by_cmd.setdefault(entry['cmd'], []).append((os.path.getmtime(path), path, entry))
+            except (OSError, ValueError, KeyError):
+                continue
+        referenced = set()
+        for cached in by_cmd.values():
+            cached.sort(key=lambda item: item[0], reverse=True)
+            for _, path, entry in cached[self.keep:]:
+                self._remove(path)
+            referenced.update(digest for _, _, entry in cached[:self.keep] for _, digest, _ in entry['files'])
+        objects_dir = os.path.join(self.cache_dir, 'objects')
+        cutoff = time.time() - PRUNE_GRACE_SECONDS
+        for root, _, names in os.walk(objects_dir):
+            for name in names:
+                path = os.path.join(root, name)
+                if name not in referenced and os.path.getmtime(path) < cutoff:
+                    self._remove(path)
+
+    # --- Helpers ---
+
+    def _entry_path(self, fingerprint):
+        return os.path.join(self.cache_dir, 'entries', fingerprint + '.json')
+
+    def _object_path(self, digest):
+        return os.path.join(self.cache_dir, 'objects', digest[:2], digest)
+
+    def _add_object(self, path, digest=None):
+        digest = digest or _sha256_file(path)
+        object_path = self._object_path(digest)
+        if os.path.isfile(object_path): # Same bytes as an earlier build: nothing to copy
+            os.utime(object_path) # Protects it from a concurrent prune until the entry is written
+        else:
+            os.makedirs(os.path.dirname(object_path), exist_ok=True)
+            temp_path = f"{object_path}.{os.getpid()}.tmp" # Matrix processes may store the same object
+            shutil.copyfile(path, temp_path)
+            os.chmod(temp_path, 0o444)
+            os.replace(temp_path, object_path)
+        return digest
+
+    def _read_index(self, index_path):
+        try:
+            with open(index_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            return data['files'], data['written_ns']
+        except (OSError, ValueError, KeyError):
+            return {}, 0
+
+    def _write_index(self, index_path, files):
+        self._write_json(index_path, {'written_ns': time.time_ns(), 'files': files})
+
+    def _write_json(self, path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f)
+            os.replace(temp_path, path)
+        except OSError as e:
+            print(f"Warning: Could not write build cache file {path}: {e}", file=sys.stderr)
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -0,0 +1,1637 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Core build/upload/publish logic of the Flutter Build & Deploy Tool.
+
+Everything in this module is Qt-free so it can be used by the PySide6 GUI
+(releaser_gui.py) as well as the headless CLI (geecodex_releaser.py run ...).
+paramiko and psycopg are imported lazily by the steps that need them, which
+keeps the headless startup path light.
+"""
+
+import sys
+import os
+import subprocess
+import time
+import threading # subprocess reading runs in the worker thread context
+import traceback # For detailed error logging
+import datetime
+import glob # Fallback when flutter does not report the artifact path
+import fnmatch
+import re
+import mmap # Reading older log lines back from the per-run log file
+import multiprocessing
+import queue # Matrix event queue raises queue.Empty
+import concurrent.futures # Process pool for the release matrix
+import contextlib # ExitStack for pooled SFTP leases
+import hashlib # Artifact digests for upload dedupe
+import json
+import shlex
+import shutil
+import tempfile
+
+from releaser_events import BuildEventStream, TIMELINE_EVENT_TYPES, append_event
+
+# =============================================================================
+# Constants
+# =============================================================================
+
+# Platform Definitions: UI Text -> {id, cmd, artifact_pattern, needs_zip, ext, zip_ext}
+#   id: Internal identifier, used in database
+#   cmd: Platform argument for 'flutter build'
+#   artifact_pattern: Relative path from project root to find the artifact(s).
+#                     Can include wildcards (*) or be a directory.
+#   needs_zip: Boolean, indicates if the output directory should be zipped (streamed into the upload, see releaser_zip)
+#   ext: Expected final artifact extension (e.g., .apk, .ipa, .zip if needs_zip=True)
+#   zip_ext: Extension to use if zipping.
+TARGET_PLATFORMS = {
+    "Android APK": {
+        "id": "android",
+        "cmd": "apk",
+        "artifact_pattern": "build/app/outputs/flutter-apk/app-release.apk",
+        "needs_zip": False,
+        "ext": ".apk",
+        "zip_ext": ".zip"
+    },
+    "Android App Bundle": {
+        "id": "android", # Same platform ID as APK
+        "cmd": "appbundle",
+        "artifact_pattern": "build/app/outputs/bundle/release/app-release.aab",
+        "needs_zip": False,
+        "ext": ".aab",
+        "zip_ext": ".zip"
+    },
+    "iOS App (IPA)": {
+        "id": "ios",
+        "cmd": "ipa",
+        # Note: IPA location might vary based on export options; the directory flutter
+        # reports ("Built IPA to ...") is searched first. Requires build on macOS.
+        "artifact_pattern": "build/ios/ipa/*.ipa",
+        "needs_zip": False,
+        "ext": ".ipa",
+        "zip_ext": ".zip"
+    },
+    "Web Build": {
+        "id": "web",
+        "cmd": "web",
+        # Output is a directory. We might want to zip it.
+        "artifact_pattern": "build/web",
+        "needs_zip": True, # Zipped while uploading
+        "ext": ".zip", # If needs_zip=True, final artifact is zip
+        "zip_ext": ".zip"
+    },
+    # Add other platforms like Linux, macOS, Windows as needed
+    # "Linux Desktop": { ... },
+    # "macOS Desktop": { ... },
+    # "Windows Desktop": { ... },
+}
+
+# Build Environment Platforms (Where the build is executed)
+BUILD_PLATFORMS = ["Windows", "macOS", "Linux"]
+
+# Constants for QSettings
+ORGANIZATION_NAME = "GeeCodeX"
+APPLICATION_NAME = "FlutterReleaser"
+
+# Build log batching: worker output is delivered to the GUI in blocks,
+# whichever limit is reached first.
+LOG_FLUSH_INTERVAL_MS = 50
+LOG_FLUSH_MAX_LINES = 500
+
+# Build output view: only the most recent lines stay in memory, the full log
+# of every run is written to disk and can be paged back in on demand.
+LOG_VIEW_MAX_LINES = 5000
+LOG_LOAD_OLDER_LINES = 2000
+LOG_VIEW_MAX_OLDER_LINES = 20000 # Cap on lines "Load Older" may add on top of LOG_VIEW_MAX_LINES
+LOG_KEEP_RUNS = 30 # Number of per-run log files kept in LOG_DIR
+
+# Artifact paths flutter reports when a build finishes, e.g.
+#   "✓ Built build/app/outputs/flutter-apk/app-release.apk (20.3MB)"
+#   "✓ Built build/web"
+#   "Built IPA to /path/to/project/build/ios/ipa."
+FLUTTER_BUILT_RE = re.compile(r'^(?:\S+\s+)?Built (?:IPA to )?(.+?)(?: \([\d.]+\s*[KMG]?B\))?\.?$')
+
+# Local state (logs, caches) lives outside the project directory
+RELEASER_HOME = os.environ.get("GEECODEX_RELEASER_HOME", os.path.join(os.path.expanduser("~"), ".geecodex_releaser"))
+LOG_DIR = os.path.join(RELEASER_HOME, "logs")
+UPLOAD_STATE_DIR = os.path.join(RELEASER_HOME, "uploads") # Resume manifests of unfinished uploads
+UPLOAD_HISTORY_FILE = os.path.join(RELEASER_HOME, "upload_history.jsonl") # Bytes on the wire per release
+# Copies of published artifacts, used as delta bases for the next release
+ARTIFACT_CACHE_DIR = os.path.join(RELEASER_HOME, "artifacts")
+ARTIFACT_CACHE_KEEP = 3 # Per platform
+# Structured build events (NDJSON per run), see releaser_events
+EVENTS_DIR = os.path.join(RELEASER_HOME, "events")
+# Runs waiting for the release_metrics table while the database is offline
+METRICS_DB_FILE = os.path.join(RELEASER_HOME, "metrics.sqlite3")
+# Artifacts of earlier builds by input fingerprint, see releaser_buildcache
+BUILD_CACHE_DIR = os.path.join(RELEASER_HOME, "build_cache")
+# Remote build agents (registry) and their running jobs, see releaser_agents
+AGENTS_FILE = os.path.join(RELEASER_HOME, "agents.json")
+AGENTS_STATE_DIR = os.path.join(RELEASER_HOME, "agents")
+# Persistent release queue, see releaser_jobs
+JOBS_DB_FILE = os.path.join(RELEASER_HOME, "jobs.sqlite3")
+# Artifacts smaller than this are always uploaded in full
+DELTA_MIN_BYTES = 1024 * 1024
+
+# Artifact digests are computed from an mmap of the file in blocks of this size
+ARTIFACT_DIGEST_BLOCK_BYTES = 4 * 1024 * 1024
+
+# Release matrix: several targets released in one run, each in its own process
+MATRIX_MAX_WORKERS = 3
+# Targets built from the same project share flutter's startup lock and the
+# Gradle project lock, so their builds run one at a time by default while
+# uploads and DB updates overlap with the next target's build.
+MATRIX_SERIALIZE_BUILDS = True
+
+# =============================================================================
+# Helper Classes
+# =============================================================================
+
+class BufferedLogChannel:
+    """Collects output lines and forwards them to a sink as newline-joined blocks.
+
+    A block is flushed when max_lines are pending or flush_interval_ms has
+    elapsed. The sink is called from a background flusher thread and from
+    flush()/close(), never concurrently, so blocks always arrive in order.
+    """
+
+    def __init__(self, sink, flush_interval_ms=LOG_FLUSH_INTERVAL_MS, max_lines=LOG_FLUSH_MAX_LINES):
+        self._sink = sink
+        self._interval = flush_interval_ms / 1000.0
+        self._max_lines = max_lines
+        self._pending = []
+        self._cond = threading.Condition()
+        self._sink_lock = threading.Lock() # Serializes sink calls between flusher and callers
+        self._closed = False
+        # Stats, reported after a build
+        self.lines_written = 0
+        self.blocks_flushed = 0
+        self.sink_seconds = 0.0
+        self._flusher = threading.Thread(target=self._flush_loop, name="log-flusher", daemon=True)
+        self._flusher.start()
+
+    def write(self, text):
+        """Queues one line (or pre-joined lines) for delivery."""
+        with self._cond:
+            self._pending.append(text)
+            self.lines_written += 1
+            closed = self._closed
+            if len(self._pending) >= self._max_lines:
+                self._cond.notify()
+        if closed: # No flusher thread any more, deliver right away
+            self.flush()
+
+    def flush(self):
+        """Delivers everything pending as a single block."""
+        with self._sink_lock:
+            with self._cond:
+                block, self._pending = self._pending, []
+            if not block:
+                return
+            start = time.perf_counter()
+            self._sink("\n".join(block))
+            self.sink_seconds += time.perf_counter() - start
+            self.blocks_flushed += 1
+
+    def close(self):
+        """Stops the flusher thread and delivers the remaining lines."""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify()
+        self._flusher.join()
+        self.flush()
+
+    def _flush_loop(self):
+        while True:
+            with self._cond:
+                if not self._closed and len(self._pending) < self._max_lines:
+                    self._cond.wait(self._interval)
+                if self._closed:
+                    return
+            self.flush()
+
+
+class RunLogFile:
+    """Append-only log file for a single run, stored in LOG_DIR.
+
+    Each appended text is terminated by a newline, so byte offsets returned by
+    this class always point at the start of a line. Older lines are read back
+    through a memory map without loading the whole file.
+    """
+
+    def __init__(self, log_dir=LOG_DIR, keep_runs=LOG_KEEP_RUNS):
+        os.makedirs(log_dir, exist_ok=True)
+        stamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+        self.path = os.path.join(log_dir, f"release-{stamp}.log")
+        suffix = 1
+        while os.path.exists(self.path): # Two runs within the same second
+            self.path = os.path.join(log_dir, f"release-{stamp}-{suffix}.log")
+            suffix += 1
+        self._file = open(self.path, "ab")
+        self.rotate(log_dir, keep_runs)
+
+    @staticmethod
+    def rotate(log_dir, keep_runs):
+        """Deletes the oldest run logs so that at most keep_runs remain."""
+        try:
+            logs = sorted(
+                (os.path.join(log_dir, name) for name in os.listdir(log_dir)
+                 if name.startswith("release-") and name.endswith(".log")),
+                key=os.path.getmtime)
+            for old_path in logs[:-keep_runs] if keep_runs > 0 else []:
+                os.remove(old_path)
+        except OSError as e:
+            print(f"Warning: Failed to rotate run logs in {log_dir}: {e}")
+
+    def append(self, text):
+        if self._file:
+            self._file.write(text.encode("utf-8", errors="replace") + b"\n")
+
+    def size(self):
+        if self._file:
+            self._file.flush()
+        return os.path.getsize(self.path)
+
+    def offset_of_last_lines(self, line_count):
+        """Byte offset where the last line_count lines of the file begin."""
+        size = self.size()
+        if size == 0:
+            return 0
+        with open(self.path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return self._line_start_before(mm, size, line_count)
+
+    def read_before(self, offset, max_lines):
+        """Returns (text, start_offset) for up to max_lines lines ending at offset."""
+        if offset <= 0:
+            return "", 0
+        self.size() # Make sure buffered lines are on disk before mapping
+        with open(self.path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            start = self._line_start_before(mm, offset, max_lines)
+            text = mm[start:offset - 1].decode("utf-8", errors="replace") # Drop the trailing newline
+        return text, start
+
+    @staticmethod
+    def _line_start_before(mm, offset, line_count):
+        cursor = offset - 1 # Newline that terminates the last line before offset
+        start = 0
+        for _ in range(line_count):
+            newline = mm.rfind(b"\n", 0, cursor)
+            if newline < 0:
+                return 0
+            start = newline + 1
+            cursor = newline
+        return start
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+
+# =============================================================================
+# Config Helpers (shared by GUI and CLI)
+# =============================================================================
+
+def target_platform_config(target_ui_text):
+    """Maps a TARGET_PLATFORMS key to the platform fields of a release config."""
+    target_info = TARGET_PLATFORMS.get(target_ui_text, {}) # Get details from our constant map
+    return {
+        'platform': target_info.get('id', 'unknown'), # Target platform ID (e.g., 'android') for DB
+        'target_platform_text': target_ui_text, # UI text for display/logging
+        'target_platform_cmd': target_info.get('cmd', 'unknown'), # Build command part
+        'artifact_pattern': target_info.get('artifact_pattern', ''), # Expected output path/dir
+        'needs_zip': target_info.get('needs_zip', False), # Whether to zip output
+        'ext': target_info.get('ext', '.unknown'), # Final artifact extension
+        'zip_ext': target_info.get('zip_ext', '.zip') # Extension if zipped
+    }
+
+
+def default_build_platform():
+    """Returns the BUILD_PLATFORMS entry matching the current OS."""
+    if sys.platform == "win32":
+        return "Windows"
+    if sys.platform == "darwin":
+        return "macOS"
+    return "Linux" # Default fallback
+
+
+def read_pubspec_version(project_dir):
+    """Returns (version_line, version_name, version_code) from pubspec.yaml.
+
+    Returns None if there is no usable 'version:' line. Raises OSError if the
+    file cannot be read.
+    """
+    pubspec_path = os.path.join(project_dir, 'pubspec.yaml')
+    with open(pubspec_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line_stripped = line.strip()
+            if line_stripped.startswith('version:'):
+                version_line = line_stripped.split('version:', 1)[1].strip().split('#')[0].strip() # Remove comments
+                parts = version_line.split('+')
+                code_val = 1 # Default if only name is present or if code is not an int
+                if len(parts) > 1:
+                    try:
+                        code_val = int(parts[1].strip())
+                    except (ValueError, TypeError):
+                        code_val = 1
+                return version_line, parts[0].strip(), code_val
+    return None
+
+
+def validate_release_config(config):
+    """Returns a list of human-readable problems with a full release config."""
+    errors = []
+    if not config.get('project_dir') or not os.path.isdir(config['project_dir']):
+        errors.append("Please select a valid Flutter project directory.")
+    if config.get('platform') == 'unknown' or config.get('target_platform_cmd') == 'unknown':
+         errors.append("Please select a valid Target Platform.")
+    # iOS specific check - Requires macOS build platform (local, or a macOS build agent)
+    if config.get('build_agent'):
+        from releaser_agents import load_agents, suitable_agents
+        try:
+            if not suitable_agents(load_agents(AGENTS_FILE), config.get('target_platform_cmd'), config['build_agent']):
+                errors.append(f"No build agent ({config['build_agent']}) can build {config.get('target_platform_text')}. "
+                              f"Register agents in {AGENTS_FILE}.")
+        except ValueError as e:
+            errors.append(str(e))
+    elif config.get('platform') == 'ios' and config.get('build_platform') != 'macOS':
+        errors.append("iOS builds can only be performed on macOS (or on a macOS build agent).")
+
+    if not config.get('version_name') or not ('.' in config['version_name']): # Basic check
+        errors.append("Please enter a valid Version Name (e.g., 1.0.0).")
+    if not isinstance(config.get('version_code'), int) or not config['version_code'] > 0:
+         errors.append("Please enter a valid Version Code (must be > 0).")
+
+    # DB/SFTP checks (ensure fields needed for operation are present)
+    db_op_fields = ['db_host', 'db_port', 'db_name', 'db_user', 'db_password']
+    sftp_op_fields = ['sftp_host', 'sftp_port', 'sftp_user', 'sftp_remote_path']
+    sftp_auth_ok = config.get('sftp_password') or config.get('sftp_key_path') # Check password OR key path
+
+    if not all(config.get(k) for k in db_op_fields):
+        errors.append("Missing required PostgreSQL details for database update.")
+    if not all(config.get(k) for k in sftp_op_fields):
+         errors.append("Missing required SFTP details for upload.")
+    if not sftp_auth_ok:
+         errors.append("Missing SFTP Password (or Key Path) for upload.")
+    return errors
+
+def artifact_mtime(path):
+    """Newest mtime of a file, or of a directory and everything below it."""
+    newest = os.path.getmtime(path)
+    if os.path.isdir(path):
+        for root, dirs, files in os.walk(path):
+            for name in dirs + files:
+                try:
+                    newest = max(newest, os.lstat(os.path.join(root, name)).st_mtime)
+                except OSError:
+                    pass # Removed while walking
+    return newest
+
+def locate_artifact(project_dir, artifact_pattern, reported_paths=(), built_after=None):
+    """Finds the artifact of a build. Returns (path or None, how it was found).
+
+    Paths flutter reported ("Built ...") are checked first, the latest one
+    first; a reported directory (e.g. build/ios/ipa) is searched for the
+    pattern. Otherwise the fixed path or the newest pattern match by mtime is
+    used. Except for paths flutter reported itself, only artifacts written
+    after built_after (a time.time() value) count: a leftover of an earlier
+    build is never returned as the result of this one.
+    """
+    def is_fresh(path):
+        return built_after is None or artifact_mtime(path) >= built_after
+
+    pattern = os.path.normpath(os.path.join(project_dir, artifact_pattern))
+    for reported in reversed(reported_paths):
+        path = os.path.normpath(os.path.join(project_dir, reported))
+        if fnmatch.fnmatch(path, pattern) and os.path.exists(path):
+            return path, "flutter output"
+        if os.path.isdir(path) and os.path.dirname(pattern) == path:
+            with os.scandir(path) as entries:
+                matches = [(entry.stat().st_mtime, entry.path) for entry in entries if fnmatch.fnmatch(entry.path, pattern)]
+            if matches and is_fresh(max(matches)[1]):
+                return max(matches)[1], "flutter output directory"
+    if not any(c in artifact_pattern for c in '*?['):
+        if not os.path.exists(pattern):
+            return None, "fixed path"
+        return (pattern, "fixed path") if is_fresh(pattern) else (None, "fixed path, only a stale copy from an earlier build")
+    matches = [(os.path.getmtime(path), path) for path in glob.glob(pattern, recursive='**' in artifact_pattern)]
+    fresh = [match for match in matches if built_after is None or match[0] >= built_after]
+    if fresh:
+        return os.path.normpath(max(fresh)[1]), "newest pattern match"
+    return None, "pattern, only stale matches from an earlier build" if matches else "pattern"
+
+
+def file_sha256(path, block_bytes=ARTIFACT_DIGEST_BLOCK_BYTES):
+    """Hex sha256 of a file, read through mmap (hashlib releases the GIL per block)."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return digest.hexdigest() # mmap refuses empty files
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            view = memoryview(mm)
+            try:
+                for offset in range(0, len(mm), block_bytes):
+                    digest.update(view[offset:offset + block_bytes])
+            finally:
+                view.release() # mmap can't close while a view is exported
+    return digest.hexdigest()
+
+
+def digest_in_background(path):
+    """Starts file_sha256(path) in a daemon thread. Returns a concurrent.futures.Future."""
+    future = concurrent.futures.Future()
+
+    def work():
+        try:
+            future.set_result(file_sha256(path))
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=work, name="artifact-digest", daemon=True).start()
+    return future
+
+def cache_artifact(local_path, platform_id, remote_name, keep=ARTIFACT_CACHE_KEEP):
+    """Keeps a copy of a published artifact under its remote file name."""
+    cache_dir = os.path.join(ARTIFACT_CACHE_DIR, platform_id)
+    os.makedirs(cache_dir, exist_ok=True)
+    cached_path = os.path.join(cache_dir, remote_name)
+    if os.path.abspath(local_path) != os.path.abspath(cached_path):
+        temp_path = f"{cached_path}.{os.getpid()}.tmp" # Matrix processes may cache the same platform
+        shutil.copy2(local_path, temp_path)
+        os.replace(temp_path, cached_path)
+    os.utime(cached_path) # mtime = last publish, used for pruning
+    cached = sorted((os.path.join(cache_dir, name) for name in os.listdir(cache_dir) if not name.endswith(".tmp")),
+                    key=os.path.getmtime, reverse=True)
+    for old_path in cached[keep:]:
+        try:
+            os.remove(old_path)
+        except OSError:
+            pass
+    return cached_path
+
+
+def record_upload(entry, history_file=UPLOAD_HISTORY_FILE):
+    """Appends one upload (mode, artifact bytes, bytes on the wire, ...) to the history file."""
+    try:
+        os.makedirs(os.path.dirname(history_file), exist_ok=True)
+        with open(history_file, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry) + "\n")
+    except OSError as e:
+        print(f"Warning: Could not record upload history: {e}", file=sys.stderr)
+
+# =============================================================================
+# Release Runner (build -> upload -> database)
+# =============================================================================
+
+class ReleaseRunner:
+    """Handles the entire build, upload, and DB update process without Qt.
+
+    Progress is reported through plain callables, so the same runner backs the
+    GUI worker (which forwards them to Qt signals) and the headless CLI:
+      on_output(text)                 build/upload/DB log text
+      on_step(message)                e.g., "Building...", "Uploading...", "Updating DB..."
+      on_progress(transferred, total) upload progress in bytes
+      on_finished(success, message)   final result of the run
+      on_event(event)                 structured build events (dicts, see releaser_events)
+
+    build_lock is an optional lock (e.g. a multiprocessing.Manager lock) held
+    for the duration of the flutter build, see ReleaseMatrix. While the build
+    runs, pre-flight checks log in to the SFTP server (creating the upload
+    directory if needed) and check the app_updates schema; a failing check
+    stops the build early, and the warm sessions stay in SFTP_POOL/DB_POOL
+    for the upload and publish stages. config['build_agent'] ('auto' or an
+    agent name) runs the build on a remote build agent instead (see
+    releaser_agents); the remote build runs in the agent slot's own copy of
+    the project, so only copying the artifact back into the local project
+    takes build_lock. With
+    defer_publish, run() stops after the upload and leaves the database
+    record in deferred_publish for a batch publish; run_end and the run
+    metrics are reported by finish_deferred_run() once its outcome is known.
+    """
+
+    def __init__(self, config, on_output=print, on_step=None, on_progress=None, on_finished=None,
+                 build_lock=None, defer_publish=False, on_event=None):
+        self.config = config
+        self.build_lock = build_lock
+        self.defer_publish = defer_publish
+        self.deferred_publish = None # Upload result and run timing left for a batch publish, see _defer
+        self._is_running = True
+        self.current_process = None # Store reference to the subprocess
+        self._remote_build = None # releaser_agents.RemoteBuild while a build agent builds
+        self._on_step = on_step or (lambda message: None)
+        self._on_progress = on_progress or (lambda transferred, total: None)
+        self._on_finished = on_finished or (lambda success, message: None)
+        self.result = (False, "Not started.") # (success, message) of the last run
+        self.retryable = False # Set by failures another attempt may not repeat (connections), see releaser_jobs
+        self._artifact_digest = None # (artifact_path, Future of its sha256), started when the build produced it
+        self._build_cache_digest = None # sha256 of a file artifact, known when the build cache handled it
+        self._upload_entry = None # Upload history entry of this run (bytes, seconds, mode)
+        self._db_ms = None # Duration of the database publish
+        self.metrics_future = None # Future of the background move of the run metrics to PostgreSQL
+        self._preflight = {} # check name -> Future of its message, see _start_preflight
+        self._preflight_error = None # First failed pre-flight check, stops the build
+        self._preflight_lock = threading.Lock() # The check threads and the stage thread may both record it
+        self._preflight_start = None
+        self._preflight_seconds = 0.0 # Until the last pre-flight check finished
+        # All output goes through the channel so consumers get blocks, not lines
+        self.log = BufferedLogChannel(on_output)
+        self.events = BuildEventStream(EVENTS_DIR, config.get('target_platform_cmd', 'build'), on_event)
+
+    def _finish(self, success, message):
+        """Flushes pending output, then reports the result so the log stays in order."""
+        self.events.run_end(success, message)
+        self._record_metrics(success)
+        self.log.flush()
+        self.result = (success, message)
+        self._on_finished(success, message)
+
+    def _defer(self, remote_path):
+        """Ends the run after the upload, leaving the publish and the run result to the batch."""
+        from releaser_metrics import metrics_row
+        self.events.end_stage()
+        started = self.events.count('run_start') > 0
+        self.deferred_publish = {
+            'remote_path': remote_path,
+            'build_timestamp': datetime.datetime.now(datetime.timezone.utc),
+            'events_path': self.events.path,
+            'elapsed': self.events.elapsed(),
+            'stages': dict(self.events.stages),
+            'metrics': metrics_row(self.config, self.events, self._upload_entry, None, True) if started else None,
+        }
+        self.log.write("Uploaded, the release is published together with the rest of the batch.")
+        self.log.flush()
+        self.result = (True, "Uploaded, waiting for the batch publish.")
+
+    def _record_metrics(self, success):
+        """Stores the timing of this run locally; a background thread moves it to release_metrics."""
+        if self.events.count('run_start') == 0: # Stopped before the build started
+            return
+        from releaser_metrics import MetricsStore, metrics_row
+        row = metrics_row(self.config, self.events, self._upload_entry, self._db_ms, success)
+        try:
+            self.metrics_future = MetricsStore(METRICS_DB_FILE).record(self.config, row) # Does not wait for PostgreSQL
+        except Exception as e: # Metrics never fail a release
+            self.log.write(f"Warning: Could not record run metrics: {type(e).__name__}: {e}")
+            return
+        self.log.write(f"Run metrics ({row['total_seconds']:.1f}s total) recorded, moving them to PostgreSQL in the background.")
+
+    def run(self):
+        """Execute the build and deploy steps. Returns True on success."""
+        self._is_running = True
+        self.current_process = None
+        self.result = (False, "Operation cancelled.") # Kept if a stop request ends the run early
+        try:
+            build_success, artifact_path = self.build_stage()
+            if not build_success: return self.result[0]
+            upload_success, remote_path = self.upload_stage(artifact_path)
+            if not upload_success: return self.result[0]
+            if self.defer_publish:
+                self._defer(remote_path)
+                return True
+            if not self.publish_stage(remote_path): return self.result[0]
+            self.finish_success()
+        except Exception as e:
+            self.fail_unexpected(e)
+        finally:
+             self.close()
+        return self.result[0]
+
+
+    # --- Stages (used by run() and by releaser_jobs.ReleaseScheduler) ---
+    # Each stage reports its own failure/cancellation through _finish and
+    # returns a falsy success value, so callers just stop the chain.
+
+    def build_stage(self):
+        """Step 1: flutter build (+ zip if needed). Returns (success, artifact_path)."""
+        if not self._is_running: return False, None
+        self._on_step(f"Building {self.config['target_platform_text']} v{self.config['version_name']}...")
+        self.events.run_start(self.config)
+        self.events.stage('build')
+        if self.events.path:
+            self.log.write(f"Build events: {self.events.path}")
+        self._start_preflight() # Also covers the wait for the build lock
+        # Agent jobs build in their slot's own remote copy of the project; _run_agent_build locks the fetch
+        build_lock = None if self.config.get('build_agent') else self.build_lock
+        if not self._acquire_build_lock(build_lock):
+            self._finish(False, self._preflight_error or "Build cancelled.")
+            return False, None
+        try:
+            build_success, artifact_path = self.run_flutter_build()
+        finally:
+            if build_lock is not None:
+                build_lock.release()
+        if not self._is_running: # Check if cancelled during build (or stopped by a failed pre-flight check)
+            self._finish(False, self._preflight_error or "Build cancelled.")
+            return False, None
+        if not build_success:
+            self._finish(False, "Build failed. Check output.")
+            return False, None
+        if not self._await_preflight():
+            return False, None
+
+        # --- Step 1.5: Directory artifacts (e.g., Web) are zipped by the upload step ---
+        if self.config.get('needs_zip', False) and os.path.isdir(artifact_path):
+            self.log.write(f"{artifact_path} will be zipped while it is uploaded.")
+        elif self._build_cache_digest:
+            known = concurrent.futures.Future()
+            known.set_result(self._build_cache_digest)
+            self._artifact_digest = (artifact_path, known)
+        elif os.path.isfile(artifact_path):
+            # Hashing overlaps with the hand-off to the upload stage and the SFTP connect
+            self._artifact_digest = (artifact_path, digest_in_background(artifact_path))
+        return True, artifact_path
+
+    def upload_stage(self, artifact_path):
+        """Step 2: SFTP upload. Returns (success, remote_path)."""
+        if not self._is_running: return False, None
+        self._start_resumed_run()
+        self._on_step(f"Uploading {os.path.basename(artifact_path)}...")
+        self.events.stage('upload')
+        upload_success, remote_path = self.upload_via_sftp(artifact_path)
+        if not self._is_running: # Check if cancelled during upload
+             self._finish(False, "Upload cancelled.")
+             return False, None
+        # On failure the error message was reported within upload_via_sftp via _finish
+        return upload_success, remote_path
+
+    def publish_stage(self, remote_path):
+        """Step 3: database update. Returns success."""
+        if not self._is_running: return False
+        self._start_resumed_run()
+        self._on_step("Updating database record...")
+        self.events.stage('publish')
+        build_ts = datetime.datetime.now(datetime.timezone.utc)
+        db_success = self.update_database(remote_path, build_ts)
+        if not self._is_running: # Check if cancelled (less likely here)
+             self._finish(False, "Operation cancelled.")
+             return False
+        # On failure the error message was reported within update_database via _finish
+        return db_success
+
+    def _start_resumed_run(self):
+        """A queued job that resumes after its build (retry, restart) still gets a run in the events and metrics."""
+        if self.events.count('run_start') == 0:
+            self.events.run_start(self.config)
+
+    def finish_success(self):
+        """Reports the successful end of all steps."""
+        self._finish(True, self.success_message(self.config))
+
+    @staticmethod
+    def success_message(config):
+        return f"Successfully deployed v{config['version_name']} for {config['platform']}!"
+
+    def fail_unexpected(self, error):
+        """Reports an exception that escaped a stage."""
+        self.log.write("\n--- UNEXPECTED WORKER ERROR ---")
+        self.log.write(f"{type(error).__name__}: {error}")
+        self.log.write(traceback.format_exc())
+        self._finish(False, f"An unexpected error occurred: {error}")
+
+    def close(self):
+        """Ends the run: no more stages, remaining output is delivered."""
+        self._is_running = False
+        self.current_process = None # Clear process reference
+        self.log.close()
+        self.events.close()
+
+
+    def _start_preflight(self):
+        """Starts the SFTP and database checks of the later stages next to the build."""
+        self._preflight, self._preflight_error, self._preflight_seconds = {}, None, 0.0
+        if not self.config.get('preflight', True):
+            return
+        self._preflight_start = time.perf_counter()
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=2, thread_name_prefix="preflight")
+        for name, check in (("SFTP", self._preflight_sftp), ("Database", self._preflight_db)):
+            future = executor.submit(check)
+            future.add_done_callback(lambda future, name=name: self._preflight_done(name, future))
+            self._preflight[name] = future
+        executor.shutdown(wait=False)
+
+    def _preflight_done(self, name, future):
+        """Pre-flight thread: a failed check stops the build right away."""
+        self._preflight_seconds = max(self._preflight_seconds, time.perf_counter() - self._preflight_start)
+        error = future.exception()
+        if error is None or not self._is_running or not self._preflight_failed(name, error):
+            return
+        self.log.write(f"{self._preflight_error}, stopping the build.")
+        self._is_running = False
+        self._terminate_build_process()
+
+    def _preflight_failed(self, name, error):
+        """Records the first failed check. Returns False if one was recorded already."""
+        with self._preflight_lock:
+            if self._preflight_error is not None:
+                return False
+            detail = str(error).strip().splitlines()[0] if str(error).strip() else type(error).__name__
+            self._preflight_error = f"Pre-flight check failed ({name}): {detail}"
+            self.retryable = not isinstance(error, ValueError) # Missing settings and schema problems stay
+        return True
+
+    def _await_preflight(self):
+        """Waits for the pre-flight checks after a successful build. Returns False (and reports) if one failed."""
+        if not self._preflight:
+            return True
+        wait_start = time.perf_counter()
+        pending = set(self._preflight.values())
+        while pending and self._is_running:
+            _, pending = concurrent.futures.wait(pending, timeout=0.5)
+        # A future is done before its done-callback ran, so look at the outcomes here as well
+        for name, future in self._preflight.items():
+            if future.done() and future.exception() is not None:
+                self._preflight_failed(name, future.exception())
+                break
+        if self._preflight_error is not None:
+            self._finish(False, self._preflight_error)
+            return False
+        if not self._is_running:
+            self._finish(False, "Build cancelled.")
+            return False
+        results = "; ".join(f"{name}: {future.result()}" for name, future in self._preflight.items())
+        self.log.write(f"Pre-flight checks passed in {self._preflight_seconds:.2f}s "
+                       f"(waited {time.perf_counter() - wait_start:.2f}s after the build). {results}")
+        self.events.emit('preflight', seconds=round(self._preflight_seconds, 3), checks=list(self._preflight))
+        return True
+
+    def _preflight_sftp(self):
+        """Logs in to the SFTP server and makes sure the upload directory exists. Returns a summary."""
+        from releaser_sftp import SFTP_POOL
+        from releaser_probe import PROBE_CACHE, ProbeResult, probe_key
+        if not all(self.config.get(k) for k in ('sftp_host', 'sftp_port', 'sftp_user', 'sftp_remote_path')):
+            raise ValueError("Missing SFTP host, port, user or remote path.")
+        if not self.config.get('sftp_password') and not self.config.get('sftp_key_path'):
+            raise ValueError("SFTP requires either a password or a private key path.")
+        probed_age = PROBE_CACHE.fresh('sftp', self.config)
+        if probed_age is not None:
+            return f"verified by a connection test {probed_age:.0f}s ago"
+        start = time.perf_counter()
+        remote_dir = self.config['sftp_remote_path'].replace("\\", "/")
+        with SFTP_POOL.checkout(self.config, timeout=20) as lease: # The connection stays warm for the upload
+            try:
+                lease.sftp.stat(remote_dir)
+                found = f"{remote_dir} found"
+            except FileNotFoundError:
+                lease.sftp.mkdir(remote_dir)
+                found = f"created {remote_dir}"
+        seconds = time.perf_counter() - start
+        message = f"logged in, {found} ({seconds:.2f}s)"
+        # The upload skips its own directory check while this is fresh
+        PROBE_CACHE.put(probe_key('sftp', self.config), ProbeResult('sftp', True, message, seconds, False))
+        return message
+
+    def _preflight_db(self):
+        """Connects to the database and checks app_updates against the publish statement. Returns a summary."""
+        from releaser_db import DB_POOL, check_release_schema
+        from releaser_probe import PROBE_CACHE, ProbeResult, probe_key
+        if not all(self.config.get(k) for k in ('db_host', 'db_port', 'db_name', 'db_user')):
+            raise ValueError("Missing one or more PostgreSQL connection details.")
+        probed_age = PROBE_CACHE.fresh('db', self.config) # The connection test checked the schema too
+        if probed_age is not None:
+            return f"verified by a connection test {probed_age:.0f}s ago"
+        start = time.perf_counter()
+        with DB_POOL.connection(self.config) as conn: # The session stays in the pool for the publish
+            problems = check_release_schema(conn)
+        if problems:
+            raise ValueError("; ".join(problems))
+        seconds = time.perf_counter() - start
+        message = f"app_updates schema ok ({seconds * 1000:.0f} ms)"
+        PROBE_CACHE.put(probe_key('db', self.config), ProbeResult('db', True, message, seconds, False))
+        return message
+
+
+    def _acquire_build_lock(self, build_lock):
+        """Waits for build_lock (if any). Returns False if stopped while waiting."""
+        if build_lock is None or build_lock.acquire(False):
+            return True
+        self.log.write("Waiting for another target's build to finish...")
+        while self._is_running:
+            if build_lock.acquire(True, 0.5):
+                return True
+        return False
+
+
+    def stop(self):
+        """Signals the worker to stop processing."""
+        self.log.write("\n--- Stop Requested ---")
+        self._is_running = False
+        self._terminate_build_process()
+
+    def _terminate_build_process(self):
+        """Terminates the flutter build if it is running."""
+        remote_build = self._remote_build
+        if remote_build is not None:
+            self.log.write(f"Hanging up the build on agent {remote_build.agent.name}...")
+            remote_build.terminate()
+        process_to_stop = self.current_process # Capture current process
+        if process_to_stop and process_to_stop.poll() is None: # Check if running
+             self.log.write("Attempting to terminate build process...")
+             try:
+                 process_to_stop.terminate() # Ask nicely first
+                 try:
+                     # Wait a short time for termination
+                     process_to_stop.wait(timeout=2)
+                     self.log.write("Build process terminated.")
+                 except subprocess.TimeoutExpired:
+                      self.log.write("Build process did not terminate gracefully, killing.")
+                      process_to_stop.kill() # Force kill
+                      # Ensure it's dead before continuing cleanup
+                      process_to_stop.wait(timeout=1)
+                      self.log.write("Build process killed.")
+             except Exception as e:
+                  self.log.write(f"Error terminating process: {e}")
+
+
+    def run_flutter_build(self):
+        """Executes the flutter build command based on selected platform."""
+        project_dir = self.config['project_dir']
+        platform_cmd = self.config['target_platform_cmd']
+        artifact_pattern = self.config['artifact_pattern']
+        platform_name = self.config['target_platform_text'] # For logging
+
+        if not os.path.isdir(project_dir):
+            self.log.write(f"Error: Project directory not found: {project_dir}")
+            return False, None
+        if not platform_cmd or platform_cmd == 'unknown':
+             self.log.write("Error: Invalid or unknown target platform selected.")
+             return False, None
+        if not artifact_pattern:
+             self.log.write(f"Error: No artifact pattern defined for {platform_name}.")
+             return False, None
+
+        # --- Build cache: same inputs as an earlier build -> reuse its artifact ---
+        self._build_cache_digest = None
+        build_cache = fingerprint = None
+        if self.config.get('build_cache', True):
+            build_cache, fingerprint, cached_path = self._check_build_cache(project_dir, platform_cmd, artifact_pattern)
+            if cached_path:
+                return True, cached_path
+        if self.config.get('build_agent'):
+            return self._run_agent_build(project_dir, platform_cmd, artifact_pattern, build_cache, fingerprint)
+
+        # --- Construct command ---
+        command = ['flutter', 'build', platform_cmd, '--release']
+        # Add version args if supported for the platform (often requires pubspec mod)
+        # command.extend(['--build-name', self.config['version_name']])
+        # command.extend(['--build-number', str(self.config['version_code'])])
+
+        self.log.write(f"Running command: {' '.join(command)}")
+        self.log.write(f"In directory: {project_dir}\n---\n")
+
+        try:
+            build_start = time.perf_counter()
+            build_started_at = time.time() - 1 # mtime granularity of some filesystems
+            reported_paths = [] # Artifact paths from flutter's "Built ..." lines
+            lines_before = self.log.lines_written
+            sink_before = self.log.sink_seconds
+            # Store the process object
+            self.current_process = subprocess.Popen(
+                command,
+                cwd=project_dir,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT, # Redirect stderr to stdout
+                text=True,
+                encoding='utf-8',
+                errors='replace', # Handle potential encoding issues
+                bufsize=1, # Line buffered
+                # creationflags=subprocess.CREATE_NO_WINDOW if sys.platform == 'win32' else 0
+            )
+
+            # Read output line by line
+            for line in self.current_process.stdout:
+                 if not self._is_running: # Check stop flag before processing line
+                      self.log.write("...build stopped by request.")
+                      if self.current_process.poll() is None:
+                           self.stop() # Trigger termination logic
+                      return False, None # Indicate failure/cancellation
+                 line = line.strip()
+                 self.log.write(line)
+                 self.events.feed(line)
+                 built = FLUTTER_BUILT_RE.match(line)
+                 if built:
+                     reported_paths.append(built.group(1))
+
+            exit_code = self.current_process.wait()
+            self.events.end_build()
+
+            if not self._is_running:
+                self.log.write("...build process finished after stop request.")
+                return False, None
+
+            self.current_process = None
+            self.log.flush()
+            build_seconds = time.perf_counter() - build_start
+            self.log.write("\n---")
+            self.log.write(
+                f"Build output: {self.log.lines_written - lines_before} lines in {build_seconds:.1f}s, "
+                f"log delivery overhead {(self.log.sink_seconds - sink_before) * 1000:.1f} ms "
+                f"({self.log.blocks_flushed} block(s) so far)."
+            )
+            self._log_build_phases()
+
+            if exit_code == 0:
+                self.log.write(f"Flutter build for {platform_name} completed successfully.")
+
+                # --- Find the artifact: flutter's "Built ..." line, else the newest pattern match ---
+                locate_start = time.perf_counter()
+                artifact_abs_path, found_by = locate_artifact(project_dir, artifact_pattern, reported_paths, build_started_at)
+                locate_ms = (time.perf_counter() - locate_start) * 1000
+                if artifact_abs_path is None:
+                    self.log.write(f"Error: Build succeeded but this build wrote no artifact matching pattern: {artifact_pattern} (checked {found_by})")
+                    self.log.write("Check build output or the artifact_pattern in TARGET_PLATFORMS.")
+                    return False, None
+                self.log.write(f"Found artifact: {artifact_abs_path} (via {found_by}, {locate_ms:.1f} ms)")
+                if build_cache is not None:
+                    self._store_build(build_cache, fingerprint, project_dir, platform_cmd, artifact_abs_path)
+                return True, artifact_abs_path
+
+            else:
+                self.log.write(f"Flutter build failed with exit code {exit_code}.")
+                return False, None
+
+        except FileNotFoundError:
+             self.log.write("Error: 'flutter' command not found. Make sure Flutter SDK is in your system's PATH.")
+             return False, None
+        except Exception as e:
+            self.log.write(f"Error running build process: {e}")
+            self.log.write(traceback.format_exc())
+            self.current_process = None
+            return False, None
+
+
+    def _log_build_phases(self):
+        slowest = ", ".join(f"{name} {duration:.1f}s" for name, duration in self.events.summary('phase', 3))
+        self.log.write(f"Build phases: {slowest or 'none reported'}; {self.events.count('task_end')} Gradle task(s), "
+                       f"{self.events.count('warning')} warning(s), {self.events.count('error')} error line(s).")
+
+    def _run_agent_build(self, project_dir, platform_cmd, artifact_pattern, build_cache, fingerprint):
+        """Builds on the least-loaded suitable build agent and copies the artifact into project_dir."""
+        from releaser_agents import AgentSlots, RemoteBuild, load_agents, pick_agent, suitable_agents
+        wanted = self.config['build_agent']
+        try:
+            agents = suitable_agents(load_agents(AGENTS_FILE), platform_cmd, wanted)
+        except ValueError as e:
+            self.log.write(f"Error: {e}")
+            return False, None
+        if not agents:
+            self.log.write(f"Error: No build agent ({wanted}) can build '{platform_cmd}', see {AGENTS_FILE}.")
+            return False, None
+        slots = AgentSlots(AGENTS_STATE_DIR)
+        picked = pick_agent(agents, slots, on_output=self.log.write, should_stop=lambda: not self._is_running)
+        if picked is None:
+            if self._is_running:
+                self.log.write("Error: No suitable build agent is reachable.")
+                self.retryable = True
+            return False, None
+        agent, slot_path, slot = picked
+        reported_paths = [] # Artifact paths from flutter's "Built ..." lines
+
+        def on_line(line):
+            self.log.write(line)
+            self.events.feed(line)
+            built = FLUTTER_BUILT_RE.match(line)
+            if built:
+                reported_paths.append(built.group(1))
+
+        try:
+            remote_build = RemoteBuild(agent, slot, on_line=on_line, should_stop=lambda: not self._is_running,
+                                       heartbeat=lambda: slots.heartbeat(slot_path))
+            self._remote_build = remote_build
+            if self.config.get('build_platform') != agent.os: # The database records where the build ran
+                self.log.write(f"Build platform recorded as {agent.os} (selected: {self.config.get('build_platform')}).")
+                self.config['build_platform'] = agent.os
+            stats = remote_build.sync(project_dir)
+            self.log.write(f"Synced the project to {agent.name}:{remote_build.work_dir}: {stats['uploaded']} of {stats['files']} "
+                           f"file(s) changed ({stats['bytes'] / 1024 / 1024:.2f} MB), {stats['removed']} removed, "
+                           f"in {stats['seconds']:.2f}s.\n---\n")
+            build_start = time.perf_counter()
+            exit_code = remote_build.run(platform_cmd)
+            self.events.end_build()
+            if exit_code is None or not self._is_running:
+                self.log.write("...remote build stopped by request.")
+                return False, None
+            self.log.flush()
+            self.log.write("\n---")
+            self.log.write(f"Remote build on {agent.name} exited with code {exit_code} after {time.perf_counter() - build_start:.1f}s.")
+            self._log_build_phases()
+            if exit_code != 0:
+                self.log.write(f"Flutter build failed with exit code {exit_code}.")
+                return False, None
+            # The artifact lands in the local project, where other targets of the matrix may be building
+            if not self._acquire_build_lock(self.build_lock):
+                return False, None
+            try:
+                fetch_start = time.perf_counter()
+                artifact_path, remote_path = remote_build.fetch(project_dir, artifact_pattern, reported_paths)
+            finally:
+                if self.build_lock is not None:
+                    self.build_lock.release()
+            self.log.write(f"Found artifact: {artifact_path} (fetched {remote_path} from {agent.name} "
+                           f"in {time.perf_counter() - fetch_start:.2f}s)")
+        except Exception as e:
+            if not self._is_running:
+                return False, None
+            self.log.write(f"Error: Build on agent {agent.name} failed: {type(e).__name__}: {e}")
+            self.retryable = True
+            from releaser_sftp import SFTP_POOL
+            # Other builds on this agent may share the pooled transport; only drop it if it died
+            SFTP_POOL.discard_if_dead(agent.ssh_config())
+            return False, None
+        finally:
+            self._remote_build = None
+            slots.release(slot_path)
+        if build_cache is not None:
+            self._store_build(build_cache, fingerprint, project_dir, platform_cmd, artifact_path)
+        return True, artifact_path
+
+    def _check_build_cache(self, project_dir, platform_cmd, artifact_pattern):
+        """Fingerprints the build inputs and restores a cached artifact on a hit.
+
+        Returns (build_cache, fingerprint, restored artifact path or None);
+        build_cache is None if the cache could not be used.
+        """
+        from releaser_buildcache import BuildCache, toolchain_key
+        build_cache = BuildCache(BUILD_CACHE_DIR)
+        try:
+            fingerprint, stats = build_cache.fingerprint(project_dir, platform_cmd, extra=(toolchain_key(),))
+            self.log.write(f"Build inputs: {stats['files']} file(s), {stats['hashed']} hashed "
+                           f"({stats['hashed_bytes'] / 1024 / 1024:.1f} MB), fingerprint {fingerprint[:12]} "
+                           f"in {stats['seconds'] * 1000:.0f} ms.")
+            entry = build_cache.lookup(fingerprint)
+            if entry is None:
+                return build_cache, fingerprint, None
+            start = time.perf_counter()
+            if any(c in artifact_pattern for c in '*?['): # e.g. build/ios/ipa/*.ipa: restore under the cached name
+                dest_path = os.path.join(project_dir, os.path.dirname(artifact_pattern), entry['name'])
+            else:
+                dest_path = os.path.join(project_dir, artifact_pattern)
+            artifact_path = build_cache.restore(entry, os.path.normpath(dest_path))
+        except (OSError, ValueError, KeyError) as e:
+            self.log.write(f"Warning: Build cache unavailable, building normally: {e}")
+            return None, None, None
+        if entry['kind'] == 'file':
+            self._build_cache_digest = entry['files'][0][1]
+        self.events.emit('cache_hit', fingerprint=fingerprint, created=entry['created'])
+        built = datetime.datetime.fromtimestamp(entry['created']).strftime('%Y-%m-%d %H:%M:%S')
+        self.log.write(f"Build cache hit: inputs unchanged since the build of {built}, skipping 'flutter build'.")
+        self.log.write(f"Restored {artifact_path} ({entry['bytes'] / 1024 / 1024:.1f} MB, "
+                       f"{len(entry['files'])} file(s)) in {(time.perf_counter() - start) * 1000:.0f} ms.")
+        return build_cache, fingerprint, artifact_path
+
+    def _store_build(self, build_cache, fingerprint, project_dir, platform_cmd, artifact_path):
+        """Adds a fresh artifact to the build cache, unless the inputs changed during the build."""
+        from releaser_buildcache import toolchain_key
+        try:
+            start = time.perf_counter()
+            after, _ = build_cache.fingerprint(project_dir, platform_cmd, extra=(toolchain_key(),))
+            if after != fingerprint:
+                self.log.write("Build inputs changed during the build, not caching this artifact.")
+                return
+            digest = file_sha256(artifact_path) if os.path.isfile(artifact_path) else None
+            entry = build_cache.store(fingerprint, artifact_path, platform_cmd, artifact_digest=digest)
+        except (OSError, ValueError) as e:
+            self.log.write(f"Warning: Could not add the artifact to the build cache: {e}")
+            return
+        self._build_cache_digest = digest # The upload dedupe reuses it
+        self.log.write(f"Cached the build under fingerprint {fingerprint[:12]} "
+                       f"({entry['bytes'] / 1024 / 1024:.1f} MB) in {(time.perf_counter() - start) * 1000:.0f} ms.")
+
+
+    def _sftp_progress_callback(self, bytes_transferred, total_bytes):
+         """Callback for SFTP upload progress. Raises exception if stopped."""
+         if self._is_running: # Check if cancelled during upload
+             self._on_progress(int(bytes_transferred), int(total_bytes))
+         else:
+             # Use an exception to signal Paramiko to stop the transfer
+             raise Exception("Upload cancelled by user signal.")
+
+
+    def upload_via_sftp(self, local_path):
+        """Uploads the artifact via SFTP with a custom remote filename including version code.""" # Docstring updated
+        from releaser_sftp import SFTP_POOL, ParallelUploader, read_remote_digest, write_remote_digest # Imported lazily (pulls in paramiko), only needed once a build has succeeded
+        lease_stack = contextlib.ExitStack() # Returns the pooled SFTP channel when done
+        sftp = None
+        remote_path = None
+        try:
+            # --- Configuration and Validation ---
+            # Added 'version_code' to required keys check
+            required_base = ['sftp_host', 'sftp_port', 'sftp_user', 'sftp_remote_path', 'platform', 'version_name', 'version_code']
+            if not all(self.config.get(k) for k in required_base):
+                raise ValueError("Missing SFTP host, port, user, remote path, platform, version name, or version code in config.")
+            if not self.config.get('sftp_password') and not self.config.get('sftp_key_path'):
+                 raise ValueError("SFTP requires either a password or a private key path.")
+
+            # --- Construct New Filename ---
+            platform_id = self.config['platform']         # e.g., 'android'
+            version_name = self.config['version_name']   # e.g., '0.0.3'
+            version_code = self.config['version_code']   # e.g., 2
+            _, original_extension = os.path.splitext(local_path)
+            if os.path.isdir(local_path) and self.config.get('needs_zip', False):
+                original_extension = self.config.get('zip_ext', '.zip')
+            safe_version_name = version_name.replace(" ", "_")
+
+            # ***** MODIFIED LINE: Added version_code *****
+            new_filename = f"geecodex-{platform_id}-{safe_version_name}-{version_code}{original_extension}"
+            # Example output: geecodex-android-0.0.3-2.apk
+
+            # --- Construct Remote Path (Unchanged from previous modification) ---
+            remote_dir = self.config['sftp_remote_path'].replace("\\", "/")
+            remote_path = f"{remote_dir.rstrip('/')}/{new_filename}"
+
+            self.log.write(f"Target remote path: {remote_path}")
+
+            # --- Connection Logic (pooled, see releaser_sftp) ---
+            lease = lease_stack.enter_context(SFTP_POOL.checkout(self.config, timeout=20))
+            sftp = lease.sftp
+            if lease.reused:
+                self.log.write(f"Reusing warm SFTP connection (skipped ~{lease.handshake_seconds:.2f}s handshake).")
+            else:
+                self.log.write(f"SFTP connected in {lease.handshake_seconds:.2f}s.")
+
+            # --- Ensure Remote Directory Exists ---
+            from releaser_probe import PROBE_CACHE
+            probed_age = PROBE_CACHE.fresh('sftp', self.config)
+            try:
+                if probed_age is not None: # A connection test or the pre-flight check just found it
+                    self.log.write(f"Remote directory {remote_dir} verified {probed_age:.0f}s ago, skipping the check.")
+                else:
+                    sftp.stat(remote_dir)
+                    self.log.write(f"Remote directory {remote_dir} found.")
+            except FileNotFoundError:
+                self.log.write(f"Remote directory {remote_dir} not found, attempting to create...")
+                try:
+                    sftp.mkdir(remote_dir)
+                    self.log.write("Created remote directory.")
+                except Exception as mkdir_e:
+                    self.log.write(f"Error: Failed to create remote directory: {mkdir_e}")
+                    self.retryable = True
+                    self._finish(False, f"Failed to create remote directory: {remote_dir}")
+                    return False, None
+
+            # --- Upload logic (Unchanged) ---
+            if os.path.isdir(local_path):
+                 if not self.config.get('needs_zip', False):
+                     self.log.write(f"Error: Cannot directly upload directory '{local_path}'. This target does not zip its output.")
+                     self._finish(False, "Directory upload without zipping is not supported.")
+                     return False, None
+                 self._upload_zipped_directory(sftp, local_path, remote_path)
+                 self.log.write(SFTP_POOL.stats_line())
+            else:
+                 if self._artifact_digest is None or self._artifact_digest[0] != local_path:
+                     self._artifact_digest = (local_path, digest_in_background(local_path))
+                 digest_wait = time.perf_counter()
+                 local_digest = self._artifact_digest[1].result()
+                 self.log.write(f"Artifact sha256: {local_digest} (waited {time.perf_counter() - digest_wait:.2f}s for the hash).")
+                 file_size = os.path.getsize(local_path)
+                 upload_start = time.perf_counter()
+                 if read_remote_digest(sftp, remote_path) == local_digest and self._remote_size(sftp, remote_path) == file_size:
+                     self.log.write(f"Remote artifact {remote_path} is identical, skipping upload.")
+                     mode, wire_bytes = 'skipped', 0
+                 else:
+                     # The patch is only applied once the result matches local_digest
+                     mode, wire_bytes = 'delta', self._try_delta_upload(sftp, local_path, remote_path, local_digest)
+                 if wire_bytes is None:
+                     write_remote_digest(sftp, remote_path, None) # The old digest is invalid once the upload starts
+                     self.log.write(f"Uploading {local_path} to {remote_path}...")
+                     uploader = ParallelUploader(SFTP_POOL, self.config, manifest_dir=UPLOAD_STATE_DIR,
+                                                 progress=self._sftp_progress_callback)
+                     stats = uploader.upload(local_path, remote_path)
+
+                     duration = stats['seconds']
+                     sent_mb = (stats['bytes'] - stats['resumed_bytes']) / (1024 * 1024)
+                     speed = sent_mb / duration if duration > 0 else 0
+                     self.log.write(f"Upload complete ({sent_mb:.2f} MB in {duration:.2f}s, {speed:.2f} MB/s, "
+                                    f"{stats['channels']} channel(s), {stats['chunks']} range(s)).")
+                     if stats['resumed_bytes']:
+                         self.log.write(f"Resumed an interrupted upload, {stats['resumed_bytes'] / (1024 * 1024):.2f} MB were already on the server.")
+                     if stats['retries']:
+                         self.log.write(f"Warning: {stats['retries']} range(s) had to be re-sent after connection errors.")
+                     mode, wire_bytes = 'full', stats['bytes'] - stats['resumed_bytes']
+                 if mode != 'skipped':
+                     write_remote_digest(sftp, remote_path, local_digest)
+                 self.log.write(f"Bytes on the wire: {wire_bytes / (1024 * 1024):.2f} MB of {file_size / (1024 * 1024):.2f} MB ({mode}).")
+                 self.log.write(SFTP_POOL.stats_line())
+                 self._record_upload({
+                     'time': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+                     'platform': platform_id, 'version_code': version_code, 'remote_path': remote_path,
+                     'mode': mode, 'artifact_bytes': file_size, 'wire_bytes': wire_bytes,
+                     'seconds': round(time.perf_counter() - upload_start, 3),
+                 })
+                 try:
+                     cache_artifact(local_path, platform_id, new_filename)
+                 except OSError as e:
+                     self.log.write(f"Warning: Could not cache the artifact for delta uploads: {e}")
+
+            # --- Return the NEW remote path (Unchanged) ---
+            return True, remote_path
+
+        except Exception as e:
+            if "Upload cancelled by user signal" in str(e):
+                 self.log.write("Upload cancelled.")
+            else:
+                 self.log.write(f"SFTP Upload Error: {type(e).__name__}: {e}")
+                 self.retryable = not isinstance(e, ValueError) # Connection errors, not missing settings
+                 self.log.write(traceback.format_exc())
+                 self._finish(False, f"SFTP Upload Error: {e}")
+                 # Other leases (parallel upload channels, pre-flight, other jobs) may share the
+                 # pooled transport; only drop it if it died
+                 if sftp: SFTP_POOL.discard_if_dead(self.config)
+            return False, None
+        finally:
+            lease_stack.close()
+
+
+    def _upload_zipped_directory(self, sftp, local_dir, remote_path):
+        """Zips local_dir straight into the SFTP write stream (no local archive)."""
+        from releaser_sftp import write_remote_digest, replace_remote_file
+        from releaser_zip import write_zip_stream
+
+        temp_path = remote_path + ".part"
+        write_remote_digest(sftp, remote_path, None)
+        self.log.write(f"Zipping {local_dir} into {remote_path}...")
+        try:
+            with sftp.open(temp_path, 'wb') as remote_file:
+                remote_file.set_pipelined(True)
+                stats = write_zip_stream(local_dir, remote_file, progress=self._sftp_progress_callback)
+            replace_remote_file(sftp, temp_path, remote_path)
+        except BaseException:
+            try:
+                sftp.remove(temp_path)
+            except IOError:
+                pass
+            raise
+        write_remote_digest(sftp, remote_path, stats['sha256'])
+
+        duration = stats['seconds']
+        output_mb = stats['output_bytes'] / (1024 * 1024)
+        speed = output_mb / duration if duration > 0 else 0
+        self.log.write(f"Upload complete ({stats['files']} files, {stats['input_bytes'] / (1024 * 1024):.2f} MB zipped to "
+                       f"{output_mb:.2f} MB in {duration:.2f}s, {speed:.2f} MB/s, {stats['stored_files']} stored without compression).")
+        self._record_upload({
+            'time': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+            'platform': self.config['platform'], 'version_code': self.config['version_code'], 'remote_path': remote_path,
+            'mode': 'zip-stream', 'artifact_bytes': stats['output_bytes'], 'wire_bytes': stats['output_bytes'],
+            'seconds': round(duration, 3),
+        })
+
+    def _record_upload(self, entry):
+        self._upload_entry = entry
+        record_upload(entry)
+
+    def _try_delta_upload(self, sftp, local_path, remote_path, local_digest):
+        """Uploads a patch against the last published artifact and rebuilds the file on the server.
+
+        Returns the bytes sent, or None when a full upload is needed (no usable
+        base, patch too big, no python3 on the server, ...).
+        """
+        from releaser_sftp import SFTP_POOL, ParallelUploader, read_remote_digest
+        from releaser_delta import create_patch, APPLY_SCRIPT
+
+        if not self.config.get('delta_upload', True) or os.path.getsize(local_path) < DELTA_MIN_BYTES:
+            return None
+        base_remote_path = self._last_published_package()
+        if not base_remote_path:
+            return None
+        base_name = base_remote_path.replace("\\", "/").rsplit('/', 1)[-1]
+        base_local_path = os.path.join(ARTIFACT_CACHE_DIR, self.config['platform'], base_name)
+        if os.path.splitext(base_name)[1] != os.path.splitext(local_path)[1] or not os.path.isfile(base_local_path):
+            self.log.write(f"Delta upload: no cached copy of {base_name}, uploading in full.")
+            return None
+        base_digest = read_remote_digest(sftp, base_remote_path)
+        if base_digest is None or base_digest != file_sha256(base_local_path):
+            self.log.write(f"Delta upload: cached {base_name} does not match the server copy, uploading in full.")
+            return None
+
+        os.makedirs(UPLOAD_STATE_DIR, exist_ok=True)
+        patch_fd, patch_path = tempfile.mkstemp(suffix=".gxdelta", dir=UPLOAD_STATE_DIR)
+        os.close(patch_fd)
+        remote_patch_path = remote_path + ".gxdelta"
+        try:
+            delta_start = time.perf_counter()
+            patch_size = create_patch(base_local_path, local_path, patch_path, should_stop=lambda: not self._is_running)
+            if patch_size is None:
+                self.log.write(f"Delta upload: {base_name} differs too much (patch too big or too slow to compute), "
+                               f"uploading in full.")
+                return None
+            self.log.write(f"Delta against {base_name}: {patch_size / (1024 * 1024):.2f} MB patch "
+                           f"(computed in {time.perf_counter() - delta_start:.2f}s).")
+
+            try:
+                ParallelUploader(SFTP_POOL, self.config, progress=self._sftp_progress_callback).upload(patch_path, remote_patch_path)
+                command = "python3 - " + " ".join(shlex.quote(p) for p in (base_remote_path, remote_patch_path, remote_path))
+                exit_status, out, err = SFTP_POOL.exec_command(self.config, command, stdin_text=APPLY_SCRIPT)
+            except Exception as e:
+                if not self._is_running:
+                    raise # Cancelled, not a reason to fall back
+                self.log.write(f"Delta upload: {type(e).__name__}: {e}, uploading in full.")
+                return None
+            if exit_status != 0 or out.split()[-1:] != [local_digest]:
+                self.log.write(f"Delta upload: rebuilding on the server failed ({(err or out).strip() or exit_status}), uploading in full.")
+                return None
+            self.log.write("Delta upload: artifact rebuilt and verified on the server.")
+            return patch_size
+        finally:
+            if os.path.exists(patch_path):
+                os.remove(patch_path)
+            try:
+                sftp.remove(remote_patch_path)
+            except IOError:
+                pass
+
+    def _last_published_package(self):
+        """package_path of the active release for this platform, or None."""
+        try:
+            from releaser_db import DB_POOL, LAST_ACTIVE_PACKAGE_SQL
+            with DB_POOL.connection(self.config) as conn:
+                row = conn.execute(LAST_ACTIVE_PACKAGE_SQL, (self.config['platform'],), prepare=True).fetchone()
+        except Exception as e:
+            self.log.write(f"Delta upload: could not look up the previous release ({type(e).__name__}: {e}).")
+            return None
+        return row[0] if row else None
+
+    @staticmethod
+    def _remote_size(sftp, remote_path):
+        try:
+            return sftp.stat(remote_path).st_size
+        except FileNotFoundError:
+            return None
+
+
+    def update_database(self, uploaded_package_path, build_timestamp): # Added timestamp argument
+        """Updates the app_updates table in PostgreSQL."""
+        import psycopg # Imported lazily, only needed for the final step
+        from releaser_db import DB_POOL, publish_releases, release_record
+        try:
+            # --- Start Validation (Unchanged) ---
+            required_keys = ['platform', 'version_name', 'version_code', 'release_notes', 'build_platform']
+            missing_keys = [k for k in required_keys if k not in self.config or self.config[k] is None]
+            if missing_keys:
+                raise ValueError(f"Internal Error: Missing required config keys: {', '.join(missing_keys)}")
+
+            if not self.config.get('version_name'):
+                raise ValueError("Missing build information: Version Name cannot be empty.")
+            if not self.config.get('platform') or self.config['platform'] == 'unknown':
+                 raise ValueError("Missing build information: Target Platform ID is invalid.")
+            if not self.config.get('build_platform'):
+                 raise ValueError("Missing build information: Build Platform cannot be empty.")
+            if not isinstance(self.config.get('version_code'), int) or self.config.get('version_code', 0) <= 0:
+                raise ValueError("Missing build information: Version Code must be a positive integer.")
+            # --- End Validation ---
+
+
+            checkout_start = time.perf_counter()
+            with DB_POOL.connection(self.config) as conn: # Commits on success, rolls back on errors
+                self.log.write(f"DB session ready in {(time.perf_counter() - checkout_start) * 1000:.1f} ms.")
+                # Deactivates older versions (different version_name, so only one *named* version
+                # stays active) and upserts ON CONFLICT (platform, version_code) in one statement
+                publish_start = time.perf_counter()
+                rows, deactivated = publish_releases(conn, [release_record(self.config, uploaded_package_path, build_timestamp)])
+                self._db_ms = (time.perf_counter() - publish_start) * 1000
+                self.log.write(f"Deactivated {deactivated} older active version(s) for platform '{self.config['platform']}' with different version names.")
+                inserted = rows[0][2] if rows else False
+                self.log.write(f"DB record {'inserted' if inserted else 'updated'} for v{self.config['version_name']} / code {self.config['version_code']} ({self.config['platform']} built on {self.config['build_platform']}).")
+            self.log.write(DB_POOL.stats_line())
+            return True
+
+        except ValueError as e: # Catch validation errors specifically
+             self.log.write(f"Database Update Validation Error: {e}")
+             self._finish(False, f"DB Validation Error: {e}") # Report specific error
+             return False
+        except psycopg.Error as e:
+            # ***** CORRECTION: Adjusted exception detail access *****
+            error_message = str(e) # Get the main message
+            sql_state = e.sqlstate if hasattr(e, 'sqlstate') else 'N/A' # Get SQLSTATE safely
+
+            self.log.write("Database Error:")
+            self.log.write(f"  SQLSTATE: {sql_state}")
+            self.log.write(f"  Message: {error_message}")
+            # You could try accessing e.diag for more details if needed, checking its existence first
+            # if hasattr(e, 'diag') and e.diag:
+            #    self.log.write(f"  Detail: {e.diag.message_detail}")
+            #    self.log.write(f"  Hint: {e.diag.message_hint}")
+
+            # Use the extracted error message for the UI feedback
+            self.retryable = isinstance(e, psycopg.OperationalError) # Connection lost/refused, pool timeout
+            self._finish(False, f"Database error: {error_message}")
+            return False
+        except Exception as e:
+             # Catch other unexpected errors
+             self.log.write(f"Unexpected DB Update Error: {type(e).__name__}: {e}")
+             self.log.write(traceback.format_exc())
+             self._finish(False, f"Unexpected DB update error: {e}")
+             return False
+
+# =============================================================================
+# Release Matrix (several targets, one process each)
+# =============================================================================
+
+def finish_deferred_run(config, deferred, success, message, publish_seconds=None):
+    """Reports the end of a run that left its publish to a batch (ReleaseRunner.deferred_publish).
+
+    Appends run_end to the run's event file and records the run metrics with
+    the outcome and duration of the batch publish. Returns the run_end event
+    and the Future of the metrics move to PostgreSQL (None if not recorded).
+    """
+    stages = dict(deferred['stages'])
+    if publish_seconds is not None:
+        stages['publish'] = round(publish_seconds, 3)
+    total = deferred['elapsed'] + (publish_seconds or 0.0)
+    event = {'t': round(total, 3), 'type': 'run_end', 'success': success, 'message': message, 'stages': stages}
+    append_event(deferred['events_path'], event)
+    if deferred['metrics'] is None: # Stopped before the build started
+        return event, None
+    from releaser_metrics import MetricsStore
+    row = dict(deferred['metrics'], recorded_at=datetime.datetime.now(datetime.timezone.utc), success=bool(success),
+               db_ms=round(publish_seconds * 1000, 3) if publish_seconds is not None else None,
+               total_seconds=round(total, 3))
+    try:
+        return event, MetricsStore(METRICS_DB_FILE).record(config, row)
+    except Exception as e: # Metrics never fail a release
+        print(f"Warning: Could not record run metrics: {type(e).__name__}: {e}", file=sys.stderr)
+        return event, None
+
+
+def _matrix_target_main(config, events, build_lock, stop_event, defer_publish):
+    """Process pool entry point: releases one target and streams its events back.
+
+    Events are (target, kind, payload) tuples put on the shared events queue,
+    kind being 'output', 'step', 'progress' or 'event' (build events of the
+    timeline). Returns (result, seconds, deferred_publish).
+    """
+    target = config['target_platform_text']
+    start = time.perf_counter()
+    progress_state = {'percent': -1}
+
+    def on_progress(transferred, total):
+        percent = int(transferred * 100 / total) if total > 0 else 0
+        if percent != progress_state['percent']: # One event per percent, not per chunk
+            progress_state['percent'] = percent
+            events.put((target, 'progress', (transferred, total)))
+
+    def on_event(event):
+        if event['type'] in TIMELINE_EVENT_TYPES: # Each put is a round trip to the manager
+            events.put((target, 'event', event))
+
+    runner = ReleaseRunner(
+        config,
+        on_output=lambda text: events.put((target, 'output', text)),
+        on_step=lambda message: events.put((target, 'step', message)),
+        on_progress=on_progress,
+        build_lock=build_lock,
+        defer_publish=defer_publish,
+        on_event=on_event,
+    )
+
+    done = threading.Event()
+    def watch_stop():
+        while not done.is_set():
+            if stop_event.wait(0.5):
+                runner.stop()
+                return
+    threading.Thread(target=watch_stop, name="matrix-stop-watch", daemon=True).start()
+    try:
+        runner.run()
+    finally:
+        done.set()
+    return runner.result, time.perf_counter() - start, runner.deferred_publish
+
+
+class ReleaseMatrix:
+    """Releases several targets concurrently through a process pool.
+
+    Every target runs its own ReleaseRunner in a pool process, so one target's
+    upload and DB update overlap with the other targets' builds. At most
+    max_workers targets run at once. With batch_publish, targets stop after
+    their upload and all database records are published at the end in one
+    transaction. on_event(target, kind, payload) is called from the thread
+    that calls run(), with kind one of 'output', 'step', 'progress', 'event'
+    (a build event dict) or 'finished' (payload (success, message)).
+    """
+
+    def __init__(self, configs, on_event, max_workers=MATRIX_MAX_WORKERS,
+                 serialize_builds=MATRIX_SERIALIZE_BUILDS, batch_publish=True):
+        self.configs = configs
+        self.on_event = on_event
+        self.max_workers = max(1, min(max_workers, len(configs)))
+        self.serialize_builds = serialize_builds
+        self.batch_publish = batch_publish
+        self.publish_seconds = 0.0 # Wall time of the batch publish
+        self._deferred = [] # (target, config, deferred_publish of its runner) waiting for the batch publish
+        self.results = {} # target -> (success, message)
+        self.target_seconds = {} # target -> wall time of that target's chain
+        self.wall_seconds = 0.0
+        self._stop_requested = False
+        self._stop_event = None
+
+    def run(self):
+        """Runs all targets and returns {target: (success, message)}."""
+        start = time.perf_counter()
+        # spawn: pool processes only import this Qt-free module, never the GUI
+        context = multiprocessing.get_context("spawn")
+        with context.Manager() as manager:
+            events = manager.Queue()
+            build_lock = manager.Lock() if self.serialize_builds else None
+            self._stop_event = manager.Event()
+            if self._stop_requested:
+                self._stop_event.set()
+            with concurrent.futures.ProcessPoolExecutor(max_workers=self.max_workers, mp_context=context) as pool:
+                futures = {
+                    pool.submit(_matrix_target_main, config, events, build_lock, self._stop_event, self.batch_publish):
+                        config
+                    for config in self.configs
+                }
+                pending = set(futures)
+                while pending:
+                    self._drain_events(events, timeout=0.1)
+                    finished = {future for future in pending if future.done()}
+                    pending -= finished
+                    for future in finished:
+                        self._collect(futures[future], future)
+                self._drain_events(events, timeout=0) # Whatever the last targets put before returning
+            self._stop_event = None
+        if self._deferred:
+            self._publish_deferred()
+        self.wall_seconds = time.perf_counter() - start
+        return self.results
+
+    def stop(self):
+        """Asks every running target to stop."""
+        self._stop_requested = True
+        stop_event = self._stop_event
+        if stop_event is not None:
+            stop_event.set()
+
+    def summary(self):
+        """One line comparing matrix wall time with running the chains back to back."""
+        sequential = sum(self.target_seconds.values())
+        ok_count = sum(1 for success, _ in self.results.values() if success)
+        publish = f", batch publish {self.publish_seconds * 1000:.0f} ms" if self.batch_publish else ""
+        return (f"Matrix: {ok_count}/{len(self.results)} target(s) succeeded in {self.wall_seconds:.1f}s "
+                f"(sum of target chains {sequential:.1f}s{publish}).")
+
+    def _collect(self, config, future):
+        target = config['target_platform_text']
+        deferred = None
+        try:
+            result, seconds, deferred = future.result()
+        except Exception as e: # Pool process died or the runner could not be started
+            result, seconds = (False, f"{type(e).__name__}: {e}"), 0.0
+        self.target_seconds[target] = seconds
+        if result[0] and deferred and not self._stop_requested:
+            self._deferred.append((target, config, deferred))
+            return # Finished once the batch is published
+        if result[0] and deferred: # Uploaded, but the matrix was stopped before publishing
+            result = (False, "Operation cancelled.")
+            self._finish_deferred(target, config, deferred, result)
+        self.results[target] = result
+        self.on_event(target, 'finished', result)
+
+    def _publish_deferred(self):
+        """Publishes the database records of all uploaded targets in one transaction."""
+        import psycopg
+        from releaser_db import DB_POOL, publish_releases, release_record
+
+        targets = [target for target, _, _ in self._deferred]
+        for target in targets:
+            self.on_event(target, 'step', f"Publishing {len(targets)} release(s) in one transaction...")
+        start = time.perf_counter()
+        try:
+            with DB_POOL.connection(self._deferred[0][1]) as conn: # All targets share the DB settings
+                rows, deactivated = publish_releases(
+                    conn, [release_record(config, deferred['remote_path'], deferred['build_timestamp'])
+                           for _, config, deferred in self._deferred])
+            self.publish_seconds = time.perf_counter() - start
+            outcome = {(platform, code): inserted for platform, code, inserted in rows}
+            for target, config, _ in self._deferred:
+                inserted = outcome.get((config['platform'], config['version_code']))
+                self.on_event(target, 'output', f"DB record {'inserted' if inserted else 'updated'} for "
+                                                f"v{config['version_name']} / code {config['version_code']} ({config['platform']}), "
+                                                f"batch of {len(rows)} row(s), {deactivated} older version(s) deactivated, "
+                                                f"{self.publish_seconds * 1000:.1f} ms.")
+                self.results[target] = (True, ReleaseRunner.success_message(config))
+        except (psycopg.Error, ValueError, KeyError) as e:
+            self.publish_seconds = time.perf_counter() - start
+            for target, _, _ in self._deferred:
+                self.on_event(target, 'output', f"Batch publish failed: {type(e).__name__}: {e}")
+                self.results[target] = (False, f"Database error: {e}")
+        for target, config, deferred in self._deferred:
+            self._finish_deferred(target, config, deferred, self.results[target], self.publish_seconds)
+            self.on_event(target, 'finished', self.results[target])
+        self._deferred = []
+
+    def _finish_deferred(self, target, config, deferred, result, publish_seconds=None):
+        """run_end and run metrics of a target whose publish was deferred, with the real outcome."""
+        event, _ = finish_deferred_run(config, deferred, result[0], result[1], publish_seconds)
+        self.on_event(target, 'event', event)
+
+    def _drain_events(self, events, timeout):
+        try:
+            event = events.get(timeout=timeout) if timeout else events.get_nowait()
+            while True:
+                self.on_event(*event)
+                event = events.get_nowait()
+        except queue.Empty:
+            pass
@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+PostgreSQL helpers of the Flutter Build & Deploy Tool.
+
+DbConnectionPool keeps a psycopg_pool.ConnectionPool per database and user,
+so "Test DB" clicks and every publish in the same process reuse open
+sessions instead of paying for TCP + auth each time. The release statements
+are executed with prepare=True, so every pooled session parses and plans
+them once. Without psycopg_pool installed, each checkout opens its own
+connection as before. Qt-free; imported lazily by releaser_core.
+
+Dependencies: psycopg, psycopg_pool (optional)
+"""
+
+import time
+import threading
+import contextlib
+import collections
+import hashlib # Passwords are only kept as digests inside pool keys
+
+import psycopg
+from psycopg.conninfo import make_conninfo
+
+from releaser_metrics import METRIC_FIELDS
+
+try:
+    import psycopg_pool
+except ImportError: # Optional, connections are opened per checkout without it
+    psycopg_pool = None
+
+DB_CONNECT_TIMEOUT = 10
+DB_POOL_MIN_SIZE = 1
+DB_POOL_MAX_SIZE = 4
+# Pooled sessions idle for longer than this are closed (down to DB_POOL_MIN_SIZE)
+DB_POOL_MAX_IDLE_SECONDS = 300
+# Number of recent checkouts kept for the latency percentiles
+DB_LATENCY_SAMPLES = 200
+
+# Fields of a release record, in the order of the arrays PUBLISH_RELEASES_SQL unnests
+RELEASE_FIELDS = ('platform', 'version_name', 'version_code', 'release_notes', 'download_url',
+                  'is_mandatory', 'package_path', 'build_platform', 'build_timestamp')
+
+# Publishes N releases in one statement: every field is passed as an array.
+# Older active versions (different version name) of every affected platform
+# are deactivated set-based, then all rows are upserted on (platform,
+# version_code). Rows of the batch itself are never deactivated.
+PUBLISH_RELEASES_SQL = """
+    WITH incoming AS (
+        SELECT * FROM unnest(
+            %(platform)s::text[], %(version_name)s::text[], %(version_code)s::bigint[], %(release_notes)s::text[],
+            %(download_url)s::text[], %(is_mandatory)s::boolean[], %(package_path)s::text[],
+            %(build_platform)s::text[], %(build_timestamp)s::timestamptz[]
+        ) AS r(platform, version_name, version_code, release_notes, download_url,
+               is_mandatory, package_path, build_platform, build_timestamp)
+    ), deactivated AS (
+        UPDATE app_updates AS a
+        SET is_active = FALSE
+        FROM incoming AS r
+        WHERE a.platform = r.platform AND a.is_active = TRUE AND a.version_name <> r.version_name
+          AND NOT EXISTS (SELECT 1 FROM incoming AS n
+                          WHERE n.platform = a.platform AND n.version_code = a.version_code)
+        RETURNING 1
+    )
+    INSERT INTO app_updates (
+        platform, version_name, version_code, release_notes,
+        download_url, is_mandatory, is_active, package_path,
+        build_platform, build_timestamp, created_at
+    )
+    SELECT platform, version_name, version_code, release_notes,
+           download_url, is_mandatory, TRUE, package_path,
+           build_platform, build_timestamp, CURRENT_TIMESTAMP
+    FROM incoming
+    ON CONFLICT (platform, version_code) DO UPDATE SET
+        version_name = EXCLUDED.version_name,
+        release_notes = EXCLUDED.release_notes,
+        download_url = EXCLUDED.download_url,
+        is_mandatory = EXCLUDED.is_mandatory,
+        is_active = EXCLUDED.is_active,
+        package_path = EXCLUDED.package_path,
+        build_platform = EXCLUDED.build_platform,
+        build_timestamp = EXCLUDED.build_timestamp,
+        created_at = CURRENT_TIMESTAMP
+    RETURNING platform, version_code, (xmax = 0) AS inserted, (SELECT count(*) FROM deactivated) AS deactivated;
+"""
+
+# package_path of the active release of a platform
+LAST_ACTIVE_PACKAGE_SQL = """
+    SELECT package_path FROM app_updates
+    WHERE platform = %s AND is_active = TRUE
+    ORDER BY version_code DESC LIMIT 1;
+"""
+
+# Columns publish_releases writes besides RELEASE_FIELDS
+RELEASE_EXTRA_COLUMNS = ('is_active', 'created_at')
+
+# Shape of app_updates as publish_releases needs it, in one round trip:
+# table exists, its column names, and whether a usable arbiter for
+# ON CONFLICT (platform, version_code) exists (a unique, non-partial,
+# non-deferrable index on exactly those columns)
+RELEASE_SCHEMA_SQL = """
+    SELECT to_regclass('app_updates') IS NOT NULL,
+           ARRAY(SELECT attname::text FROM pg_attribute
+                 WHERE attrelid = to_regclass('app_updates') AND attnum > 0 AND NOT attisdropped),
+           EXISTS (SELECT 1 FROM pg_index AS i
+                   WHERE i.indrelid = to_regclass('app_updates') AND i.indisunique AND i.indimmediate
+                     AND i.indpred IS NULL AND i.indexprs IS NULL
+                     AND ARRAY(SELECT a.attname::text FROM pg_attribute AS a
+                               WHERE a.attrelid = i.indrelid AND a.attnum = ANY(i.indkey)
+                               ORDER BY a.attname) = ARRAY['platform', 'version_code']);
+"""
+
+# Timing of every release run, see releaser_metrics
+RELEASE_METRICS_DDL = """
+    CREATE TABLE IF NOT EXISTS release_metrics (
+        id BIGSERIAL PRIMARY KEY,
+        recorded_at TIMESTAMPTZ NOT NULL,
+        platform TEXT NOT NULL,
+        target TEXT,
+        version_name TEXT,
+        version_code BIGINT,
+        build_platform TEXT,
+        success BOOLEAN NOT NULL,
+        build_seconds DOUBLE PRECISION,
+        build_cached BOOLEAN,
+        artifact_bytes BIGINT,
+        upload_mode TEXT,
+        upload_bytes BIGINT,
+        upload_seconds DOUBLE PRECISION,
+        upload_mbps DOUBLE PRECISION,
+        db_ms DOUBLE PRECISION,
+        total_seconds DOUBLE PRECISION
+    );
+    CREATE INDEX IF NOT EXISTS release_metrics_platform_recorded_at ON release_metrics (platform, recorded_at);
+"""
+
+INSERT_METRICS_SQL = f"""
+    INSERT INTO release_metrics ({', '.join(METRIC_FIELDS)})
+    VALUES ({', '.join(f'%({field})s' for field in METRIC_FIELDS)});
+"""
+
+RECENT_METRICS_SQL = f"""
+    SELECT {', '.join(METRIC_FIELDS)} FROM release_metrics
+    WHERE platform = %s ORDER BY recorded_at DESC LIMIT %s;
+"""
+
+
+
+def release_record(config, package_path, build_timestamp):
+    """The app_updates fields of one release (see RELEASE_FIELDS)."""
+    return {
+        'platform': config['platform'],
+        'version_name': config['version_name'],
+        'version_code': config['version_code'],
+        'release_notes': config['release_notes'],
+        'download_url': config.get('download_url'),
+        'is_mandatory': config.get('is_mandatory', False),
+        'package_path': package_path,
+        'build_platform': config['build_platform'],
+        'build_timestamp': build_timestamp,
+    }
+
+
+def publish_releases(conn, records):
+    """Publishes release records in one statement and one transaction.
+
+    With libpq pipeline support, the statement and the COMMIT go out in a
+    single round trip. Records are unique per (platform, version_code); of
+    duplicates the last one wins, as with one upsert per record.
+    Returns (rows, deactivated): rows are (platform, version_code, inserted).
+    """
+    unique = {}
+    for record in records:
+        unique[(record['platform'], record['version_code'])] = record
+    params = {field: [record[field] for record in unique.values()] for field in RELEASE_FIELDS}
+    if psycopg.Pipeline.is_supported():
+        with conn.pipeline():
+            cur = conn.execute(PUBLISH_RELEASES_SQL, params, prepare=True)
+            conn.commit()
+    else:
+        cur = conn.execute(PUBLISH_RELEASES_SQL, params, prepare=True)
+        conn.commit()
+    rows = cur.fetchall()
+    deactivated = rows[0][3] if rows else 0
+    return [row[:3] for row in rows], deactivated
+
+
+def check_release_schema(conn):
+    """Problems that would make publish_releases fail on this database, or [] if there are none."""
+    exists, columns, has_arbiter = conn.execute(RELEASE_SCHEMA_SQL, prepare=True).fetchone()
+    if not exists:
+        return ["table app_updates does not exist"]
+    problems = []
+    missing = [column for column in RELEASE_FIELDS + RELEASE_EXTRA_COLUMNS if column not in columns]
+    if missing:
+        problems.append(f"app_updates lacks column(s) {', '.join(missing)}")
+    if not has_arbiter:
+        problems.append("app_updates has no unique constraint on (platform, version_code) for ON CONFLICT")
+    return problems
+
+
+def db_conninfo(config, connect_timeout=DB_CONNECT_TIMEOUT):
+    """libpq connection string for the db_* fields of a release config (values are escaped)."""
+    return make_conninfo(dbname=config['db_name'], user=config['db_user'], password=config['db_password'],
+                         host=config['db_host'], port=config['db_port'], connect_timeout=connect_timeout)
+
+
+class DbConnectionPool:
+    """Long-lived PostgreSQL sessions keyed by (host, port, database, user, password digest).
+
+    connection() is a context manager yielding a connection in a transaction
+    that is committed when the block succeeds and rolled back otherwise.
+    The first checkout for a key connects directly, so bad credentials raise
+    the server's error instead of a pool timeout.
+    """
+
+    def __init__(self, min_size=DB_POOL_MIN_SIZE, max_size=DB_POOL_MAX_SIZE, max_idle=DB_POOL_MAX_IDLE_SECONDS):
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_idle = max_idle
+        self._lock = threading.Lock()
+        self._pools = {} # pool key -> psycopg_pool.ConnectionPool
+        # Stats
+        self.checkouts = 0
+        self.connects = 0 # Direct connections (first checkout per key, or no psycopg_pool)
+        self._latencies = collections.deque(maxlen=DB_LATENCY_SAMPLES) # Checkout latency (seconds)
+
+    @staticmethod
+    def pool_key(config):
+        password_digest = hashlib.sha256(config['db_password'].encode('utf-8')).hexdigest()
+        return (config['db_host'], str(config['db_port']), config['db_name'], config['db_user'], password_digest)
+
+    @contextlib.contextmanager
+    def connection(self, config, timeout=DB_CONNECT_TIMEOUT):
+        start = time.perf_counter()
+        pool = self._pool(config, timeout) if psycopg_pool is not None else None
+        if pool is None:
+            with psycopg.connect(db_conninfo(config, timeout)) as conn: # Commits or rolls back, then closes
+                self._record_checkout(start, connected=True)
+                yield conn
+            return
+        with pool.connection(timeout=timeout) as conn: # Commits or rolls back, then returns the session
+            self._record_checkout(start)
+            yield conn
+
+    def close_all(self):
+        with self._lock:
+            pools = list(self._pools.values())
+            self._pools.clear()
+        for pool in pools:
+            pool.close()
+
+    def latency_ms(self):
+        """(median, p95, max) checkout latency in milliseconds over the recent checkouts."""
+        with self._lock:
+            samples = sorted(self._latencies)
+        if not samples:
+            return 0.0, 0.0, 0.0
+        pick = lambda q: samples[min(len(samples) - 1, int(q * len(samples)))] * 1000
+        return pick(0.5), pick(0.95), samples[-1] * 1000
+
+    def stats_line(self):
+        median, p95, worst = self.latency_ms()
+        return (f"DB pool: {self.checkouts} checkout(s), {self.connects} direct connect(s), "
+                f"checkout latency median {median:.1f} ms / p95 {p95:.1f} ms / max {worst:.1f} ms.")
+
+    def _pool(self, config, timeout):
+        key = self.pool_key(config)
+        with self._lock:
+            pool = self._pools.get(key)
+        if pool is not None:
+            return pool
+        # Validate the settings with a plain connection, so errors carry the server's message
+        start = time.perf_counter()
+        psycopg.connect(db_conninfo(config, timeout)).close()
+        self._record_checkout(start, connected=True, count=False)
+        pool = psycopg_pool.ConnectionPool(
+            db_conninfo(config), min_size=self.min_size, max_size=self.max_size, max_idle=self.max_idle,
+            name=f"releaser-{config['db_user']}@{config['db_host']}", open=True)
+        with self._lock:
+            existing = self._pools.setdefault(key, pool)
+        if existing is not pool: # Another thread created one meanwhile
+            pool.close()
+        return existing
+
+    def _record_checkout(self, start, connected=False, count=True):
+        with self._lock:
+            if count:
+                self.checkouts += 1
+                self._latencies.append(time.perf_counter() - start)
+            if connected:
+                self.connects += 1
+
+
+# Process-wide pool shared by connection tests and publishes
+DB_POOL = DbConnectionPool()
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Binary deltas of the Flutter Build & Deploy Tool.
+
+An rsync-style delta: the previous artifact (the base) is indexed by a weak
+rolling checksum and a strong hash per fixed-size block, the new artifact is
+scanned with the rolling checksum and encoded as "copy from base" and
+"literal bytes" operations. APKs/AABs/IPAs are zip files whose unchanged
+entries keep their bytes, so consecutive releases mostly turn into copies.
+
+The patch is applied on the server by APPLY_SCRIPT, a stdlib-only python3
+program that verifies the sha256 of the result before moving it into place.
+
+Patch format (big endian):
+    b"GXDELTA1" | target size (u64) | target sha256 (32 bytes) | operations
+    b"C" | base offset (u64) | length (u32)     copy from the base
+    b"L" | length (u32) | bytes                 literal bytes
+
+Qt-free and stdlib only.
+"""
+
+import os
+import mmap
+import time
+import struct
+import hashlib
+import itertools
+
+# Block size of the base index; smaller blocks find more matches but make the index bigger
+DELTA_BLOCK_BYTES = 4096
+# Give up when the patch would be larger than this share of the new file
+DELTA_MAX_PATCH_RATIO = 0.6
+# Give up when the byte-wise scan of unmatched data takes longer than this (seconds);
+# it runs in Python, and on a widely changed file a full upload is faster
+DELTA_MAX_SECONDS = 15
+# Positions of the new file probed for matches before the full scan; unrelated
+# files are rejected after a few milliseconds instead of a full byte-wise scan
+DELTA_PROBE_SAMPLES = 64
+
+PATCH_MAGIC = b"GXDELTA1"
+_WEAK_MOD = 1 << 16
+
+
+def _weak_checksum(block):
+    """rsync's weak checksum of a whole block as (a, b); sums run in C."""
+    return sum(block) % _WEAK_MOD, sum(itertools.accumulate(block)) % _WEAK_MOD
+
+
+def _strong_hash(block):
+    return hashlib.blake2b(block, digest_size=16).digest()
+
+
+def _block_index(base, block_bytes):
+    """Maps weak checksum -> {strong hash: offset} for every whole block of base."""
+    index = {}
+    for offset in range(0, len(base) - block_bytes + 1, block_bytes):
+        block = base[offset:offset + block_bytes]
+        a, b = _weak_checksum(block)
+        index.setdefault((b << 16) | a, {}).setdefault(_strong_hash(block), offset)
+    return index
+
+
+def _find_match(index, data, start, end, block_bytes):
+    """First offset in data[start:end] where a base block starts, or None."""
+    if start + block_bytes > len(data):
+        return None
+    a, b = _weak_checksum(data[start:start + block_bytes])
+    for pos in range(start, min(end, len(data) - block_bytes + 1)):
+        candidates = index.get((b << 16) | a)
+        if candidates and _strong_hash(data[pos:pos + block_bytes]) in candidates:
+            return pos
+        if pos + block_bytes < len(data):
+            old, new = data[pos], data[pos + block_bytes]
+            a = (a - old + new) % _WEAK_MOD
+            b = (b - block_bytes * old + a) % _WEAK_MOD
+    return None
+
+
+def estimate_match_ratio(index, data, block_bytes, samples=DELTA_PROBE_SAMPLES):
+    """Share of evenly spaced probes that find a base block within one block length."""
+    if len(data) < 2 * block_bytes or not index:
+        return 0.0
+    step = max(1, (len(data) - 2 * block_bytes) // samples)
+    probes = range(0, len(data) - 2 * block_bytes + 1, step)
+    hits = sum(1 for start in probes if _find_match(index, data, start, start + block_bytes, block_bytes) is not None)
+    return hits / len(probes)
+
+
+class _PatchWriter:
+    """Writes patch operations, merging adjacent copies."""
+
+    def __init__(self, f):
+        self.f = f
+        self.size = 0
+        self.literal_bytes = 0
+        self._copy = None # Pending (offset, length)
+
+    def copy(self, offset, length):
+        if self._copy and self._copy[0] + self._copy[1] == offset and self._copy[1] + length < 1 << 32:
+            self._copy = (self._copy[0], self._copy[1] + length)
+            return
+        self._flush_copy()
+        self._copy = (offset, length)
+
+    def literal(self, data):
+        if not data:
+            return
+        self._flush_copy()
+        for start in range(0, len(data), 1 << 30):
+            chunk = data[start:start + (1 << 30)]
+            self._write(b"L" + struct.pack(">I", len(chunk)) + chunk)
+            self.literal_bytes += len(chunk)
+
+    def finish(self):
+        self._flush_copy()
+
+    def _flush_copy(self):
+        if self._copy:
+            self._write(b"C" + struct.pack(">QI", *self._copy))
+            self._copy = None
+
+    def _write(self, data):
+        self.f.write(data)
+        self.size += len(data)
+
+
+def _map_file(f):
+    if os.fstat(f.fileno()).st_size == 0:
+        return b"" # mmap refuses empty files
+    return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def create_patch(base_path, target_path, patch_path, block_bytes=DELTA_BLOCK_BYTES,
+                 max_ratio=DELTA_MAX_PATCH_RATIO, should_stop=None, max_seconds=DELTA_MAX_SECONDS):
+    """Writes the delta base -> target to patch_path.
+
+    Returns the patch size, or None if the patch would exceed max_ratio of the
+    target size, computing it took longer than max_seconds (or should_stop()
+    became true); patch_path is removed then.
+    """
+    deadline = time.monotonic() + max_seconds
+    target_sha256 = hashlib.sha256()
+    with open(base_path, 'rb') as base_file, open(target_path, 'rb') as target_file:
+        base = _map_file(base_file)
+        target = _map_file(target_file)
+        try:
+            size = len(target)
+            budget = int(size * max_ratio)
+            index = _block_index(base, block_bytes)
+            complete = False
+            if estimate_match_ratio(index, target, block_bytes) < 1 - max_ratio:
+                return None # Mostly new bytes, a full upload is cheaper
+            with open(patch_path, 'wb') as f:
+                f.write(PATCH_MAGIC + struct.pack(">Q", size) + b"\0" * 32) # Digest is filled in below
+                writer = _PatchWriter(f)
+                pos = literal_start = scanned = 0
+                a = b = None
+                while pos + block_bytes <= size:
+                    if a is None:
+                        a, b = _weak_checksum(target[pos:pos + block_bytes])
+                    candidates = index.get((b << 16) | a)
+                    if candidates:
+                        block = target[pos:pos + block_bytes]
+                        offset = candidates.get(_strong_hash(block))
+                        if offset is not None:
+                            writer.literal(target[literal_start:pos])
+                            writer.copy(offset, block_bytes)
+                            pos += block_bytes
+                            literal_start = pos
+                            a = None
+                            continue
+                    # No match at pos: roll the checksum one byte forward
+                    if pos - literal_start >= 1 << 16:
+                        writer.literal(target[literal_start:pos]) # Keep literal runs bounded in memory
+                        literal_start = pos
+                    scanned += 1
+                    if scanned & 0xFFFF == 0: # Every 64 KiB scanned byte by byte, however short the runs
+                        if writer.size + pos - literal_start > budget or time.monotonic() > deadline \
+                                or (should_stop and should_stop()):
+                            break
+                    if pos + block_bytes < size:
+                        old, new = target[pos], target[pos + block_bytes]
+                        a = (a - old + new) % _WEAK_MOD
+                        b = (b - block_bytes * old + a) % _WEAK_MOD
+                    pos += 1
+                else:
+                    writer.literal(target[literal_start:size])
+                writer.finish()
+                complete = pos + block_bytes > size and writer.size <= budget
+                if complete:
+                    for start in range(0, size, 1 << 22):
+                        target_sha256.update(target[start:start + (1 << 22)])
+                    f.seek(len(PATCH_MAGIC) + 8)
+                    f.write(target_sha256.digest())
+                patch_size = writer.size + len(PATCH_MAGIC) + 8 + 32
+        finally:
+            if isinstance(target, mmap.mmap):
+                target.close()
+            if isinstance(base, mmap.mmap):
+                base.close()
+    if not complete:
+        os.remove(patch_path)
+        return None
+    return patch_size
+
+
+# Applies a patch on the server: python3 - BASE PATCH OUT (script on stdin).
+# Prints "OK <sha256>" on success; exits non-zero without touching OUT otherwise.
+APPLY_SCRIPT = r'''
+import hashlib, os, struct, sys
+base_path, patch_path, out_path = sys.argv[1:4]
+tmp_path = out_path + ".delta-part"
+digest = hashlib.sha256()
+try:
+    with open(base_path, "rb") as base, open(patch_path, "rb") as patch, open(tmp_path, "wb") as out:
+        if patch.read(8) != b"GXDELTA1":
+            sys.exit("bad patch header")
+        size, = struct.unpack(">Q", patch.read(8))
+        expected = patch.read(32)
+        while True:
+            op = patch.read(1)
+            if not op:
+                break
+            if op == b"C":
+                offset, length = struct.unpack(">QI", patch.read(12))
+                base.seek(offset)
+                while length:
+                    data = base.read(min(length, 1 << 20))
+                    if not data:
+                        sys.exit("base too short")
+                    out.write(data); digest.update(data); length -= len(data)
+            elif op == b"L":
+                length, = struct.unpack(">I", patch.read(4))
+                while length:
+                    data = patch.read(min(length, 1 << 20))
+                    if not data:
+                        sys.exit("patch truncated")
+                    out.write(data); digest.update(data); length -= len(data)
+            else:
+                sys.exit("bad patch operation")
+        written = out.tell()
+    if written != size or digest.digest() != expected:
+        sys.exit("result does not match the expected size/sha256")
+    os.replace(tmp_path, out_path)
+finally:
+    if os.path.exists(tmp_path): # Any failure above, including sys.exit
+        os.remove(tmp_path)
+print("OK " + digest.hexdigest())
+'''
+
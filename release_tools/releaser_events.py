@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Structured build events of the Flutter Build & Deploy Tool.
+
+BuildEventStream turns a release into events: stage start/end (build,
+upload, publish), phases parsed from the `flutter build` output (Gradle,
+dart compile, Xcode archive, ...), Gradle tasks, font tree-shaking and
+warnings/errors. Lines are parsed as they arrive, every event is appended
+to an NDJSON file per run in EVENTS_DIR and handed to an optional callback
+(the GUI draws its phase timeline from them).
+
+Event fields: t (seconds since the run started; phase_start of a phase
+flutter timed itself is back-dated by that time), type, and per type
+  run_start     target, platform, version_name, version_code, build_platform
+  stage_start   name                          stage_end   name, duration
+  phase_start   name                          phase_end   name, duration
+  task_start    name                          task_end    name, duration, outcome
+  tree_shake    name, from_bytes, to_bytes
+  cache_hit     fingerprint, created (the build was restored from the build cache)
+  preflight     seconds, checks (SFTP/database checks that ran next to the build passed)
+  warning       text                          error       text
+  run_end       success, message, stages {name: duration}
+
+Qt-free and stdlib only.
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import datetime
+
+EVENTS_KEEP_RUNS = 100 # Number of per-run event files kept
+# Event types a timeline needs; the rest (warnings, task starts) only go to the file
+TIMELINE_EVENT_TYPES = {'run_start', 'stage_start', 'stage_end', 'phase_start', 'phase_end', 'task_end', 'cache_hit', 'run_end'}
+
+# "Running Gradle task 'assembleRelease'...      45.3s": flutter prints the
+# time once the phase is done (on the same line when not on a terminal)
+_TIMED_PHASE_RE = re.compile(r'^(?:\S\s+)?(?P<name>[A-Z][^\n]*?)\.\.\.\s+(?P<value>\d+(?:[.,]\d+)?)(?P<unit>ms|s)$')
+# "Compiling lib/main.dart for the Web..." without a time: ends when the next phase starts
+_PHASE_RE = re.compile(r'^(?:\S\s+)?(?P<name>(?:Running|Compiling|Building|Archiving|Signing|Exporting|Resolving|'
+                       r'Downloading|Installing|Generating|Assembling|Linking)\b[^\n]*?)\.\.\.$')
+# Gradle console output ("> Task :app:compileReleaseKotlin UP-TO-DATE")
+_GRADLE_TASK_RE = re.compile(r'^> Task (?P<name>:\S+)(?:\s+(?P<outcome>UP-TO-DATE|FROM-CACHE|NO-SOURCE|SKIPPED|FAILED))?$')
+_TREE_SHAKE_RE = re.compile(r'^Font asset "(?P<name>[^"]+)" was tree-shaken, reducing it from (?P<from>\d+) to (?P<to>\d+) bytes')
+_WARNING_RE = re.compile(r'^(?:w: |\[!\] )|\b(?:warning|Warning|WARNING)\b:')
+_ERROR_RE = re.compile(r'^(?:e: |FAILURE:)|\b(?:error|Error|ERROR)\b:')
+
+
+class BuildEventStream:
+    """Collects the events of one release run and writes them as NDJSON.
+
+    on_event(event) is called for every event from the thread that produced
+    it. The file is opened on the first event; write errors only disable it.
+    """
+
+    def __init__(self, events_dir, label, on_event=None, keep_runs=EVENTS_KEEP_RUNS):
+        self.events_dir = events_dir
+        self.label = label
+        self.keep_runs = keep_runs
+        self.path = None
+        self.events = []
+        self._on_event = on_event or (lambda event: None)
+        self._start = time.perf_counter()
+        self._file = None
+        self._file_failed = False
+        self._ended = False
+        self._stage = None # (name, start)
+        self._phase = None # (name, start), phases without a reported time
+        self._task = None # (name, start, outcome)
+        self.stages = {} # stage name -> duration
+
+    # --- Stages ---
+
+    def run_start(self, config):
+        self._start = time.perf_counter() # Queued runners are created long before they start
+        self.emit('run_start', target=config.get('target_platform_text'), platform=config.get('platform'),
+                  version_name=config.get('version_name'), version_code=config.get('version_code'),
+                  build_platform=config.get('build_platform'))
+
+    def stage(self, name):
+        """Ends the current stage (if any) and starts stage name."""
+        self.end_stage()
+        self._stage = (name, self.elapsed())
+        self.emit('stage_start', name=name)
+
+    def end_stage(self):
+        if self._stage is None:
+            return
+        name, start = self._stage
+        self._stage = None
+        self.stages[name] = round(self.elapsed() - start, 3)
+        self.emit('stage_end', name=name, duration=self.stages[name])
+
+    def run_end(self, success, message):
+        if self._ended: # A run reports its result once
+            return
+        self.end_build()
+        self.end_stage()
+        self.emit('run_end', success=success, message=message, stages=self.stages)
+        self._ended = True
+        self.close()
+
+    # --- Build output ---
+
+    def feed(self, line):
+        """Parses one line of build output."""
+        match = _TIMED_PHASE_RE.match(line)
+        if match:
+            duration = float(match.group('value').replace(',', '.'))
+            if match.group('unit') == 'ms':
+                duration /= 1000
+            name = match.group('name')
+            start = max(0.0, self.elapsed() - duration)
+            if self._phase and self._phase[0] == name: # Announced earlier, now done
+                self._phase = None
+            else:
+                self._end_phase(at=start) # An untimed phase ends where the timed one began
+                self.emit('phase_start', t=round(start, 3), name=name)
+            self.emit('phase_end', name=name, duration=round(duration, 3))
+            return
+        match = _PHASE_RE.match(line)
+        if match:
+            self._end_phase()
+            self._phase = (match.group('name'), self.elapsed())
+            self.emit('phase_start', name=self._phase[0])
+            return
+        match = _GRADLE_TASK_RE.match(line)
+        if match:
+            self._end_task()
+            self._task = (match.group('name'), self.elapsed(), match.group('outcome') or 'EXECUTED')
+            self.emit('task_start', name=self._task[0])
+            return
+        match = _TREE_SHAKE_RE.match(line)
+        if match:
+            self.emit('tree_shake', name=match.group('name'),
+                      from_bytes=int(match.group('from')), to_bytes=int(match.group('to')))
+        elif _ERROR_RE.search(line):
+            self.emit('error', text=line[:500])
+        elif _WARNING_RE.search(line):
+            self.emit('warning', text=line[:500])
+
+    def end_build(self):
+        """Closes the phase and task still open when the build process exits."""
+        self._end_task()
+        self._end_phase()
+
+    def _end_phase(self, at=None):
+        if self._phase is not None:
+            name, start = self._phase
+            self._phase = None
+            end = self.elapsed() if at is None else max(start, at)
+            self.emit('phase_end', t=round(end, 3), name=name, duration=round(end - start, 3))
+
+    def _end_task(self):
+        if self._task is not None:
+            name, start, outcome = self._task
+            self._task = None
+            self.emit('task_end', name=name, duration=round(self.elapsed() - start, 3), outcome=outcome)
+
+    # --- Output ---
+
+    def elapsed(self):
+        return time.perf_counter() - self._start
+
+    def emit(self, event_type, t=None, **fields):
+        event = {'t': round(self.elapsed(), 3) if t is None else t, 'type': event_type}
+        event.update(fields)
+        self.events.append(event)
+        self._write(event)
+        self._on_event(event)
+
+    def summary(self, kind='phase', limit=5):
+        """(name, duration) of the slowest finished phases or tasks."""
+        ended = [(event['name'], event['duration']) for event in self.events if event['type'] == f"{kind}_end"]
+        return sorted(ended, key=lambda item: item[1], reverse=True)[:limit]
+
+    def count(self, event_type):
+        return sum(1 for event in self.events if event['type'] == event_type)
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def _write(self, event):
+        if self._file is None and not self._file_failed and not self._ended:
+            try:
+                os.makedirs(self.events_dir, exist_ok=True)
+                stamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+                self.path = os.path.join(self.events_dir, f"events-{stamp}-{self.label}-{os.getpid()}.ndjson")
+                self._file = open(self.path, 'a', encoding='utf-8', buffering=1) # Line buffered: readable while running
+                self._rotate()
+            except OSError as e:
+                self._file_failed = True
+                print(f"Warning: Build events are not written to disk: {e}", file=sys.stderr)
+        if self._file:
+            self._file.write(json.dumps(event) + "\n")
+
+    def _rotate(self):
+        try:
+            runs = sorted((os.path.join(self.events_dir, name) for name in os.listdir(self.events_dir)
+                           if name.startswith("events-") and name.endswith(".ndjson")), key=os.path.getmtime)
+            for old_path in runs[:-self.keep_runs] if self.keep_runs > 0 else []:
+                os.remove(old_path)
+        except OSError:
+            pass
+
+
+def append_event(path, event):
+    """Appends one event to the NDJSON file of an ended stream, e.g. the run_end of a deferred publish."""
+    if not path:
+        return
+    try:
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(event) + "\n")
+    except OSError as e:
+        print(f"Warning: Build event not written to {path}: {e}", file=sys.stderr)
+
+
+def read_events(path):
+    """Events of an NDJSON file, skipping a torn last line."""
+    events = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                events.append(json.loads(line))
+            except ValueError:
+                continue
+    return events
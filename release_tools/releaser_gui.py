@@ -0,0 +1,1526 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+PySide6 GUI of the Flutter Build & Deploy Tool.
+
+Hosts MainWindow and the QObject workers that run connection tests and
+ReleaseRunner jobs in background threads. Saves configuration using QSettings
+(excluding passwords). Loaded lazily by geecodex_releaser.py when the GUI is
+requested.
+
+Dependencies: PySide6, psycopg, paramiko
+"""
+
+import sys
+import os
+import traceback # For detailed error logging
+
+from PySide6.QtWidgets import (
+    QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
+    QLabel, QLineEdit, QPushButton, QFileDialog, QPlainTextEdit,
+    QSpinBox, QGroupBox, QStatusBar, QMessageBox, QProgressBar,
+    QComboBox, QCheckBox, QTabWidget, QScrollArea
+)
+# Import QSettings and QByteArray for geometry saving/loading
+from PySide6.QtCore import QObject, Signal, QThread, Slot, Qt, QSettings, QByteArray, QTimer
+from PySide6.QtGui import QColor, QFont, QTextCursor, QPainter # Added QFont
+
+from releaser_core import (
+    TARGET_PLATFORMS, BUILD_PLATFORMS, ORGANIZATION_NAME, APPLICATION_NAME, AGENTS_FILE,
+    LOG_VIEW_MAX_LINES, LOG_LOAD_OLDER_LINES, LOG_VIEW_MAX_OLDER_LINES, MATRIX_MAX_WORKERS,
+    RunLogFile, ReleaseRunner, ReleaseMatrix,
+    target_platform_config, default_build_platform, read_pubspec_version, validate_release_config,
+)
+from releaser_core import METRICS_DB_FILE, JOBS_DB_FILE
+from releaser_sftp import SFTP_POOL
+from releaser_db import DB_POOL
+from releaser_metrics import CHART_METRICS, REGRESSION_THRESHOLD, MetricsStore, regressions
+from releaser_probe import PROBE_ENGINE
+from releaser_jobs import JobStore, ReleaseScheduler, job_label
+
+# =============================================================================
+# Worker Classes (Background Tasks)
+# =============================================================================
+
+class ProbeBridge(QObject):
+    """Forwards ProbeEngine results (probe loop thread) to the GUI thread."""
+    result_ready = Signal(object) # releaser_probe.ProbeResult
+
+
+class MetricsLoadWorker(QObject):
+    """Loads the release_metrics history of a platform in a separate thread."""
+    loaded = Signal(object, str) # rows (chronological), source description
+
+    def __init__(self, config, platform):
+        super().__init__()
+        self.config = config
+        self.platform = platform
+
+    @Slot()
+    def run(self):
+        try:
+            rows, source = MetricsStore(METRICS_DB_FILE).history(self.config, self.platform)
+        except Exception as e: # e.g. an unreadable SQLite file
+            rows, source = [], f"unavailable ({type(e).__name__}: {e})"
+        self.loaded.emit(rows, source)
+
+
+class BuildDeployWorker(QObject):
+    """Worker to handle the entire build, upload, and DB update process.
+
+    Thin Qt adapter: the work is done by a ReleaseRunner whose callbacks are
+    forwarded to this worker's signals.
+    """
+    output_received = Signal(str)
+    upload_progress = Signal(int, int) # bytes_transferred, total_bytes
+    step_changed = Signal(str) # e.g., "Building...", "Uploading...", "Updating DB..."
+    build_event = Signal(object) # Build event dict, see releaser_events
+    finished = Signal(bool, str) # success, final_message
+
+    def __init__(self, config):
+        super().__init__()
+        self.config = config
+        self.runner = ReleaseRunner(
+            config,
+            on_output=self.output_received.emit,
+            on_step=self.step_changed.emit,
+            on_progress=self.upload_progress.emit,
+            on_finished=self.finished.emit,
+            on_event=self.build_event.emit,
+        )
+
+    @Slot()
+    def run(self):
+        """Execute the build and deploy steps."""
+        self.runner.run()
+
+    def stop(self):
+        """Signals the worker to stop processing."""
+        self.runner.stop()
+
+
+class MatrixDeployWorker(QObject):
+    """Worker that runs a ReleaseMatrix (several targets in a process pool).
+
+    Matrix events are re-emitted as per-target signals; finished carries the
+    overall result once every target is done.
+    """
+    target_output = Signal(str, str) # target, text
+    target_step = Signal(str, str) # target, step message
+    target_progress = Signal(str, int, int) # target, bytes_transferred, total_bytes
+    target_finished = Signal(str, bool, str) # target, success, message
+    target_event = Signal(str, object) # target, build event dict
+    finished = Signal(bool, str) # success (all targets), summary
+
+    def __init__(self, configs, max_workers):
+        super().__init__()
+        self.configs = configs
+        self.matrix = ReleaseMatrix(configs, on_event=self._dispatch_event, max_workers=max_workers)
+
+    def _dispatch_event(self, target, kind, payload):
+        if kind == 'output':
+            self.target_output.emit(target, payload)
+        elif kind == 'step':
+            self.target_step.emit(target, payload)
+        elif kind == 'progress':
+            self.target_progress.emit(target, int(payload[0]), int(payload[1]))
+        elif kind == 'event':
+            self.target_event.emit(target, payload)
+        elif kind == 'finished':
+            self.target_finished.emit(target, payload[0], payload[1])
+
+    @Slot()
+    def run(self):
+        """Runs every target and reports the combined result."""
+        try:
+            results = self.matrix.run()
+            all_ok = bool(results) and all(success for success, _ in results.values())
+            self.finished.emit(all_ok, self.matrix.summary())
+        except Exception as e:
+            self.target_output.emit("matrix", traceback.format_exc())
+            self.finished.emit(False, f"Release matrix failed: {type(e).__name__}: {e}")
+
+    def stop(self):
+        """Signals every target to stop processing."""
+        self.matrix.stop()
+
+class JobBridge(QObject):
+    """Forwards ReleaseScheduler job callbacks (stage threads) to the GUI thread."""
+    job_output = Signal(str, str) # job label, text
+    job_step = Signal(str, str) # job label, step message
+    job_finished = Signal(str, bool, str) # job label, success, message
+
+    def create_runner(self, job):
+        """ReleaseScheduler.runner_factory: a ReleaseRunner whose callbacks go through this bridge."""
+        label = job['label']
+        return ReleaseRunner(
+            job['config'],
+            on_output=lambda text: self.job_output.emit(label, text),
+            on_step=lambda message: self.job_step.emit(label, message),
+        )
+
+    def report_finished(self, job):
+        """ReleaseScheduler.on_job_finished callback."""
+        self.job_finished.emit(job['label'], job['state'] == 'done', job['message'] or job['state'])
+
+class PhaseTimelineWidget(QWidget):
+    """Bars of the stages, build phases and slow Gradle tasks of the current run.
+
+    Fed with build events (see releaser_events); matrix targets get one lane
+    prefix each. Open stages/phases grow with the latest event time.
+    """
+    ROW_HEIGHT = 20
+    LABEL_WIDTH = 300
+    MIN_TASK_SECONDS = 1.0 # Shorter Gradle tasks are only in the NDJSON file
+    COLORS = {'stage': QColor("#2196F3"), 'phase': QColor("#4CAF50"), 'task': QColor("#FF9800")}
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.rows = [] # [lane, kind, name, start, duration or None]
+        self._open = {} # (lane, kind, name) -> row
+        self._now = 0.0
+        self.setMinimumHeight(self.ROW_HEIGHT)
+
+    def clear(self):
+        self.rows = []
+        self._open = {}
+        self._now = 0.0
+        self.setMinimumHeight(self.ROW_HEIGHT)
+        self.update()
+
+    def add_event(self, event, lane=""):
+        event_type = event.get('type', '')
+        kind, _, edge = event_type.rpartition('_')
+        self._now = max(self._now, event.get('t', 0.0))
+        if kind in ('stage', 'phase') and edge == 'start':
+            row = [lane, kind, event['name'], event['t'], None]
+            self.rows.append(row)
+            self._open[(lane, kind, event['name'])] = row
+        elif kind in ('stage', 'phase') and edge == 'end':
+            row = self._open.pop((lane, kind, event['name']), None)
+            if row is not None:
+                row[4] = event['duration']
+        elif event_type == 'task_end' and event['duration'] >= self.MIN_TASK_SECONDS:
+            self.rows.append([lane, 'task', event['name'], event['t'] - event['duration'], event['duration']])
+        elif event_type == 'run_end':
+            for row in self._open.values(): # Cancelled or failed while they ran
+                row[4] = self._now - row[3]
+            self._open = {}
+        self.setMinimumHeight(self.ROW_HEIGHT * max(1, len(self.rows)) + 4)
+        self.update()
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        if not self.rows:
+            painter.drawText(self.rect(), Qt.AlignmentFlag.AlignCenter, "The phase timeline of the next run appears here.")
+            return
+        span = max(self._now, max(row[3] + (row[4] or 0.0) for row in self.rows), 0.001)
+        bar_width = max(50, self.width() - self.LABEL_WIDTH - 70)
+        for index, (lane, kind, name, start, duration) in enumerate(self.rows):
+            y = index * self.ROW_HEIGHT + 2
+            length = duration if duration is not None else self._now - start
+            indent = {'stage': 0, 'phase': 12, 'task': 24}[kind]
+            label = f"{lane}: {name}" if lane else name
+            painter.setPen(self.palette().text().color())
+            painter.drawText(indent, y, self.LABEL_WIDTH - indent, self.ROW_HEIGHT - 4,
+                             Qt.AlignmentFlag.AlignVCenter, painter.fontMetrics().elidedText(
+                                 label, Qt.TextElideMode.ElideRight, self.LABEL_WIDTH - indent - 6))
+            x = self.LABEL_WIDTH + int(start / span * bar_width)
+            painter.fillRect(x, y + 3, max(2, int(length / span * bar_width)), self.ROW_HEIGHT - 10,
+                             self.COLORS[kind].lighter(130) if duration is None else self.COLORS[kind])
+            painter.drawText(x + max(2, int(length / span * bar_width)) + 4, y, 70, self.ROW_HEIGHT - 4,
+                             Qt.AlignmentFlag.AlignVCenter, f"{length:.1f}s" + ("…" if duration is None else ""))
+
+class MetricsChartWidget(QWidget):
+    """Line chart of one release metric across runs; flagged regressions are drawn red."""
+    MARGIN = 40
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.rows = []
+        self.field = 'total_seconds'
+        self.flagged = set() # Row indexes
+        self.setMinimumHeight(180)
+
+    def set_data(self, rows, field, flagged):
+        self.rows = rows
+        self.field = field
+        self.flagged = {index for index, _, _ in flagged}
+        self.update()
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+        label, scale, _ = CHART_METRICS[self.field]
+        points = [(index, row[self.field] * scale) for index, row in enumerate(self.rows) if row.get(self.field) is not None]
+        if not points:
+            painter.drawText(self.rect(), Qt.AlignmentFlag.AlignCenter, f"No recorded runs with {label.lower()} yet.")
+            return
+        left, top = self.MARGIN + 10, 16
+        width, height = max(10, self.width() - left - 16), max(10, self.height() - top - self.MARGIN)
+        peak = max(value for _, value in points) or 1.0
+        slots = max(1, len(self.rows) - 1)
+        painter.setPen(self.palette().text().color())
+        painter.drawLine(left, top + height, left + width, top + height)
+        painter.drawText(2, top, left - 4, 14, Qt.AlignmentFlag.AlignRight, f"{peak:.3g}")
+        painter.drawText(left, 0, width, 14, Qt.AlignmentFlag.AlignLeft, label)
+        coords = [(left + int(index / slots * width), top + height - int(value / peak * height), index)
+                  for index, value in points]
+        painter.setPen(QColor("#2196F3"))
+        for (x1, y1, _), (x2, y2, _) in zip(coords, coords[1:]):
+            painter.drawLine(x1, y1, x2, y2)
+        label_every = max(1, len(coords) // 10)
+        for position, (x, y, index) in enumerate(coords):
+            row = self.rows[index]
+            color = QColor("#f44336") if index in self.flagged else QColor("#9E9E9E") if not row.get('success') else QColor("#2196F3")
+            painter.setBrush(color)
+            painter.setPen(color)
+            painter.drawEllipse(x - 3, y - 3, 7, 7)
+            if position % label_every == 0 or index in self.flagged:
+                painter.setPen(self.palette().text().color())
+                painter.drawText(x - 30, top + height + 4, 60, 14, Qt.AlignmentFlag.AlignCenter, str(row.get('version_name') or ''))
+
+# =============================================================================
+# Main Window Class
+# =============================================================================
+
+class MainWindow(QMainWindow):
+    def __init__(self):
+        super().__init__()
+        self.setWindowTitle(f"{APPLICATION_NAME} - {ORGANIZATION_NAME}")
+        self.setGeometry(100, 100, 850, 780) # Increased height slightly
+
+        self.worker_thread = None
+        self.build_worker = None
+        self.probe_bridge = ProbeBridge(self) # Connection tests run on PROBE_ENGINE, not worker_thread
+        self.endpoint_results = {} # probe name -> ProbeResult of the extra endpoints
+        self.run_log = None # RunLogFile of the current/last build
+        self.matrix_output_edits = {} # target text -> QPlainTextEdit tab of the last matrix run
+        # Persistent release queue; its threads start with the first queued release or Resume Queue
+        self.job_bridge = JobBridge(self)
+        self.scheduler = ReleaseScheduler(JobStore(JOBS_DB_FILE), self.job_bridge.create_runner,
+                                          on_job_finished=self.job_bridge.report_finished)
+        self.metrics_thread = None # Loads the metrics history, independent of build/test workers
+        self.metrics_worker = None
+        self.metrics_rows = []
+        self.metrics_source = "-"
+        self._older_log_offset = None # File offset of the oldest line shown in output_edit
+
+        # Store status label styles
+        self.status_ok_style = "color: green; font-weight: bold;"
+        self.status_err_style = "color: red; font-weight: bold;"
+        self.status_progress_style = "color: blue;"
+        self.status_idle_style = "color: gray;"
+        self.status_warn_style = "color: darkorange; font-weight: bold;"
+
+        # --- Initialize QSettings ---
+        # INI in the user scope, the file the headless command reads (see default_settings_path)
+        self.settings = QSettings(QSettings.Format.IniFormat, QSettings.Scope.UserScope,
+                                  ORGANIZATION_NAME, APPLICATION_NAME)
+        if not self.settings.allKeys():
+            legacy = QSettings(ORGANIZATION_NAME, APPLICATION_NAME) # Native format of earlier versions
+            for key in legacy.allKeys():
+                self.settings.setValue(key, legacy.value(key))
+
+        self.setup_ui()
+        self.set_default_build_platform() # Set default build OS after UI setup
+        self.load_settings() # Load settings AFTER UI is created and defaults set
+        self.show_restored_jobs()
+
+
+    def setup_ui(self):
+        central_widget = QWidget()
+        self.setCentralWidget(central_widget)
+        main_layout = QVBoxLayout(central_widget)
+
+        # --- Project Selection ---
+        project_group = QGroupBox("1. Flutter Project")
+        project_layout = QHBoxLayout()
+        self.project_path_edit = QLineEdit()
+        self.project_path_edit.setPlaceholderText("Select Flutter project directory...")
+        self.project_path_edit.setReadOnly(True)
+        browse_button = QPushButton("Browse...")
+        browse_button.clicked.connect(self.browse_project_dir)
+        project_layout.addWidget(QLabel("Project Path:"))
+        project_layout.addWidget(self.project_path_edit)
+        project_layout.addWidget(browse_button)
+        project_group.setLayout(project_layout)
+        main_layout.addWidget(project_group)
+
+        # --- Build Configuration ---
+        build_config_group = QGroupBox("2. Build Configuration")
+        build_config_layout = QVBoxLayout()
+
+        # Platform Selection Layout
+        platform_layout = QHBoxLayout()
+        platform_layout.addWidget(QLabel("Target Platform:"))
+        self.target_platform_combo = QComboBox()
+        self.target_platform_combo.addItems(TARGET_PLATFORMS.keys())
+        platform_layout.addWidget(self.target_platform_combo, 1) # Stretch
+
+        platform_layout.addWidget(QLabel("Build On:")) # Label for build OS
+        self.build_platform_combo = QComboBox()
+        self.build_platform_combo.addItems(BUILD_PLATFORMS)
+        platform_layout.addWidget(self.build_platform_combo, 0) # No stretch
+
+        platform_layout.addWidget(QLabel("Agent:"))
+        self.build_agent_combo = QComboBox()
+        self.build_agent_combo.setToolTip(f"Where flutter build runs; remote build agents are registered in {AGENTS_FILE}")
+        self.load_build_agents()
+        platform_layout.addWidget(self.build_agent_combo, 0)
+        build_config_layout.addLayout(platform_layout)
+
+        # Release Matrix Layout (several targets released in one run)
+        matrix_layout = QHBoxLayout()
+        matrix_layout.addWidget(QLabel("Matrix Targets:"))
+        self.matrix_target_checks = {}
+        for target_text in TARGET_PLATFORMS:
+            target_check = QCheckBox(target_text)
+            self.matrix_target_checks[target_text] = target_check
+            matrix_layout.addWidget(target_check)
+        matrix_layout.addStretch()
+        matrix_layout.addWidget(QLabel("Parallel:"))
+        self.matrix_workers_spin = QSpinBox()
+        self.matrix_workers_spin.setRange(1, max(1, len(TARGET_PLATFORMS)))
+        self.matrix_workers_spin.setValue(MATRIX_MAX_WORKERS)
+        self.matrix_workers_spin.setToolTip("Maximum number of targets processed at the same time")
+        matrix_layout.addWidget(self.matrix_workers_spin)
+        build_config_layout.addLayout(matrix_layout)
+
+
+        # Version Name / Code Layout
+        version_layout = QHBoxLayout()
+        version_layout.addWidget(QLabel("Version Name:"))
+        self.version_name_edit = QLineEdit()
+        self.version_name_edit.setPlaceholderText("e.g., 1.2.3 (from pubspec.yaml)")
+        version_layout.addWidget(self.version_name_edit, 1) # Stretch factor
+        version_layout.addWidget(QLabel("Version Code:"))
+        self.version_code_spin = QSpinBox()
+        self.version_code_spin.setRange(1, 999999)
+        self.version_code_spin.setAlignment(Qt.AlignmentFlag.AlignRight)
+        version_layout.addWidget(self.version_code_spin, 0) # No stretch
+        build_config_layout.addLayout(version_layout)
+
+        # Release Notes
+        build_config_layout.addWidget(QLabel("Release Notes:"))
+        self.release_notes_edit = QPlainTextEdit()
+        self.release_notes_edit.setPlaceholderText("Enter changes for this version (one change per line recommended)...")
+        self.release_notes_edit.setFixedHeight(80) # Limit height
+        build_config_layout.addWidget(self.release_notes_edit)
+        build_config_group.setLayout(build_config_layout)
+        main_layout.addWidget(build_config_group)
+
+
+        # --- Connection Settings ---
+        connection_group = QGroupBox("3. Deployment Settings")
+        connections_main_layout = QVBoxLayout() # Main layout for this group
+        connections_layout = QHBoxLayout() # Layout for DB and SFTP side-by-side
+
+        # DB Settings
+        db_sub_group = QGroupBox("PostgreSQL Database")
+        db_layout = QVBoxLayout()
+        db_layout.addWidget(QLabel("Host:"))
+        self.db_host_edit = QLineEdit()
+        self.db_host_edit.setPlaceholderText("e.g., localhost or IP")
+        db_layout.addWidget(self.db_host_edit)
+        db_port_layout = QHBoxLayout()
+        db_port_layout.addWidget(QLabel("Port:"))
+        self.db_port_edit = QLineEdit("5432") # Default Port
+        db_port_layout.addWidget(self.db_port_edit)
+        db_layout.addLayout(db_port_layout)
+        db_layout.addWidget(QLabel("Database:"))
+        self.db_name_edit = QLineEdit()
+        db_layout.addWidget(self.db_name_edit)
+        db_layout.addWidget(QLabel("User:"))
+        self.db_user_edit = QLineEdit()
+        db_layout.addWidget(self.db_user_edit)
+        db_layout.addWidget(QLabel("Password:"))
+        self.db_password_edit = QLineEdit()
+        self.db_password_edit.setPlaceholderText("Enter password (not saved)") # Clarify not saved
+        self.db_password_edit.setEchoMode(QLineEdit.EchoMode.Password)
+        db_layout.addWidget(self.db_password_edit)
+        db_layout.addStretch()
+        self.db_test_button = QPushButton("Test DB Connection")
+        self.db_status_label = QLabel("Status: Idle")
+        self.db_status_label.setStyleSheet(self.status_idle_style)
+        db_layout.addWidget(self.db_test_button)
+        db_layout.addWidget(self.db_status_label)
+        db_sub_group.setLayout(db_layout)
+        connections_layout.addWidget(db_sub_group)
+
+        # SFTP Settings
+        sftp_sub_group = QGroupBox("SFTP Server")
+        sftp_layout = QVBoxLayout()
+        sftp_layout.addWidget(QLabel("Host:"))
+        self.sftp_host_edit = QLineEdit()
+        self.sftp_host_edit.setPlaceholderText("e.g., yourserver.com or IP")
+        sftp_layout.addWidget(self.sftp_host_edit)
+        sftp_port_layout = QHBoxLayout()
+        sftp_port_layout.addWidget(QLabel("Port:"))
+        self.sftp_port_edit = QLineEdit("22") # Default Port
+        sftp_port_layout.addWidget(self.sftp_port_edit)
+        sftp_layout.addLayout(sftp_port_layout)
+        sftp_layout.addWidget(QLabel("User:"))
+        self.sftp_user_edit = QLineEdit()
+        sftp_layout.addWidget(self.sftp_user_edit)
+        sftp_layout.addWidget(QLabel("Password:"))
+        self.sftp_password_edit = QLineEdit()
+        self.sftp_password_edit.setPlaceholderText("Enter password (not saved)") # Clarify not saved
+        self.sftp_password_edit.setEchoMode(QLineEdit.EchoMode.Password)
+        sftp_layout.addWidget(self.sftp_password_edit)
+        # TODO: Add Key Path Selection Button/LineEdit
+        # self.sftp_key_path_edit = QLineEdit() ... add browse button
+        sftp_layout.addWidget(QLabel("Remote Upload Path:"))
+        self.sftp_remote_path_edit = QLineEdit()
+        self.sftp_remote_path_edit.setPlaceholderText("e.g., /var/www/app_updates/android")
+        sftp_layout.addWidget(self.sftp_remote_path_edit)
+        sftp_layout.addStretch()
+        self.sftp_test_button = QPushButton("Test SFTP Connection")
+        self.sftp_status_label = QLabel("Status: Idle")
+        self.sftp_status_label.setStyleSheet(self.status_idle_style)
+        sftp_layout.addWidget(self.sftp_test_button)
+        sftp_layout.addWidget(self.sftp_status_label)
+        sftp_sub_group.setLayout(sftp_layout)
+        connections_layout.addWidget(sftp_sub_group)
+
+        connections_main_layout.addLayout(connections_layout)
+        probe_layout = QHBoxLayout()
+        probe_layout.addWidget(QLabel("Extra endpoints:"))
+        self.probe_endpoints_edit = QLineEdit()
+        self.probe_endpoints_edit.setPlaceholderText("Optional, comma separated: cdn.example.com:443, https://example.com/health")
+        probe_layout.addWidget(self.probe_endpoints_edit, 1)
+        self.test_all_button = QPushButton("Test All Connections")
+        self.test_all_button.setToolTip("Test the database, SFTP and extra endpoints at the same time")
+        probe_layout.addWidget(self.test_all_button)
+        connections_main_layout.addLayout(probe_layout)
+        self.probe_status_label = QLabel("Endpoints: -")
+        self.probe_status_label.setStyleSheet(self.status_idle_style)
+        self.probe_status_label.setWordWrap(True)
+        connections_main_layout.addWidget(self.probe_status_label)
+        connection_group.setLayout(connections_main_layout)
+        main_layout.addWidget(connection_group)
+
+
+        # --- Build Output ---
+        output_group = QGroupBox("4. Build Output")
+        output_layout = QVBoxLayout()
+        self.output_edit = QPlainTextEdit()
+        self.output_edit.setReadOnly(True)
+        self.output_edit.setPlaceholderText("Build process output will appear here...")
+        monospace_font = QFont("Monospace")
+        monospace_font.setStyleHint(QFont.StyleHint.TypeWriter)
+        monospace_font.setPointSize(9)
+        self.output_edit.setFont(monospace_font)
+        self.output_edit.setMaximumBlockCount(LOG_VIEW_MAX_LINES) # Oldest lines drop off, full log is on disk
+        self.output_font = monospace_font # Reused by the per-target matrix tabs
+        self.output_tabs = QTabWidget()
+        self.output_tabs.addTab(self.output_edit, "All Output")
+        self.timeline_widget = PhaseTimelineWidget()
+        timeline_scroll = QScrollArea()
+        timeline_scroll.setWidgetResizable(True)
+        timeline_scroll.setWidget(self.timeline_widget)
+        self.output_tabs.addTab(timeline_scroll, "Timeline")
+        self.output_tabs.addTab(self.create_metrics_tab(), "Metrics")
+        output_layout.addWidget(self.output_tabs)
+        log_file_layout = QHBoxLayout()
+        self.load_older_button = QPushButton("⏫ Load Older")
+        self.load_older_button.setToolTip(f"Load the previous {LOG_LOAD_OLDER_LINES} lines from the run log file")
+        self.log_path_label = QLabel("Full log: -")
+        self.log_path_label.setTextInteractionFlags(Qt.TextInteractionFlag.TextSelectableByMouse)
+        log_file_layout.addWidget(self.load_older_button)
+        log_file_layout.addWidget(self.log_path_label, 1)
+        output_layout.addLayout(log_file_layout)
+        queue_status_layout = QHBoxLayout()
+        self.queue_status_label = QLabel("Release queue: idle")
+        self.queue_status_label.setStyleSheet(self.status_idle_style)
+        self.queue_status_label.setWordWrap(True)
+        self.resume_queue_button = QPushButton("▶ Resume Queue")
+        self.resume_queue_button.setToolTip("Run the releases queued in an earlier session with the passwords entered above")
+        self.resume_queue_button.setVisible(False)
+        queue_status_layout.addWidget(self.queue_status_label, 1)
+        queue_status_layout.addWidget(self.resume_queue_button)
+        output_layout.addLayout(queue_status_layout)
+        output_group.setLayout(output_layout)
+        main_layout.addWidget(output_group, stretch=1)
+
+        # --- Progress Bar ---
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setVisible(False)
+        self.progress_bar.setTextVisible(True)
+        self.progress_bar.setFormat("Uploading... %p%")
+        self.progress_bar.setRange(0, 100)
+        self.progress_bar.setValue(0)
+        main_layout.addWidget(self.progress_bar)
+
+
+        # --- Control Buttons ---
+        control_layout = QHBoxLayout()
+        self.start_button = QPushButton("🚀 Start Build & Deploy")
+        self.start_button.setStyleSheet("background-color: #4CAF50; color: white; padding: 6px; font-weight: bold;")
+        self.cancel_button = QPushButton("⏹️ Cancel")
+        self.cancel_button.setStyleSheet("background-color: #f44336; color: white; padding: 6px;")
+        self.cancel_button.setEnabled(False)
+        self.matrix_button = QPushButton("🧩 Start Matrix Release")
+        self.matrix_button.setToolTip("Build & deploy every checked Matrix Target in parallel")
+        self.matrix_button.setStyleSheet("background-color: #2196F3; color: white; padding: 6px; font-weight: bold;")
+        self.queue_button = QPushButton("➕ Queue Release")
+        self.queue_button.setToolTip("Add the current configuration to the release queue (build -> upload -> publish, "
+                                     "failed uploads and DB updates are retried; the queue survives a restart)")
+        self.queue_priority_spin = QSpinBox()
+        self.queue_priority_spin.setRange(-9, 9)
+        self.queue_priority_spin.setPrefix("Priority ")
+        self.queue_priority_spin.setToolTip("Queued releases with a higher priority run first")
+        control_layout.addWidget(self.start_button)
+        control_layout.addWidget(self.queue_button)
+        control_layout.addWidget(self.queue_priority_spin)
+        control_layout.addWidget(self.matrix_button)
+        control_layout.addWidget(self.cancel_button)
+        main_layout.addLayout(control_layout)
+
+        # --- Status Bar ---
+        self.status_bar = QStatusBar()
+        self.setStatusBar(self.status_bar)
+        self.status_bar.showMessage("Ready. Load settings or configure.")
+
+        # --- Connect Signals ---
+        self.db_test_button.clicked.connect(self.test_db_connection)
+        self.sftp_test_button.clicked.connect(self.test_sftp_connection)
+        self.test_all_button.clicked.connect(self.test_all_connections)
+        self.probe_bridge.result_ready.connect(self.handle_test_result)
+        self.start_button.clicked.connect(self.start_build_deploy)
+        self.matrix_button.clicked.connect(self.start_matrix_release)
+        self.queue_button.clicked.connect(self.queue_release)
+        self.resume_queue_button.clicked.connect(self.resume_queue)
+        self.job_bridge.job_output.connect(self.append_job_output)
+        self.job_bridge.job_step.connect(self.update_job_step)
+        self.job_bridge.job_finished.connect(self.handle_job_finished)
+
+        # Refresh queue metrics while the queue has work
+        self.queue_timer = QTimer(self)
+        self.queue_timer.setInterval(1000)
+        self.queue_timer.timeout.connect(self.refresh_queue_status)
+        self.cancel_button.clicked.connect(self.cancel_operation)
+        self.load_older_button.clicked.connect(self.load_older_output)
+
+        # Connect target platform change to update placeholder (optional)
+        self.target_platform_combo.currentTextChanged.connect(self.update_remote_path_placeholder)
+
+
+    def create_metrics_tab(self):
+        """Metrics history of the selected target platform with regression flags."""
+        metrics_tab = QWidget()
+        metrics_layout = QVBoxLayout(metrics_tab)
+        controls_layout = QHBoxLayout()
+        controls_layout.addWidget(QLabel("Metric:"))
+        self.metrics_field_combo = QComboBox()
+        for field, (label, _, _) in CHART_METRICS.items():
+            self.metrics_field_combo.addItem(label, field)
+        controls_layout.addWidget(self.metrics_field_combo, 1)
+        controls_layout.addWidget(QLabel("Flag runs worse than the rolling median by:"))
+        self.metrics_threshold_spin = QSpinBox()
+        self.metrics_threshold_spin.setRange(5, 500)
+        self.metrics_threshold_spin.setSuffix(" %")
+        self.metrics_threshold_spin.setValue(int(REGRESSION_THRESHOLD * 100))
+        controls_layout.addWidget(self.metrics_threshold_spin)
+        self.metrics_refresh_button = QPushButton("Refresh")
+        self.metrics_refresh_button.setToolTip("Load the recorded runs of the selected Target Platform")
+        controls_layout.addWidget(self.metrics_refresh_button)
+        metrics_layout.addLayout(controls_layout)
+        self.metrics_chart = MetricsChartWidget()
+        metrics_layout.addWidget(self.metrics_chart, 1)
+        self.metrics_status_label = QLabel("Press Refresh to load the release metrics.")
+        self.metrics_status_label.setWordWrap(True)
+        self.metrics_status_label.setTextInteractionFlags(Qt.TextInteractionFlag.TextSelectableByMouse)
+        metrics_layout.addWidget(self.metrics_status_label)
+
+        self.metrics_refresh_button.clicked.connect(self.refresh_metrics)
+        self.metrics_field_combo.currentIndexChanged.connect(self.show_metrics)
+        self.metrics_threshold_spin.valueChanged.connect(self.show_metrics)
+        return metrics_tab
+
+
+    @Slot()
+    def refresh_metrics(self):
+        """Loads the recorded runs of the selected target platform in the background."""
+        if self.metrics_thread is not None: # A load is still running
+            return
+        platform = target_platform_config(self.target_platform_combo.currentText())['platform']
+        self.metrics_refresh_button.setEnabled(False)
+        self.metrics_status_label.setText(f"Loading metrics for {platform}...")
+        self.metrics_thread = QThread(self)
+        self.metrics_worker = MetricsLoadWorker(self.get_current_config(), platform)
+        self.metrics_worker.moveToThread(self.metrics_thread)
+        self.metrics_worker.loaded.connect(self.handle_metrics_loaded)
+        self.metrics_thread.started.connect(self.metrics_worker.run)
+        self.metrics_worker.loaded.connect(self.metrics_thread.quit)
+        self.metrics_worker.loaded.connect(self.metrics_worker.deleteLater)
+        self.metrics_thread.finished.connect(self.metrics_thread.deleteLater)
+        self.metrics_thread.finished.connect(self._clear_metrics_worker_ref)
+        self.metrics_thread.start()
+
+
+    @Slot()
+    def _clear_metrics_worker_ref(self):
+        self.metrics_worker = None
+        self.metrics_thread = None
+
+
+    @Slot(object, str)
+    def handle_metrics_loaded(self, rows, source):
+        self.metrics_rows = rows
+        self.metrics_source = source
+        self.metrics_refresh_button.setEnabled(True)
+        self.show_metrics()
+
+
+    @Slot()
+    def show_metrics(self):
+        """Redraws the chart for the selected metric and lists the flagged runs."""
+        field = self.metrics_field_combo.currentData()
+        label, scale, higher_is_worse = CHART_METRICS[field]
+        flagged = regressions(self.metrics_rows, field, threshold=self.metrics_threshold_spin.value() / 100,
+                              higher_is_worse=higher_is_worse)
+        self.metrics_chart.set_data(self.metrics_rows, field, flagged)
+        if not self.metrics_rows:
+            return
+        lines = [f"{len(self.metrics_rows)} run(s) from {self.metrics_source}."]
+        for index, value, median in flagged[-5:]:
+            row = self.metrics_rows[index]
+            lines.append(f"⚠ v{row['version_name']} ({row['target']}, {row['recorded_at']:%Y-%m-%d %H:%M}): "
+                         f"{label} {value * scale:.3g} vs. median {median * scale:.3g}")
+        if not flagged:
+            lines.append(f"No run is {self.metrics_threshold_spin.value()}% worse than its rolling median.")
+        self.metrics_status_label.setText("\n".join(lines))
+
+
+    @Slot()
+    def browse_project_dir(self):
+        """Opens a dialog to select the Flutter project directory."""
+        last_dir = self.settings.value("paths/last_project_dir", os.path.expanduser("~"))
+        directory = QFileDialog.getExistingDirectory(self, "Select Flutter Project Directory", last_dir)
+        if directory:
+            self.project_path_edit.setText(directory)
+            self.settings.setValue("paths/last_project_dir", directory) # Save for next time
+            self.read_pubspec_info(directory) # Try reading version info
+
+
+    def read_pubspec_info(self, project_dir):
+         """Attempt to read version from pubspec.yaml."""
+         pubspec_path = os.path.join(project_dir, 'pubspec.yaml')
+         try:
+             if os.path.exists(pubspec_path):
+                 version_info = read_pubspec_version(project_dir)
+                 if version_info:
+                      version_line, version_name, version_code = version_info
+                      self.version_name_edit.setText(version_name)
+                      self.version_code_spin.setValue(version_code)
+                      self.status_bar.showMessage(f"Read version {version_line} from pubspec.yaml", 3000)
+                 else:
+                      self.status_bar.showMessage("'version:' line not found or invalid in pubspec.yaml", 3000)
+                      self.version_name_edit.setText("")
+                      self.version_code_spin.setValue(1)
+             else:
+                  self.status_bar.showMessage("pubspec.yaml not found in selected directory.", 3000)
+                  self.version_name_edit.setText("")
+                  self.version_code_spin.setValue(1)
+
+         except Exception as e:
+             self.status_bar.showMessage(f"Error reading pubspec.yaml: {e}", 4000)
+             print(f"Error reading pubspec: {traceback.format_exc()}") # Log details
+             self.version_name_edit.setText("")
+             self.version_code_spin.setValue(1)
+
+
+    def get_current_config(self, include_build_info=False):
+        """Gathers config, maps target platform UI text to internal details."""
+        # Use local variable to avoid potential name clash if 'config' passed in
+        current_config = { # Connection details read fresh each time
+            'db_host': self.db_host_edit.text().strip(),
+            'db_port': self.db_port_edit.text().strip() or '5432',
+            'db_name': self.db_name_edit.text().strip(),
+            'db_user': self.db_user_edit.text().strip(),
+            'db_password': self.db_password_edit.text(), # Read password directly
+            'sftp_host': self.sftp_host_edit.text().strip(),
+            'sftp_port': self.sftp_port_edit.text().strip() or '22',
+            'sftp_user': self.sftp_user_edit.text().strip(),
+            'sftp_password': self.sftp_password_edit.text(), # Read password directly
+            # TODO: Read key path from UI element when added
+            'sftp_key_path': None, # Placeholder
+            'sftp_remote_path': self.sftp_remote_path_edit.text().strip(),
+            'probe_endpoints': [e.strip() for e in self.probe_endpoints_edit.text().split(',') if e.strip()],
+        }
+        if include_build_info:
+            current_config.update({
+                'project_dir': self.project_path_edit.text().strip(),
+                'version_name': self.version_name_edit.text().strip(),
+                'version_code': self.version_code_spin.value(),
+                'release_notes': self.release_notes_edit.toPlainText().strip(),
+                'build_platform': self.build_platform_combo.currentText(), # Where the build runs
+                'build_agent': self.build_agent_combo.currentData() or '', # '' local, 'auto' or an agent name
+                # 'download_url': ..., # Maybe add UI field for this? Or construct later.
+                # 'is_mandatory': ..., # Maybe add UI checkbox for this? Default False.
+            })
+            # --- Platform details from map ---
+            current_config.update(target_platform_config(self.target_platform_combo.currentText()))
+        return current_config
+
+    def load_build_agents(self):
+        """Fills the agent combo: local build, the least-loaded agent, or a named agent."""
+        from releaser_agents import load_agents # stdlib only until an agent is contacted
+        self.build_agent_combo.clear()
+        self.build_agent_combo.addItem("Local", "")
+        try:
+            agents = load_agents(AGENTS_FILE)
+        except ValueError as e:
+            print(f"Warning: {e}")
+            agents = []
+        if agents:
+            self.build_agent_combo.addItem("Auto (least loaded)", "auto")
+        for agent in agents:
+            self.build_agent_combo.addItem(f"{agent.name} ({agent.os})", agent.name)
+
+    def set_controls_enabled(self, enabled):
+        """Enable/disable controls during operations."""
+        self.start_button.setEnabled(enabled)
+        self.matrix_button.setEnabled(enabled)
+        self.cancel_button.setEnabled(not enabled)
+        self.db_test_button.setEnabled(enabled)
+        self.sftp_test_button.setEnabled(enabled)
+        self.test_all_button.setEnabled(enabled)
+
+        # Disable/Enable group boxes or specific interactive elements
+        # Project Selection Group
+        self.project_path_edit.parent().findChild(QPushButton).setEnabled(enabled) # Browse button
+
+        # Build Configuration Group
+        build_config_group = self.target_platform_combo.parentWidget().parentWidget() # Find the QGroupBox
+        if isinstance(build_config_group, QGroupBox): build_config_group.setEnabled(enabled)
+        else: # Fallback if structure changes
+             self.target_platform_combo.setEnabled(enabled)
+             self.build_platform_combo.setEnabled(enabled)
+             self.version_name_edit.setEnabled(enabled)
+             self.version_code_spin.setEnabled(enabled)
+             self.release_notes_edit.setEnabled(enabled)
+
+        # DB Settings Group
+        db_group = self.db_host_edit.parentWidget().parentWidget() # Find the QGroupBox
+        if isinstance(db_group, QGroupBox): db_group.setEnabled(enabled)
+        # Ensure password can always be entered, even if group is disabled
+        self.db_password_edit.setEnabled(True) # Always allow password entry
+
+
+        # SFTP Settings Group
+        sftp_group = self.sftp_host_edit.parentWidget().parentWidget() # Find the QGroupBox
+        if isinstance(sftp_group, QGroupBox): sftp_group.setEnabled(enabled)
+        # Ensure password can always be entered
+        self.sftp_password_edit.setEnabled(True) # Always allow password entry
+
+        # Re-enable test buttons specifically if parent group was disabled
+        self.db_test_button.setEnabled(enabled)
+        self.sftp_test_button.setEnabled(enabled)
+
+
+    def run_connection_test(self, names):
+        """Starts connection probes on the background probe loop; they run concurrently."""
+        config = self.get_current_config() # Gets current values including passwords
+        names = list(names)
+
+        # Validate passwords needed for test
+        if 'db' in names and not config['db_password']:
+             names.remove('db')
+             self.db_status_label.setText("Status: Need Password")
+             self.db_status_label.setStyleSheet(self.status_err_style)
+             if not names:
+                 QMessageBox.warning(self, "Input Needed", "Please enter the Database Password to test the connection.")
+                 return
+        if 'sftp' in names and not config['sftp_password'] and not config['sftp_key_path']:
+             # Allow testing connection without password/key if agent auth might work
+             self.status_bar.showMessage("Attempting SFTP test without password/key...", 3000)
+
+        for name in names:
+            status_label, button = self.probe_widgets(name)
+            if name.startswith('endpoint:'):
+                self.endpoint_results.pop(name, None)
+                continue
+            status_label.setText("Status: Testing...")
+            status_label.setStyleSheet(self.status_progress_style)
+            button.setEnabled(False)
+        if any(name.startswith('endpoint:') for name in names):
+            self.probe_status_label.setText("Endpoints: Testing...")
+            self.probe_status_label.setStyleSheet(self.status_progress_style)
+        self.status_bar.showMessage(f"Testing {', '.join(n.split(':', 1)[-1] for n in names)}...")
+        # Results arrive on the probe loop thread; the bridge queues them to this thread.
+        # A click always probes again; the cached result is for the release that follows.
+        PROBE_ENGINE.probe(config, names, on_result=self.probe_bridge.result_ready.emit, use_cache=False)
+
+    def probe_widgets(self, name):
+        """(status label, button) showing the result of a probe."""
+        if name == 'db':
+            return self.db_status_label, self.db_test_button
+        if name == 'sftp':
+            return self.sftp_status_label, self.sftp_test_button
+        return self.probe_status_label, self.test_all_button
+
+    @Slot()
+    def test_db_connection(self):
+        self.run_connection_test(['db'])
+
+    @Slot()
+    def test_sftp_connection(self):
+        self.run_connection_test(['sftp'])
+
+    @Slot()
+    def test_all_connections(self):
+        config = self.get_current_config()
+        self.run_connection_test(['db', 'sftp'] + [f"endpoint:{target}" for target in config['probe_endpoints']])
+
+    @Slot(object)
+    def handle_test_result(self, result):
+        """Updates the status label of a finished probe."""
+        status_label, button = self.probe_widgets(result.name)
+        timing = " [cached]" if result.cached else f" [{result.seconds:.2f}s]"
+        if result.name.startswith('endpoint:'):
+            self.endpoint_results[result.name] = result
+            status_label.setText("Endpoints: " + "; ".join(
+                f"{name.split(':', 1)[1]}: {'OK' if r.success else 'FAILED'} - {r.message}"
+                for name, r in self.endpoint_results.items()))
+            all_ok = all(r.success for r in self.endpoint_results.values())
+            status_label.setStyleSheet(self.status_ok_style if all_ok else self.status_err_style)
+        else:
+            status_label.setText(f"Status: {result.message}{timing}")
+            style = self.status_warn_style if result.warning else self.status_ok_style
+            status_label.setStyleSheet(style if result.success else self.status_err_style)
+            if not (self.worker_thread and self.worker_thread.isRunning()): # A build keeps them disabled
+                button.setEnabled(True)
+        self.status_bar.showMessage(f"{result.name.upper()} test finished: {result.message}", 5000)
+
+
+    @Slot()
+    def start_build_deploy(self):
+        """Validates input and starts the build/deploy process."""
+        if self.worker_thread and self.worker_thread.isRunning():
+            reply = QMessageBox.question(self, "Busy", "Another operation is already in progress.\n\n"
+                                                       "Add this release to the release queue instead?",
+                                         QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
+                                         QMessageBox.StandardButton.Yes)
+            if reply == QMessageBox.StandardButton.Yes:
+                self.queue_release()
+            return
+
+        config = self.get_current_config(include_build_info=True)
+
+        # --- Validation ---
+        if not self.confirm_release_notes(config):
+            return
+
+        errors = validate_release_config(config) # Project, platform, version and connection fields
+        if errors:
+            QMessageBox.critical(self, "Input Error", "\n".join(errors))
+            return
+
+        self.prepare_ui_for_run(f"Starting build & deploy for {config['target_platform_text']}...")
+
+        # --- Create Worker and Thread ---
+        self.worker_thread = QThread(self)
+        self.build_worker = BuildDeployWorker(config) # Pass full config
+        self.build_worker.moveToThread(self.worker_thread)
+
+        # Connect signals from worker to UI slots
+        self.build_worker.output_received.connect(self.append_output)
+        self.build_worker.step_changed.connect(self.update_status_message)
+        self.build_worker.upload_progress.connect(self.update_progress_bar)
+        self.build_worker.build_event.connect(self.timeline_widget.add_event)
+        self.build_worker.finished.connect(self.handle_build_finished)
+
+        # Connect thread signals for lifecycle management
+        self.worker_thread.started.connect(self.build_worker.run)
+        # Cleanup when finished
+        self.build_worker.finished.connect(self.worker_thread.quit)
+        self.build_worker.finished.connect(self.build_worker.deleteLater)
+        self.worker_thread.finished.connect(self.worker_thread.deleteLater)
+        # Ensure worker references are cleared when the thread finishes
+        self.worker_thread.finished.connect(self._clear_build_worker_ref)
+
+        self.worker_thread.start()
+
+    def confirm_release_notes(self, config):
+        """Warns if release notes are empty. Returns False if the user wants to edit them."""
+        if not config['release_notes']:
+              reply = QMessageBox.question(self, 'Confirm Empty Notes',
+                                         "Release Notes are empty. Continue anyway?",
+                                         QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
+                                         QMessageBox.StandardButton.No)
+              if reply == QMessageBox.StandardButton.No:
+                  # Don't add to errors, just return to let user edit
+                  self.release_notes_edit.setFocus()
+                  return False
+        return True
+
+
+    def prepare_ui_for_run(self, status_message):
+        """Resets output, status labels and progress before a build/deploy starts."""
+        self.output_edit.clear()
+        self.output_edit.setMaximumBlockCount(LOG_VIEW_MAX_LINES) # Undo any growth from "Load Older"
+        self.clear_matrix_tabs()
+        self.timeline_widget.clear()
+        self.start_run_log()
+        self.set_controls_enabled(False) # Disable controls
+        self.start_button.setText("Processing...")
+        self.status_bar.showMessage(status_message)
+        self.db_status_label.setText("Status: Idle")
+        self.db_status_label.setStyleSheet(self.status_idle_style)
+        self.sftp_status_label.setText("Status: Idle")
+        self.sftp_status_label.setStyleSheet(self.status_idle_style)
+        self.progress_bar.setValue(0)
+        self.progress_bar.setVisible(False)
+
+
+    @Slot()
+    def queue_release(self):
+        """Validates input and adds the current configuration to the release queue."""
+        config = self.get_current_config(include_build_info=True)
+        if not self.confirm_release_notes(config):
+            return
+        errors = validate_release_config(config)
+        if errors:
+            QMessageBox.critical(self, "Input Error", "\n".join(errors))
+            return
+        if self.run_log is None:
+            self.start_run_log()
+
+        priority = self.queue_priority_spin.value()
+        self.scheduler.set_credentials(config) # Also runs the jobs restored from an earlier session
+        job_id = self.scheduler.submit(config, priority)
+        label = job_label(config)
+        self.append_output(f"[{label}] Queued as job {job_id} (priority {priority}).")
+        self.status_bar.showMessage(f"Queued release {label}.", 5000)
+        self.resume_queue_button.setVisible(False)
+        self.queue_timer.start()
+        self.refresh_queue_status()
+
+
+    @Slot()
+    def resume_queue(self):
+        """Runs the releases queued in an earlier session, with the passwords entered now."""
+        config = self.get_current_config()
+        if not config['db_password'] or not (config['sftp_password'] or config['sftp_key_path']):
+            QMessageBox.warning(self, "Input Needed", "Queued releases do not store passwords.\n"
+                                                      "Please enter the Database and SFTP passwords first.")
+            return
+        if self.run_log is None:
+            self.start_run_log()
+        self.scheduler.set_credentials(config)
+        self.scheduler.start()
+        self.resume_queue_button.setVisible(False)
+        self.queue_timer.start()
+        self.refresh_queue_status()
+
+
+    def show_restored_jobs(self):
+        """Offers to resume releases an earlier session left in the queue."""
+        try:
+            pending = self.scheduler.store.pending_count()
+        except Exception as e: # e.g. an unreadable SQLite file
+            print(f"Warning: Could not read the release queue: {type(e).__name__}: {e}")
+            return
+        if pending:
+            self.queue_status_label.setStyleSheet(self.status_progress_style)
+            self.queue_status_label.setText(f"Release queue: {pending} release(s) queued in an earlier session. "
+                                            f"Enter the passwords and press Resume Queue.")
+            self.resume_queue_button.setVisible(True)
+
+
+    @Slot(str, str)
+    def append_job_output(self, label, text):
+        self.append_output("\n".join(f"[{label}] {line}" for line in text.split("\n")))
+
+
+    @Slot(str, str)
+    def update_job_step(self, label, message):
+        self.status_bar.showMessage(f"[{label}] {message}")
+        self.append_job_output(label, f"==> {message}")
+
+
+    @Slot(str, bool, str)
+    def handle_job_finished(self, label, success, message):
+        self.append_job_output(label, f"==> {'Done' if success else 'Failed'}: {message}")
+        self.status_bar.showMessage(f"[{label}] {message}", 10000)
+        self.refresh_queue_status()
+
+
+    @Slot()
+    def refresh_queue_status(self):
+        """Shows the release queue: running jobs, queue latency and retries per stage."""
+        if self.scheduler.is_idle():
+            self.queue_timer.stop()
+            self.queue_status_label.setStyleSheet(self.status_idle_style)
+            self.queue_status_label.setText(f"Release queue: idle — {self.scheduler.format_metrics()}")
+            if not (self.worker_thread and self.worker_thread.isRunning()):
+                self.cancel_button.setEnabled(False)
+        else:
+            self.queue_status_label.setStyleSheet(self.status_progress_style)
+            self.queue_status_label.setText(f"Release queue: {self.scheduler.format_metrics()}")
+            self.cancel_button.setEnabled(True)
+
+
+    @Slot()
+    def start_matrix_release(self):
+        """Validates input and releases every checked matrix target in parallel."""
+        if self.worker_thread and self.worker_thread.isRunning():
+            QMessageBox.warning(self, "Busy", "Another operation is already in progress.")
+            return
+
+        targets = [text for text, check in self.matrix_target_checks.items() if check.isChecked()]
+        if not targets:
+            QMessageBox.warning(self, "No Targets", "Check at least one Matrix Target first.")
+            return
+
+        base_config = self.get_current_config(include_build_info=True)
+        if not self.confirm_release_notes(base_config):
+            return
+
+        configs = []
+        errors = []
+        for target_text in targets:
+            config = dict(base_config)
+            config.update(target_platform_config(target_text))
+            for error in validate_release_config(config):
+                # Platform problems are listed per target, shared ones (version, connections) once
+                if "Platform" in error or "iOS" in error:
+                    error = f"{target_text}: {error}"
+                if error not in errors:
+                    errors.append(error)
+            configs.append(config)
+        if errors:
+            QMessageBox.critical(self, "Input Error", "\n".join(errors))
+            return
+
+        self.prepare_ui_for_run(f"Starting release matrix for {', '.join(targets)}...")
+        for target_text in targets:
+            target_edit = QPlainTextEdit()
+            target_edit.setReadOnly(True)
+            target_edit.setFont(self.output_font)
+            target_edit.setMaximumBlockCount(LOG_VIEW_MAX_LINES)
+            self.output_tabs.addTab(target_edit, target_text)
+            self.matrix_output_edits[target_text] = target_edit
+
+        # --- Create Worker and Thread ---
+        self.worker_thread = QThread(self)
+        self.build_worker = MatrixDeployWorker(configs, self.matrix_workers_spin.value())
+        self.build_worker.moveToThread(self.worker_thread)
+
+        self.build_worker.target_output.connect(self.append_matrix_output)
+        self.build_worker.target_step.connect(self.update_matrix_step)
+        self.build_worker.target_progress.connect(self.update_matrix_progress)
+        self.build_worker.target_finished.connect(self.handle_matrix_target_finished)
+        self.build_worker.target_event.connect(self.add_matrix_timeline_event)
+        self.build_worker.finished.connect(self.handle_build_finished)
+
+        self.worker_thread.started.connect(self.build_worker.run)
+        self.build_worker.finished.connect(self.worker_thread.quit)
+        self.build_worker.finished.connect(self.build_worker.deleteLater)
+        self.worker_thread.finished.connect(self.worker_thread.deleteLater)
+        self.worker_thread.finished.connect(self._clear_build_worker_ref)
+
+        self.worker_thread.start()
+
+
+    def clear_matrix_tabs(self):
+        """Removes the per-target output tabs of the previous matrix run."""
+        for target_edit in self.matrix_output_edits.values():
+            index = self.output_tabs.indexOf(target_edit)
+            if index >= 0:
+                self.output_tabs.removeTab(index)
+            target_edit.deleteLater()
+        self.matrix_output_edits = {}
+
+
+    def _set_matrix_tab_title(self, target, suffix=""):
+        target_edit = self.matrix_output_edits.get(target)
+        if target_edit is not None:
+            self.output_tabs.setTabText(self.output_tabs.indexOf(target_edit), f"{target}{suffix}")
+
+
+    @Slot(str, str)
+    def append_matrix_output(self, target, text):
+        """Appends a matrix target's output to its tab and, prefixed, to the combined log."""
+        target_edit = self.matrix_output_edits.get(target)
+        if target_edit is not None:
+            target_edit.appendPlainText(text)
+        self.append_output("\n".join(f"[{target}] {line}" for line in text.split("\n")))
+
+
+    @Slot(str, str)
+    def update_matrix_step(self, target, message):
+        self.status_bar.showMessage(f"[{target}] {message}")
+        self.append_matrix_output(target, f"==> {message}")
+
+
+    @Slot(str, int, int)
+    def update_matrix_progress(self, target, transferred, total):
+        if total > 0:
+            self._set_matrix_tab_title(target, f" ({int(transferred * 100 / total)}%)")
+
+
+    @Slot(str, object)
+    def add_matrix_timeline_event(self, target, event):
+        self.timeline_widget.add_event(event, lane=target)
+
+
+    @Slot(str, bool, str)
+    def handle_matrix_target_finished(self, target, success, message):
+        self._set_matrix_tab_title(target, " ✔" if success else " ✘")
+        self.append_matrix_output(target, f"==> {'Done' if success else 'Failed'}: {message}")
+
+
+    @Slot()
+    def _clear_build_worker_ref(self):
+        """Clear build worker references after thread finishes."""
+        print("Build worker thread finished.")
+        self.build_worker = None
+        self.worker_thread = None
+        # Explicitly re-enable cancel button here ONLY if needed,
+        # but handle_build_finished should cover control re-enabling normally.
+        # self.cancel_button.setEnabled(False)
+
+
+    @Slot()
+    def cancel_operation(self):
+        """Requests the running build/deploy worker thread to stop."""
+        if self.worker_thread and self.worker_thread.isRunning() and self.build_worker:
+            self.status_bar.showMessage("Attempting to cancel operation...")
+            self.append_output("\n*** CANCEL REQUESTED BY USER ***\n")
+            self.build_worker.stop() # Call the worker's stop method
+            self.cancel_button.setEnabled(False) # Disable cancel button immediately
+            self.start_button.setText("Cancelling...")
+            # Controls will be re-enabled in handle_build_finished after worker confirms stop
+        elif not self.scheduler.is_idle():
+            self.status_bar.showMessage("Cancelling queued releases...")
+            self.append_output("\n*** QUEUE CANCEL REQUESTED BY USER ***\n")
+            self.scheduler.stop()
+            self.resume_queue_button.setVisible(False)
+        else:
+            self.status_bar.showMessage("No operation running to cancel.", 3000)
+
+
+    def start_run_log(self):
+        """Closes the previous run log and opens a fresh one for the next build."""
+        if self.run_log:
+            self.run_log.close()
+        self._older_log_offset = None
+        try:
+            self.run_log = RunLogFile()
+            self.log_path_label.setText(f"Full log: {self.run_log.path}")
+        except OSError as e:
+            self.run_log = None
+            self.log_path_label.setText(f"Full log: unavailable ({e})")
+
+
+    @Slot()
+    def load_older_output(self):
+        """Prepends the lines preceding the oldest visible line, read from the run log."""
+        if not self.run_log:
+            self.status_bar.showMessage("No run log available yet.", 3000)
+            return
+        # The view may grow by at most LOG_VIEW_MAX_OLDER_LINES, the rest stays in the file
+        room = LOG_VIEW_MAX_LINES + LOG_VIEW_MAX_OLDER_LINES - self.output_edit.maximumBlockCount()
+        if room <= 0:
+            self.status_bar.showMessage(f"Older output limit reached, see {self.run_log.path} for the full log.", 5000)
+            return
+        try:
+            if self._older_log_offset is None:
+                self._older_log_offset = self.run_log.offset_of_last_lines(self.output_edit.blockCount())
+            text, start = self.run_log.read_before(self._older_log_offset, min(LOG_LOAD_OLDER_LINES, room))
+        except (OSError, ValueError) as e:
+            self.status_bar.showMessage(f"Error reading run log: {e}", 5000)
+            return
+        if not text and start == self._older_log_offset:
+            self.status_bar.showMessage("Start of the run log reached.", 3000)
+            return
+        self._older_log_offset = start
+        # Grow the cap by what we insert, otherwise the view would trim it right away
+        line_count = text.count("\n") + 1
+        self.output_edit.setMaximumBlockCount(self.output_edit.maximumBlockCount() + line_count)
+        cursor = QTextCursor(self.output_edit.document())
+        cursor.movePosition(QTextCursor.MoveOperation.Start)
+        cursor.insertText(text + "\n")
+        self.status_bar.showMessage(f"Loaded {line_count} older line(s).", 3000)
+
+
+    @Slot(str)
+    def append_output(self, text):
+        """Appends text to the output area and ensures visibility."""
+        if self.run_log:
+            self.run_log.append(text)
+        self.output_edit.appendPlainText(text)
+        # self.output_edit.ensureCursorVisible() # Scroll to the bottom - can be slow with lots of output
+        # Alternative: move cursor to end without forcing scroll unless at bottom
+        cursor = self.output_edit.textCursor()
+        cursor.movePosition(cursor.MoveOperation.End)
+        self.output_edit.setTextCursor(cursor)
+
+
+    @Slot(str)
+    def update_status_message(self, message):
+        """Updates the status bar message and controls progress bar visibility."""
+        self.status_bar.showMessage(message)
+        # Show progress bar specifically during the Upload step
+        if "Uploading" in message and not self.progress_bar.isVisible():
+             self.progress_bar.setValue(0)
+             self.progress_bar.setFormat("Uploading... %p%")
+             self.progress_bar.setVisible(True)
+        elif "Uploading" not in message and self.progress_bar.isVisible():
+             self.progress_bar.setVisible(False)
+
+
+    @Slot(int, int)
+    def update_progress_bar(self, transferred, total):
+        """Updates the SFTP upload progress bar based on bytes."""
+        if total > 0:
+            percent = int((transferred / total) * 100)
+            self.progress_bar.setValue(percent)
+            # Optionally update format to show bytes/total
+            # self.progress_bar.setFormat(f"Uploading {transferred/1024**2:.1f}/{total/1024**2:.1f} MB... %p%")
+        else:
+             # Indeterminate state if total is 0 (shouldn't happen with SFTP put)
+             self.progress_bar.setRange(0, 0) # Makes it show busy indicator
+             self.progress_bar.setValue(-1)
+
+
+    @Slot(bool, str)
+    def handle_build_finished(self, success, message):
+        """Handles the completion of the build/deploy process."""
+        self.status_bar.showMessage(message, 15000) # Show final message longer
+        self.set_controls_enabled(True) # Re-enable controls
+        self.start_button.setText("🚀 Start Build & Deploy")
+        self.progress_bar.setVisible(False)
+        self.progress_bar.setRange(0, 100) # Reset range
+        self.refresh_metrics() # The run just recorded its metrics
+
+        # Display result dialog
+        if success:
+             QMessageBox.information(self, "Operation Successful", message)
+        else:
+            # Check if it was a cancellation message
+            if "cancel" in message.lower():
+                 QMessageBox.warning(self, "Operation Cancelled", message)
+            else:
+                 QMessageBox.critical(self, "Operation Failed", f"{message}\n\nCheck the Build Output for details.")
+        # Worker/thread refs are cleared by the _clear_build_worker_ref slot connected to thread.finished
+
+    @Slot(str)
+    def update_remote_path_placeholder(self, platform_text):
+        """Updates the SFTP remote path placeholder based on selected platform."""
+        platform_info = TARGET_PLATFORMS.get(platform_text, {})
+        platform_id = platform_info.get('id', 'unknown')
+        if platform_id != 'unknown':
+            self.sftp_remote_path_edit.setPlaceholderText(f"e.g., /var/www/app_updates/{platform_id}")
+        else:
+            self.sftp_remote_path_edit.setPlaceholderText("e.g., /var/www/app_updates/platform")
+
+
+    def set_default_build_platform(self):
+        """Sets the Build Platform combo based on the current OS."""
+        default_platform = default_build_platform()
+        index = self.build_platform_combo.findText(default_platform)
+        if index >= 0:
+            self.build_platform_combo.setCurrentIndex(index)
+        else:
+             # Fallback if current OS name isn't in our list exactly
+             if self.build_platform_combo.count() > 0:
+                 self.build_platform_combo.setCurrentIndex(0)
+
+
+    # --- QSettings Implementation ---
+
+    def save_settings(self):
+        """Save settings using QSettings (excluding passwords)."""
+        try:
+            print("Saving settings...") # Console feedback
+            # Window geometry
+            self.settings.setValue("window/geometry", self.saveGeometry())
+            self.settings.setValue("window/state", self.saveState())
+
+            # Paths
+            self.settings.setValue("paths/project", self.project_path_edit.text())
+            # Save directory containing the project path for 'Browse' starting point
+            proj_path = self.project_path_edit.text()
+            if proj_path and os.path.isdir(os.path.dirname(proj_path)):
+                 self.settings.setValue("paths/last_project_dir", os.path.dirname(proj_path))
+            elif proj_path and os.path.isdir(proj_path):
+                 self.settings.setValue("paths/last_project_dir", proj_path)
+            else:
+                 self.settings.setValue("paths/last_project_dir", os.path.expanduser("~"))
+
+            # Build Platforms - Use correct widget names
+            self.settings.setValue("build/target_platform", self.target_platform_combo.currentText())
+            self.settings.setValue("build/build_platform", self.build_platform_combo.currentText())
+            self.settings.setValue("build/agent", self.build_agent_combo.currentData() or "")
+
+            # DB Settings (NO PASSWORD)
+            self.settings.beginGroup("db")
+            self.settings.setValue("host", self.db_host_edit.text())
+            self.settings.setValue("port", self.db_port_edit.text())
+            self.settings.setValue("name", self.db_name_edit.text())
+            self.settings.setValue("user", self.db_user_edit.text())
+            self.settings.endGroup()
+
+            # SFTP Settings (NO PASSWORD)
+            self.settings.beginGroup("sftp")
+            self.settings.setValue("host", self.sftp_host_edit.text())
+            self.settings.setValue("port", self.sftp_port_edit.text())
+            self.settings.setValue("user", self.sftp_user_edit.text())
+            self.settings.setValue("remote_path", self.sftp_remote_path_edit.text())
+            self.settings.setValue("probe_endpoints", self.probe_endpoints_edit.text())
+            # TODO: Save key path if UI added
+            # self.settings.setValue("key_path", self.sftp_key_path_edit.text())
+            self.settings.endGroup()
+
+            self.settings.sync() # Ensure changes are written
+            self.status_bar.showMessage("Settings saved.", 3000)
+            print("Settings saved successfully.")
+
+        except Exception as e:
+            print(f"Error saving settings: {e}")
+            self.status_bar.showMessage(f"Error saving settings: {e}", 5000)
+
+
+    def load_settings(self):
+        """Load saved settings on startup (excluding passwords)."""
+        try:
+            print("Loading settings...") # Console feedback
+
+            # --- Window Geometry/State ---
+            geometry = self.settings.value("window/geometry")
+            state = self.settings.value("window/state")
+            # Check if loaded values are valid QByteArray before restoring
+            if isinstance(geometry, QByteArray) and not geometry.isNull() and not geometry.isEmpty():
+                 self.restoreGeometry(geometry)
+            if isinstance(state, QByteArray) and not state.isNull() and not state.isEmpty():
+                 self.restoreState(state)
+
+            # --- Paths ---
+            self.project_path_edit.setText(self.settings.value("paths/project", ""))
+            if self.project_path_edit.text(): # If path loaded, try reading pubspec
+                 self.read_pubspec_info(self.project_path_edit.text())
+
+            # --- Load Target Platform ---
+            saved_target = self.settings.value("build/target_platform")
+            if saved_target and self.target_platform_combo.findText(saved_target) >= 0:
+                self.target_platform_combo.setCurrentText(saved_target)
+                print(f"Target platform loaded: {saved_target}")
+            elif self.target_platform_combo.count() > 0:
+                self.target_platform_combo.setCurrentIndex(0) # Default to first item if saved not found
+                print(f"Target platform defaulted to: {self.target_platform_combo.currentText()}")
+            self.update_remote_path_placeholder(self.target_platform_combo.currentText()) # Update placeholder
+
+            # --- Load Build Platform ---
+            saved_build = self.settings.value("build/build_platform")
+            if saved_build and self.build_platform_combo.findText(saved_build) >= 0:
+                 self.build_platform_combo.setCurrentText(saved_build)
+                 print(f"Build platform loaded: {saved_build}")
+            else:
+                 # If not loaded, keep the default set by set_default_build_platform()
+                 print(f"Build platform using default: {self.build_platform_combo.currentText()}")
+            saved_agent = self.settings.value("build/agent", "")
+            if saved_agent and self.build_agent_combo.findData(saved_agent) >= 0:
+                 self.build_agent_combo.setCurrentIndex(self.build_agent_combo.findData(saved_agent))
+
+
+            # --- Load DB Settings (NO PASSWORD) ---
+            self.settings.beginGroup("db")
+            self.db_host_edit.setText(self.settings.value("host",""))
+            self.db_port_edit.setText(self.settings.value("port","5432"))
+            self.db_name_edit.setText(self.settings.value("name",""))
+            self.db_user_edit.setText(self.settings.value("user",""))
+            self.settings.endGroup()
+            self.db_password_edit.clear() # Clear password field
+
+            # --- Load SFTP Settings (NO PASSWORD) ---
+            self.settings.beginGroup("sftp")
+            self.sftp_host_edit.setText(self.settings.value("host",""))
+            self.sftp_port_edit.setText(self.settings.value("port","22"))
+            self.sftp_user_edit.setText(self.settings.value("user",""))
+            self.sftp_remote_path_edit.setText(self.settings.value("remote_path","")) # Correct name
+            self.probe_endpoints_edit.setText(self.settings.value("probe_endpoints", ""))
+            # TODO: Load key path when UI added
+            # self.sftp_key_path_edit.setText(self.settings.value("key_path", ""))
+            self.settings.endGroup()
+            self.sftp_password_edit.clear() # Clear password field
+
+            self.status_bar.showMessage("Settings loaded. Enter passwords if needed.", 3000)
+            print("Settings loaded.")
+
+        except Exception as e:
+            print(f"Error loading settings: {e}")
+            print(traceback.format_exc()) # Log details
+            self.status_bar.showMessage(f"Error loading settings: {e}", 5000)
+            # Attempt to set defaults even on error
+            try:
+                self.set_default_build_platform()
+                if self.target_platform_combo.count() > 0:
+                    self.target_platform_combo.setCurrentIndex(0)
+                self.update_remote_path_placeholder(self.target_platform_combo.currentText())
+            except Exception as e_def:
+                 print(f"Error setting defaults after load error: {e_def}")
+
+    def closeEvent(self, event):
+        """Handle window closing event, save settings first."""
+        # Check if a worker thread is running (either build or test) or a queued release is running
+        queue_busy = bool(self.scheduler.running_jobs())
+        if (self.worker_thread and self.worker_thread.isRunning()) or queue_busy:
+             reply = QMessageBox.question(self, 'Confirm Exit',
+                                         "An operation (build, test, queued release) is currently in progress.\n"
+                                         "Stopping it might leave things in an inconsistent state.\n"
+                                         "Queued releases are kept and can be resumed the next time.\n\n"
+                                         "Do you really want to exit?",
+                                         QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
+                                         QMessageBox.StandardButton.No)
+
+             if reply == QMessageBox.StandardButton.Yes:
+                 print("Attempting to stop worker on exit...")
+                 # Try stopping whichever worker might be active
+                 if self.build_worker:
+                     self.build_worker.stop()
+                 # Save settings even if exiting during operation? Risky.
+                 # Let's save settings *only* if closing normally.
+                 print("Exiting without saving settings due to ongoing operation.")
+                 event.accept() # Allow window to close
+             else:
+                 event.ignore() # Prevent window from closing
+        else:
+             # No worker running, save settings and close normally
+             self.save_settings() # Save settings on normal close
+             event.accept()
+        if event.isAccepted() and self.run_log:
+             self.run_log.close()
+        if event.isAccepted() and self.metrics_thread is not None:
+             self.metrics_thread.wait(5000) # Bounded by the metrics DB timeout
+        if event.isAccepted():
+             self.scheduler.shutdown() # Interrupted jobs stay queued for the next session
+             PROBE_ENGINE.close() # Before the pools its probes use
+             SFTP_POOL.close_all()
+             DB_POOL.close_all()
+
+# =============================================================================
+# Main Application Execution
+# =============================================================================
+
+def run_gui(argv=None):
+    """Starts the Qt application and blocks until the main window is closed."""
+    # Set application details for QSettings BEFORE creating QApplication
+    QApplication.setOrganizationName(ORGANIZATION_NAME)
+    QApplication.setApplicationName(APPLICATION_NAME)
+    # Optional: Set application version if needed elsewhere
+    # QApplication.setApplicationVersion("1.1.0")
+
+    app = QApplication(sys.argv if argv is None else argv)
+
+    window = MainWindow()
+    window.show()
+    return app.exec()
+
+
+if __name__ == "__main__":
+    sys.exit(run_gui())
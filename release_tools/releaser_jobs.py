@@ -0,0 +1,543 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Persistent release queue of the Flutter Build & Deploy Tool.
+
+JobStore keeps queued releases in a local SQLite file, so the queue survives
+a restart of the GUI or CLI. A job remembers the stage it reached (build ->
+upload -> publish), the artifact the build produced and the remote path the
+upload wrote, so a failed upload is retried without building again.
+
+ReleaseScheduler runs one thread per stage. Each stage takes the
+highest-priority job that is due; job N+1 builds while job N uploads. A
+stage that failed for a reason another attempt may not repeat (a dropped
+SFTP connection, an unreachable database or build agent) is retried after
+an exponential backoff, up to JOB_STAGE_RETRIES times. Every stage attempt
+is logged, for per-stage throughput, busy time and queue depth in stats(). Passwords are never
+written to the store: jobs of the current session keep them in memory, jobs
+restored from an earlier session use the credentials the caller provides.
+
+Qt-free and stdlib only; the scheduler gets its ReleaseRunners from a
+factory, see MainWindow and geecodex_releaser.py queue.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import sqlite3
+import threading
+
+JOB_STAGES = ("build", "upload", "publish")
+JOB_STATES = ("queued", "running", "done", "failed", "cancelled")
+# Retries after the first attempt, per stage (build failures are mostly compile errors)
+JOB_STAGE_RETRIES = {'build': 1, 'upload': 5, 'publish': 5}
+JOB_RETRY_BASE_SECONDS = 10 # Doubled per attempt
+JOB_RETRY_MAX_SECONDS = 600
+JOB_POLL_SECONDS = 5 # Idle stages look for due retries and jobs added by other processes
+JOB_HEARTBEAT_SECONDS = 15
+JOB_STALE_SECONDS = 60 # A running job without heartbeat this long was interrupted (crash), it is queued again
+JOB_KEEP_FINISHED = 200
+JOB_STATS_WINDOW = 50 # Most recently started jobs the queue latency is taken over
+JOB_STAGE_STATS_SECONDS = 3600 # Per-stage throughput and busy time are taken over the last hour
+JOB_ATTEMPTS_KEEP_SECONDS = 7 * 24 * 3600
+# Config keys that are never written to the store
+JOB_SECRET_KEYS = ('db_password', 'sftp_password')
+
+_COLUMNS = ("id", "label", "priority", "state", "stage", "project_dir", "target", "config", "artifact_path",
+            "artifact_stamp", "remote_path", "build_attempts", "upload_attempts", "publish_attempts",
+            "next_attempt_at", "heartbeat_at", "enqueued_at", "started_at", "finished_at", "message")
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS release_jobs (
+    id INTEGER PRIMARY KEY,
+    label TEXT NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 0,
+    state TEXT NOT NULL DEFAULT 'queued',
+    stage TEXT NOT NULL DEFAULT 'build',
+    project_dir TEXT,
+    target TEXT,
+    config TEXT NOT NULL,
+    artifact_path TEXT,
+    artifact_stamp TEXT,
+    remote_path TEXT,
+    build_attempts INTEGER NOT NULL DEFAULT 0,
+    upload_attempts INTEGER NOT NULL DEFAULT 0,
+    publish_attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL DEFAULT 0,
+    heartbeat_at REAL,
+    enqueued_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    message TEXT
+);
+CREATE INDEX IF NOT EXISTS release_jobs_due ON release_jobs (state, stage, priority DESC, id);
+-- One row per stage attempt, for throughput and busy time per stage
+CREATE TABLE IF NOT EXISTS release_job_attempts (
+    job_id INTEGER NOT NULL,
+    stage TEXT NOT NULL,
+    started_at REAL NOT NULL,
+    ended_at REAL NOT NULL,
+    success INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS release_job_attempts_ended ON release_job_attempts (ended_at);
+"""
+# Highest-priority due job of a stage. A build waits while an earlier job of the
+# same project and target has not uploaded yet: both write the same artifact.
+_CLAIM_SQL = """
+SELECT id FROM release_jobs AS j
+ WHERE j.state = 'queued' AND j.stage = ? AND j.next_attempt_at <= ?
+   AND (j.stage != 'build' OR NOT EXISTS (
+        SELECT 1 FROM release_jobs AS o
+         WHERE o.id != j.id AND o.project_dir = j.project_dir AND o.target = j.target
+           AND ((o.stage = 'upload' AND o.state IN ('queued', 'running'))
+                OR (o.stage = 'build' AND o.state = 'running'))))
+ ORDER BY j.priority DESC, j.id
+ LIMIT 1
+"""
+
+
+def job_label(config):
+    return f"{config['target_platform_text']} v{config['version_name']}+{config['version_code']}"
+
+
+def split_secrets(config):
+    """(config without passwords, {key: password})."""
+    public = {k: v for k, v in config.items() if k not in JOB_SECRET_KEYS}
+    return public, {k: config[k] for k in JOB_SECRET_KEYS if config.get(k)}
+
+
+def retry_delay(attempt, base=JOB_RETRY_BASE_SECONDS, cap=JOB_RETRY_MAX_SECONDS):
+    """Seconds before the next attempt after attempt failures, with jitter so jobs do not retry in step."""
+    return min(cap, base * 2 ** (attempt - 1)) * random.uniform(0.9, 1.1)
+
+
+def artifact_stamp(path):
+    """[size, mtime_ns] of a file, [files, bytes, newest mtime_ns] of a directory; None if it is gone."""
+    try:
+        if os.path.isdir(path):
+            files = size = newest = 0
+            for root, _, names in os.walk(path):
+                for name in names:
+                    st = os.stat(os.path.join(root, name))
+                    files, size, newest = files + 1, size + st.st_size, max(newest, st.st_mtime_ns)
+            return [files, size, newest]
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_size, st.st_mtime_ns]
+
+
+def format_job_stats(stats):
+    """One line of JobStore.stats(): queue, results, queue latency, retries and per-stage throughput."""
+    counts = stats['counts']
+    latency = (f"avg {stats['latency_avg']:.1f}s, max {stats['latency_max']:.1f}s"
+               if stats['latency_avg'] is not None else "-")
+    retries = ", ".join(f"{stage} {count}" for stage, count in stats['retries'].items())
+    stages = "; ".join(
+        f"{stage} {s['queued']} queued/{s['running']} running, {s['jobs_per_hour']:.1f} jobs/h, "
+        f"busy {s['busy_seconds']:.1f}s ({s['utilization'] * 100:.0f}%), avg {s['avg_seconds']:.1f}s"
+        for stage, s in stats['stages'].items())
+    return (f"{counts['queued']} queued ({stats['retry_wait']} waiting to retry), {counts['running']} running | "
+            f"{counts['done']} done, {counts['failed']} failed, {counts['cancelled']} cancelled | "
+            f"queue latency {latency} | retries: {retries} | last hour: {stages}")
+
+
+def format_job_table(jobs):
+    """Lines describing jobs, e.g. for `geecodex_releaser queue list`."""
+    if not jobs:
+        return ["The release queue is empty."]
+    now = time.time()
+    lines = [f"{'ID':>5}  {'STATE':<9} {'STAGE':<8} {'PRIO':>4}  {'TRIES b/u/p':<11}  {'WAITED':>7}  RELEASE"]
+    for job in jobs:
+        tries = "/".join(str(job[f'{stage}_attempts']) for stage in JOB_STAGES)
+        waited = (job['started_at'] or now) - job['enqueued_at']
+        state = job['state']
+        if state == 'queued' and job['next_attempt_at'] > now:
+            state = f"retry {job['next_attempt_at'] - now:.0f}s"
+        line = f"{job['id']:>5}  {state:<9} {job['stage']:<8} {job['priority']:>4}  {tries:<11}  {waited:>6.0f}s  {job['label']}"
+        if job['message']:
+            line += f" - {job['message']}"
+        lines.append(line)
+    return lines
+
+
+class JobStore:
+    """Release jobs in a local SQLite file, shared by every process of the tool."""
+
+    def __init__(self, sqlite_path):
+        self.sqlite_path = sqlite_path
+
+    def add(self, config, priority=0):
+        """Queues a release (passwords are dropped). Returns the job id."""
+        public, _ = split_secrets(config)
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "INSERT INTO release_jobs (label, priority, project_dir, target, config, enqueued_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (job_label(config), int(priority), config.get('project_dir'), config.get('target_platform_cmd'),
+                 json.dumps(public), time.time()))
+            return cursor.lastrowid
+
+    def claim(self, stage):
+        """Marks the next due job of stage as running and returns it, or None."""
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute("UPDATE release_jobs SET state = 'queued', message = 'Interrupted, resuming.' "
+                         "WHERE state = 'running' AND heartbeat_at < ?", (now - JOB_STALE_SECONDS,))
+            row = conn.execute(_CLAIM_SQL, (stage, now)).fetchone()
+            if row is None:
+                return None
+            conn.execute(f"UPDATE release_jobs SET state = 'running', heartbeat_at = ?, "
+                         f"started_at = COALESCE(started_at, ?), {stage}_attempts = {stage}_attempts + 1 "
+                         f"WHERE id = ?", (now, now, row[0]))
+            return self._job(conn, row[0])
+
+    def heartbeat(self, job_ids):
+        if job_ids:
+            with self._transaction() as conn:
+                conn.executemany("UPDATE release_jobs SET heartbeat_at = ? WHERE id = ? AND state = 'running'",
+                                 [(time.time(), job_id) for job_id in job_ids])
+
+    def advance(self, job_id, stage, **fields):
+        """Queues the job for stage, storing artifact_path/artifact_stamp/remote_path."""
+        if 'artifact_stamp' in fields:
+            fields['artifact_stamp'] = json.dumps(fields['artifact_stamp'])
+        assignments = "".join(f", {name} = :{name}" for name in fields if name in _COLUMNS)
+        with self._transaction() as conn:
+            conn.execute(f"UPDATE release_jobs SET state = 'queued', stage = :stage, next_attempt_at = 0{assignments} "
+                         f"WHERE id = :id", dict(fields, stage=stage, id=job_id))
+
+    def retry(self, job_id, delay, message):
+        with self._transaction() as conn:
+            conn.execute("UPDATE release_jobs SET state = 'queued', next_attempt_at = ?, message = ? WHERE id = ?",
+                         (time.time() + delay, message, job_id))
+
+    def requeue(self, job_id, stage, uncount, message):
+        """Queues an interrupted attempt again; uncount gives the attempt of that stage back."""
+        with self._transaction() as conn:
+            conn.execute(f"UPDATE release_jobs SET state = 'queued', stage = ?, next_attempt_at = 0, message = ?, "
+                         f"{uncount}_attempts = MAX({uncount}_attempts - 1, 0) WHERE id = ?", (stage, message, job_id))
+
+    def record_attempt(self, job_id, stage, started_at, success):
+        """Logs one stage attempt (started_at to now) for stats()."""
+        with self._transaction() as conn:
+            conn.execute("INSERT INTO release_job_attempts (job_id, stage, started_at, ended_at, success) "
+                         "VALUES (?, ?, ?, ?, ?)", (job_id, stage, started_at, time.time(), int(bool(success))))
+
+    def finish(self, job_id, state, message):
+        with self._transaction() as conn:
+            conn.execute("UPDATE release_jobs SET state = ?, finished_at = ?, message = ? WHERE id = ?",
+                         (state, time.time(), message, job_id))
+            conn.execute("DELETE FROM release_job_attempts WHERE ended_at < ?", (time.time() - JOB_ATTEMPTS_KEEP_SECONDS,))
+            conn.execute("DELETE FROM release_jobs WHERE state IN ('done', 'failed', 'cancelled') AND id NOT IN "
+                         "(SELECT id FROM release_jobs WHERE state IN ('done', 'failed', 'cancelled') "
+                         "ORDER BY finished_at DESC LIMIT ?)", (JOB_KEEP_FINISHED,))
+
+    def cancel_queued(self, job_ids=None):
+        """Cancels queued (not running) jobs, all of them by default. Returns the cancelled jobs."""
+        with self._transaction() as conn:
+            query = "SELECT id FROM release_jobs WHERE state = 'queued'"
+            if job_ids is not None:
+                query += f" AND id IN ({', '.join('?' * len(job_ids))})"
+            ids = [row[0] for row in conn.execute(query, tuple(job_ids or ()))]
+            conn.executemany("UPDATE release_jobs SET state = 'cancelled', finished_at = ?, message = ? WHERE id = ?",
+                             [(time.time(), "Cancelled while queued.", job_id) for job_id in ids])
+            return [self._job(conn, job_id) for job_id in ids]
+
+    def next_due(self, stage):
+        """Time (epoch seconds) the next queued job of stage is due, or None."""
+        with self._transaction() as conn:
+            row = conn.execute("SELECT MIN(next_attempt_at) FROM release_jobs WHERE state = 'queued' AND stage = ?",
+                               (stage,)).fetchone()
+        return row[0]
+
+    def jobs(self, unfinished_only=False, limit=50):
+        """Jobs, unfinished ones first by priority, then the most recently finished."""
+        where = "WHERE state IN ('queued', 'running')" if unfinished_only else ""
+        with self._transaction() as conn:
+            ids = [row[0] for row in conn.execute(
+                f"SELECT id FROM release_jobs {where} ORDER BY finished_at IS NOT NULL, "
+                f"CASE WHEN finished_at IS NULL THEN -priority ELSE 0 END, finished_at DESC, id LIMIT ?", (limit,))]
+            return [self._job(conn, job_id) for job_id in ids]
+
+    def pending_count(self):
+        with self._transaction() as conn:
+            return conn.execute("SELECT COUNT(*) FROM release_jobs WHERE state IN ('queued', 'running')").fetchone()[0]
+
+    def stats(self, window=JOB_STAGE_STATS_SECONDS):
+        """Job counts by state, queue latency of recently started jobs and retries per stage.
+
+        'stages' has per stage: jobs queued and running now, and over the last
+        window seconds the completed attempts per hour, busy time (finished
+        attempts, clipped to the window), utilization and average duration.
+        """
+        now = time.time()
+        since = now - window
+        with self._transaction() as conn:
+            by_stage = {(stage, state): count for stage, state, count in conn.execute(
+                "SELECT stage, state, COUNT(*) FROM release_jobs WHERE state IN ('queued', 'running') GROUP BY stage, state")}
+            attempts = {row[0]: row[1:] for row in conn.execute(
+                "SELECT stage, SUM(success), SUM(MIN(ended_at, ?) - MAX(started_at, ?)), "
+                "AVG(CASE WHEN success THEN ended_at - started_at END) "
+                "FROM release_job_attempts WHERE ended_at > ? GROUP BY stage", (now, since, since))}
+            counts = dict(conn.execute("SELECT state, COUNT(*) FROM release_jobs GROUP BY state").fetchall())
+            waiting = conn.execute("SELECT COUNT(*) FROM release_jobs WHERE state = 'queued' AND next_attempt_at > ?",
+                                   (now,)).fetchone()[0]
+            latencies = [row[0] for row in conn.execute(
+                "SELECT started_at - enqueued_at FROM release_jobs WHERE started_at IS NOT NULL "
+                "ORDER BY started_at DESC LIMIT ?", (JOB_STATS_WINDOW,))]
+            retries = conn.execute("SELECT " + ", ".join(f"SUM(MAX({stage}_attempts - 1, 0))" for stage in JOB_STAGES)
+                                   + " FROM release_jobs").fetchone()
+        return {
+            'counts': {state: counts.get(state, 0) for state in JOB_STATES},
+            'retry_wait': waiting,
+            'latency_avg': sum(latencies) / len(latencies) if latencies else None,
+            'latency_max': max(latencies) if latencies else None,
+            'retries': {stage: retries[i] or 0 for i, stage in enumerate(JOB_STAGES)},
+            'stages': {stage: self._stage_stats(by_stage, attempts.get(stage), stage, window) for stage in JOB_STAGES},
+        }
+
+    @staticmethod
+    def _stage_stats(by_stage, attempts, stage, window):
+        completed, busy, avg = attempts or (0, 0.0, None)
+        return {
+            'queued': by_stage.get((stage, 'queued'), 0),
+            'running': by_stage.get((stage, 'running'), 0),
+            'jobs_per_hour': (completed or 0) * 3600.0 / window,
+            'busy_seconds': busy or 0.0,
+            'utilization': (busy or 0.0) / window,
+            'avg_seconds': avg or 0.0,
+        }
+
+    def _transaction(self):
+        os.makedirs(os.path.dirname(self.sqlite_path) or ".", exist_ok=True)
+        # Transactions are explicit; the GUI and CLI may use the queue at the same time
+        conn = sqlite3.connect(self.sqlite_path, timeout=10, isolation_level=None)
+        conn.executescript(_SCHEMA)
+        return _Transaction(conn)
+
+    @staticmethod
+    def _job(conn, job_id):
+        row = conn.execute(f"SELECT {', '.join(_COLUMNS)} FROM release_jobs WHERE id = ?", (job_id,)).fetchone()
+        job = dict(zip(_COLUMNS, row))
+        job['config'] = json.loads(job['config'])
+        job['artifact_stamp'] = json.loads(job['artifact_stamp']) if job['artifact_stamp'] else None
+        return job
+
+
+class _Transaction:
+    """BEGIN IMMEDIATE ... COMMIT (ROLLBACK on errors) around one connection, which is closed afterwards."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        finally:
+            self.conn.close()
+
+
+class ReleaseScheduler:
+    """Runs the jobs of a JobStore, one thread per stage.
+
+    runner_factory(job) returns a ReleaseRunner for job['config'] (passwords
+    included); a job keeps its runner from one stage to the next, a retry or
+    a job restored from an earlier session gets a new one.
+    on_job_finished(job) is called from a stage thread (or from stop()) with
+    job['state'] 'done', 'failed' or 'cancelled' and job['message'].
+    """
+
+    def __init__(self, store, runner_factory, on_job_finished=None, retries=None):
+        self.store = store
+        self.runner_factory = runner_factory
+        self.on_job_finished = on_job_finished or (lambda job: None)
+        self.retries = dict(JOB_STAGE_RETRIES, **(retries or {}))
+        self.credentials = {} # Passwords for jobs queued by an earlier session, see set_credentials
+        self._lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+        self._secrets = {} # job id -> passwords of the jobs queued in this session
+        self._runners = {} # job id -> runner handed from one stage to the next
+        self._active = {stage: None for stage in JOB_STAGES} # (job, runner) each stage is working on
+        self._threads = []
+        self._closed = threading.Event()
+        self._stopping = False # stop(): failures end as cancelled
+
+    def set_credentials(self, config):
+        """Takes the passwords of config for jobs that were queued before this session."""
+        self.credentials = split_secrets(config)[1]
+
+    def submit(self, config, priority=0):
+        """Queues a release and starts the stage threads. Returns the job id."""
+        job_id = self.store.add(config, priority)
+        with self._wake:
+            self._secrets[job_id] = split_secrets(config)[1]
+            self._stopping = False
+            self._wake.notify_all()
+        self.start()
+        return job_id
+
+    def start(self):
+        """Starts the stage threads (idempotent)."""
+        with self._lock:
+            if self._threads:
+                return
+            self._closed.clear()
+            for stage in JOB_STAGES:
+                self._threads.append(threading.Thread(target=self._stage_loop, args=(stage,),
+                                                      name=f"jobs-{stage}", daemon=True))
+            self._threads.append(threading.Thread(target=self._heartbeat_loop, name="jobs-heartbeat", daemon=True))
+            for thread in self._threads:
+                thread.start()
+
+    def stop(self):
+        """Cancels the queued jobs and stops the running ones."""
+        with self._wake:
+            self._stopping = True
+            active = [entry for entry in self._active.values() if entry is not None]
+        for job in self.store.cancel_queued():
+            runner = self._runners.pop(job['id'], None)
+            if runner is not None: # Waiting between two stages
+                runner.close()
+            self._secrets.pop(job['id'], None)
+            self.on_job_finished(job)
+        for _, runner in active:
+            runner.stop()
+
+    def shutdown(self, wait=True):
+        """Ends the stage threads. Running jobs are interrupted and queued again, to resume with the next session."""
+        with self._wake:
+            if not self._threads:
+                return
+            self._closed.set()
+            active = [entry for entry in self._active.values() if entry is not None]
+            self._wake.notify_all()
+        for _, runner in active:
+            runner.stop()
+        if wait:
+            for thread in self._threads:
+                thread.join()
+            for runner in self._runners.values():
+                runner.close()
+            self._runners.clear()
+            self._threads = []
+
+    def running_jobs(self):
+        """{stage: job} of the jobs this scheduler is running right now."""
+        with self._lock:
+            return {stage: entry[0] for stage, entry in self._active.items() if entry is not None}
+
+    def is_idle(self):
+        """True when nothing runs here and no job is queued (including jobs of other processes)."""
+        return not self.running_jobs() and self.store.pending_count() == 0
+
+    def format_metrics(self):
+        """One status line: running jobs, queue, queue latency, retries and throughput per stage."""
+        jobs = self.running_jobs()
+        running = ", ".join(f"{stage} {jobs[stage]['label'] if stage in jobs else '-'}" for stage in JOB_STAGES)
+        return f"{running} | {format_job_stats(self.store.stats())}"
+
+    def _stage_loop(self, stage):
+        while not self._closed.is_set():
+            try:
+                job = self.store.claim(stage)
+                if job is not None:
+                    self._run_stage(stage, job)
+                    continue
+                due = self.store.next_due(stage)
+                timeout = JOB_POLL_SECONDS if due is None else min(JOB_POLL_SECONDS, max(0.05, due - time.time()))
+            except Exception as e:
+                # e.g. the store locked for longer than the timeout. The thread keeps serving the
+                # queue; a job left running without heartbeat is picked up again once it is stale.
+                print(f"Warning: Release queue ({stage} stage): {type(e).__name__}: {e}", file=sys.stderr)
+                timeout = JOB_POLL_SECONDS
+            with self._wake:
+                if not self._closed.is_set():
+                    self._wake.wait(timeout)
+
+    def _heartbeat_loop(self):
+        while not self._closed.wait(JOB_HEARTBEAT_SECONDS):
+            with self._lock:
+                job_ids = [entry[0]['id'] for entry in self._active.values() if entry is not None]
+            try:
+                self.store.heartbeat(job_ids)
+            except sqlite3.Error:
+                pass # The next heartbeat is well within JOB_STALE_SECONDS
+
+    def _run_stage(self, stage, job):
+        job_id = job['id']
+        runner = self._runners.pop(job_id, None)
+        if runner is None:
+            secrets = self._secrets.get(job_id, self.credentials)
+            try:
+                runner = self.runner_factory(dict(job, config=dict(job['config'], **secrets)))
+            except Exception as e: # Would fail the same way on every attempt
+                return self._end(job, 'failed', f"Could not start the release: {type(e).__name__}: {e}")
+        if stage == 'build' and job['build_attempts'] == 1:
+            runner.log.write(f"Started after {job['started_at'] - job['enqueued_at']:.1f}s in the release queue "
+                             f"(priority {job['priority']}).")
+        if stage == 'upload' and artifact_stamp(job['artifact_path']) != job['artifact_stamp']:
+            runner.log.write(f"{job['artifact_path']} changed or is gone since the build, building again.")
+            runner.close()
+            self.store.requeue(job_id, 'build', 'upload', "Artifact changed, building again.")
+            return self._notify()
+
+        with self._lock:
+            self._active[stage] = (job, runner)
+        started_at = time.time()
+        try:
+            if stage == 'build':
+                success, result = runner.build_stage()
+            elif stage == 'upload':
+                success, result = runner.upload_stage(job['artifact_path'])
+            else:
+                success, result = runner.publish_stage(job['remote_path']), None
+        except Exception as e:
+            runner.fail_unexpected(e)
+            success, result = False, None
+        finally:
+            with self._lock:
+                self._active[stage] = None
+        self.store.record_attempt(job_id, stage, started_at, success)
+
+        if success and stage == 'build':
+            self._runners[job_id] = runner
+            self.store.advance(job_id, 'upload', artifact_path=result, artifact_stamp=artifact_stamp(result))
+            return self._notify()
+        if success and stage == 'upload':
+            self._runners[job_id] = runner
+            self.store.advance(job_id, 'publish', remote_path=result)
+            return self._notify()
+        if success:
+            runner.finish_success()
+            runner.close()
+            return self._end(job, 'done', runner.result[1])
+
+        message = runner.result[1]
+        if self._closed.is_set(): # App closing: the attempt does not count, the job resumes next session
+            runner.close()
+            return self.store.requeue(job_id, stage, stage, "Interrupted, resuming.")
+        attempts = job[f'{stage}_attempts']
+        if self._stopping or not runner.retryable or attempts > self.retries[stage]:
+            runner.close()
+            return self._end(job, 'cancelled' if self._stopping else 'failed', message)
+        delay = retry_delay(attempts)
+        runner.log.write(f"Retrying the {stage} stage in {delay:.0f}s (attempt {attempts + 1} of {self.retries[stage] + 1}).")
+        runner.close()
+        self.store.retry(job_id, delay, message)
+        self._notify()
+
+    def _end(self, job, state, message):
+        self.store.finish(job['id'], state, message)
+        self._secrets.pop(job['id'], None)
+        self.on_job_finished(dict(job, state=state, message=message))
+
+    def _notify(self):
+        with self._wake:
+            self._wake.notify_all()
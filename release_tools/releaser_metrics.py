@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Release timing history of the Flutter Build & Deploy Tool.
+
+Every run records build seconds, artifact size, upload throughput, DB
+latency and total wall time in the release_metrics table next to
+app_updates. Each row is first written to a local SQLite file, which takes
+milliseconds, and moved to PostgreSQL by a background thread; when
+PostgreSQL is not configured or not reachable it stays there until a later
+run can reach it. regressions() flags runs that are slower than the rolling median
+of the runs before them.
+
+Qt-free; psycopg is only imported when PostgreSQL is used.
+"""
+
+import os
+import uuid
+import time
+import sqlite3
+import datetime
+import threading
+import statistics
+import concurrent.futures
+
+# Columns of release_metrics written per run, in insert order
+METRIC_FIELDS = ('recorded_at', 'platform', 'target', 'version_name', 'version_code', 'build_platform', 'success',
+                 'build_seconds', 'build_cached', 'artifact_bytes', 'upload_mode', 'upload_bytes', 'upload_seconds',
+                 'upload_mbps', 'db_ms', 'total_seconds')
+
+# Charted metrics: field -> (label, scale, higher is worse)
+CHART_METRICS = {
+    'total_seconds': ("Total wall time (s)", 1.0, True),
+    'build_seconds': ("Build (s)", 1.0, True),
+    'upload_mbps': ("Upload throughput (MB/s)", 1.0, False),
+    'db_ms': ("DB publish (ms)", 1.0, True),
+    'artifact_bytes': ("Artifact size (MB)", 1.0 / (1024 * 1024), True),
+}
+REGRESSION_WINDOW = 5 # Earlier successful runs the median is taken over
+REGRESSION_THRESHOLD = 0.25 # Flag runs 25% worse than that median
+METRICS_DB_TIMEOUT = 3 # Seconds; an offline database must not hold up the run result
+METRICS_HISTORY_LIMIT = 100
+METRICS_CLAIM_SECONDS = 60 # Rows claimed by a flush that never finished are free again after this
+
+_SQLITE_COLUMNS = ", ".join(METRIC_FIELDS)
+
+# One background thread per process moves local rows to PostgreSQL, so
+# finishing a run never waits for the database. Rows it does not get to
+# (offline, process ended) stay in SQLite for the next run.
+_flusher = None
+_flusher_pid = None
+_tables_created = set() # DB_POOL keys release_metrics was created for in this process
+_tables_lock = threading.Lock()
+
+
+def _flusher_executor():
+    global _flusher, _flusher_pid
+    with _tables_lock:
+        if _flusher is None or _flusher_pid != os.getpid(): # A forked matrix worker needs its own thread
+            _flusher = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="metrics-flush")
+            _flusher_pid = os.getpid()
+        return _flusher
+
+
+def metrics_row(config, events, upload=None, db_ms=None, success=False):
+    """The release_metrics row of a run from its BuildEventStream and upload history entry."""
+    upload = upload or {}
+    wire_bytes, upload_seconds = upload.get('wire_bytes'), upload.get('seconds')
+    return {
+        'recorded_at': datetime.datetime.now(datetime.timezone.utc),
+        'platform': config.get('platform', 'unknown'),
+        'target': config.get('target_platform_text'),
+        'version_name': config.get('version_name'),
+        'version_code': config.get('version_code'),
+        'build_platform': config.get('build_platform'),
+        'success': bool(success),
+        'build_seconds': events.stages.get('build'),
+        'build_cached': events.count('cache_hit') > 0,
+        'artifact_bytes': upload.get('artifact_bytes'),
+        'upload_mode': upload.get('mode'),
+        'upload_bytes': wire_bytes,
+        'upload_seconds': upload_seconds,
+        'upload_mbps': round(wire_bytes / (1024 * 1024) / upload_seconds, 3) if wire_bytes and upload_seconds else None,
+        'db_ms': round(db_ms, 3) if db_ms is not None else None,
+        'total_seconds': round(events.elapsed(), 3),
+    }
+
+
+def regressions(rows, field, window=REGRESSION_WINDOW, threshold=REGRESSION_THRESHOLD, higher_is_worse=True):
+    """Indexes of rows whose field is worse than the median of the previous window successful runs.
+
+    Returns [(index, value, median)]; rows are in chronological order.
+    """
+    flagged = []
+    previous = []
+    for index, row in enumerate(rows):
+        value = row.get(field)
+        if value is None or not row.get('success'):
+            continue
+        if len(previous) >= min(3, window): # A median of one or two runs is noise
+            median = statistics.median(previous[-window:])
+            worse = value > median * (1 + threshold) if higher_is_worse else value < median * (1 - threshold)
+            if worse:
+                flagged.append((index, value, median))
+        previous.append(value)
+    return flagged
+
+
+class MetricsStore:
+    """Writes and reads release_metrics, with a local SQLite file as fallback.
+
+    The SQLite file only holds rows that have not reached PostgreSQL yet.
+    """
+
+    def __init__(self, sqlite_path):
+        self.sqlite_path = sqlite_path
+
+    def record(self, config, row):
+        """Stores one run locally and starts moving it to PostgreSQL in the background.
+
+        Returns the Future of the move (see flush()).
+        """
+        self.record_local(row)
+        return self.flush_in_background(config)
+
+    def record_local(self, row):
+        """Writes one run to the local SQLite file; the write lock is held only for the insert."""
+        conn = self._connect_local()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            self._insert_local(conn, row)
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+
+    def flush_in_background(self, config):
+        return _flusher_executor().submit(self.flush, dict(config))
+
+    def flush(self, config):
+        """Moves the local rows to PostgreSQL. Returns where they are, e.g. "PostgreSQL (3 run(s))".
+
+        Rows are claimed in a short SQLite transaction and PostgreSQL is
+        written outside of it, so other processes are never blocked on the
+        database; a claim only keeps them from moving the same rows twice.
+        """
+        conn = self._connect_local()
+        try:
+            token = uuid.uuid4().hex
+            now = time.time()
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("UPDATE release_metrics SET claim = ?, claimed_until = ? "
+                         "WHERE claim IS NULL OR claimed_until < ?", (token, now + METRICS_CLAIM_SECONDS, now))
+            claimed = self._local_rows(conn, token)
+            conn.execute("COMMIT")
+            if not claimed:
+                return "PostgreSQL (nothing pending)"
+            try:
+                self._insert_postgres(config, [row for _, row in claimed])
+            except Exception as e: # Offline, not configured, no psycopg, no CREATE permission, ...
+                conn.execute("UPDATE release_metrics SET claim = NULL, claimed_until = NULL WHERE claim = ?", (token,))
+                reason = str(e).strip().splitlines()[0] if str(e).strip() else "unavailable"
+                return f"local SQLite ({type(e).__name__}: {reason})"
+            conn.execute("DELETE FROM release_metrics WHERE claim = ?", (token,))
+        finally:
+            conn.close()
+        return f"PostgreSQL ({len(claimed)} run(s))"
+
+    def history(self, config, platform, limit=METRICS_HISTORY_LIMIT):
+        """Recent runs of a platform in chronological order. Returns (rows, source)."""
+        conn = self._connect_local()
+        try:
+            local = [row for _, row in self._local_rows(conn) if row['platform'] == platform]
+        finally:
+            conn.close()
+        try:
+            rows = self._select_postgres(config, platform, limit) + local
+            source = "PostgreSQL" + (f" + {len(local)} local run(s)" if local else "")
+        except Exception as e:
+            rows = local
+            source = f"local SQLite ({type(e).__name__})"
+        rows.sort(key=lambda row: row['recorded_at'])
+        return rows[-limit:], source
+
+    # --- PostgreSQL ---
+
+    @staticmethod
+    def _check_config(config):
+        if not all(config.get(k) for k in ('db_host', 'db_port', 'db_name', 'db_user')):
+            raise ValueError("database not configured")
+
+    def _insert_postgres(self, config, rows):
+        self._check_config(config)
+        from releaser_db import DB_POOL, RELEASE_METRICS_DDL, INSERT_METRICS_SQL # Imports psycopg
+        table_key = DB_POOL.pool_key(config)
+        with DB_POOL.connection(config, timeout=METRICS_DB_TIMEOUT) as conn:
+            with _tables_lock:
+                created = table_key in _tables_created
+            if not created:
+                conn.execute(RELEASE_METRICS_DDL)
+                conn.commit()
+                with _tables_lock:
+                    _tables_created.add(table_key)
+            try:
+                with conn.cursor() as cur:
+                    cur.executemany(INSERT_METRICS_SQL, rows)
+            except Exception as e:
+                if getattr(e, 'sqlstate', None) == '42P01': # Table dropped since, create it next time
+                    with _tables_lock:
+                        _tables_created.discard(table_key)
+                raise
+
+    def _select_postgres(self, config, platform, limit):
+        self._check_config(config)
+        from releaser_db import DB_POOL, RECENT_METRICS_SQL
+        with DB_POOL.connection(config, timeout=METRICS_DB_TIMEOUT) as conn:
+            try:
+                rows = conn.execute(RECENT_METRICS_SQL, (platform, limit)).fetchall()
+            except Exception as e:
+                if getattr(e, 'sqlstate', None) == '42P01': # No release_metrics table yet
+                    return []
+                raise
+        return [dict(zip(METRIC_FIELDS, row)) for row in rows]
+
+    # --- Local SQLite ---
+
+    def _connect_local(self):
+        os.makedirs(os.path.dirname(self.sqlite_path), exist_ok=True)
+        # Transactions are explicit; matrix processes may write at the same time
+        conn = sqlite3.connect(self.sqlite_path, timeout=10, isolation_level=None)
+        conn.execute(f"CREATE TABLE IF NOT EXISTS release_metrics (id INTEGER PRIMARY KEY, {_SQLITE_COLUMNS}, "
+                     "claim TEXT, claimed_until REAL)")
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(release_metrics)")}
+        if 'claim' not in columns: # File from before background flushing
+            conn.execute("ALTER TABLE release_metrics ADD COLUMN claim TEXT")
+            conn.execute("ALTER TABLE release_metrics ADD COLUMN claimed_until REAL")
+        return conn
+
+    @staticmethod
+    def _insert_local(conn, row):
+        values = dict(row, recorded_at=row['recorded_at'].isoformat())
+        conn.execute(f"INSERT INTO release_metrics ({_SQLITE_COLUMNS}) VALUES "
+                     f"({', '.join(':' + field for field in METRIC_FIELDS)})", values)
+
+    @staticmethod
+    def _local_rows(conn, claim=None):
+        """[(id, row)] of runs waiting for PostgreSQL, or only those claimed with claim."""
+        rows = []
+        where, params = ("WHERE claim = ?", (claim,)) if claim else ("", ())
+        for row_id, *values in conn.execute(f"SELECT id, {_SQLITE_COLUMNS} FROM release_metrics {where} ORDER BY id", params):
+            row = dict(zip(METRIC_FIELDS, values))
+            row['recorded_at'] = datetime.datetime.fromisoformat(row['recorded_at'])
+            row['success'] = bool(row['success'])
+            row['build_cached'] = bool(row['build_cached'])
+            rows.append((row_id, row))
+        return rows
@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Connection probes of the Flutter Build & Deploy Tool.
+
+ProbeEngine runs one asyncio event loop on a background thread. Every probe
+(the PostgreSQL database, the SFTP server and its upload directory, and any
+extra deploy endpoints such as "cdn.example.com:443" or an http(s) URL) is
+a task on that loop with its own timeout, so probes run concurrently and
+one slow server does not hold up the others. Database and SFTP probes go
+through DB_POOL and SFTP_POOL on executor threads, so their sessions stay
+warm for the following release.
+
+Successful results are kept in PROBE_CACHE for PROBE_CACHE_TTL seconds; a
+release started right after a test skips the pre-flight checks a probe
+just did: the SFTP login and upload directory stat, and the database
+round trip with its app_updates schema check.
+
+Qt-free; paramiko and psycopg are only imported by the probes that need them.
+"""
+
+import sys
+import time
+import asyncio
+import hashlib
+import threading
+import collections
+import urllib.error
+import urllib.request
+
+# Seconds a successful probe result stays valid for the next release
+PROBE_CACHE_TTL = 60
+# Seconds per probe, by kind
+PROBE_TIMEOUTS = {'db': 5, 'sftp': 10, 'endpoint': 5}
+
+# name: 'db', 'sftp' or 'endpoint:<host:port or URL>'; seconds: time the probe took (0 if cached);
+# warning: succeeded with a caveat (e.g. upload directory missing), such results are not cached
+ProbeResult = collections.namedtuple('ProbeResult', 'name success message seconds cached warning', defaults=(False,))
+
+
+def probe_names(config):
+    """Names of all probes a config asks for: db, sftp and its extra endpoints."""
+    return ['db', 'sftp'] + [f"endpoint:{target}" for target in config.get('probe_endpoints') or ()]
+
+
+def probe_key(name, config):
+    """Cache key of a probe: what it connected to, with passwords only as digests."""
+    digest = lambda value: hashlib.sha256((value or '').encode('utf-8')).hexdigest()
+    if name == 'db':
+        return ('db', config['db_host'], str(config['db_port']), config['db_name'], config['db_user'],
+                digest(config.get('db_password')))
+    if name == 'sftp':
+        return ('sftp', config['sftp_host'], str(config['sftp_port']), config['sftp_user'],
+                digest(config.get('sftp_password')), config.get('sftp_key_path') or '',
+                config.get('sftp_remote_path', '').replace("\\", "/"))
+    return (name,)
+
+
+class ProbeCache:
+    """Successful probe results by probe key, valid for ttl seconds."""
+
+    def __init__(self, ttl=PROBE_CACHE_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._results = {} # key -> (monotonic time, ProbeResult)
+
+    def put(self, key, result):
+        with self._lock:
+            self._results[key] = (time.monotonic(), result)
+
+    def get(self, key):
+        """(age in seconds, ProbeResult) of a fresh success, or None."""
+        with self._lock:
+            cached = self._results.get(key)
+            if cached is None:
+                return None
+            age = time.monotonic() - cached[0]
+            if age > self.ttl:
+                del self._results[key]
+                return None
+        return age, cached[1]
+
+    def fresh(self, name, config):
+        """Seconds since the probe succeeded for this config, or None if there is no fresh success."""
+        try:
+            cached = self.get(probe_key(name, config))
+        except KeyError: # Config without the fields of this probe
+            return None
+        return cached[0] if cached else None
+
+    def invalidate(self, name, config):
+        with self._lock:
+            self._results.pop(probe_key(name, config), None)
+
+    def clear(self):
+        with self._lock:
+            self._results.clear()
+
+
+# =============================================================================
+# Probes (blocking parts run on the loop's executor threads)
+# =============================================================================
+
+def _check_db(config, timeout):
+    """(success, message, warning) of a PostgreSQL round trip through DB_POOL, including the app_updates schema."""
+    required = ['db_host', 'db_port', 'db_name', 'db_user', 'db_password']
+    if not all(config.get(k) for k in required):
+        return False, "Config Error: Missing one or more PostgreSQL connection details."
+    import psycopg
+    from releaser_db import DB_POOL, check_release_schema
+    try:
+        # The session stays in the pool, so a following deploy skips connect + auth
+        with DB_POOL.connection(config, timeout=timeout) as conn:
+            problems = check_release_schema(conn) # Same check as the release pre-flight, which a cached success skips
+    except psycopg.OperationalError as e:
+        msg = f"DB Error: {e}"
+        if "password authentication failed" in str(e):
+            msg = "DB Error: Password authentication failed."
+        elif "database" in str(e) and "does not exist" in str(e):
+            msg = "DB Error: Database does not exist."
+        elif "connection refused" in str(e).lower():
+            msg = "DB Error: Connection refused (check host/port/firewall)."
+        return False, msg
+    except Exception as e:
+        return False, f"DB Unexpected Error: {type(e).__name__}: {e}"
+    median_ms, _, _ = DB_POOL.latency_ms()
+    if problems: # Connected, but publishing would fail
+        return True, f"Database connection successful, but {'; '.join(problems)}.", True
+    return True, f"Database connection successful! (median checkout {median_ms:.1f} ms)", False
+
+
+def _check_sftp(config, timeout):
+    """(success, message, warning) of an SFTP login through SFTP_POOL, including the upload directory."""
+    if not all(config.get(k) for k in ('sftp_host', 'sftp_port', 'sftp_user')):
+        return False, "Config Error: Missing SFTP host, port, or user."
+    import paramiko
+    from releaser_sftp import SFTP_POOL
+    remote_dir = config.get('sftp_remote_path', '').replace("\\", "/")
+    connected = False
+    try:
+        # The connection stays in the pool, so a following deploy skips the handshake
+        with SFTP_POOL.checkout(config, timeout=timeout) as lease:
+            connected = True
+            if remote_dir:
+                lease.sftp.stat(remote_dir) # What the upload would check first
+            else:
+                lease.sftp.listdir('.')
+    except paramiko.AuthenticationException:
+        return False, "SFTP Error: Authentication failed (check user/pass/key)."
+    except paramiko.SSHException as e:
+        return False, f"SFTP SSH Error: {e}"
+    except FileNotFoundError:
+        if connected: # Logged in; the upload directory is missing, but a release creates it
+            how = "reused warm connection" if lease.reused else f"connected in {lease.handshake_seconds:.2f}s"
+            return True, (f"SFTP connection successful! ({how}). Warning: remote directory {remote_dir} "
+                          f"does not exist yet, a release creates it."), True
+        return False, "SFTP Error: Private key file not found at specified path."
+    except Exception as e:
+        return False, f"SFTP Unexpected Error: {type(e).__name__}: {e}"
+    how = "reused warm connection" if lease.reused else f"connected in {lease.handshake_seconds:.2f}s"
+    checked = f", {remote_dir} found" if remote_dir else ""
+    return True, f"SFTP connection successful! ({how}{checked})", False
+
+
+def _check_url(url, timeout):
+    request = urllib.request.Request(url, method='HEAD', headers={'User-Agent': 'geecodex-releaser'})
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            status = response.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    if status >= 500:
+        return False, f"HTTP {status}"
+    return True, f"HTTP {status}"
+
+
+async def _probe_endpoint(target, timeout):
+    """An http(s) URL gets a HEAD request, host:port a TCP connect."""
+    if target.startswith(('http://', 'https://')):
+        return await asyncio.to_thread(_check_url, target, timeout)
+    host, _, port = target.rpartition(':')
+    if not host or not port.isdigit():
+        return False, "Config Error: Expected host:port or an http(s) URL."
+    _, writer = await asyncio.open_connection(host.strip('[]'), int(port))
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except OSError:
+        pass
+    return True, "Reachable"
+
+
+# =============================================================================
+# Engine
+# =============================================================================
+
+class ProbeEngine:
+    """Runs probes concurrently on one background asyncio loop.
+
+    probe() returns at once; on_result(ProbeResult) is called from the loop
+    thread as each probe finishes. A probe that is already running for the
+    same key is joined instead of started twice.
+    """
+
+    def __init__(self, cache=None):
+        self.cache = cache if cache is not None else PROBE_CACHE
+        self._lock = threading.Lock()
+        self._loop = None
+        self._thread = None
+        self._running = {} # probe key -> asyncio.Task (only touched on the loop)
+
+    def probe(self, config, names=None, on_result=None, use_cache=True):
+        """Starts the named probes (default: probe_names(config)). Returns a concurrent Future of [ProbeResult]."""
+        names = probe_names(config) if names is None else list(names)
+        return asyncio.run_coroutine_threadsafe(
+            self._probe_all(dict(config), names, on_result or (lambda result: None), use_cache), self._ensure_loop())
+
+    def close(self):
+        with self._lock:
+            loop, thread = self._loop, self._thread
+            self._loop = self._thread = None
+        if loop is not None:
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join(timeout=2)
+
+    def _ensure_loop(self):
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever, name="connection-probes", daemon=True)
+                self._thread.start()
+            return self._loop
+
+    async def _probe_all(self, config, names, on_result, use_cache):
+        return await asyncio.gather(*(self._probe_one(config, name, on_result, use_cache) for name in names))
+
+    async def _probe_one(self, config, name, on_result, use_cache):
+        try:
+            key = probe_key(name, config)
+        except KeyError as e:
+            result = ProbeResult(name, False, f"Config Error: Missing {e.args[0]}.", 0.0, False)
+        else:
+            cached = self.cache.get(key) if use_cache else None
+            if cached is not None:
+                result = cached[1]._replace(seconds=0.0, cached=True)
+            else:
+                task = self._running.get(key)
+                if task is None:
+                    task = asyncio.ensure_future(self._run_probe(config, name, key))
+                    self._running[key] = task
+                    task.add_done_callback(lambda _, key=key: self._running.pop(key, None))
+                result = await asyncio.shield(task)
+        try:
+            on_result(result)
+        except Exception as e: # A broken callback must not take the other probes down
+            print(f"Warning: Probe result callback failed: {type(e).__name__}: {e}", file=sys.stderr)
+        return result
+
+    async def _run_probe(self, config, name, key):
+        kind = name.split(':', 1)[0]
+        timeout = PROBE_TIMEOUTS.get(kind, PROBE_TIMEOUTS['endpoint'])
+        start = time.perf_counter()
+        warning = False
+        try:
+            if kind == 'db':
+                check = asyncio.to_thread(_check_db, config, timeout)
+            elif kind == 'sftp':
+                check = asyncio.to_thread(_check_sftp, config, timeout)
+            else:
+                check = _probe_endpoint(name.split(':', 1)[1], timeout)
+            # The blocking checks have their own timeouts; this bounds the wait for a hung server
+            success, message, *warning = await asyncio.wait_for(check, timeout + 1)
+            warning = bool(warning and warning[0])
+        except asyncio.TimeoutError:
+            success, message = False, f"Timed out after {timeout}s."
+        except OSError as e: # Refused, unresolvable host, ...
+            success, message = False, f"Unreachable: {e.strerror or e}"
+        except Exception as e:
+            success, message = False, f"Unexpected Error: {type(e).__name__}: {e}"
+        result = ProbeResult(name, success, message, time.perf_counter() - start, False, warning)
+        if success and not warning: # A cached success lets the next release skip its pre-flight check
+            self.cache.put(key, result)
+        elif warning:
+            self.cache.invalidate(name, config)
+        return result
+
+
+# Process-wide cache and engine shared by connection tests and releases
+PROBE_CACHE = ProbeCache()
+PROBE_ENGINE = ProbeEngine(PROBE_CACHE)
@@ -0,0 +1,535 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+SFTP helpers of the Flutter Build & Deploy Tool.
+
+SftpConnectionPool keeps authenticated SSH transports alive between
+operations, so "Test SFTP" clicks and repeated deploys in the same process
+skip the TCP + SSH handshake and the private key parsing. ParallelUploader
+writes one file over several SFTP channels and resumes interrupted uploads.
+Qt-free; imported lazily by releaser_core so the headless startup path does
+not pay for paramiko.
+
+Dependencies: paramiko
+"""
+
+import os
+import time
+import threading
+import contextlib
+import hashlib # Passwords are only kept as digests inside pool keys
+import json # Upload resume manifests
+import queue
+
+import paramiko
+
+# Keepalive interval for pooled transports (seconds)
+SFTP_KEEPALIVE_SECONDS = 30
+# Pooled transports unused for longer than this are closed on the next checkout
+SFTP_POOL_IDLE_SECONDS = 600
+
+# Parallel uploads: concurrent SFTP channels and the size of the ranges they write
+SFTP_UPLOAD_CHANNELS = 4
+SFTP_UPLOAD_CHUNK_BYTES = 8 * 1024 * 1024
+# Bytes per write call inside a range; progress is reported at this granularity
+SFTP_UPLOAD_BLOCK_BYTES = 1024 * 1024
+# How often one range is retried on a fresh connection before the upload fails
+SFTP_UPLOAD_RETRIES = 2
+
+# Remote sidecar holding "<sha256>  <file name>" (sha256sum format) next to each upload
+REMOTE_DIGEST_SUFFIX = ".sha256"
+
+# Key classes tried in order when loading a private key file (DSSKey is gone in paramiko >= 4)
+PRIVATE_KEY_TYPES = [getattr(paramiko, name) for name in ('RSAKey', 'Ed25519Key', 'ECDSAKey', 'DSSKey')
+                     if hasattr(paramiko, name)]
+
+
+def load_private_key(key_path):
+    """Loads a private key file, trying every supported key type."""
+    # TODO: Add passphrase handling if key is encrypted
+    last_exception = None
+    for key_type in PRIVATE_KEY_TYPES:
+        try:
+            return key_type.from_private_key_file(key_path)
+        except paramiko.SSHException as e:
+            last_exception = e # Store last error in case none work
+        except Exception as e_gen: # Catch generic load errors too (e.g. FileNotFoundError)
+            last_exception = e_gen
+    if last_exception:
+        raise last_exception # Raise the last SSHException or file load error
+    raise paramiko.SSHException("Could not load private key (unknown issue).")
+
+
+class _PooledConnection:
+    def __init__(self, client, handshake_seconds):
+        self.client = client
+        self.handshake_seconds = handshake_seconds
+        self.last_used = time.monotonic()
+        self.in_use = 0 # Open leases; idle eviction skips connections in use
+
+    def is_alive(self):
+        transport = self.client.get_transport()
+        return transport is not None and transport.is_active()
+
+
+class SftpLease:
+    """An SFTP channel checked out from SftpConnectionPool.checkout()."""
+
+    def __init__(self, sftp, reused, handshake_seconds):
+        self.sftp = sftp
+        self.reused = reused # True if an already connected transport was used
+        self.handshake_seconds = handshake_seconds # What connecting took (or would have taken)
+
+
+class SftpConnectionPool:
+    """Warm SSH connections keyed by (host, port, user, auth), handing out SFTP channels.
+
+    Every checkout opens a fresh SFTP channel on the pooled transport; the
+    channel is closed when the lease ends and the transport stays connected
+    (with keepalives) for the next operation. Several leases on the same
+    connection can be used from different threads at once. Loaded private
+    keys are cached by path and mtime.
+    """
+
+    def __init__(self, keepalive_seconds=SFTP_KEEPALIVE_SECONDS, idle_seconds=SFTP_POOL_IDLE_SECONDS):
+        self.keepalive_seconds = keepalive_seconds
+        self.idle_seconds = idle_seconds
+        self._lock = threading.Lock()
+        self._connections = {} # pool key -> _PooledConnection
+        self._connect_locks = {} # pool key -> Lock, so one key is only connected once at a time
+        self._keys = {} # (key_path, mtime_ns) -> loaded key object
+        # Stats
+        self.handshakes = 0
+        self.reuses = 0
+        self.saved_seconds = 0.0 # Handshake time skipped thanks to reuse
+
+    @staticmethod
+    def pool_key(config):
+        """(host, port, user, auth) identifying a reusable connection for config."""
+        if config.get('sftp_key_path'):
+            auth = ('key', os.path.abspath(config['sftp_key_path']))
+        elif config.get('sftp_password'):
+            auth = ('password', hashlib.sha256(config['sftp_password'].encode('utf-8')).hexdigest())
+        else:
+            auth = ('none',)
+        return (config['sftp_host'], int(config['sftp_port']), config['sftp_user'], auth)
+
+    @contextlib.contextmanager
+    def checkout(self, config, timeout=20):
+        """Context manager yielding an SftpLease for config."""
+        connection, lease = self._open(config, timeout)
+        try:
+            yield lease
+        finally:
+            try:
+                lease.sftp.close()
+            finally:
+                with self._lock:
+                    connection.in_use -= 1
+                    connection.last_used = time.monotonic()
+
+    def _open(self, config, timeout, open_sftp=True):
+        key = self.pool_key(config)
+        with self._lock:
+            self._evict_idle()
+            connect_lock = self._connect_locks.setdefault(key, threading.Lock())
+        with connect_lock:
+            with self._lock:
+                connection = self._connections.get(key)
+                reused = connection is not None and connection.is_alive()
+                if connection is not None and not reused:
+                    self._discard(key)
+            if not reused:
+                connection = self._connect(config, key, timeout)
+            try:
+                sftp = connection.client.open_sftp() if open_sftp else None
+            except (paramiko.SSHException, EOFError, OSError):
+                if not reused:
+                    raise
+                # The server dropped the pooled transport, connect once more
+                with self._lock:
+                    self._discard(key)
+                connection = self._connect(config, key, timeout)
+                reused = False
+                sftp = connection.client.open_sftp()
+        with self._lock:
+            connection.in_use += 1
+            connection.last_used = time.monotonic()
+            if reused:
+                self.reuses += 1
+                self.saved_seconds += connection.handshake_seconds
+        return connection, SftpLease(sftp, reused, connection.handshake_seconds)
+
+    def exec_command(self, config, command, stdin_text=None, timeout=120):
+        """Runs command on the pooled connection. Returns (exit_status, stdout, stderr)."""
+        connection, _ = self._open(config, timeout, open_sftp=False)
+        try:
+            stdin, stdout, stderr = connection.client.exec_command(command, timeout=timeout)
+            if stdin_text is not None:
+                stdin.write(stdin_text)
+            stdin.channel.shutdown_write()
+            out = stdout.read().decode('utf-8', 'replace')
+            err = stderr.read().decode('utf-8', 'replace')
+            return stdout.channel.recv_exit_status(), out, err
+        finally:
+            with self._lock:
+                connection.in_use -= 1
+                connection.last_used = time.monotonic()
+
+    @contextlib.contextmanager
+    def session(self, config, timeout=20):
+        """Context manager yielding a new session channel on the pooled connection, for long-running commands."""
+        connection, _ = self._open(config, timeout, open_sftp=False)
+        channel = None
+        try:
+            channel = connection.client.get_transport().open_session(timeout=timeout)
+            yield channel
+        finally:
+            try:
+                if channel is not None:
+                    channel.close()
+            finally:
+                with self._lock:
+                    connection.in_use -= 1
+                    connection.last_used = time.monotonic()
+
+    def discard(self, config):
+        """Closes the pooled connection for config, e.g. after a transfer error."""
+        key = self.pool_key(config)
+        with self._lock:
+            self._discard(key)
+
+    def discard_if_dead(self, config):
+        """Closes the pooled connection for config only if its transport is gone.
+
+        Use this after an error on one channel: other leases may still be busy
+        on the same transport, and a live transport just needs a new channel.
+        """
+        key = self.pool_key(config)
+        with self._lock:
+            connection = self._connections.get(key)
+            if connection is None or connection.is_alive():
+                return False
+            self._discard(key)
+            return True
+
+    def close_all(self):
+        with self._lock:
+            for key in list(self._connections):
+                self._discard(key)
+
+    def stats_line(self):
+        return (f"SFTP pool: {self.handshakes} handshake(s), {self.reuses} reuse(s), "
+                f"~{self.saved_seconds:.2f}s of handshakes saved.")
+
+    def _connect(self, config, key, timeout):
+        client = paramiko.SSHClient()
+        client.set_missing_host_key_policy(paramiko.AutoAddPolicy()) # Consider WarningPolicy for security
+        connect_args = dict(hostname=config['sftp_host'], port=int(config['sftp_port']),
+                            username=config['sftp_user'], timeout=timeout)
+        if config.get('sftp_key_path'):
+            connect_args['pkey'] = self._private_key(config['sftp_key_path'])
+        elif config.get('sftp_password'):
+            connect_args['password'] = config['sftp_password']
+        start = time.perf_counter()
+        try:
+            client.connect(**connect_args)
+        except Exception:
+            client.close()
+            raise
+        handshake_seconds = time.perf_counter() - start
+        client.get_transport().set_keepalive(self.keepalive_seconds)
+        connection = _PooledConnection(client, handshake_seconds)
+        with self._lock:
+            self._connections[key] = connection
+            self.handshakes += 1
+        return connection
+
+    def _private_key(self, key_path):
+        cache_key = (os.path.abspath(key_path), os.stat(key_path).st_mtime_ns)
+        with self._lock:
+            private_key = self._keys.get(cache_key)
+        if private_key is None:
+            private_key = load_private_key(key_path)
+            with self._lock:
+                self._keys[cache_key] = private_key
+        return private_key
+
+    def _discard(self, key):
+        connection = self._connections.pop(key, None)
+        if connection is not None:
+            connection.client.close()
+
+    def _evict_idle(self):
+        now = time.monotonic()
+        for key, connection in list(self._connections.items()):
+            if connection.in_use:
+                continue
+            if now - connection.last_used > self.idle_seconds or not connection.is_alive():
+                self._discard(key)
+
+
+# Process-wide pool shared by connection tests and uploads
+SFTP_POOL = SftpConnectionPool()
+
+
+# =============================================================================
+# Remote Digests
+# =============================================================================
+
+def read_remote_digest(sftp, remote_path):
+    """sha256 recorded next to remote_path, or None if there is no readable sidecar."""
+    try:
+        with sftp.open(remote_path + REMOTE_DIGEST_SUFFIX, 'r') as f:
+            fields = f.read(1024).decode('ascii', 'replace').split()
+    except IOError:
+        return None
+    return fields[0].lower() if fields else None
+
+
+def write_remote_digest(sftp, remote_path, digest):
+    """Writes the sidecar for remote_path, or removes it when digest is None."""
+    sidecar_path = remote_path + REMOTE_DIGEST_SUFFIX
+    if digest is None:
+        try:
+            sftp.remove(sidecar_path)
+        except FileNotFoundError:
+            pass
+        return
+    with sftp.open(sidecar_path, 'w') as f:
+        f.write(f"{digest}  {remote_path.rsplit('/', 1)[-1]}\n".encode('ascii'))
+
+def replace_remote_file(sftp, temp_path, remote_path):
+    """Moves temp_path over remote_path, atomically where the server supports it."""
+    try:
+        sftp.posix_rename(temp_path, remote_path) # posix-rename@openssh.com
+    except IOError:
+        # Server without the extension: plain rename refuses to overwrite
+        try:
+            sftp.remove(remote_path)
+        except FileNotFoundError:
+            pass
+        sftp.rename(temp_path, remote_path)
+
+# =============================================================================
+# Parallel Upload
+# =============================================================================
+
+class ParallelUploader:
+    """Uploads one file as fixed-size ranges over several SFTP channels.
+
+    Ranges are written with offset writes into "<remote_path>.part", which is
+    renamed over remote_path once every range is there. With a manifest_dir,
+    completed ranges are recorded in a local JSON manifest, so an upload that
+    was cancelled or lost its connection continues with the missing ranges the
+    next time the same file is uploaded to the same path. A range that fails
+    is retried on a fresh SFTP channel (and a fresh connection if the
+    transport itself dropped) before the whole upload gives up.
+
+    progress(transferred, total) is called from the channel threads, one call
+    at a time; an exception raised by it cancels the upload and is re-raised
+    by upload().
+    """
+
+    def __init__(self, pool, config, channels=SFTP_UPLOAD_CHANNELS, chunk_bytes=SFTP_UPLOAD_CHUNK_BYTES,
+                 manifest_dir=None, progress=None, retries=SFTP_UPLOAD_RETRIES):
+        self.pool = pool
+        self.config = config
+        self.channels = max(1, int(channels))
+        self.chunk_bytes = max(SFTP_UPLOAD_BLOCK_BYTES, int(chunk_bytes))
+        self.manifest_dir = manifest_dir
+        self.progress = progress
+        self.retries = retries
+        self._lock = threading.Lock()
+        self._abort = threading.Event()
+        self._transferred = 0
+        self._total = 0
+        self._retried = 0
+
+    def upload(self, local_path, remote_path):
+        """Uploads local_path to remote_path. Returns a dict of transfer stats."""
+        stat = os.stat(local_path)
+        size = stat.st_size
+        chunk_count = max(1, -(-size // self.chunk_bytes))
+        temp_path = remote_path + ".part"
+        manifest_path = self._manifest_path(local_path, remote_path)
+        manifest = {
+            'local_path': os.path.abspath(local_path), 'size': size, 'mtime_ns': stat.st_mtime_ns,
+            'remote_path': remote_path, 'chunk_bytes': self.chunk_bytes, 'done': [],
+        }
+
+        with self.pool.checkout(self.config) as lease:
+            previous = self._load_manifest(manifest_path)
+            if previous and all(previous.get(k) == manifest[k] for k in ('local_path', 'size', 'mtime_ns', 'remote_path', 'chunk_bytes')):
+                try:
+                    lease.sftp.stat(temp_path)
+                    manifest['done'] = sorted(set(previous['done']))
+                except FileNotFoundError:
+                    pass # The partial file is gone, start over
+            if not manifest['done']:
+                with lease.sftp.open(temp_path, 'wb'):
+                    pass
+                lease.sftp.truncate(temp_path, size)
+            self._save_manifest(manifest_path, manifest)
+
+        done = set(manifest['done'])
+        pending = queue.Queue()
+        for index in range(chunk_count):
+            if index not in done:
+                pending.put(index)
+        resumed_bytes = sum(self._chunk_range(index, size)[1] for index in done)
+        self._transferred = resumed_bytes
+        self._total = size
+        self._retried = 0
+        self._abort.clear()
+
+        start = time.perf_counter()
+        errors = []
+        threads = [threading.Thread(target=self._channel_loop, name=f"sftp-upload-{i}",
+                                    args=(local_path, temp_path, size, pending, manifest, manifest_path, errors))
+                   for i in range(min(self.channels, pending.qsize()))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if errors:
+            raise errors[0]
+
+        with self.pool.checkout(self.config) as lease:
+            remote_size = lease.sftp.stat(temp_path).st_size
+            if remote_size != size:
+                raise IOError(f"Remote size mismatch for {temp_path}: {remote_size} != {size} bytes")
+            replace_remote_file(lease.sftp, temp_path, remote_path)
+        if manifest_path and os.path.exists(manifest_path):
+            os.remove(manifest_path)
+        return {
+            'bytes': size, 'resumed_bytes': resumed_bytes, 'seconds': time.perf_counter() - start,
+            'channels': len(threads), 'chunks': chunk_count, 'retries': self._retried,
+        }
+
+    def _channel_loop(self, local_path, temp_path, size, pending, manifest, manifest_path, errors):
+        index = None
+        attempts = 0
+        try:
+            with open(local_path, 'rb') as local_file:
+                while not self._abort.is_set():
+                    if index is None:
+                        try:
+                            index = pending.get_nowait()
+                        except queue.Empty:
+                            return
+                        attempts = 0
+                    sent = 0
+                    try:
+                        with self.pool.checkout(self.config) as lease:
+                            while index is not None and not self._abort.is_set():
+                                sent = 0
+                                offset, length = self._chunk_range(index, size)
+                                local_file.seek(offset)
+                                # Closing the file waits for every pipelined write to be acknowledged
+                                with lease.sftp.open(temp_path, 'r+b') as remote_file:
+                                    remote_file.set_pipelined(True)
+                                    remote_file.seek(offset)
+                                    while sent < length and not self._abort.is_set():
+                                        block = local_file.read(min(SFTP_UPLOAD_BLOCK_BYTES, length - sent))
+                                        if not block:
+                                            raise ValueError(f"{local_path} changed size during the upload")
+                                        remote_file.write(block)
+                                        sent += len(block)
+                                        self._advance(len(block))
+                                if sent < length:
+                                    return # Aborted by another channel
+                                self._mark_done(index, manifest, manifest_path)
+                                sent = 0
+                                try:
+                                    index = pending.get_nowait()
+                                except queue.Empty:
+                                    index = None
+                                attempts = 0
+                    except (paramiko.SSHException, EOFError, OSError):
+                        self._advance(-sent) # The range is sent again from its start
+                        attempts += 1
+                        if attempts > self.retries:
+                            raise
+                        with self._lock:
+                            self._retried += 1
+                        # The next checkout opens a new channel; the shared transport is only
+                        # reconnected if it died, so the other channels keep going
+                        self.pool.discard_if_dead(self.config)
+                    if index is None:
+                        return
+        except Exception as e:
+            self._abort.set()
+            with self._lock:
+                errors.append(e)
+
+    def _advance(self, count):
+        with self._lock:
+            self._transferred += count
+            if self.progress and count > 0:
+                self.progress(self._transferred, self._total)
+
+    def _chunk_range(self, index, size):
+        offset = index * self.chunk_bytes
+        return offset, min(self.chunk_bytes, size - offset)
+
+    def _mark_done(self, index, manifest, manifest_path):
+        with self._lock:
+            manifest['done'].append(index)
+            self._save_manifest(manifest_path, manifest)
+
+    def _manifest_path(self, local_path, remote_path):
+        if not self.manifest_dir:
+            return None
+        host, port, user, _ = SftpConnectionPool.pool_key(self.config)
+        digest = hashlib.sha1(f"{host}:{port}:{user}:{remote_path}:{os.path.abspath(local_path)}".encode('utf-8')).hexdigest()
+        return os.path.join(self.manifest_dir, f"upload-{digest[:16]}.json")
+
+    @staticmethod
+    def _load_manifest(manifest_path):
+        if not manifest_path:
+            return None
+        try:
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def _save_manifest(manifest_path, manifest):
+        if not manifest_path:
+            return
+        os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+        with open(manifest_path + ".tmp", 'w', encoding='utf-8') as f:
+            json.dump(manifest, f)
+        os.replace(manifest_path + ".tmp", manifest_path) # Never leave a half-written manifest
+
+
+def benchmark_upload(pool, config, local_path, remote_dir, channel_counts=(1, 2, 4, 8), on_output=print):
+    """Uploads local_path with sftp.put and with ParallelUploader, printing MB/s for each."""
+    size_mb = os.path.getsize(local_path) / (1024 * 1024)
+    remote_dir = remote_dir.replace("\\", "/").rstrip('/')
+    base_name = os.path.basename(local_path)
+    results = []
+
+    def report(label, seconds):
+        speed = size_mb / seconds if seconds > 0 else 0
+        results.append((label, seconds, speed))
+        on_output(f"{label:<14} {seconds:8.2f}s {speed:9.2f} MB/s")
+
+    on_output(f"Benchmarking {size_mb:.2f} MB upload to {config['sftp_host']}:{remote_dir}")
+    with pool.checkout(config) as lease: # Connect before timing anything
+        remote_path = f"{remote_dir}/bench-put-{base_name}"
+        start = time.perf_counter()
+        lease.sftp.put(local_path, remote_path)
+        report("sftp.put", time.perf_counter() - start)
+        lease.sftp.remove(remote_path)
+
+    for channels in channel_counts:
+        remote_path = f"{remote_dir}/bench-{channels}ch-{base_name}"
+        stats = ParallelUploader(pool, config, channels=channels).upload(local_path, remote_path)
+        report(f"{channels} channel(s)", stats['seconds'])
+        with pool.checkout(config) as lease:
+            lease.sftp.remove(remote_path)
+    return results
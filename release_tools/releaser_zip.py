@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Streaming zip packager of the Flutter Build & Deploy Tool.
+
+Packs a directory (e.g. build/web) into a zip archive written sequentially
+to any object with a write() method, such as an open SFTP file, so no
+temporary archive is needed. Files are read in 1 MiB chunks that are
+deflated in parallel on a thread pool (zlib releases the GIL); chunks of
+the same file are compressed independently with the previous 32 KiB as
+preset dictionary and joined with sync flushes, like pigz does. The bytes
+in flight are capped by a memory budget, whatever the size of the site.
+Already compressed assets are stored as they are, and so is any file whose
+deflated form is not smaller (for files of several chunks, judged by the
+first chunk, since the method is in the header written before the rest).
+Deflated files of several chunks put their CRC and sizes in a data
+descriptor after the data. Streaming readers such as Java's ZipInputStream
+reject that for stored entries, so a stored file of several chunks has its
+CRC computed in an extra read pass and written in the header up front.
+
+Qt-free and stdlib only.
+"""
+
+import os
+import time
+import zlib
+import struct
+import hashlib
+import collections
+import concurrent.futures
+
+ZIP_CHUNK_BYTES = 1024 * 1024
+# Upper bound for raw + compressed chunks held in memory at once
+ZIP_MEMORY_BUDGET_BYTES = 64 * 1024 * 1024
+ZIP_COMPRESS_LEVEL = 6
+# Assets that are already compressed; deflating them again only costs CPU
+ZIP_STORED_EXTENSIONS = {
+    '.png', '.jpg', '.jpeg', '.gif', '.webp', '.avif', '.ico',
+    '.gz', '.br', '.zst', '.zip', '.jar', '.woff', '.woff2',
+    '.mp3', '.mp4', '.m4a', '.ogg', '.webm',
+}
+
+_STORED = 0
+_DEFLATED = 8
+_FLAG_DATA_DESCRIPTOR = 0x08
+_FLAG_UTF8 = 0x800
+_DICTIONARY_BYTES = 32 * 1024
+_ZIP_LIMIT = 0xFFFFFFFF # Sizes and offsets beyond this need ZIP64, which is not written
+
+
+def _dos_datetime(mtime):
+    t = time.localtime(max(mtime, 315532800)) # Zip timestamps start in 1980
+    return (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2), ((t.tm_year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday
+
+
+def _compress_chunk(data, zdict, last):
+    compressor = zlib.compressobj(ZIP_COMPRESS_LEVEL, zlib.DEFLATED, -15, zdict=zdict) if zdict else \
+        zlib.compressobj(ZIP_COMPRESS_LEVEL, zlib.DEFLATED, -15)
+    return compressor.compress(data) + compressor.flush(zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
+
+
+def _file_crc32(path):
+    crc = 0
+    with open(path, 'rb') as f:
+        while True:
+            block = f.read(ZIP_CHUNK_BYTES)
+            if not block:
+                return crc
+            crc = zlib.crc32(block, crc)
+
+
+def _done(result):
+    future = concurrent.futures.Future()
+    future.set_result(result)
+    return future
+
+
+class _Entry:
+    def __init__(self, path, name, size, mtime, mode):
+        self.path = path
+        self.name = name.encode('utf-8')
+        self.size = size
+        self.dos_time, self.dos_date = _dos_datetime(mtime)
+        self.mode = mode
+        self.method = _STORED if os.path.splitext(name)[1].lower() in ZIP_STORED_EXTENSIONS else _DEFLATED
+        self.streamed = size > ZIP_CHUNK_BYTES # Several chunks: deflated sizes follow the data in a descriptor
+        self.flags = _FLAG_UTF8 | (_FLAG_DATA_DESCRIPTOR if self.streamed else 0) # Cleared once stored
+        self.crc = 0
+        self.header_crc = None # CRC written in the local header of a stored file of several chunks
+        self.compressed_size = 0
+        self.offset = 0
+
+
+def list_files(source_dir):
+    """Files below source_dir as (path, archive name), in a stable order."""
+    files = []
+    for root, dirs, names in os.walk(source_dir):
+        dirs.sort()
+        for name in sorted(names):
+            path = os.path.join(root, name)
+            if os.path.isfile(path):
+                files.append((path, os.path.relpath(path, source_dir).replace(os.sep, '/')))
+    return files
+
+
+class _Output:
+    """Counts and hashes everything written to the target stream."""
+
+    def __init__(self, out):
+        self.out = out
+        self.offset = 0
+        self.sha256 = hashlib.sha256()
+
+    def write(self, data):
+        if self.offset + len(data) > _ZIP_LIMIT:
+            raise ValueError("Archive exceeds 4 GiB, which needs ZIP64 (not supported).")
+        self.out.write(data)
+        self.sha256.update(data)
+        self.offset += len(data)
+
+
+def write_zip_stream(source_dir, out, progress=None, workers=None, memory_budget=ZIP_MEMORY_BUDGET_BYTES):
+    """Writes a zip of source_dir to out. Returns a dict of packaging stats.
+
+    progress(done, total) is called with raw input bytes after every chunk;
+    an exception raised by it aborts the archive.
+    """
+    start = time.perf_counter()
+    entries = []
+    for path, name in list_files(source_dir):
+        st = os.stat(path)
+        entries.append(_Entry(path, name, st.st_size, st.st_mtime, st.st_mode))
+    if len(entries) >= 0xFFFF:
+        raise ValueError(f"{len(entries)} files need ZIP64 (not supported).")
+    total = sum(entry.size for entry in entries)
+    output = _Output(out)
+    max_inflight = max(2, memory_budget // (2 * ZIP_CHUNK_BYTES)) # A chunk is held raw and compressed
+    done_bytes = 0
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 2,
+                                               thread_name_prefix="zip-deflate") as executor:
+        inflight = collections.deque() # (entry, raw chunk, raw length, is_first, is_last, future)
+
+        def write_next():
+            nonlocal done_bytes
+            entry, raw, raw_length, first, last, future = inflight.popleft()
+            data = future.result()
+            if not entry.streamed:
+                if entry.method == _DEFLATED and len(data) >= len(raw):
+                    entry.method, data = _STORED, raw # Deflate did not help
+                entry.compressed_size = len(data)
+                _write_local_header(output, entry, entry.crc)
+            else:
+                if first:
+                    if entry.method == _DEFLATED and len(data) >= len(raw):
+                        entry.method = _STORED # Incompressible, store the whole file
+                    if entry.method == _STORED: # No data descriptor: CRC and sizes go in the header
+                        entry.flags &= ~_FLAG_DATA_DESCRIPTOR
+                        entry.compressed_size = entry.size
+                        entry.header_crc = _file_crc32(entry.path)
+                        _write_local_header(output, entry, entry.header_crc)
+                    else:
+                        _write_local_header(output, entry, 0)
+                if entry.method == _STORED:
+                    data = raw
+            output.write(data)
+            if entry.flags & _FLAG_DATA_DESCRIPTOR:
+                entry.compressed_size += len(data)
+                if last:
+                    output.write(struct.pack('<IIII', 0x08074b50, entry.crc, entry.compressed_size, entry.size))
+            elif entry.streamed and last and entry.crc != entry.header_crc: # entry.crc is from the packaging read
+                raise ValueError(f"{entry.path} changed while it was being packaged.")
+            done_bytes += raw_length
+            if progress:
+                progress(done_bytes, total)
+
+        for entry in entries:
+            with open(entry.path, 'rb') as f:
+                crc = 0
+                previous = b''
+                first = True
+                remaining = entry.size
+                while True:
+                    wanted = min(ZIP_CHUNK_BYTES, remaining)
+                    data = f.read(wanted)
+                    if len(data) < wanted:
+                        raise ValueError(f"{entry.path} changed while it was being packaged.")
+                    remaining -= len(data)
+                    last = remaining == 0
+                    crc = zlib.crc32(data, crc)
+                    if last:
+                        entry.crc = crc
+                    if entry.method == _STORED: # Also once write_next() gave up on deflating this file
+                        future = _done(data)
+                    else:
+                        future = executor.submit(_compress_chunk, data, previous[-_DICTIONARY_BYTES:], last)
+                    while len(inflight) >= max_inflight:
+                        write_next()
+                    inflight.append((entry, data, len(data), first, last, future))
+                    previous = data
+                    first = False
+                    if last:
+                        break
+        while inflight:
+            write_next()
+
+    central_offset = output.offset
+    for entry in entries:
+        _write_central_header(output, entry)
+    central_size = output.offset - central_offset
+    output.write(struct.pack('<IHHHHIIH', 0x06054b50, 0, 0, len(entries), len(entries),
+                             central_size, central_offset, 0))
+    return {
+        'files': len(entries), 'stored_files': sum(1 for entry in entries if entry.method == _STORED), 'input_bytes': total,
+        'output_bytes': output.offset, 'sha256': output.sha256.hexdigest(),
+        'seconds': time.perf_counter() - start,
+    }
+
+
+def _write_local_header(output, entry, crc):
+    entry.offset = output.offset
+    csize, usize = (0, 0) if entry.flags & _FLAG_DATA_DESCRIPTOR else (entry.compressed_size, entry.size)
+    output.write(struct.pack('<IHHHHHIIIHH', 0x04034b50, 20, entry.flags, entry.method,
+                             entry.dos_time, entry.dos_date, crc, csize, usize, len(entry.name), 0) + entry.name)
+
+
+def _write_central_header(output, entry):
+    output.write(struct.pack('<IHHHHHHIIIHHHHHII', 0x02014b50, (3 << 8) | 20, 20, entry.flags, entry.method,
+                             entry.dos_time, entry.dos_date, entry.crc, entry.compressed_size, entry.size,
+                             len(entry.name), 0, 0, 0, 0, (entry.mode & 0xFFFF) << 16, entry.offset) + entry.name)
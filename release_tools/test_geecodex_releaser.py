@@ -0,0 +1,70 @@
+import sys
+import types
+import threading
+import concurrent.futures
+
+import pytest
+
+import geecodex_releaser
+from geecodex_releaser import load_gui_settings, default_settings_path
+
+# As written by QSettings(IniFormat, UserScope, ...) of the GUI
+GUI_SETTINGS_INI = r'''[build]
+target_platform=Android APK
+
+[db]
+host=db.example.com
+port=5432
+user=rel
+
+[paths]
+project="C:\\Users\\dev\\my app, v2"
+
+[sftp]
+probe_endpoints="a.com:443, b.com"
+remote_path=/srv/ä downloads
+user=\x1f34deploy\tops
+
+[window]
+geometry="@ByteArray(\0\x1\x2\x3\a\b\t\n\v\f\r\xe\x1f !\"#$%&'=;,[]#)"
+state=@ByteArray(\0\0\0\xff\0\0\0\0\xfd)
+'''
+
+
+def test_load_gui_settings_reads_qsettings_ini(tmp_path):
+    path = tmp_path / "FlutterReleaser.ini"
+    path.write_text(GUI_SETTINGS_INI, encoding='utf-8')
+    assert load_gui_settings(str(path)) == {
+        'build/target_platform': "Android APK",
+        'db/host': "db.example.com",
+        'db/port': "5432",
+        'db/user': "rel",
+        'paths/project': "C:\\Users\\dev\\my app, v2",
+        'sftp/probe_endpoints': "a.com:443, b.com",
+        'sftp/remote_path': "/srv/ä downloads",
+        'sftp/user': "\u34de" "ploy\tops", # Qt reads every hex digit after \x
+    }
+
+
+def test_load_gui_settings_without_file(tmp_path):
+    assert load_gui_settings(str(tmp_path / "missing.ini")) == {}
+    assert load_gui_settings("") == {}
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="QSettings uses %APPDATA% on Windows")
+def test_default_settings_path_is_the_gui_ini(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CONFIG_HOME", str(tmp_path))
+    assert default_settings_path() == str(
+        tmp_path / geecodex_releaser.ORGANIZATION_NAME / f"{geecodex_releaser.APPLICATION_NAME}.ini")
+
+
+def test_close_connection_pools_waits_for_metrics_move(monkeypatch):
+    order = []
+    pool = types.SimpleNamespace(close_all=lambda: order.append('closed'))
+    monkeypatch.setitem(sys.modules, 'releaser_db', types.SimpleNamespace(DB_POOL=pool))
+    future = concurrent.futures.Future()
+    timer = threading.Timer(0.2, lambda: (order.append('moved'), future.set_result("PostgreSQL (1 run(s))")))
+    timer.start()
+    geecodex_releaser.close_connection_pools([future, None])
+    timer.join()
+    assert order == ['moved', 'closed']
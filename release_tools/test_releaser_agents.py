@@ -0,0 +1,123 @@
+import os
+import json
+import time
+
+import pytest
+
+import releaser_agents
+from releaser_agents import AgentSlots, BuildAgent, load_agents, pick_agent, project_files, suitable_agents
+
+
+def _agent(name, agent_os="Linux", max_jobs=1, **fields):
+    return BuildAgent(name, f"{name}.example.com", "ci", agent_os, "/srv/builds/app/", max_jobs=max_jobs, **fields)
+
+
+@pytest.fixture
+def slots(tmp_path):
+    return AgentSlots(str(tmp_path / "agents"))
+
+
+def test_load_agents(tmp_path):
+    path = tmp_path / "agents.json"
+    assert load_agents(str(path)) == []
+    path.write_text(json.dumps({'agents': [
+        {'name': "mac-mini", 'host': "10.0.0.12", 'user': "ci", 'os': "macOS", 'project_dir': "/Users/ci/app",
+         'max_jobs': 2, 'targets': ["ipa"]},
+    ]}))
+    [agent] = load_agents(str(path))
+    assert (agent.name, agent.os, agent.port, agent.max_jobs, agent.targets) == ("mac-mini", "macOS", 22, 2, ("ipa",))
+
+    path.write_text(json.dumps({'agents': [{'name': "a", 'host': "h", 'user': "u", 'os': "BeOS", 'project_dir': "/p"}]}))
+    with pytest.raises(ValueError, match="os must be one of"):
+        load_agents(str(path))
+    path.write_text(json.dumps({'agents': [{'name': "a", 'host': "h", 'user': "u", 'os': "Linux", 'project_dir': "/p"}] * 2}))
+    with pytest.raises(ValueError, match="unique"):
+        load_agents(str(path))
+
+
+def test_suitable_agents():
+    linux, mac, web_only = _agent("linux"), _agent("mac", "macOS"), _agent("web", targets=["web"])
+    agents = [linux, mac, web_only]
+    assert suitable_agents(agents, 'apk') == [linux, mac]
+    assert suitable_agents(agents, 'ipa') == [mac] # iOS builds need macOS
+    assert suitable_agents(agents, 'web') == agents
+    assert suitable_agents(agents, 'web', wanted="mac") == [mac]
+    assert suitable_agents(agents, 'ipa', wanted="linux") == []
+
+
+def test_work_dir_and_build_command():
+    single, shared = _agent("single"), _agent("shared", max_jobs=3)
+    assert single.work_dir(0) == "/srv/builds/app"
+    assert shared.work_dir(2) == "/srv/builds/app/slot-2"
+    assert shared.build_command('apk', shared.work_dir(2)) == "cd '/srv/builds/app/slot-2' && flutter build apk --release"
+    windows = BuildAgent("win", "win.example.com", "ci", "Windows", "/C:/builds/app")
+    assert windows.build_command('web') == 'cd /d "C:/builds/app" && flutter build web --release'
+
+
+def test_reserve_prefers_free_capacity_then_load(slots):
+    busy, idle = _agent("busy", max_jobs=2), _agent("idle", max_jobs=2)
+    statuses = {'busy': {'load_per_core': 0.1}, 'idle': {'load_per_core': 0.9}}
+    first = slots.reserve([busy, idle], statuses)
+    assert first[0] is busy and first[2:] == (0, 0) # Both empty: the lower load wins
+    second = slots.reserve([busy, idle], statuses)
+    assert second[0] is idle and second[2:] == (0, 0) # busy is half full now
+    third = slots.reserve([busy, idle], statuses)
+    assert third[0] is busy and third[2:] == (1, 1) # Next free slot number
+    assert slots.taken('busy') == {0, 1} and slots.running('idle') == 1
+
+    slots.release(first[1])
+    fourth = slots.reserve([busy, idle], statuses)
+    assert fourth[0] is busy and fourth[2] == 0 # Both half full again; the released slot is reused
+    assert slots.reserve([busy, idle], statuses)[0] is idle and slots.taken('idle') == {0, 1}
+    assert slots.reserve([busy, idle], statuses) is None
+
+
+def test_stale_slots_are_free_again(slots):
+    agent = _agent("linux")
+    _, slot_path, _, _ = slots.reserve([agent], {'linux': {'load_per_core': 0.0}})
+    assert slots.reserve([agent], {'linux': {'load_per_core': 0.0}}) is None
+    old = time.time() - releaser_agents.AGENT_SLOT_STALE_SECONDS - 1
+    os.utime(slot_path, (old, old)) # Process died without releasing it
+    assert slots.running('linux') == 0
+    slots.heartbeat(slot_path)
+    assert slots.running('linux') == 1
+
+
+def test_pick_agent_skips_unreachable_agents(slots, monkeypatch):
+    def status(agent):
+        if agent.name == "down":
+            raise OSError("No route to host")
+        return {'cores': 8, 'load': 2.0, 'load_per_core': 0.25}
+
+    monkeypatch.setattr(releaser_agents, 'agent_status', status)
+    output = []
+    up = _agent("up")
+    agent, slot_path, slot = pick_agent([_agent("down"), up], slots, on_output=output.append)
+    assert agent is up and slot == 0 and os.path.exists(slot_path)
+    assert output == ["Build agent down is not reachable: OSError: No route to host",
+                      "Build agent: up (Linux, load 2.00 on 8 core(s), 0/1 job(s) running)."]
+    assert pick_agent([_agent("down")], slots, on_output=output.append) is None
+
+
+def test_pick_agent_waits_for_a_free_slot(slots, monkeypatch):
+    monkeypatch.setattr(releaser_agents, 'agent_status', lambda agent: {'cores': None, 'load': None, 'load_per_core': 0.0})
+    monkeypatch.setattr(releaser_agents, 'AGENT_WAIT_POLL_SECONDS', 0.01)
+    agent = _agent("only")
+    slots.reserve([agent], {'only': {'load_per_core': 0.0}})
+    output, polls = [], []
+
+    def should_stop():
+        polls.append(None)
+        return len(polls) > 3
+
+    assert pick_agent([agent], slots, on_output=output.append, should_stop=should_stop) is None
+    assert output == ["All suitable build agents are busy, waiting for a free slot..."] # Said once
+
+
+def test_project_files_skip_generated_and_host_files(tmp_path):
+    for rel in ("pubspec.yaml", "lib/main.dart", "build/app.apk", ".dart_tool/x", "android/local.properties",
+                "android/app/build.gradle", ".flutter-plugins-dependencies", "ios/Flutter/Generated.xcconfig"):
+        path = tmp_path / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text("x")
+    assert sorted(project_files(str(tmp_path))) == ["android/app/build.gradle", "lib/main.dart", "pubspec.yaml"]
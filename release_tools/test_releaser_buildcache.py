@@ -0,0 +1,112 @@
+import os
+
+import pytest
+
+import releaser_buildcache
+from releaser_buildcache import BuildCache
+
+
+def _project(tmp_path):
+    project = tmp_path / "app"
+    (project / "lib").mkdir(parents=True)
+    (project / "android" / "app").mkdir(parents=True)
+    (project / "android" / ".gradle").mkdir()
+    (project / "build").mkdir()
+    (project / "lib" / "main.dart").write_text("void main() {}\n")
+    (project / "pubspec.yaml").write_text("name: app\n")
+    (project / "android" / "app" / "build.gradle").write_text("android {}\n")
+    (project / "android" / ".gradle" / "cache.bin").write_text("ignored")
+    (project / "build" / "output.txt").write_text("ignored")
+    return project
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return BuildCache(str(tmp_path / "cache"))
+
+
+def test_input_files_skip_generated_dirs(tmp_path, cache):
+    project = _project(tmp_path)
+    assert sorted(cache.input_files(str(project), 'apk')) == [
+        'android/app/build.gradle', 'lib/main.dart', 'pubspec.yaml']
+    assert sorted(cache.input_files(str(project), 'web')) == ['lib/main.dart', 'pubspec.yaml']
+
+
+def test_fingerprint_follows_inputs(tmp_path, cache):
+    project = _project(tmp_path)
+    first, stats = cache.fingerprint(str(project), 'apk')
+    assert stats['files'] == 3 and stats['hashed'] == 3
+    assert cache.fingerprint(str(project), 'apk')[0] == first
+    assert cache.fingerprint(str(project), 'appbundle')[0] != first
+    assert cache.fingerprint(str(project), 'apk', extra=("flutter@abc",))[0] != first
+
+    (project / "build" / "output.txt").write_text("changed")
+    assert cache.fingerprint(str(project), 'apk')[0] == first
+
+    (project / "lib" / "main.dart").write_text("void main() { print(1); }\n")
+    changed, _ = cache.fingerprint(str(project), 'apk')
+    assert changed != first
+    (project / "lib" / "main.dart").write_text("void main() {}\n")
+    assert cache.fingerprint(str(project), 'apk')[0] == first
+
+
+def test_fingerprint_reuses_index(tmp_path, cache, monkeypatch):
+    project = _project(tmp_path)
+    first, _ = cache.fingerprint(str(project), 'apk')
+    # Files are only trusted by (size, mtime) once they are older than the racy window
+    monkeypatch.setattr(releaser_buildcache, 'RACY_MTIME_NS', -10 ** 12)
+    cache.fingerprint(str(project), 'apk')
+    fingerprint, stats = cache.fingerprint(str(project), 'apk')
+    assert fingerprint == first
+    assert stats['hashed'] == 0
+
+
+def test_store_and_restore_file(tmp_path, cache):
+    artifact = tmp_path / "app-release.apk"
+    artifact.write_bytes(b"apk bytes")
+    assert cache.lookup("f1") is None
+    cache.store("f1", str(artifact), 'apk')
+    entry = cache.lookup("f1")
+    assert entry['kind'] == 'file' and entry['bytes'] == 9
+
+    dest = tmp_path / "out" / "app-release.apk"
+    cache.restore(entry, str(dest))
+    assert dest.read_bytes() == b"apk bytes"
+    dest.write_bytes(b"overwritable") # Restored files are writable, unlike the read-only objects
+
+
+def test_store_and_restore_directory(tmp_path, cache):
+    site = tmp_path / "web"
+    (site / "assets").mkdir(parents=True)
+    (site / "index.html").write_text("<html></html>")
+    (site / "assets" / "a.txt").write_text("same")
+    (site / "assets" / "b.txt").write_text("same")
+    entry = cache.store("f2", str(site), 'web')
+    assert entry['kind'] == 'dir'
+    assert len({digest for _, digest, _ in entry['files']}) == 2 # Identical files share an object
+
+    dest = tmp_path / "restored" / "web"
+    (dest / "stale").mkdir(parents=True)
+    cache.restore(cache.lookup("f2"), str(dest))
+    assert sorted(os.listdir(dest)) == ['assets', 'index.html']
+    assert (dest / "assets" / "b.txt").read_text() == "same"
+
+
+def test_lookup_misses_when_objects_are_gone(tmp_path, cache):
+    artifact = tmp_path / "a.apk"
+    artifact.write_bytes(b"data")
+    entry = cache.store("f3", str(artifact), 'apk')
+    os.remove(cache._object_path(entry['files'][0][1]))
+    assert cache.lookup("f3") is None
+
+
+def test_prune_keeps_newest_entries_per_command(tmp_path):
+    cache = BuildCache(str(tmp_path / "cache"), keep=2)
+    for i in range(4):
+        artifact = tmp_path / f"{i}.apk"
+        artifact.write_bytes(f"build {i}".encode())
+        cache.store(f"f{i}", str(artifact), 'apk')
+        entry_path = cache._entry_path(f"f{i}")
+        os.utime(entry_path, (1000 + i, 1000 + i))
+    cache.prune()
+    assert [cache.lookup(f"f{i}") is not None for i in range(4)] == [False, False, True, True]
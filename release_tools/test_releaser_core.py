@@ -0,0 +1,304 @@
+import os
+import json
+import time
+import types
+import threading
+import concurrent.futures
+
+import pytest
+
+import releaser_core
+from releaser_core import (
+    FLUTTER_BUILT_RE, BufferedLogChannel, RunLogFile, ReleaseMatrix, ReleaseRunner, finish_deferred_run,
+    locate_artifact,
+)
+from releaser_events import BuildEventStream, read_events
+from releaser_metrics import MetricsStore, metrics_row
+
+
+def _config(**fields):
+    config = {'platform': 'android', 'target_platform_text': "Android APK", 'target_platform_cmd': 'apk',
+              'version_name': "1.2.0", 'version_code': 12, 'build_platform': "Linux", 'release_notes': ""}
+    config.update(fields)
+    return config
+
+
+@pytest.fixture
+def metrics_file(tmp_path, monkeypatch):
+    path = str(tmp_path / "metrics.sqlite3")
+    monkeypatch.setattr(releaser_core, 'METRICS_DB_FILE', path)
+    return path
+
+
+def _deferred(tmp_path, config):
+    """deferred_publish of a runner that built and uploaded, as ReleaseRunner._defer leaves it."""
+    events = BuildEventStream(str(tmp_path / "events"), 'apk')
+    events.run_start(config)
+    events.stage('build')
+    events.stage('upload')
+    events.end_stage()
+    deferred = {
+        'remote_path': "/srv/app-1.2.0.apk", 'build_timestamp': None, 'events_path': events.path,
+        'elapsed': events.elapsed(), 'stages': dict(events.stages),
+        'metrics': metrics_row(config, events, {'mode': 'full', 'wire_bytes': 1024, 'seconds': 1.0}, None, True),
+    }
+    events.close()
+    return deferred
+
+
+def _local_metrics(path):
+    store = MetricsStore(path)
+    conn = store._connect_local()
+    try:
+        return [row for _, row in store._local_rows(conn)]
+    finally:
+        conn.close()
+
+
+def test_finish_deferred_run_records_publish_outcome(tmp_path, metrics_file):
+    config = _config()
+    deferred = _deferred(tmp_path, config)
+    event, future = finish_deferred_run(config, deferred, False, "Database error: timeout", publish_seconds=0.25)
+    assert "local SQLite" in future.result(timeout=10) # No database configured: the row stays local
+
+    assert event['type'] == 'run_end' and event['success'] is False
+    assert event['stages']['publish'] == 0.25
+    assert read_events(deferred['events_path'])[-1] == json.loads(json.dumps(event))
+    [row] = _local_metrics(metrics_file)
+    assert row['success'] is False
+    assert row['db_ms'] == 250.0
+    assert row['upload_mode'] == 'full'
+    assert row['total_seconds'] == pytest.approx(deferred['elapsed'] + 0.25, abs=0.01)
+
+
+def test_matrix_reports_deferred_targets_after_the_batch_publish(tmp_path, metrics_file):
+    pytest.importorskip("psycopg")
+    config = _config() # No database settings: the batch publish fails
+    events = []
+    matrix = ReleaseMatrix([config], on_event=lambda target, kind, payload: events.append((target, kind, payload)))
+    matrix._deferred = [("Android APK", config, _deferred(tmp_path, config))]
+    matrix._publish_deferred()
+
+    success, message = matrix.results["Android APK"]
+    assert not success and message.startswith("Database error")
+    kinds = [kind for _, kind, _ in events]
+    assert kinds.index('event') < kinds.index('finished')
+    run_end = next(payload for _, kind, payload in events if kind == 'event')
+    assert run_end['success'] is False
+    [row] = _local_metrics(metrics_file)
+    assert row['success'] is False and row['db_ms'] is not None
+
+
+def test_log_channel_flushes_a_block_at_max_lines():
+    blocks = []
+    delivered = threading.Event()
+
+    def sink(block):
+        blocks.append(block)
+        delivered.set()
+
+    channel = BufferedLogChannel(sink, flush_interval_ms=60000, max_lines=3)
+    for i in range(3):
+        channel.write(f"line {i}")
+    assert delivered.wait(5) # Long before the interval
+    channel.write("line 3")
+    channel.close()
+    assert blocks == ["line 0\nline 1\nline 2", "line 3"]
+    assert channel.lines_written == 4 and channel.blocks_flushed == 2
+
+
+def test_log_channel_flushes_after_the_interval():
+    blocks = []
+    channel = BufferedLogChannel(blocks.append, flush_interval_ms=20, max_lines=1000)
+    channel.write("first")
+    channel.write("second")
+    deadline = time.monotonic() + 5
+    while not blocks and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert blocks == ["first\nsecond"]
+    channel.close()
+
+
+def test_log_channel_delivers_directly_after_close():
+    blocks = []
+    channel = BufferedLogChannel(blocks.append, flush_interval_ms=60000, max_lines=1000)
+    channel.write("pending")
+    channel.close()
+    assert blocks == ["pending"]
+    channel.write("late")
+    channel.close() # Idempotent
+    assert blocks == ["pending", "late"]
+
+
+def test_run_log_reads_the_tail_back_in_pages(tmp_path):
+    run_log = RunLogFile(str(tmp_path))
+    for i in range(10):
+        run_log.append(f"line {i}")
+    run_log.append("two\nlines ä")
+
+    offset = run_log.offset_of_last_lines(3)
+    text, start = run_log.read_before(run_log.size(), 3)
+    assert start == offset
+    assert text == "line 9\ntwo\nlines ä"
+    text, start = run_log.read_before(start, 4)
+    assert text == "line 5\nline 6\nline 7\nline 8"
+    text, start = run_log.read_before(start, 100) # Fewer lines left than asked for
+    assert text.split("\n") == [f"line {i}" for i in range(5)] and start == 0
+    assert run_log.read_before(0, 10) == ("", 0)
+    run_log.close()
+
+
+def test_run_log_empty_file(tmp_path):
+    run_log = RunLogFile(str(tmp_path))
+    assert run_log.size() == 0
+    assert run_log.offset_of_last_lines(10) == 0
+    run_log.close()
+    run_log.append("after close") # Ignored
+    assert os.path.getsize(run_log.path) == 0
+
+
+def test_run_logs_are_rotated(tmp_path):
+    for i in range(4):
+        old_path = tmp_path / f"release-2024010{i}-000000.log"
+        old_path.write_text("old")
+        os.utime(old_path, (1000 + i, 1000 + i))
+    (tmp_path / "notes.txt").write_text("kept")
+    run_log = RunLogFile(str(tmp_path), keep_runs=3)
+    run_log.close()
+    assert sorted(os.listdir(tmp_path)) == sorted(
+        ["notes.txt", "release-20240102-000000.log", "release-20240103-000000.log", os.path.basename(run_log.path)])
+
+
+@pytest.mark.parametrize("line, path", [
+    ("✓ Built build/app/outputs/flutter-apk/app-release.apk (20.3MB)", "build/app/outputs/flutter-apk/app-release.apk"),
+    ("✓ Built build/web", "build/web"),
+    ("Built IPA to /work/app/build/ios/ipa.", "/work/app/build/ios/ipa"),
+    ("Building with sound null safety", None),
+])
+def test_flutter_built_line(line, path):
+    match = FLUTTER_BUILT_RE.match(line)
+    assert (match.group(1) if match else None) == path
+
+
+def _touch(path, mtime):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b"artifact")
+    os.utime(path, (mtime, mtime))
+    return str(path)
+
+
+def test_locate_artifact_prefers_the_reported_path(tmp_path):
+    pattern = "build/app/outputs/flutter-apk/*.apk"
+    _touch(tmp_path / "build/app/outputs/flutter-apk/app-debug.apk", 2000)
+    release = _touch(tmp_path / "build/app/outputs/flutter-apk/app-release.apk", 1000)
+    assert locate_artifact(str(tmp_path), pattern, ["build/app/outputs/flutter-apk/app-release.apk"],
+                           built_after=1500) == (release, "flutter output") # Trusted even if older
+
+
+def test_locate_artifact_in_reported_directory(tmp_path):
+    _touch(tmp_path / "build/ios/ipa/old.ipa", 1000)
+    new = _touch(tmp_path / "build/ios/ipa/Runner.ipa", 2000)
+    assert locate_artifact(str(tmp_path), "build/ios/ipa/*.ipa", [str(tmp_path / "build/ios/ipa")],
+                           built_after=1500) == (new, "flutter output directory")
+
+
+def test_locate_artifact_newest_fresh_match(tmp_path):
+    pattern = "build/**/*.apk"
+    _touch(tmp_path / "build/a/old.apk", 1000)
+    newest = _touch(tmp_path / "build/b/c/new.apk", 2000)
+    assert locate_artifact(str(tmp_path), pattern) == (newest, "newest pattern match")
+    assert locate_artifact(str(tmp_path), pattern, built_after=3000) == \
+        (None, "pattern, only stale matches from an earlier build")
+    assert locate_artifact(str(tmp_path), "build/*.aab") == (None, "pattern")
+
+
+def test_locate_artifact_fixed_path(tmp_path):
+    web = tmp_path / "build/web"
+    _touch(web / "index.html", 1000)
+    os.utime(web, (1000, 1000))
+    assert locate_artifact(str(tmp_path), "build/web") == (str(web), "fixed path")
+    assert locate_artifact(str(tmp_path), "build/web", built_after=1500) == \
+        (None, "fixed path, only a stale copy from an earlier build")
+    _touch(web / "main.dart.js", 2000) # Written by this build
+    assert locate_artifact(str(tmp_path), "build/web", built_after=1500) == (str(web), "fixed path")
+    assert locate_artifact(str(tmp_path), "build/windows") == (None, "fixed path")
+
+
+@pytest.fixture
+def runner(tmp_path, monkeypatch):
+    monkeypatch.setattr(releaser_core, 'EVENTS_DIR', str(tmp_path / "events"))
+    output = []
+    runner = ReleaseRunner(_config(), on_output=output.append)
+    runner.output = output
+    yield runner
+    runner.log.close()
+
+
+def test_failed_preflight_check_stops_the_build(runner):
+    started = threading.Event()
+
+    def slow_db():
+        started.wait(5)
+        return "schema ok"
+
+    def missing_sftp():
+        started.set()
+        raise ValueError("Missing SFTP host, port, user or remote path.\nmore detail")
+
+    runner._preflight_sftp, runner._preflight_db = missing_sftp, slow_db
+    terminated = []
+    runner._terminate_build_process = lambda: terminated.append(True)
+    runner._start_preflight()
+    runner._preflight['SFTP'].exception(timeout=5)
+    deadline = time.monotonic() + 5
+    while runner._is_running and time.monotonic() < deadline: # The done-callback runs right after
+        time.sleep(0.01)
+
+    assert not runner._is_running and terminated
+    assert runner._preflight_error == "Pre-flight check failed (SFTP): Missing SFTP host, port, user or remote path."
+    assert runner.retryable is False # Settings do not fix themselves
+    assert not runner._await_preflight()
+    assert runner.result == (False, runner._preflight_error)
+
+
+def test_preflight_connection_errors_are_retryable(runner):
+    def refused():
+        raise OSError("Connection refused")
+
+    runner._preflight_sftp, runner._preflight_db = (lambda: "logged in"), refused
+    runner._terminate_build_process = lambda: None
+    runner._start_preflight()
+    concurrent.futures.wait(runner._preflight.values(), timeout=5)
+    assert not runner._await_preflight()
+    assert runner.result == (False, "Pre-flight check failed (Database): Connection refused")
+    assert runner.retryable is True
+
+
+def test_passed_preflight_checks_are_reported(runner):
+    runner._preflight_sftp, runner._preflight_db = (lambda: "logged in"), (lambda: "schema ok")
+    runner._start_preflight()
+    assert runner._await_preflight()
+    runner.log.flush()
+    assert "SFTP: logged in; Database: schema ok" in runner.output[-1]
+    assert runner.events.events[-1]['type'] == 'preflight'
+    assert runner.events.events[-1]['checks'] == ['SFTP', 'Database']
+
+
+def test_preflight_can_be_turned_off(runner):
+    runner.config['preflight'] = False
+    runner._preflight_sftp = runner._preflight_db = lambda: pytest.fail("pre-flight check ran")
+    runner._start_preflight()
+    assert runner._preflight == {} and runner._await_preflight()
+
+
+def test_preflight_db_skipped_after_a_connection_test(runner):
+    pytest.importorskip("psycopg")
+    from releaser_probe import PROBE_CACHE, ProbeResult, probe_key
+    runner.config.update(db_host="db.invalid", db_port=5432, db_name="updates", db_user="rel", db_password="pw")
+    PROBE_CACHE.put(probe_key('db', runner.config), ProbeResult('db', True, "ok", 0.1, False))
+    try:
+        assert runner._preflight_db().startswith("verified by a connection test")
+    finally:
+        PROBE_CACHE.clear()
+    with pytest.raises(ValueError, match="PostgreSQL"):
+        ReleaseRunner._preflight_db(types.SimpleNamespace(config=_config()))
@@ -0,0 +1,127 @@
+import datetime
+import contextlib
+
+import pytest
+
+psycopg = pytest.importorskip("psycopg")
+
+from psycopg.conninfo import conninfo_to_dict
+
+from releaser_db import (
+    RELEASE_FIELDS, DbConnectionPool, check_release_schema, db_conninfo, publish_releases, release_record,
+)
+
+DB_CONFIG = {'db_host': "db.example.com", 'db_port': 5432, 'db_name': "updates", 'db_user': "rel",
+             'db_password': "it's a 'secret' \\ word"}
+
+
+class FakeCursor:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def fetchone(self):
+        return self.rows[0]
+
+    def fetchall(self):
+        return self.rows
+
+
+class FakeConnection:
+    """Records the statements a helper executes and answers them with the given rows."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.executed = []
+        self.commits = 0
+
+    def execute(self, sql, params=None, prepare=None):
+        self.executed.append((sql, params, prepare))
+        return FakeCursor(self.rows)
+
+    def commit(self):
+        self.commits += 1
+
+    @contextlib.contextmanager
+    def pipeline(self):
+        self.pipelined = True
+        yield
+
+
+def test_conninfo_escapes_values():
+    info = conninfo_to_dict(db_conninfo(DB_CONFIG, connect_timeout=3))
+    assert info == {'host': "db.example.com", 'port': "5432", 'dbname': "updates", 'user': "rel",
+                    'password': DB_CONFIG['db_password'], 'connect_timeout': "3"}
+
+
+def test_pool_key_keeps_only_a_password_digest():
+    key = DbConnectionPool.pool_key(DB_CONFIG)
+    assert DB_CONFIG['db_password'] not in key
+    assert key == DbConnectionPool.pool_key(dict(DB_CONFIG, db_port="5432"))
+    assert key != DbConnectionPool.pool_key(dict(DB_CONFIG, db_password="other"))
+
+
+def test_latency_stats():
+    pool = DbConnectionPool()
+    assert pool.latency_ms() == (0.0, 0.0, 0.0)
+    pool._latencies.extend(i / 1000 for i in range(1, 101))
+    median, p95, worst = pool.latency_ms()
+    assert median == pytest.approx(51) and p95 == pytest.approx(96) and worst == pytest.approx(100)
+
+
+@pytest.mark.parametrize("row, problems", [
+    ((False, [], False), ["table app_updates does not exist"]),
+    ((True, ['platform', 'version_code', 'version_name'], True), ["app_updates lacks column(s) release_notes, "
+     "download_url, is_mandatory, package_path, build_platform, build_timestamp, is_active, created_at"]),
+    ((True, ['platform', 'version_name', 'version_code', 'release_notes', 'download_url', 'is_mandatory',
+             'package_path', 'build_platform', 'build_timestamp', 'is_active', 'created_at', 'id'], False),
+     ["app_updates has no unique constraint on (platform, version_code) for ON CONFLICT"]),
+])
+def test_check_release_schema(row, problems):
+    conn = FakeConnection([row])
+    assert check_release_schema(conn) == problems
+    assert conn.executed[0][2] is True # Prepared
+
+
+def _release_config(platform, version_code, **fields):
+    config = {'platform': platform, 'version_name': "1.2.0", 'version_code': version_code,
+              'release_notes': "Fixes", 'build_platform': "Linux"}
+    config.update(fields)
+    return config
+
+
+def test_release_record_defaults():
+    built_at = datetime.datetime(2024, 5, 1, tzinfo=datetime.timezone.utc)
+    record = release_record(_release_config('android', 12), "android/app-1.2.0.apk", built_at)
+    assert tuple(record) == RELEASE_FIELDS
+    assert record['download_url'] is None and record['is_mandatory'] is False
+    assert record['package_path'] == "android/app-1.2.0.apk" and record['build_timestamp'] == built_at
+
+
+@pytest.mark.parametrize("pipeline_supported", [True, False])
+def test_publish_releases_passes_one_array_per_field(monkeypatch, pipeline_supported):
+    monkeypatch.setattr(psycopg.Pipeline, 'is_supported', staticmethod(lambda: pipeline_supported))
+    records = [
+        release_record(_release_config('android', 12), "android/a.apk", None),
+        release_record(_release_config('windows', 12, is_mandatory=True), "windows/a.zip", None),
+        release_record(_release_config('android', 12, release_notes="Rebuilt"), "android/b.apk", None),
+        release_record(_release_config('android', 13), "android/c.apk", None),
+    ]
+    conn = FakeConnection([('android', 12, False, 2), ('windows', 12, True, 2), ('android', 13, True, 2)])
+    rows, deactivated = publish_releases(conn, records)
+
+    [(sql, params, prepare)] = conn.executed
+    assert prepare is True and conn.commits == 1
+    assert getattr(conn, 'pipelined', False) == pipeline_supported
+    assert set(params) == set(RELEASE_FIELDS)
+    # One entry per (platform, version_code), the last duplicate wins, first-seen order is kept
+    assert params['platform'] == ['android', 'windows', 'android']
+    assert params['version_code'] == [12, 12, 13]
+    assert params['release_notes'] == ["Rebuilt", "Fixes", "Fixes"]
+    assert params['package_path'] == ["android/b.apk", "windows/a.zip", "android/c.apk"]
+    assert params['is_mandatory'] == [False, True, False]
+    assert rows == [('android', 12, False), ('windows', 12, True), ('android', 13, True)]
+    assert deactivated == 2
+
+
+def test_publish_releases_without_rows():
+    assert publish_releases(FakeConnection([]), []) == ([], 0)
@@ -0,0 +1,97 @@
+import os
+import random
+import hashlib
+import subprocess
+import sys
+
+from releaser_delta import create_patch, APPLY_SCRIPT
+
+
+def _apply(base_path, patch_path, out_path):
+    return subprocess.run([sys.executable, "-", str(base_path), str(patch_path), str(out_path)],
+                          input=APPLY_SCRIPT, capture_output=True, text=True)
+
+
+def _write(path, data):
+    path.write_bytes(data)
+    return path
+
+
+def test_round_trip_of_edited_file(tmp_path):
+    rng = random.Random(1)
+    base = rng.randbytes(300 * 1024)
+    # Insertions, a deletion and a changed block, so blocks move off their alignment
+    target = base[:1000] + b"inserted" + base[1000:50000] + rng.randbytes(5000) + base[60000:200000] + base[210000:]
+    base_path = _write(tmp_path / "base.apk", base)
+    target_path = _write(tmp_path / "target.apk", target)
+    patch_path = tmp_path / "target.patch"
+
+    size = create_patch(str(base_path), str(target_path), str(patch_path), block_bytes=4096)
+    assert size == os.path.getsize(patch_path)
+    assert size < len(target) * 0.2
+
+    out_path = tmp_path / "out.apk"
+    result = _apply(base_path, patch_path, out_path)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == "OK " + hashlib.sha256(target).hexdigest()
+    assert out_path.read_bytes() == target
+    assert not os.path.exists(f"{out_path}.delta-part")
+
+
+def test_round_trip_with_empty_base(tmp_path):
+    base_path = _write(tmp_path / "base", b"")
+    target_path = _write(tmp_path / "target", b"x" * 10000)
+    patch_path = tmp_path / "patch"
+    assert create_patch(str(base_path), str(target_path), str(patch_path), max_ratio=2.0) is not None # Header overhead
+    out_path = tmp_path / "out"
+    assert _apply(base_path, patch_path, out_path).returncode == 0
+    assert out_path.read_bytes() == b"x" * 10000
+
+
+def test_unrelated_files_give_no_patch(tmp_path):
+    rng = random.Random(2)
+    base_path = _write(tmp_path / "base", rng.randbytes(64 * 1024))
+    target_path = _write(tmp_path / "target", rng.randbytes(64 * 1024))
+    patch_path = tmp_path / "patch"
+    assert create_patch(str(base_path), str(target_path), str(patch_path)) is None
+    assert not patch_path.exists()
+
+
+def test_apply_rejects_wrong_base(tmp_path):
+    rng = random.Random(3)
+    base = rng.randbytes(64 * 1024)
+    base_path = _write(tmp_path / "base", base)
+    target_path = _write(tmp_path / "target", base + b"tail")
+    patch_path = tmp_path / "patch"
+    assert create_patch(str(base_path), str(target_path), str(patch_path)) is not None
+
+    wrong_base = _write(tmp_path / "wrong", rng.randbytes(64 * 1024))
+    out_path = _write(tmp_path / "out", b"previous")
+    result = _apply(wrong_base, patch_path, out_path)
+    assert result.returncode != 0
+    assert "does not match" in result.stderr
+    assert out_path.read_bytes() == b"previous"
+    assert not os.path.exists(f"{out_path}.delta-part")
+
+
+def test_apply_rejects_bad_patch_without_leftovers(tmp_path):
+    base_path = _write(tmp_path / "base", b"base")
+    for name, patch in (("header", b"NOTADELTA" + bytes(40)), ("truncated", b"GXDELTA1" + bytes(4))):
+        patch_path = _write(tmp_path / f"{name}.patch", patch)
+        out_path = tmp_path / f"{name}.out"
+        assert _apply(base_path, patch_path, out_path).returncode != 0
+        assert not out_path.exists()
+        assert not os.path.exists(f"{out_path}.delta-part")
+
+
+def test_slow_scan_gives_no_patch(tmp_path):
+    rng = random.Random(5)
+    base = rng.randbytes(256 * 1024)
+    # Every other stretch changed: passes the sampling pre-check, but needs a long byte-wise scan
+    target = b"".join(base[i:i + 8192] if i % 16384 == 0 else rng.randbytes(8192) for i in range(0, len(base), 8192))
+    base_path = _write(tmp_path / "base", base)
+    target_path = _write(tmp_path / "target", target)
+    patch_path = tmp_path / "patch"
+    assert create_patch(str(base_path), str(target_path), str(patch_path), max_ratio=0.9) is not None
+    assert create_patch(str(base_path), str(target_path), str(patch_path), max_ratio=0.9, max_seconds=0) is None
+    assert not patch_path.exists()
@@ -0,0 +1,82 @@
+import os
+
+from releaser_events import BuildEventStream, read_events
+
+FLUTTER_OUTPUT = [
+    "Resolving dependencies...",
+    "Running Gradle task 'assembleRelease'...",
+    "> Task :app:preBuild UP-TO-DATE",
+    "> Task :app:compileReleaseKotlin",
+    "w: Parameter 'x' is never used",
+    'Font asset "MaterialIcons-Regular.otf" was tree-shaken, reducing it from 1645184 to 2632 bytes (99.8% reduction).',
+    "Running Gradle task 'assembleRelease'...                          45.3s",
+    "✓ Built build/app/outputs/flutter-apk/app-release.apk (20.3MB)",
+]
+
+CONFIG = {'target_platform_text': "Android APK", 'platform': 'android', 'version_name': "1.2.0",
+          'version_code': 12, 'build_platform': "Linux"}
+
+
+def test_stream_writes_ndjson(tmp_path):
+    received = []
+    events = BuildEventStream(str(tmp_path), 'apk', on_event=received.append)
+    events.run_start(CONFIG)
+    events.stage('build')
+    for line in FLUTTER_OUTPUT:
+        events.feed(line)
+    events.end_build()
+    events.stage('upload')
+    events.run_end(True, "Released.")
+
+    written = read_events(events.path)
+    assert written == received == events.events
+    assert os.path.basename(events.path).endswith(f"-apk-{os.getpid()}.ndjson")
+    types = [event['type'] for event in written]
+    assert types == ['run_start', 'stage_start',
+                     'phase_start', 'phase_end', 'phase_start', 'task_start', 'task_end', 'task_start',
+                     'warning', 'tree_shake', 'phase_end', 'task_end',
+                     'stage_end', 'stage_start', 'stage_end', 'run_end']
+    assert written[0]['version_code'] == 12 and written[0]['target'] == "Android APK"
+    assert written[6] == {'t': written[6]['t'], 'type': 'task_end', 'name': ":app:preBuild",
+                          'duration': written[6]['duration'], 'outcome': 'UP-TO-DATE'}
+    assert written[9]['from_bytes'] == 1645184 and written[9]['to_bytes'] == 2632
+    assert written[10] == {'t': written[10]['t'], 'type': 'phase_end', 'name': "Running Gradle task 'assembleRelease'",
+                           'duration': 45.3}
+    assert written[-1]['stages'] == events.stages and set(events.stages) == {'build', 'upload'}
+    assert all(later['t'] >= earlier['t'] for earlier, later in zip(written[10:], written[11:]))
+
+
+def test_timed_phase_is_back_dated(tmp_path):
+    events = BuildEventStream(str(tmp_path), 'web')
+    events._start -= 10 # The run started 10 s ago
+    events.feed("Compiling lib/main.dart for the Web...                  2,5s")
+    start, end = events.events
+    assert start['type'] == 'phase_start' and 7.4 <= start['t'] <= 8 # Back-dated from now by 2.5 s
+    assert end['type'] == 'phase_end' and end['duration'] == 2.5
+    events.close()
+
+
+def test_run_end_is_reported_once_and_closes_the_file(tmp_path):
+    events = BuildEventStream(str(tmp_path), 'apk')
+    events.run_end(False, "Stopped.")
+    events.run_end(True, "Again.")
+    events.emit('warning', text="after the end") # Kept in memory only
+    assert [event['type'] for event in read_events(events.path)] == ['run_end']
+    assert events.count('run_end') == 1 and events.count('warning') == 1
+
+
+def test_read_events_skips_a_torn_line(tmp_path):
+    path = tmp_path / "events.ndjson"
+    path.write_text('{"t": 0, "type": "run_start"}\n{"t": 1.5, "type": "stage_')
+    assert read_events(str(path)) == [{'t': 0, 'type': 'run_start'}]
+
+
+def test_old_event_files_are_rotated(tmp_path):
+    for i in range(3):
+        old_path = tmp_path / f"events-2024010{i}-000000-apk-1.ndjson"
+        old_path.write_text("")
+        os.utime(old_path, (1000 + i, 1000 + i))
+    events = BuildEventStream(str(tmp_path), 'apk', keep_runs=2)
+    events.run_start(CONFIG)
+    events.close()
+    assert sorted(os.listdir(tmp_path)) == sorted(["events-20240102-000000-apk-1.ndjson", os.path.basename(events.path)])
@@ -0,0 +1,128 @@
+import time
+
+import pytest
+
+import releaser_jobs
+from releaser_jobs import JobStore, retry_delay
+
+
+def _config(project_dir="/work/app", target="apk", version_code=1):
+    return {
+        'project_dir': project_dir, 'target_platform_cmd': target, 'target_platform_text': "Android APK",
+        'version_name': "1.0.0", 'version_code': version_code, 'sftp_password': "secret",
+    }
+
+
+@pytest.fixture
+def store(tmp_path):
+    return JobStore(str(tmp_path / "queue.sqlite3"))
+
+
+def test_add_drops_passwords(store):
+    job_id = store.add(_config())
+    job = store.jobs()[0]
+    assert job['id'] == job_id
+    assert job['label'] == "Android APK v1.0.0+1"
+    assert 'sftp_password' not in job['config']
+
+
+def test_claim_takes_highest_priority_first(store):
+    low = store.add(_config(project_dir="/work/a"))
+    high = store.add(_config(project_dir="/work/b"), priority=5)
+    job = store.claim('build')
+    assert job['id'] == high
+    assert job['state'] == 'running'
+    assert job['build_attempts'] == 1
+    assert store.claim('build')['id'] == low
+    assert store.claim('build') is None
+    assert store.claim('upload') is None
+
+
+def test_claim_holds_build_while_same_target_uploads(store):
+    first = store.add(_config(version_code=1))
+    second = store.add(_config(version_code=2))
+    other = store.add(_config(target="web", version_code=3))
+    assert store.claim('build')['id'] == first
+    # The running build of the same project and target blocks the second one
+    assert store.claim('build')['id'] == other
+    store.advance(first, 'upload', artifact_path="/work/app/app.apk")
+    assert store.claim('build') is None
+    assert store.claim('upload')['id'] == first
+    store.advance(first, 'publish', remote_path="/srv/app.apk")
+    assert store.claim('build')['id'] == second
+
+
+def test_retry_waits_until_due(store, monkeypatch):
+    job_id = store.add(_config())
+    store.claim('build')
+    store.retry(job_id, 30, "Connection refused")
+    job = store.jobs()[0]
+    assert job['state'] == 'queued'
+    assert job['message'] == "Connection refused"
+    assert store.claim('build') is None
+    assert store.next_due('build') == pytest.approx(time.time() + 30, abs=5)
+
+    now = time.time()
+    monkeypatch.setattr(releaser_jobs.time, 'time', lambda: now + 31)
+    job = store.claim('build')
+    assert job['id'] == job_id
+    assert job['build_attempts'] == 2
+
+
+def test_requeue_gives_attempt_back(store):
+    job_id = store.add(_config())
+    store.claim('build')
+    store.advance(job_id, 'upload')
+    assert store.claim('upload')['upload_attempts'] == 1
+    store.requeue(job_id, 'build', 'upload', "Artifact changed, building again.")
+    job = store.jobs()[0]
+    assert (job['state'], job['stage']) == ('queued', 'build')
+    assert job['upload_attempts'] == 0
+    assert job['build_attempts'] == 1
+    assert store.claim('build')['build_attempts'] == 2
+    # Never below zero
+    store.requeue(job_id, 'build', 'publish', "Interrupted.")
+    assert store.jobs()[0]['publish_attempts'] == 0
+
+
+def test_stale_running_job_is_queued_again(store, monkeypatch):
+    job_id = store.add(_config())
+    store.claim('build')
+    now = time.time()
+    monkeypatch.setattr(releaser_jobs.time, 'time', lambda: now + releaser_jobs.JOB_STALE_SECONDS + 1)
+    job = store.claim('build')
+    assert job['id'] == job_id
+    assert job['message'] == "Interrupted, resuming."
+
+
+def test_cancel_queued_leaves_running_jobs(store):
+    running = store.add(_config(project_dir="/work/a"))
+    queued = store.add(_config(project_dir="/work/b"))
+    store.claim('build')
+    cancelled = store.cancel_queued()
+    assert [job['id'] for job in cancelled] == [queued]
+    assert {job['id']: job['state'] for job in store.jobs()} == {running: 'running', queued: 'cancelled'}
+
+
+def test_stats_per_stage(store):
+    job_id = store.add(_config())
+    store.claim('build')
+    store.record_attempt(job_id, 'build', time.time() - 60, True)
+    store.advance(job_id, 'upload')
+    stats = store.stats()
+    assert stats['counts']['queued'] == 1
+    build = stats['stages']['build']
+    assert build['busy_seconds'] == pytest.approx(60, abs=5)
+    assert build['avg_seconds'] == pytest.approx(60, abs=5)
+    assert stats['stages']['upload']['queued'] == 1
+    assert "last hour" in releaser_jobs.format_job_stats(stats)
+
+
+@pytest.mark.parametrize("attempt, expected", [(1, 10), (2, 20), (4, 80), (7, 600), (30, 600)])
+def test_retry_delay_doubles_up_to_cap(attempt, expected):
+    for _ in range(20):
+        assert expected * 0.9 <= retry_delay(attempt) <= expected * 1.1
+
+
+def test_retry_delay_is_jittered():
+    assert len({retry_delay(3) for _ in range(20)}) > 1
@@ -0,0 +1,109 @@
+import time
+import datetime
+
+import pytest
+
+from releaser_metrics import MetricsStore, regressions
+
+
+def _row(total_seconds, success=True, platform='android', minute=0):
+    return {
+        'recorded_at': datetime.datetime(2024, 5, 1, 12, minute, tzinfo=datetime.timezone.utc),
+        'platform': platform, 'target': "Android APK", 'version_name': "1.2.0", 'version_code': 12,
+        'build_platform': "Linux", 'success': success, 'build_seconds': None, 'build_cached': False,
+        'artifact_bytes': 1024, 'upload_mode': 'full', 'upload_bytes': 1024, 'upload_seconds': 1.0,
+        'upload_mbps': 2.0, 'db_ms': 12.5, 'total_seconds': total_seconds,
+    }
+
+
+def test_regressions_need_three_earlier_runs():
+    rows = [{'success': True, 'total_seconds': value} for value in (10, 50, 10, 10, 13, 12.4)]
+    # 50 has only one earlier run; 12.4 is within 25% of the median 10
+    assert regressions(rows, 'total_seconds') == [(4, 13, 10)]
+
+
+def test_regressions_skip_failed_and_missing_runs():
+    rows = [{'success': True, 'total_seconds': 10}] * 3 + [
+        {'success': False, 'total_seconds': 100},
+        {'success': True, 'total_seconds': None},
+        {'success': True, 'total_seconds': 20},
+    ]
+    assert regressions(rows, 'total_seconds') == [(5, 20, 10)]
+
+
+def test_regressions_use_a_rolling_window():
+    rows = [{'success': True, 'build_seconds': value} for value in (100, 100, 100, 10, 10, 10, 14)]
+    assert regressions(rows, 'build_seconds', window=3) == [(6, 14, 10)]
+    assert regressions(rows, 'build_seconds', window=10) == []
+
+
+def test_regressions_where_lower_is_worse():
+    rows = [{'success': True, 'upload_mbps': value} for value in (8, 8, 8, 7, 5)]
+    assert regressions(rows, 'upload_mbps', higher_is_worse=False) == [(4, 5, 8)]
+
+
+@pytest.fixture
+def store(tmp_path):
+    return MetricsStore(str(tmp_path / "metrics" / "metrics.sqlite3"))
+
+
+def _pending(store):
+    conn = store._connect_local()
+    try:
+        return [row for _, row in store._local_rows(conn)]
+    finally:
+        conn.close()
+
+
+def test_local_rows_round_trip(store):
+    row = _row(42.5)
+    store.record_local(row)
+    assert _pending(store) == [row]
+
+
+def test_flush_moves_rows_to_postgres(store, monkeypatch):
+    inserted = []
+    monkeypatch.setattr(store, '_insert_postgres', lambda config, rows: inserted.extend(rows))
+    store.record_local(_row(10, minute=1))
+    store.record_local(_row(11, minute=2))
+    assert store.flush({}) == "PostgreSQL (2 run(s))"
+    assert [row['total_seconds'] for row in inserted] == [10, 11]
+    assert _pending(store) == []
+    assert store.flush({}) == "PostgreSQL (nothing pending)"
+
+
+def test_failed_flush_keeps_rows_for_the_next_run(store):
+    store.record_local(_row(10))
+    assert store.flush({}) == "local SQLite (ValueError: database not configured)"
+    conn = store._connect_local()
+    try:
+        assert conn.execute("SELECT count(*) FROM release_metrics WHERE claim IS NULL").fetchone() == (1,)
+    finally:
+        conn.close()
+    assert store.history({}, 'android') == ([_row(10)], "local SQLite (ValueError)")
+    assert store.history({}, 'ios')[0] == []
+
+
+def test_flush_skips_rows_claimed_by_another_flush(store, monkeypatch):
+    inserted = []
+    monkeypatch.setattr(store, '_insert_postgres', lambda config, rows: inserted.extend(rows))
+    store.record_local(_row(10, minute=1))
+    store.record_local(_row(11, minute=2))
+    conn = store._connect_local()
+    try:
+        conn.execute("UPDATE release_metrics SET claim = 'other', claimed_until = ? WHERE total_seconds = 10",
+                     (time.time() + 60,))
+        conn.execute("UPDATE release_metrics SET claim = 'crashed', claimed_until = ? WHERE total_seconds = 11",
+                     (time.time() - 1,)) # Claim of a flush that never finished
+    finally:
+        conn.close()
+    assert store.flush({}) == "PostgreSQL (1 run(s))"
+    assert [row['total_seconds'] for row in inserted] == [11]
+    assert [row['total_seconds'] for row in _pending(store)] == [10]
+
+
+def test_record_flushes_in_the_background(store, monkeypatch):
+    monkeypatch.setattr(store, '_insert_postgres', lambda config, rows: None)
+    future = store.record({'db_host': "db"}, _row(10))
+    assert future.result(timeout=10) == "PostgreSQL (1 run(s))"
+    assert _pending(store) == []
@@ -0,0 +1,88 @@
+import socket
+
+import pytest
+
+import releaser_probe
+from releaser_probe import ProbeCache, ProbeEngine, ProbeResult, probe_key, probe_names
+
+DB_CONFIG = {'db_host': "db.example.com", 'db_port': 5432, 'db_name': "updates", 'db_user': "rel", 'db_password': "secret"}
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(releaser_probe.time, 'monotonic', clock)
+    return clock
+
+
+def test_probe_names_and_keys():
+    assert probe_names({'probe_endpoints': ["cdn.example.com:443"]}) == ['db', 'sftp', "endpoint:cdn.example.com:443"]
+    key = probe_key('db', DB_CONFIG)
+    assert "secret" not in key
+    assert key == probe_key('db', dict(DB_CONFIG, db_port="5432"))
+    assert key != probe_key('db', dict(DB_CONFIG, db_password="other"))
+    with pytest.raises(KeyError):
+        probe_key('sftp', DB_CONFIG)
+
+
+def test_cache_entries_expire_after_the_ttl(clock):
+    cache = ProbeCache(ttl=60)
+    result = ProbeResult('db', True, "ok", 0.2, False)
+    cache.put(probe_key('db', DB_CONFIG), result)
+    clock.now += 59
+    assert cache.get(probe_key('db', DB_CONFIG)) == (59, result)
+    assert cache.fresh('db', DB_CONFIG) == 59
+    clock.now += 2
+    assert cache.fresh('db', DB_CONFIG) is None
+    assert cache._results == {} # Dropped once expired
+
+
+def test_cache_invalidation(clock):
+    cache = ProbeCache()
+    cache.put(probe_key('db', DB_CONFIG), ProbeResult('db', True, "ok", 0.2, False))
+    assert cache.fresh('db', dict(DB_CONFIG, db_password="changed")) is None # Other settings, other key
+    assert cache.fresh('sftp', DB_CONFIG) is None # Config without SFTP fields
+    cache.invalidate('db', DB_CONFIG)
+    assert cache.fresh('db', DB_CONFIG) is None
+    cache.put(probe_key('db', DB_CONFIG), ProbeResult('db', True, "ok", 0.2, False))
+    cache.clear()
+    assert cache.fresh('db', DB_CONFIG) is None
+
+
+@pytest.fixture
+def engine():
+    engine = ProbeEngine(ProbeCache())
+    yield engine
+    engine.close()
+
+
+def test_engine_caches_successful_probes(engine):
+    with socket.socket() as listener:
+        listener.bind(("127.0.0.1", 0))
+        listener.listen()
+        target = f"127.0.0.1:{listener.getsockname()[1]}"
+        config = {'probe_endpoints': [target]}
+        seen = []
+        [first] = engine.probe(config, names=[f"endpoint:{target}"], on_result=seen.append).result(timeout=10)
+    assert first.success and not first.cached and seen == [first]
+
+    [second] = engine.probe(config, names=[f"endpoint:{target}"]).result(timeout=10) # Listener closed by now
+    assert second.success and second.cached and second.seconds == 0.0
+    [third] = engine.probe(config, names=[f"endpoint:{target}"], use_cache=False).result(timeout=10)
+    assert not third.success and third.message.startswith("Unreachable")
+
+
+def test_engine_reports_config_errors(engine):
+    db, sftp, endpoint = engine.probe({'probe_endpoints': ["no-port"]}).result(timeout=10)
+    assert (db.success, db.message) == (False, "Config Error: Missing db_host.")
+    assert (sftp.success, sftp.message) == (False, "Config Error: Missing sftp_host.")
+    assert (endpoint.success, endpoint.message) == (False, "Config Error: Expected host:port or an http(s) URL.")
+    assert engine.cache._results == {}
@@ -0,0 +1,159 @@
+import os
+import random
+import contextlib
+import types
+
+import pytest
+
+pytest.importorskip("paramiko")
+
+from releaser_sftp import ParallelUploader, SFTP_UPLOAD_BLOCK_BYTES
+
+CHUNK = SFTP_UPLOAD_BLOCK_BYTES
+
+
+class _FakeRemoteFile:
+    def __init__(self, sftp, path, mode):
+        self._sftp = sftp
+        self._file = open(path, mode)
+
+    def set_pipelined(self, pipelined):
+        pass
+
+    def seek(self, offset):
+        self._file.seek(offset)
+
+    def write(self, data):
+        offset = self._file.tell()
+        if self._sftp.fail_at.get(offset, 0) > 0:
+            self._sftp.fail_at[offset] -= 1
+            raise OSError(f"Connection lost at {offset}")
+        self._sftp.written += len(data)
+        self._file.write(data)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self._file.close()
+
+
+class FakeSftp:
+    """SFTP client on a local directory; fail_at maps write offsets to the number of failures left."""
+
+    def __init__(self, root):
+        self.root = root
+        self.fail_at = {}
+        self.written = 0
+
+    def _local(self, path):
+        return os.path.join(self.root, path.lstrip('/'))
+
+    def open(self, path, mode):
+        return _FakeRemoteFile(self, self._local(path), mode)
+
+    def stat(self, path):
+        return os.stat(self._local(path))
+
+    def truncate(self, path, size):
+        os.truncate(self._local(path), size)
+
+    def posix_rename(self, old_path, new_path):
+        os.replace(self._local(old_path), self._local(new_path))
+
+
+class FakePool:
+    def __init__(self, sftp):
+        self.sftp = sftp
+        self.checkouts = 0
+
+    @contextlib.contextmanager
+    def checkout(self, config):
+        self.checkouts += 1
+        yield types.SimpleNamespace(sftp=self.sftp)
+
+    def discard_if_dead(self, config):
+        pass
+
+
+CONFIG = {'sftp_host': "files.example.com", 'sftp_port': 22, 'sftp_user': "deploy", 'sftp_password': "secret"}
+
+
+@pytest.fixture
+def sftp(tmp_path):
+    (tmp_path / "remote").mkdir()
+    return FakeSftp(str(tmp_path / "remote"))
+
+
+def _artifact(tmp_path, size):
+    path = tmp_path / "app.apk"
+    path.write_bytes(random.Random(7).randbytes(size))
+    return path
+
+
+def test_upload_in_chunks(tmp_path, sftp):
+    local_path = _artifact(tmp_path, int(3.5 * CHUNK))
+    progress = []
+    uploader = ParallelUploader(FakePool(sftp), CONFIG, channels=8, chunk_bytes=CHUNK,
+                                manifest_dir=str(tmp_path / "manifests"), progress=lambda done, total: progress.append(done))
+    stats = uploader.upload(str(local_path), "/app.apk")
+
+    assert (tmp_path / "remote" / "app.apk").read_bytes() == local_path.read_bytes()
+    assert not (tmp_path / "remote" / "app.apk.part").exists()
+    assert stats['chunks'] == 4 and stats['channels'] == 4 # Never more channels than chunks
+    assert stats['bytes'] == sftp.written and stats['resumed_bytes'] == 0 and stats['retries'] == 0
+    assert max(progress) == stats['bytes']
+    assert os.listdir(tmp_path / "manifests") == [] # Removed once the file is complete
+
+
+def test_chunk_size_has_a_floor(tmp_path, sftp):
+    uploader = ParallelUploader(FakePool(sftp), CONFIG, chunk_bytes=1)
+    assert uploader.chunk_bytes == CHUNK
+    local_path = _artifact(tmp_path, 10)
+    assert uploader.upload(str(local_path), "/small.apk")['chunks'] == 1
+    assert (tmp_path / "remote" / "small.apk").read_bytes() == local_path.read_bytes()
+
+
+def test_failed_range_is_retried(tmp_path, sftp):
+    local_path = _artifact(tmp_path, 3 * CHUNK)
+    sftp.fail_at = {CHUNK: 1}
+    stats = ParallelUploader(FakePool(sftp), CONFIG, channels=2, chunk_bytes=CHUNK).upload(str(local_path), "/app.apk")
+    assert stats['retries'] == 1
+    assert (tmp_path / "remote" / "app.apk").read_bytes() == local_path.read_bytes()
+
+
+def test_interrupted_upload_resumes_from_the_manifest(tmp_path, sftp):
+    local_path = _artifact(tmp_path, 4 * CHUNK + 100)
+    manifest_dir = str(tmp_path / "manifests")
+    sftp.fail_at = {2 * CHUNK: 10}
+    with pytest.raises(OSError, match="Connection lost"):
+        ParallelUploader(FakePool(sftp), CONFIG, channels=1, chunk_bytes=CHUNK, manifest_dir=manifest_dir,
+                         retries=1).upload(str(local_path), "/app.apk")
+    assert not (tmp_path / "remote" / "app.apk").exists()
+    assert (tmp_path / "remote" / "app.apk.part").exists()
+    [manifest_name] = os.listdir(manifest_dir)
+
+    sftp.fail_at = {}
+    sftp.written = 0
+    stats = ParallelUploader(FakePool(sftp), CONFIG, channels=1, chunk_bytes=CHUNK,
+                             manifest_dir=manifest_dir).upload(str(local_path), "/app.apk")
+    assert stats['resumed_bytes'] == 2 * CHUNK # Chunks 0 and 1 were done
+    assert sftp.written == 2 * CHUNK + 100
+    assert (tmp_path / "remote" / "app.apk").read_bytes() == local_path.read_bytes()
+    assert os.listdir(manifest_dir) == []
+
+
+def test_manifest_of_a_changed_file_is_ignored(tmp_path, sftp):
+    local_path = _artifact(tmp_path, 2 * CHUNK)
+    manifest_dir = str(tmp_path / "manifests")
+    sftp.fail_at = {CHUNK: 10}
+    with pytest.raises(OSError):
+        ParallelUploader(FakePool(sftp), CONFIG, channels=1, chunk_bytes=CHUNK, manifest_dir=manifest_dir,
+                         retries=0).upload(str(local_path), "/app.apk")
+
+    local_path.write_bytes(random.Random(8).randbytes(2 * CHUNK + 1)) # Rebuilt in the meantime
+    sftp.fail_at = {}
+    stats = ParallelUploader(FakePool(sftp), CONFIG, channels=1, chunk_bytes=CHUNK,
+                             manifest_dir=manifest_dir).upload(str(local_path), "/app.apk")
+    assert stats['resumed_bytes'] == 0
+    assert (tmp_path / "remote" / "app.apk").read_bytes() == local_path.read_bytes()
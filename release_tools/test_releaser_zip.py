@@ -0,0 +1,115 @@
+import io
+import os
+import zlib
+import random
+import struct
+import zipfile
+
+import releaser_zip
+from releaser_zip import write_zip_stream, list_files
+
+
+def _site(tmp_path):
+    site = tmp_path / "web"
+    (site / "assets" / "fonts").mkdir(parents=True)
+    rng = random.Random(4)
+    files = {
+        "index.html": b"<html><body>" + b"hello world " * 2000 + b"</body></html>",
+        "main.dart.js": b"function f(){return 1;}\n" * 100000, # Several chunks, compressible
+        "assets/noise.bin": rng.randbytes(int(2.5 * releaser_zip.ZIP_CHUNK_BYTES)), # Several chunks, incompressible
+        "assets/icon.png": rng.randbytes(3000),
+        "assets/fonts/empty.txt": b"",
+        "assets/fonts/été.txt": b"utf-8 name",
+    }
+    for name, data in files.items():
+        (site / name).write_bytes(data)
+    return site, files
+
+
+def test_list_files_order_is_stable(tmp_path):
+    site, files = _site(tmp_path)
+    names = [name for _, name in list_files(str(site))]
+    assert names == ["index.html", "main.dart.js", "assets/icon.png", "assets/noise.bin",
+                     "assets/fonts/empty.txt", "assets/fonts/été.txt"]
+
+
+def test_archive_is_valid_and_complete(tmp_path):
+    site, files = _site(tmp_path)
+    out = io.BytesIO()
+    progress = []
+    stats = write_zip_stream(str(site), out, progress=lambda done, total: progress.append((done, total)),
+                             workers=4, memory_budget=4 * releaser_zip.ZIP_CHUNK_BYTES)
+
+    with zipfile.ZipFile(io.BytesIO(out.getvalue())) as archive:
+        assert archive.testzip() is None
+        assert sorted(archive.namelist()) == sorted(files)
+        for name, data in files.items():
+            assert archive.read(name) == data
+        methods = {info.filename: info.compress_type for info in archive.infolist()}
+    assert methods["main.dart.js"] == zipfile.ZIP_DEFLATED
+    assert methods["index.html"] == zipfile.ZIP_DEFLATED
+    assert methods["assets/noise.bin"] == zipfile.ZIP_STORED
+    assert methods["assets/icon.png"] == zipfile.ZIP_STORED
+
+    total = sum(len(data) for data in files.values())
+    assert stats['files'] == len(files)
+    assert stats['input_bytes'] == total
+    assert stats['output_bytes'] == len(out.getvalue())
+    assert stats['output_bytes'] < total
+    assert progress[-1] == (total, total)
+
+
+def _read_sequentially(data):
+    """{name: bytes} read front to back from the local headers, like Java's ZipInputStream."""
+    files = {}
+    pos = 0
+    while data[pos:pos + 4] == b"PK\x03\x04":
+        _, _, flags, method, _, _, crc, csize, size, name_length, extra_length = \
+            struct.unpack('<IHHHHHIIIHH', data[pos:pos + 30])
+        name = data[pos + 30:pos + 30 + name_length].decode('utf-8')
+        pos += 30 + name_length + extra_length
+        if method == zipfile.ZIP_STORED:
+            assert not flags & 0x08, f"{name}: stored entry with a data descriptor"
+            content = data[pos:pos + csize]
+            pos += csize
+        else:
+            decompressor = zlib.decompressobj(-15)
+            content = decompressor.decompress(data[pos:])
+            assert decompressor.eof
+            pos = len(data) - len(decompressor.unused_data)
+            if flags & 0x08:
+                signature, crc, csize, size = struct.unpack('<IIII', data[pos:pos + 16])
+                assert signature == 0x08074b50
+                pos += 16
+        assert len(content) == size and zlib.crc32(content) == crc, name
+        files[name] = content
+    return files
+
+
+def test_archive_reads_as_a_stream(tmp_path):
+    site, files = _site(tmp_path)
+    (site / "assets" / "video.mp4").write_bytes(random.Random(6).randbytes(3 * releaser_zip.ZIP_CHUNK_BYTES + 5))
+    files["assets/video.mp4"] = (site / "assets" / "video.mp4").read_bytes()
+    out = io.BytesIO()
+    write_zip_stream(str(site), out)
+    assert _read_sequentially(out.getvalue()) == files
+
+
+def test_file_modes_are_kept(tmp_path):
+    site = tmp_path / "web"
+    site.mkdir()
+    script = site / "run.sh"
+    script.write_bytes(b"#!/bin/sh\n")
+    os.chmod(script, 0o755)
+    out = io.BytesIO()
+    write_zip_stream(str(site), out)
+    with zipfile.ZipFile(out) as archive:
+        assert (archive.getinfo("run.sh").external_attr >> 16) & 0o777 == 0o755
+
+
+def test_empty_directory(tmp_path):
+    out = io.BytesIO()
+    stats = write_zip_stream(str(tmp_path), out)
+    assert stats['files'] == 0
+    with zipfile.ZipFile(out) as archive:
+        assert archive.namelist() == []